@@ -1,32 +1,45 @@
-import io
 import json
 import os
 import pickle
+import random
 import tempfile
 import warnings
 import zipfile
-from datetime import datetime
 from io import BytesIO
 from pprint import pprint
+from typing import List
 from typing import Optional
 from typing import Tuple
 
 import debug_config
-from param_changes import apply_agent_activity_overrides
-from param_changes import apply_global_activity_overrides
-from param_changes import apply_simple_overrides
-from param_changes import change_agent_schedule
-from param_changes import change_distribution_activity_durations
-from param_changes import change_inter_arrival_distribution
+import numpy as np
 from param_changes import change_num_cases
-from param_changes import change_start_time
-from param_changes import change_transition_probabilities
-from param_changes import update_agent_count
+from parameter_change_set import ParameterChangeSet
 from simulation_config import SimulationConfig
 from simulation_config import load_simulation_config
 from simulation_config import save_simulation_config
-from source.discovery_to_json import agent_to_json
+from source.batch_simulation import compare_replications
+from source.batch_simulation import get_replication_seeds
+from source.batch_simulation import read_simulated_log
+from source.batch_simulation import summarize_log
+from source.batch_simulation import summarize_replications
+from source.discovery_to_json import dump_agent_json
+from source.discovery_to_json import dump_visualization_json
+from source.job_executor import FINISHED
+from source.job_executor import JobExecutor
 from source.json_data_class import JsonVisualization
+from source.model_format import CONFIG_SECTION
+from source.model_format import SECTIONS
+from source.model_format import dump_model
+from source.model_format import get_changed_sections
+from source.model_format import load_model
+from source.model_registry import get_overlay_hash
+from source.model_registry import model_registry
+from source.runtime_meter import RuntimeMeter
+from source.runtime_meter import track_job
+from source.staffing_optimizer import StaffingSearch
+from source.staffing_optimizer import get_staffing_cost
+from source.staffing_optimizer import search_staffing
 from werkzeug.datastructures import FileStorage
 
 """
@@ -42,114 +55,372 @@ MODEL_DESCRIPTION = "Module for managing Agent Simulator."
 
 
 # ============= Public module functions =============
-__all__ = ["start_simulation_from_api", "update_parameters", "start_discovery_from_api"]
-
-
-def start_discovery_from_api(sim_config: SimulationConfig, args) -> Tuple[JsonVisualization, Optional[str]]:
+__all__ = [
+    "start_simulation_from_api",
+    "update_parameters",
+    "apply_overlays",
+    "start_discovery_from_api",
+    "update_discovery_from_api",
+    "run_discovery_job",
+    "run_simulation_job",
+    "register_discovery_bundle",
+    "run_replication_job",
+    "simulate_variants",
+    "optimize_staffing",
+]
+
+
+def start_discovery_from_api(
+    sim_config: SimulationConfig, args, meter: Optional[RuntimeMeter] = None
+) -> Tuple[JsonVisualization, str, bytes]:
     """
-    Runs the discovery phase, generates Json data for visualization and dumps a pkl file for simulation phase
+    Runs the discovery phase, generates Json data for visualization, the parameters as json text (params.json)
+    and encodes the model for simulation phase (see source/model_format.py),
+    the wall time and peak memory of every step are recorded in the meter
     """
+    meter = meter if meter is not None else RuntimeMeter(kind="discovery")
 
     # Process all arguments
     sim_config.process_discovery_args(args)
 
     # Run discovery
-    sim_config.run_discovery()
-
-    # Save to pkl
-    # Create a bytes buffer for the pkl object
-    buffer = io.BytesIO()
-
-    # Dump the object into the buffer
-    pickle.dump(sim_config, buffer)
+    sim_config.run_discovery(meter=meter)
 
-    # Get the binary content
-    binary_data = buffer.getvalue()
+    # Encode the model, it is returned as model.pkl
+    with meter.stage("save_model"):
+        binary_data = dump_model(sim_config)
 
     # Generate JSON Visualization data
-    json_visualization_data = sim_config.sim_instance.generate_html()
+    with meter.stage("visualization"):
+        json_visualization_data = sim_config.sim_instance.generate_html()
 
     # Generate Json params
-    json_params_data = agent_to_json(sim_config.sim_instance)
+    with meter.stage("parameters_json"):
+        params_json = dump_agent_json(sim_config.sim_instance)
+
+    # The model is registered so it can be simulated by its hash without uploading it
+    model_registry.register(binary_data, sim_config, json_visualization_data)
 
     # Return all json visualization data along with the parameter data and pkl file to api
-    return json_visualization_data, json_params_data["data"], binary_data
+    return json_visualization_data, params_json, binary_data
 
 
-def start_simulation_from_api(pkl_file: FileStorage):
-    # Load the pickle data
-    buffer = io.BytesIO(pkl_file.read())
-    sim_config = pickle.load(buffer)
+def run_discovery_job(job_id: str, directory: str, args: dict, log_file: str) -> bytes:
+    """
+    Runs a discovery job in a worker process of the job executor (see source/job_executor.py)
 
-    with tempfile.TemporaryDirectory() as simulation_dir:
-        # Set the correct path
-        sim_config.sim_instance.data_dir = simulation_dir
+    Args:
+        job_id (str): Id of the job, the progress of the discovery is recorded under this id
+        directory (str): Directory of the job, with the event log (log_file)
+        args (dict): The discovery parameters, see parse_discovery_parameters
 
-        _start_simulation(sim_config)
+    Returns: The zip file of start-agent-discovery, with model.pkl, params.json, visualization.json and runtime.json
+    """
+    args = {**args, "log_path": os.path.join(directory, log_file), "job_id": job_id}
+    sim_config = SimulationConfig()
 
-        # Get number of simulations for knowing the amount of eventlogs in the output
-        num_simulations = sim_config.sim_instance.params["num_simulations"]
+    with track_job(RuntimeMeter(job_id, kind="discovery")) as meter:
+        visualization_data, params_json, pkl_data = start_discovery_from_api(sim_config, args, meter)
 
-        # Create in-memory ZIP
-        memory_file = BytesIO()
-        with zipfile.ZipFile(memory_file, "w") as zf:
-            for i in range(num_simulations):
-                filename = f"simulated_log_{i}.csv"
-                file_path = os.path.join(simulation_dir, filename)
+    memory_file = BytesIO()
+    with zipfile.ZipFile(memory_file, "w") as zf:
+        zf.writestr("visualization.json", dump_visualization_json(visualization_data))
+        zf.writestr("params.json", params_json)
+        zf.writestr("model.pkl", pkl_data)
+        zf.writestr("runtime.json", json.dumps(meter.to_dict(), indent=2))
 
-                # Check if the file exists before reading
-                if os.path.exists(file_path):
-                    with open(file_path, "r") as file:
-                        content = file.read()
-                    zf.writestr(filename, content)
-                else:
-                    print("File: ", file_path, " not found")
+    return memory_file.getvalue()
 
-        memory_file.seek(0)
 
-        return memory_file
+def run_simulation_job(job_id: str, directory: str, model: bytes) -> bytes:
+    """
+    Runs a simulation job in a worker process of the job executor (see source/job_executor.py)
+
+    Args:
+        job_id (str): Id of the job, the progress of the simulation is recorded under this id
+        directory (str): Directory of the job, the simulated logs are written there
+        model (bytes): The pickled model to simulate, see ModelRegistry.dump. The model was decoded
+            by the service already, unpickling it is faster than decoding the model file again
+
+    Returns: The zip file of start-agent-simulation, see start_simulation_from_api
+    """
+    with track_job(RuntimeMeter(job_id, kind="simulation")) as meter:
+        with meter.stage("load_model"):
+            sim_config = pickle.loads(model)
+        return _simulate(sim_config, meter).getvalue()
+
+
+def register_discovery_bundle(bundle: bytes) -> str:
+    """
+    Registers the model of the zip file of a discovery job (see run_discovery_job), the discovery ran in a
+        worker process so the model is not registered yet
+
+        Returns: The hash of the model
+    """
+    with zipfile.ZipFile(BytesIO(bundle)) as zf:
+        return model_registry.register(zf.read("model.pkl"))
+
+
+def run_replication_job(job_id: str, directory: str, model: bytes, seed: int, include_log: bool) -> bytes:
+    """
+    Runs one replication of a batch simulation (see simulate_variants) in a worker process of the job executor,
+        the model is simulated once with the seed
+
+    Args:
+        job_id (str): Id of the job, the progress of the simulation is recorded under this id
+        directory (str): Directory of the job, the simulated log is written there
+        model (bytes): The pickled model to simulate, see run_simulation_job
+        seed (int): Seed of the random samples of the simulation
+        include_log (bool): If the simulated log is returned as well
+
+    Returns: A zip file with summary.json (see source/batch_simulation.py), runtime.json and,
+        with include_log, simulated_log.csv
+    """
+    sim_config = pickle.loads(model)
+    sim_config.sim_instance.params = {**sim_config.sim_instance.params, "num_simulations": 1}
+    sim_config.sim_instance.data_dir = directory
+
+    # The simulation samples from the global generators (random, numpy and scipy)
+    random.seed(seed)
+    np.random.seed(seed)
+
+    with track_job(RuntimeMeter(job_id, kind="simulation")) as meter:
+        _start_simulation(sim_config, meter)
+
+    log_path = os.path.join(directory, "simulated_log_0.csv")
+    summary = summarize_log(read_simulated_log(log_path))
+
+    memory_file = BytesIO()
+    with zipfile.ZipFile(memory_file, "w") as zf:
+        zf.writestr("summary.json", json.dumps(summary))
+        zf.writestr("runtime.json", json.dumps(meter.to_dict(), indent=2))
+        if include_log:
+            zf.write(log_path, "simulated_log.csv")
+
+    return memory_file.getvalue()
+
+
+def simulate_variants(
+    executor: JobExecutor,
+    models: List[bytes],
+    num_simulations: int,
+    seed: Optional[int] = None,
+    common_seeds: bool = True,
+    include_logs: bool = False,
+    job_id: Optional[str] = None,
+    first_replication: int = 0,
+) -> Tuple[dict, dict]:
+    """
+    Simulates variants of a model (e.g. the model with different parameter changes applied, see apply_overlays)
+        [num_simulations] times each, every replication runs as a simulation job of the executor.
+
+        The variants are derived and pickled once by the caller, the replications of all variants run in parallel
+        (as many as the executor allows). With common seeds the i-th replication of every variant uses the same
+        seed, see source/batch_simulation.py
+
+    Args:
+        executor (JobExecutor): Executor the replications are submitted to
+        models (list): The pickled models of the variants (see ModelRegistry.dump), the registry may not keep
+            all of them
+        num_simulations (int): Number of replications per variant
+        seed (int): Optional, seed of the batch, the same seed gives the same replications
+        common_seeds (bool): If the i-th replication of every variant uses the same seed
+        include_logs (bool): If the simulated logs are returned
+        job_id (str): Optional, the jobs of the replications get the ids <job_id>-<variant>-<replication>
+        first_replication (int): Index of the first replication, to add replications to the ones of an earlier
+            batch with the same seed
+
+    Raises:
+        ValueError: If a job id is used already
+        RuntimeError: If a replication failed, the other replications are cancelled
+
+    Returns: The summary of the batch, with the seed and per variant the summary of its replications (and with
+        common seeds the difference of its replications to the ones of the first variant), and the simulated logs
+        {variant_<i>/simulated_log_<j>.csv: content}
+    """
+    seed, variant_seeds = get_replication_seeds(len(models), num_simulations, seed, common_seeds, first_replication)
+
+    jobs = {}
+    try:
+        for i, seeds in enumerate(variant_seeds):
+            for j, replication_seed in enumerate(seeds):
+                replication_job_id = executor.submit(
+                    "simulation",
+                    run_replication_job,
+                    models[i],
+                    replication_seed,
+                    include_logs,
+                    job_id=f"{job_id}-{i}-{first_replication + j}" if job_id else None,
+                )
+                jobs[replication_job_id] = (i, j)
+
+        summaries = [[None] * num_simulations for _ in models]
+        logs = {}
+        for status in executor.as_completed(list(jobs)):
+            if status["status"] != FINISHED:
+                raise RuntimeError(status["error"] or f"Job is {status['status']}: {status['job_id']}")
+
+            i, j = jobs[status["job_id"]]
+            with zipfile.ZipFile(BytesIO(executor.read_result(status["job_id"]))) as zf:
+                summaries[i][j] = {"seed": variant_seeds[i][j], **json.loads(zf.read("summary.json"))}
+                if include_logs:
+                    logs[f"variant_{i}/simulated_log_{first_replication + j}.csv"] = zf.read("simulated_log.csv")
+            executor.discard(status["job_id"])
+    finally:
+        # Cancels the replications that did not finish if one failed
+        for replication_job_id in jobs:
+            executor.discard(replication_job_id)
+
+    variants = []
+    for i in range(len(models)):
+        variant = {
+            "variant": i,
+            "num_simulations": num_simulations,
+            "summary": summarize_replications(summaries[i]),
+            "replications": summaries[i],
+        }
+        if common_seeds and i > 0:
+            variant["difference"] = compare_replications(summaries[i], summaries[0])
+        variants.append(variant)
+
+    return {"seed": seed, "common_seeds": common_seeds, "variants": variants}, logs
+
+
+def optimize_staffing(executor: JobExecutor, model_hash: str, search: StaffingSearch, job_id: Optional[str] = None):
+    """
+    Searches the staffing (agent counts and schedules) of a registered model, see source/staffing_optimizer.py
+
+        Every candidate is derived from the model once (see apply_overlays), the candidates are simulated with
+        common seeds in rounds of batch simulations (see simulate_variants), so their replications run in parallel
+
+    Args:
+        executor (JobExecutor): Executor the replications are submitted to
+        model_hash (str): Hash of the registered model
+        search (StaffingSearch): The staffing options and settings of the search
+        job_id (str): Optional, prefix of the ids of the replication jobs, see simulate_variants
+
+    Returns: The Pareto front of cost against the kpi and every candidate, see search_staffing
+    """
+    candidates = search.get_candidates()
+    candidate_models = []
+    for candidate in candidates:
+        overlays = [json.dumps(overlay).encode() for overlay in candidate.get_overlays()]
+        candidate_hash = apply_overlays(model_hash, overlays)
+        # The registry only keeps the latest models, the pickled candidates are kept here
+        candidate_models.append(model_registry.dump(candidate_hash))
+        candidate.cost = get_staffing_cost(
+            model_registry.get(candidate_hash).sim_instance.simulation_parameters,
+            search.get_hourly_costs(),
+            search.hourly_cost,
+        )
+
+    def evaluate(active_candidates, first_replication, num_replications):
+        summary, _ = simulate_variants(
+            executor,
+            [candidate_models[candidate.index] for candidate in active_candidates],
+            num_replications,
+            seed=search.seed,
+            job_id=job_id,
+            first_replication=first_replication,
+        )
+        return [variant["replications"] for variant in summary["variants"]]
+
+    return search_staffing(search, candidates, evaluate)
+
+
+def start_simulation_from_api(
+    pkl_file: Optional[FileStorage], meter: Optional[RuntimeMeter] = None, model_hash: Optional[str] = None
+):
+    """
+    Runs the simulation of a discovered model, returns a zip file with the simulated logs and
+        runtime.json with the wall time and peak memory of every simulation and the number of simulation steps
+
+        The model is either uploaded (pkl_file) or was registered before (model_hash), see _get_model
+    """
+    meter = meter if meter is not None else RuntimeMeter(kind="simulation")
+
+    # Load the model
+    with meter.stage("load_model"):
+        sim_config = _get_model(pkl_file, model_hash)
 
+    return _simulate(sim_config, meter)
 
-def update_parameters(pkl_file: FileStorage, json_file: FileStorage):
+
+def update_parameters(pkl_file: Optional[FileStorage], json_file: FileStorage, model_hash: Optional[str] = None):
     """
-    Takes a pickle binary file and a json with parameter changes and updates
-        the pickle file with those changes.
+    Takes a model file (or the hash of a registered model, see _get_model) and a json with parameter changes
+        and updates the model with those changes.
+
+        Only the changes that change the model are applied, on top of the unchanged model (see
+        parameter_change_set.py), and the parts of the model file and the visualization data
+        that they do not change are reused.
 
         Returns: A zip file
     """
-    # Load pickle file
-    buffer = io.BytesIO(pkl_file.read())
+    if pkl_file is not None:
+        model_hash = model_registry.register(pkl_file.read())
 
-    sim_config = pickle.load(buffer)
+    # The changes are applied as an overlay of the model, see apply_overlays
+    updated_model_hash = _apply_overlay(model_hash, json_file.read())
 
-    json_data = json.load(json_file)
+    return _create_model_bundle(updated_model_hash)
 
-    # Apply all the changes, ALL CHANGES ARE APPLIED HERE
-    updated_sim_config = _apply_changes(sim_config, json_data)
 
-    # Create a bytes buffer
-    buffer = io.BytesIO()
+def apply_overlays(model_hash: str, overlays: List[bytes]) -> str:
+    """
+    Applies parameter changes (overlays, each a params.json as sent to update_parameters) in order
+        to a registered model, e.g. to get the model of a scenario that is stored as its base model and
+        the changes of every update since.
+
+        Every step is registered by the model and the changes it was derived from (see get_overlay_hash),
+        so the steps that were applied before (e.g. by update_parameters) are not applied again.
+
+        Returns: The hash of the resulting model, it is registered
+    """
+    for overlay in overlays:
+        model_hash = _apply_overlay(model_hash, overlay)
+    return model_hash
+
+
+def update_discovery_from_api(pkl_file: FileStorage, event_log_path: str):
+    """
+    Takes a model file and an event log with new cases and folds the cases into
+        the discovered model, instead of rediscovering it from the whole log.
+
+        Returns: A zip file
+    """
+    # Load model file
+    sim_config = load_model(pkl_file.read())
+
+    updated_sim_config = sim_config.run_incremental_discovery(event_log_path)
+
+    model_hash = model_registry.register(dump_model(updated_sim_config), updated_sim_config)
+    return _create_model_bundle(model_hash)
 
-    # Dump the object into the buffer
-    pickle.dump(updated_sim_config, buffer)
 
-    # Get the binary content
-    pkl_data = buffer.getvalue()
+def _create_model_bundle(model_hash: str):
+    """
+    Creates the zip file with a registered model (model.pkl, see source/model_format.py), its parameters and
+    visualization data. The visualization data is only computed if it is not registered with the model.
+    """
+    sim_config = _get_model(None, model_hash)
 
     # Compute the new visualization data
-    json_visualization_data = updated_sim_config.sim_instance.generate_html()
+    json_visualization_data = model_registry.get_visualization(model_hash)
+    if json_visualization_data is None:
+        json_visualization_data = sim_config.sim_instance.generate_html()
+        model_registry.set_visualization(model_hash, json_visualization_data)
 
     # Generate Json params
-    json_params_data = agent_to_json(updated_sim_config.sim_instance)
-    visualization_json = json.dumps(json_visualization_data, indent=2)
-    params_json = json.dumps(json_params_data["data"], indent=2)
+    params_json = dump_agent_json(sim_config.sim_instance)
+    visualization_json = dump_visualization_json(json_visualization_data)
 
     # Create in-memory ZIP
     memory_file = BytesIO()
     with zipfile.ZipFile(memory_file, "w") as zf:
         zf.writestr("visualization.json", visualization_json)
         zf.writestr("params.json", params_json)
-        zf.writestr("model.pkl", pkl_data)
+        zf.writestr("model.pkl", model_registry.get_data(model_hash))
 
     memory_file.seek(0)
 
@@ -181,7 +452,12 @@ def parse_discovery_parameters(request, temp_file_path):
         "extr_delays": False,
         "central_orchestration": False,
         "determine_automatically": False,
+        "racing": False,
+        "sample_fraction": None,
+        "sample_max_events": None,
+        "use_discovery_cache": True,
         "num_simulations": 1,
+        "job_id": None,
     }
 
     # Update parameters
@@ -198,7 +474,98 @@ def parse_discovery_parameters(request, temp_file_path):
 # ============== Helper Functions ==============
 
 
-def _start_simulation(sim_config: SimulationConfig):
+def _get_model(pkl_file: Optional[FileStorage], model_hash: Optional[str] = None, private: bool = False):
+    """
+    Returns a copy of the uploaded model (pkl_file) or of the model registered by model_hash.
+    An uploaded model is registered, so later requests can refer to it by its hash
+    instead of uploading it again (see source/model_registry.py).
+
+    Args:
+        pkl_file (FileStorage): The uploaded model file, None to use model_hash.
+        model_hash (str): Hash of a registered model.
+        private (bool): If the model is changed in place, see ModelRegistry.get
+
+    Raises:
+        KeyError: If no model was uploaded and model_hash is not registered (anymore).
+    """
+    if pkl_file is not None:
+        model_hash = model_registry.register(pkl_file.read())
+
+    sim_config = model_registry.get(model_hash, private=private)
+    if sim_config is None:
+        raise KeyError(f"Unknown model_hash {model_hash}, the model has to be uploaded")
+    return sim_config
+
+
+def _apply_overlay(model_hash: str, overlay: bytes) -> str:
+    """
+    Applies the parameter changes of a params.json (overlay) to a registered model and registers the changed model,
+    by its own hash and by the model and the changes it was derived from.
+
+    Returns:
+        str: The hash of the changed model.
+    """
+    overlay_hash = get_overlay_hash(model_hash, overlay)
+    updated_model_hash = model_registry.get_alias(overlay_hash)
+    if updated_model_hash is not None:
+        return updated_model_hash
+
+    # Load the model, it is shared with the registry and is not changed
+    base_sim_config = _get_model(None, model_hash)
+
+    changes = ParameterChangeSet.from_json(json.loads(overlay)).without_unchanged(base_sim_config)
+    if debug_config.debug:
+        print(f"Changed parameters: {sorted(changes.get_changed_parameters())}")
+
+    # Apply all the changes, ALL CHANGES ARE APPLIED HERE
+    updated_sim_config = changes.apply(base_sim_config)
+
+    # Encode the model, the sections and the visualization data the changes do not change are reused
+    unchanged_sections = set(SECTIONS) - {CONFIG_SECTION} - get_changed_sections(changes.get_changed_parameters())
+    pkl_data = dump_model(updated_sim_config, model_registry.get_data(model_hash), unchanged_sections)
+    visualization = None if changes.changes_visualization() else model_registry.get_visualization(model_hash)
+
+    updated_model_hash = model_registry.register(pkl_data, updated_sim_config, visualization)
+    model_registry.add_alias(overlay_hash, updated_model_hash)
+    return updated_model_hash
+
+
+def _simulate(sim_config: SimulationConfig, meter: RuntimeMeter):
+    """
+    Simulates a model (a copy that is changed) in a temporary directory, returns the zip file of
+        start_simulation_from_api
+    """
+    with tempfile.TemporaryDirectory() as simulation_dir:
+        # Set the correct path
+        sim_config.sim_instance.data_dir = simulation_dir
+
+        _start_simulation(sim_config, meter)
+
+        # Get number of simulations for knowing the amount of eventlogs in the output
+        num_simulations = sim_config.sim_instance.params["num_simulations"]
+
+        # Create in-memory ZIP
+        memory_file = BytesIO()
+        with zipfile.ZipFile(memory_file, "w") as zf:
+            for i in range(num_simulations):
+                filename = f"simulated_log_{i}.csv"
+                file_path = os.path.join(simulation_dir, filename)
+
+                # Check if the file exists before reading
+                if os.path.exists(file_path):
+                    with open(file_path, "r") as file:
+                        content = file.read()
+                    zf.writestr(filename, content)
+                else:
+                    print("File: ", file_path, " not found")
+            zf.writestr("runtime.json", json.dumps(meter.to_dict(), indent=2))
+
+        memory_file.seek(0)
+
+        return memory_file
+
+
+def _start_simulation(sim_config: SimulationConfig, meter: Optional[RuntimeMeter] = None):
     """
     Start simulation phase and returns _(a path to where the simulations are stored or the simulator object)_
 
@@ -216,7 +583,7 @@ def _start_simulation(sim_config: SimulationConfig):
     """
 
     try:
-        return sim_config.run_simulation()
+        return sim_config.run_simulation(meter=meter)
     except Exception as e:
         print(f"Simulation phase failed: {e}")
         raise e
@@ -224,144 +591,12 @@ def _start_simulation(sim_config: SimulationConfig):
 
 def _apply_changes(sim_config: SimulationConfig, json_data) -> SimulationConfig:
     """
-    Goes through the json and applies only the changes specified in the json
-    This could easily be used to update, add and remove different parameters in the future.
+    Goes through the json and applies only the changes specified in the json, see ParameterChangeSet.
     To see how the parameters should look, see /agent_simulator/parameters/params.json on gitlab
 
+    Returns: A copy of sim_config with the changes, sim_config itself is not changed
     """
-
-    # ==================== GENERAL PARAMETERS ====================
-
-    # 0) Start time
-    if _find_key(json_data, "start_timestamp") is not None:
-        time_str = json_data["params"]["start_timestamp"]
-        dt = datetime.fromisoformat(time_str)
-        change_start_time(sim_config, dt)
-    else:
-        default_start_time = sim_config.sim_instance.df_train.groupby("case_id")["start_timestamp"].min().min()
-        change_start_time(sim_config, default_start_time)
-
-    # 1) num_simulations
-    if _find_key(json_data, "num_simulations") is not None:
-        n = json_data["params"]["num_simulations"]
-        apply_simple_overrides(sim_config, {"num_simulations": n})
-
-    # 2) new_num_cases_to_simulate
-    if _find_key(json_data, "new_num_cases_to_simulate") is not None:
-        v = _find_key(json_data, "new_num_cases_to_simulate")
-        change_num_cases(sim_config, v)
-        if debug_config.debug:
-            print(f"Changed number of cases to simulate to: {v}")
-
-    # 3) inter_arrival_distribution
-    if _find_key(json_data, "inter_arrival_distribution") is not None:
-        iad = json_data["params"]["inter_arrival_distribution"]
-        change_inter_arrival_distribution(sim_config, iad["distribution"])
-
-    # ===================================================================
-    # ==================== AGENT SPECIFIC PARAMETERS ====================
-
-    # 4) Change amount of each agent (add / remove)
-    result = _find_key(json_data, "agent_count_changes")
-    if result is not None:
-        update_agent_count(sim_config, result)
-
-    # 5) per-agent activity durations
-    if _find_key(json_data, "agent_activity_durations") is not None:
-        aad = json_data["params"]["agent_activity_durations"]
-
-        # making it a list
-        if isinstance(aad, dict):
-            items = [aad]
-        elif isinstance(aad, list):
-            items = aad
-        else:
-            raise ValueError("agent_activity_durations must be object or list")
-
-        overrides_map = {}
-        for entry in items:
-            agent_id = entry["agent_id"]
-            ov_map = entry["overrides"]
-            overrides_map[agent_id] = ov_map
-
-        apply_agent_activity_overrides(sim_config, overrides_map)
-
-    # 6) resource calendars
-    if _find_key(json_data, "res_calendars") is not None:
-        res_cal = sim_config.sim_instance.simulation_parameters["res_calendars"]
-        # change each agent (from params.json) calendar
-        for agent_cal in json_data["params"]["res_calendars"]:
-            aid = agent_cal["agent_id"]
-            days = agent_cal["days"]
-            sched = agent_cal["schedule"]
-            change_agent_schedule(res_cal, aid, days, sched)
-
-    # 7) Agent activity mapping
-    # TODO: This is a feature that is implemnted on the frontend, but not here on the backend
-    #       This should be looked into
-
-    # 8) change transition probabilities
-    if _find_key(json_data, "transition_probabilities") is not None:
-        js = json_data["params"]["transition_probabilities"]
-        transition_probabilies = sim_config.sim_instance.simulation_parameters["transition_probabilities"]
-        transition_probabilies = change_transition_probabilities(transition_probabilies, js)
-
-    if _find_key(json_data, "transition_probabilities_autonomous") is not None:
-        js = json_data["params"]["transition_probabilities_autonomous"]
-        transition_probabilities_autonomous = sim_config.sim_instance.simulation_parameters[
-            "transition_probabilities_autonomous"
-        ]
-        transition_probabilities_autonomous = change_transition_probabilities(transition_probabilities_autonomous, js)
-
-    # ===================================================================
-    # ==================== GLOBAL PARAMETERS ====================
-
-    # 9) Global activity durations
-    if _find_key(json_data, "global_activity_durations") is not None:
-        durations = json_data["params"]["global_activity_durations"]
-        apply_global_activity_overrides(sim_config, durations)
-
-    # 10) activity_durations distribution
-    if _find_key(json_data, "new_distribution_activity_duration") is not None:
-        dist_activity_duration = json_data["params"]["new_distribution_activity_duration"]["distribution"]
-        change_distribution_activity_durations(sim_config, dist_activity_duration)
-
-    # ==================== NON WORKING PARAMETERS (remove?) ====================
-    # TODO: Look over these, and re-implement. These are rither somewhat working or
-    #       not working. They might also only support one change (can only change name
-    #       of one agent, not all agents that you want.) This is waht is sought after.
-
-    # # ?) roles
-    # if _find_key(json_data, "roles") is not None:
-    #     js = json_data["params"]["roles"]
-    #     sim_config.sim_instance.simulation_parameters["roles"] = change_agent_role(
-    #         sim_config.sim_instance.simulation_parameters["roles"], js["agent_id"], js["new_role"]
-    #     )
-
-    # # ?) rename_agent
-    # if _find_key(json_data, "rename_agent") is not None:
-    #     js = json_data["params"]["rename_agent"]
-    #     sim_config.sim_instance.simulation_parameters["agent_to_resource"] = rename_agent(
-    #         sim_config.sim_instance.simulation_parameters["agent_to_resource"], js["agent_id"], js["new_name"]
-    #     )
-
-    return sim_config
-
-
-def _find_key(data, target_key):
-    if isinstance(data, dict):
-        for key, value in data.items():
-            if key == target_key:
-                return value
-            found = _find_key(value, target_key)
-            if found is not None:
-                return found
-    elif isinstance(data, list):
-        for item in data:
-            found = _find_key(item, target_key)
-            if found is not None:
-                return found
-    return None
+    return ParameterChangeSet.from_json(json_data).apply(sim_config)
 
 
 def _print_config(cfg):
@@ -1,7 +1,5 @@
-import io
 import json
 import os
-import pickle
 import tempfile
 import warnings
 import zipfile
@@ -13,7 +11,17 @@ from flask import jsonify
 from flask import request
 from flask import send_file
 from simulation_config import SimulationConfig
-from source.discovery_to_json import agent_to_json
+from source.discovery_to_json import dump_agent_json
+from source.job_executor import CANCELLED
+from source.job_executor import FAILED
+from source.job_executor import FINISHED
+from source.job_executor import JobExecutor
+from source.job_executor import get_job_limits
+from source.model_format import PARAMETER_SECTIONS
+from source.model_format import load_model
+from source.model_registry import model_registry
+from source.runtime_meter import get_job_progress
+from source.staffing_optimizer import StaffingSearch
 
 """
 This script is the main entry point for the agent simulator, responsible for starting the Flask
@@ -23,6 +31,9 @@ application and defining the API endpoints between the Agent Simulator API and C
 warnings.filterwarnings("ignore")
 app = Flask(__name__)
 
+# Discoveries and simulations run in worker processes, see source/job_executor.py
+job_executor = JobExecutor(get_job_limits(), preload=("agent_simulator_manager",))
+
 
 @app.route("/api/start-agent-discovery", methods=["POST"])
 def start_agent_discovery_api():
@@ -30,7 +41,7 @@ def start_agent_discovery_api():
     Endpoint to start the agent discovery process, it takes in an event log and returns discovery data in a zip file
 
     Args:
-        event_log (form): CSV file containing the event log
+        event_log (form): CSV (or Parquet) file containing the event log
         parameters (form): json file with the discovery input parameters
             {
                 "log_path": temp_file_path,
@@ -44,20 +55,38 @@ def start_agent_discovery_api():
                 "extr_delays": False,
                 "central_orchestration": False,
                 "determine_automatically": False,
+                "sample_fraction": None,
+                "sample_max_events": None,
+                "use_discovery_cache": True,
                 "num_simulations": 1,
+                "job_id": None,
             }
 
+            With sample_fraction (e.g. 0.1) and/or sample_max_events (e.g. 1000000) only a sample of the cases,
+            stratified by variant and start date, is discovered. The estimated accuracy of the parameters is
+            returned as discovery_accuracy in params.json.
+            Discovery steps whose input and settings did not change since an earlier discovery
+            are reused from a local cache, unless use_discovery_cache is false.
+            The progress of the discovery can be queried with /api/job-progress/<job_id> while it runs,
+            a job_id is generated if none is given.
+        wait (form): Optional, "false" to return the job_id (202) instead of waiting for the discovery,
+            the discovery runs as a job, see get_job_api
+
     Returns:
-        zip: zip file contaning     model.pkl file to be used for the simulation
+        zip: zip file contaning     model.pkl file to be used for the simulation (see source/model_format.py)
                                     params.json contaning the simulation parameters
                                     visualization.json contaning the visualizasion data
+                                    runtime.json contaning the wall time and peak memory of every discovery step
 
         HTTP status code            200 successful run
+                                    202 job submitted (wait=false)
                                     400 error with input parameters
+                                    409 a job with the job_id exists
                                     500 error with discovery
 
     Curl example:
         curl -X POST http://127.0.0.1:6002/api/start-agent-discovery -F "event_log=@LoanApp.csv" -F "parameters=@params.json" --output received.zip
+        curl -X POST http://127.0.0.1:6002/api/start-agent-discovery -F "event_log=@LoanApp.csv" -F "wait=false"
     """
 
     if "event_log" not in request.files:
@@ -65,51 +94,18 @@ def start_agent_discovery_api():
 
     uploaded_file = request.files["event_log"]
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        temp_file_path = os.path.join(temp_dir, "uploaded_file.csv")
-        uploaded_file.save(temp_file_path)
-
-        args = agent_simulator_manager.parse_discovery_parameters(request, temp_file_path)
-
-        # TODO: This needs to be done another way than this below.
-        # None of central_orc or determine_auto is supported with
-        # the current vizualisation and therefore the program crahshes
-        # if the simulation is ran without vizualisation the program works as intended.
-        # This is because elizabeth's code does not support the differnet settings
-        # Change this in the future, (re-do the vizu code) or implement new way of
-        # imputing neccesary values when these settings are used
-
-        args["central_orchestration"] = False
-        args["determine_automatically"] = False
-
-        try:
-            sim_config = SimulationConfig()
-
-            # Start Discovery
-            visualization_data, params_data, pkl_data = agent_simulator_manager.start_discovery_from_api(
-                sim_config, args
-            )
-
-            # Serialize JSON objects to string
-            visualization_json = json.dumps(visualization_data, indent=2)
-            params_json = json.dumps(params_data, indent=2)
-
-            # Create in-memory ZIP
-            memory_file = BytesIO()
-            with zipfile.ZipFile(memory_file, "w") as zf:
-                zf.writestr("visualization.json", visualization_json)
-                zf.writestr("params.json", params_json)
-                zf.writestr("model.pkl", pkl_data)
+    # The event log is stored in the directory of the job, see agent_simulator_manager.run_discovery_job
+    log_file = "uploaded_file" + _get_log_extension(uploaded_file.filename)
+    args = agent_simulator_manager.parse_discovery_parameters(request, None)
 
-            memory_file.seek(0)
-
-            # Send ZIP file
-            return send_file(
-                memory_file, mimetype="application/zip", download_name="data_bundle.zip", as_attachment=True
-            )
-
-        except Exception as e:
-            return jsonify({"status": "error", "message": "Simulation error: " + str(e)}), 500
+    return _submit_job(
+        "discovery",
+        agent_simulator_manager.run_discovery_job,
+        args,
+        log_file,
+        job_id=args["job_id"],
+        input_files={log_file: uploaded_file},
+    )
 
 
 @app.route("/api/update-parameters", methods=["POST"])
@@ -118,7 +114,11 @@ def update_parameters():
     Changes parameters in the pkl file and returns the changed parameters in a zip file
 
     Args:
-        pkl: pkl file to be used for simulation
+        simulation_config_pkl (form): pkl file to be used for simulation
+        model_hash (form): Instead of simulation_config_pkl, SHA-256 hash of a model file that was sent before,
+            see _register_model
+        overlays (form): Optional, json files with parameter changes that are applied in order to the model
+            before changed_parameters, see _register_model
 
         changed_parameters (form): json with parameters to change recived from start-agent-discovery/update-parameters
 
@@ -133,49 +133,107 @@ def update_parameters():
                 "Schedule": [["09:00:00", "17:00:00"]]
             },
             "num_simulations": 3,
-            "new_num_cases_to_simulate": 750
+            "new_num_cases_to_simulate": 750,
+            "central_orchestration": true,
+            "extr_delays": false
         }
 
+        Switching central_orchestration or extr_delays discovers the parameters of the new mode
+        that were not discovered yet, this takes longer than other changes.
+
     Returns:
         zip: zip file contaning     model.pkl file to be used for the simulation
                                     params.json contaning the simulation parameters
                                     visualization.json contaning the visualizasion data
 
+        X-Model-Hash header         hash of the given model (with the overlays applied)
+
         HTTP status code            200 successful run
                                     400 error with input parameters
+                                    404 unknown model_hash, the model has to be uploaded
                                     500 error with discovery
 
     Curl example:
         curl -X POST -F "simulation_config_pkl=@model.pkl" -F "changed_parameters=@params.json"  http://127.0.0.1:6002/api/update-parameters --output received2.zip
+        curl -X POST -F "model_hash=<hash>" -F "changed_parameters=@params.json"  http://127.0.0.1:6002/api/update-parameters --output received2.zip
     """
 
-    if "simulation_config_pkl" not in request.files:
-        return jsonify({"status": "error", "message": "No file part"}), 400
+    model_hash, error = _register_model()
+    if error is not None:
+        return error
 
-    pkl_file = request.files["simulation_config_pkl"]
+    if "changed_parameters" not in request.files:
+        return jsonify({"status": "error", "message": "No file part"}), 400
 
     json_file = request.files["changed_parameters"]
 
-    if pkl_file.filename == "":
-        return jsonify({"status": "error", "message": "No selected file"}), 400
-
-    if not pkl_file.filename.endswith(".pkl"):
-        return jsonify({"status": "error", "message": "Invalid file type"}), 400
-
     if json_file.filename == "" or not json_file.filename.endswith(".json"):
         return jsonify({"status": "error", "message": "Invalid JSON file"}), 400
 
     try:
         # Update parameters
-        zipfile = agent_simulator_manager.update_parameters(pkl_file, json_file)
+        zipfile = agent_simulator_manager.update_parameters(None, json_file, model_hash)
 
         # Send ZIP file
-        return send_file(zipfile, mimetype="application/zip", download_name="data_bundle.zip", as_attachment=True)
+        response = send_file(zipfile, mimetype="application/zip", download_name="data_bundle.zip", as_attachment=True)
+        return _with_model_hash(response, model_hash)
 
     except Exception as e:
         return jsonify({"status": "error", "message": "Simulation error: " + str(e)}), 500
 
 
+@app.route("/api/update-agent-discovery", methods=["POST"])
+def update_agent_discovery_api():
+    """
+    Folds the cases of a new event log into a discovered model and returns the updated model in a zip file,
+    only the parameters affected by the new cases are discovered again. The roles and calendars are discovered
+    again from the combined log, changes made with update-parameters are overwritten and have to be made again
+
+    Args:
+        simulation_config_pkl: pkl file recived from start-agent-discovery/update-parameters
+
+        event_log (form): CSV (or Parquet) file containing the new cases, with the same columns as the discovered event log
+
+    Returns:
+        zip: zip file contaning     model.pkl file to be used for the simulation
+                                    params.json contaning the simulation parameters
+                                    visualization.json contaning the visualizasion data
+
+        HTTP status code            200 successful run
+                                    400 error with input parameters
+                                    500 error with discovery
+
+    Curl example:
+        curl -X POST -F "simulation_config_pkl=@model.pkl" -F "event_log=@new_cases.csv" http://127.0.0.1:6002/api/update-agent-discovery --output received.zip
+    """
+
+    if "simulation_config_pkl" not in request.files or "event_log" not in request.files:
+        return jsonify({"status": "error", "message": "No file part in the request"}), 400
+
+    pkl_file = request.files["simulation_config_pkl"]
+
+    if pkl_file.filename == "" or not pkl_file.filename.endswith(".pkl"):
+        return jsonify({"status": "error", "message": "Invalid file type"}), 400
+
+    uploaded_file = request.files["event_log"]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_file_path = os.path.join(temp_dir, "uploaded_file" + _get_log_extension(uploaded_file.filename))
+        uploaded_file.save(temp_file_path)
+
+        try:
+            zipfile = agent_simulator_manager.update_discovery_from_api(pkl_file, temp_file_path)
+
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        except Exception as e:
+            return jsonify({"status": "error", "message": "Discovery error: " + str(e)}), 500
+
+    # Send ZIP file
+    return send_file(zipfile, mimetype="application/zip", download_name="data_bundle.zip", as_attachment=True)
+
+
 @app.route("/api/start-agent-simulation", methods=["POST"])
 def start_agent_simulation_api():
     """
@@ -183,42 +241,234 @@ def start_agent_simulation_api():
 
     Args:
         simulation_config_pkl(form): pkl file to run the simulation with
+        model_hash(form): Instead of simulation_config_pkl, SHA-256 hash of a model file that was sent before,
+            see _register_model
+        overlays(form): Optional, json files with parameter changes that are applied in order to the model
+            before it is simulated, see _register_model
+        job_id(form): Optional, id to query the progress of the simulation with /api/job-progress/<job_id>
+        wait(form): Optional, "false" to return the job_id (202) instead of waiting for the simulation,
+            the simulation runs as a job, see get_job_api
 
     Returns:
         zip:                        with the simulated log data on the form simulated_log_0.csv,
                                     simulated_log_1.csv ... to number of simulations.
+                                    runtime.json contaning the wall time and peak memory of every simulation
+                                    and the number of simulation steps
+
+        X-Model-Hash header         hash of the simulated model (with the overlays applied)
 
         HTTP status code            200 successful run
+                                    202 job submitted (wait=false)
                                     400 error with input parameters
+                                    404 unknown model_hash, the model has to be uploaded
+                                    409 a job with the job_id exists
                                     500 error with discovery
 
     Curl example:
         curl -X POST -F "simulation_config_pkl=@model.pkl" http://127.0.0.1:6002/api/start-agent-simulation --output out.zip
+        curl -X POST -F "model_hash=<hash>" http://127.0.0.1:6002/api/start-agent-simulation --output out.zip
+        curl -X POST -F "model_hash=<hash>" -F "overlays=@changes_1.json" -F "overlays=@changes_2.json" http://127.0.0.1:6002/api/start-agent-simulation --output out.zip
     """
 
-    if "simulation_config_pkl" not in request.files:
-        return jsonify({"status": "error", "message": "No file part"}), 400
+    model_hash, error = _register_model()
+    if error is not None:
+        return error
 
-    pkl_file = request.files["simulation_config_pkl"]
+    return _submit_job(
+        "simulation",
+        agent_simulator_manager.run_simulation_job,
+        model_registry.dump(model_hash),
+        job_id=request.form.get("job_id"),
+        model_hash=model_hash,
+    )
 
-    if pkl_file.filename == "":
-        return jsonify({"status": "error", "message": "No selected file"}), 400
 
-    if not pkl_file.filename.endswith(".pkl"):
-        return jsonify({"status": "error", "message": "Invalid file type"}), 400
+@app.route("/api/batch-simulation", methods=["POST"])
+def batch_simulation_api():
+    """
+    Endpoint to simulate variants of a model (what-if analysis), every variant is the model with other parameter
+    changes. The variants are derived once and the replications of all variants run in parallel as simulation jobs,
+    see agent_simulator_manager.simulate_variants. The request waits until all replications are done.
 
-    try:
+    Args:
+        model_hash, simulation_config_pkl, overlays(form): The model the variants are derived from, as sent to
+            start-agent-simulation, see _register_model
+        variants(form): json files with parameter changes (as sent to update-parameters), one per variant,
+            every variant is the model with the changes of its file
+        include_base(form): Optional, "false" to not simulate the model itself as the first variant ("base")
+        num_simulations(form): Optional, number of replications per variant, by default the number of
+            simulations of the model
+        seed(form): Optional, integer seed, the same seed gives the same replications
+        common_seeds(form): Optional, "false" to not use the same seeds for the replications of every variant
+        include_logs(form): Optional, "true" to return a zip with the summary and the simulated logs
+        job_id(form): Optional, the replications run as the jobs <job_id>-<variant>-<replication>, their progress
+            can be queried with /api/job-progress/<job_id>
 
-        simulation_zip = agent_simulator_manager.start_simulation_from_api(pkl_file)
+    Returns:
+        json:                       the seed and per variant its name (file name of the changes), model_hash,
+                                    the mean, standard deviation, minimum and maximum of the key performance
+                                    indicators (cycle times, makespan, throughput ...) over its replications,
+                                    the indicators of every replication and, with common seeds, the differences
+                                    to the replications of the first variant (see source/batch_simulation.py)
+        zip:                        with include_logs, summary.json (the json) and the simulated logs
+                                    variant_<i>/simulated_log_<j>.csv
 
-        # Send ZIP file
-        return send_file(
-            simulation_zip, mimetype="application/zip", download_name="data_bundle.zip", as_attachment=True
+        HTTP status code            200 successful run
+                                    400 error with input parameters
+                                    404 unknown model_hash, the model has to be uploaded
+                                    409 a job with the job_id exists
+                                    500 error with simulation
+
+    Curl example:
+        curl -X POST -F "model_hash=<hash>" -F "variants=@more_agents.json" -F "variants=@longer_shifts.json" \
+            -F "num_simulations=5" -F "seed=42" http://127.0.0.1:6002/api/batch-simulation
+    """
+
+    model_hash, error = _register_model()
+    if error is not None:
+        return error
+
+    try:
+        num_simulations = request.form.get("num_simulations")
+        num_simulations = int(num_simulations or model_registry.get(model_hash).sim_instance.params["num_simulations"])
+        seed = int(request.form["seed"]) if request.form.get("seed") else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid num_simulations or seed"}), 400
+    if num_simulations <= 0 or (seed is not None and seed < 0):
+        return jsonify({"status": "error", "message": "Invalid num_simulations or seed"}), 400
+
+    # The pickled models are kept, the registry only keeps the latest models
+    names = []
+    model_hashes = []
+    models = []
+    if request.form.get("include_base", "true").lower() != "false":
+        names.append("base")
+        model_hashes.append(model_hash)
+        models.append(model_registry.dump(model_hash))
+    for variant in request.files.getlist("variants"):
+        try:
+            model_hashes.append(agent_simulator_manager.apply_overlays(model_hash, [variant.read()]))
+        except Exception as e:
+            return jsonify({"status": "error", "message": f"Invalid variant {variant.filename}: {e}"}), 400
+        names.append(variant.filename)
+        models.append(model_registry.dump(model_hashes[-1]))
+    if not models:
+        return jsonify({"status": "error", "message": "No variants"}), 400
+
+    include_logs = request.form.get("include_logs", "false").lower() == "true"
+    try:
+        summary, logs = agent_simulator_manager.simulate_variants(
+            job_executor,
+            models,
+            num_simulations,
+            seed=seed,
+            common_seeds=request.form.get("common_seeds", "true").lower() != "false",
+            include_logs=include_logs,
+            job_id=request.form.get("job_id"),
         )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    except Exception as e:
+        return jsonify({"status": "error", "message": "Simulation error: " + str(e)}), 500
+
+    for variant, name, variant_hash in zip(summary["variants"], names, model_hashes):
+        variant["name"] = name
+        variant["model_hash"] = variant_hash
+
+    if not include_logs:
+        return jsonify({"status": "success", **summary}), 200
+
+    memory_file = BytesIO()
+    with zipfile.ZipFile(memory_file, "w") as zf:
+        zf.writestr("summary.json", json.dumps(summary, indent=2))
+        for filename, content in logs.items():
+            zf.writestr(filename, content)
+    memory_file.seek(0)
+
+    return send_file(memory_file, mimetype="application/zip", download_name="batch_simulation.zip", as_attachment=True)
+
+
+@app.route("/api/optimize-staffing", methods=["POST"])
+def optimize_staffing_api():
+    """
+    Endpoint to search the cheapest staffing (agent counts and schedules) of a model for a key performance indicator,
+    e.g. the cycle time. Every candidate staffing is simulated with common seeds, the candidates are simulated in
+    rounds and the clearly dominated or infeasible ones are pruned, see source/staffing_optimizer.py.
+    The request waits until the search is done.
+
+    Args:
+        model_hash, simulation_config_pkl, overlays(form): The model to staff, as sent to start-agent-simulation,
+            see _register_model
+        search_space(form): json file with the staffing options and the settings of the search
+            {
+                "agents": [
+                    {
+                        "id": 3,
+                        "min_count": 1,                 (or "counts": [1, 2, 4])
+                        "max_count": 3,
+                        "hourly_cost": 40.0,            optional, by default hourly_cost of the search
+                        "schedules": [                  optional, schedules to try besides the current one
+                            {"name": "early", "days": ["MONDAY", ...], "schedule": [[["06:00:00", "14:00:00"]], ...]}
+                        ],
+                        "keep_schedule": true           optional, false to not try the current schedule
+                    }
+                ],
+                "kpi": "cycle_time_mean",               optional, see source/batch_simulation.py
+                "maximize": false,
+                "target": 172800,                       optional, kpi the staffing has to reach
+                "hourly_cost": 1.0,                     cost of the agents without their own hourly_cost
+                "num_simulations": 8,
+                "initial_simulations": 2,
+                "max_candidates": 64,
+                "prune_margin": 2.0,
+                "seed": 42
+            }
+        job_id(form): Optional, prefix of the ids of the replication jobs, see batch-simulation
+
+    Returns:
+        json:                       the Pareto front of cost (weekly working hours times hourly cost) against the
+                                    kpi, the cheapest staffing of the front that reaches the target (best) and every
+                                    candidate with its agent counts, schedules, cost, kpi, status and the parameter
+                                    changes (params.json overlays) of its staffing
+
+        HTTP status code            200 successful run
+                                    400 error with input parameters
+                                    404 unknown model_hash, the model has to be uploaded
+                                    409 a job with the job_id exists
+                                    500 error with simulation
+
+    Curl example:
+        curl -X POST -F "model_hash=<hash>" -F "search_space=@staffing.json" http://127.0.0.1:6002/api/optimize-staffing
+    """
+
+    model_hash, error = _register_model()
+    if error is not None:
+        return error
+
+    if "search_space" not in request.files:
+        return jsonify({"status": "error", "message": "No search_space file"}), 400
 
+    try:
+        search = StaffingSearch.from_json(json.load(request.files["search_space"]))
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"status": "error", "message": "Invalid search_space: " + str(e)}), 400
+
+    agents = model_registry.get(model_hash).sim_instance.simulation_parameters["agent_to_resource"]
+    unknown_agents = [options.agent_id for options in search.agents if options.agent_id not in agents]
+    if unknown_agents:
+        return jsonify({"status": "error", "message": f"Unknown agents: {unknown_agents}"}), 400
+
+    try:
+        result = agent_simulator_manager.optimize_staffing(
+            job_executor, model_hash, search, job_id=request.form.get("job_id")
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
     except Exception as e:
         return jsonify({"status": "error", "message": "Simulation error: " + str(e)}), 500
 
+    return jsonify({"status": "success", **result}), 200
+
 
 @app.route("/api/get-pkl-as-json", methods=["POST"])
 def get_pkl_as_json():
@@ -227,29 +477,275 @@ def get_pkl_as_json():
 
     Args:
         pkl_file(form): pkl file to be converted to json
+        sections(form): Optional, comma separated model sections to convert (e.g. "parameters,calendars"),
+            by default all simulation parameters. Only these sections are decoded, see source/model_format.py
+        model_hash, simulation_config_pkl, overlays(form): Instead of pkl_file, the model (with parameter changes
+            applied) as sent to start-agent-simulation, see _register_model. The whole model is converted
+        fields(form): Optional, comma separated attributes and simulation parameters to include
+            (e.g. "res_calendars,roles"), all of them by default
+        agent(form): Optional, id of an agent, only its entries are included in the parameters with entries per
+            agent (e.g. res_calendars, transition_probabilities)
 
     Returns:
         json: json object
 
+        HTTP status code            200 successful run
+                                    400 error with input parameters
+                                    404 unknown model_hash, the model has to be uploaded
+
     Curl example:
         curl -X POST http://127.0.0.1:6002/api/get-pkl-as-json -F "pkl_file=@model.pkl" --output out.json
+        curl -X POST http://127.0.0.1:6002/api/get-pkl-as-json -F "pkl_file=@model.pkl" -F "sections=calendars"
+        curl -X POST http://127.0.0.1:6002/api/get-pkl-as-json -F "model_hash=<hash>" -F "overlays=@changes.json"
+        curl -X POST http://127.0.0.1:6002/api/get-pkl-as-json -F "pkl_file=@model.pkl" -F "fields=res_calendars" \
+            -F "agent=3"
     """
 
+    fields = request.form.get("fields")
+    fields = [name.strip() for name in fields.split(",")] if fields else None
+    try:
+        agent = int(request.form["agent"]) if request.form.get("agent") else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid agent"}), 400
+
     if "pkl_file" not in request.files:
-        return jsonify({"status": "error", "message": "No file part"}), 400
+        model_hash, error = _register_model()
+        if error is not None:
+            return error
+        sim_config = model_registry.get(model_hash)
+
+    else:
+        pkl_file = request.files["pkl_file"]
 
-    pkl_file = request.files["pkl_file"]
+        if pkl_file.filename == "":
+            return jsonify({"status": "error", "message": "No selected file"}), 400
 
-    if pkl_file.filename == "":
-        return jsonify({"status": "error", "message": "No selected file"}), 400
+        # The logs and their statistics are not part of the json, they are not decoded
+        sections = request.form.get("sections")
+        sections = [name.strip() for name in sections.split(",")] if sections else PARAMETER_SECTIONS
 
-    buffer = io.BytesIO(pkl_file.read())
-    sim_config: SimulationConfig = pickle.load(buffer)
-    json_params_data = agent_to_json(sim_config.sim_instance)
-    params_json = json.dumps(json_params_data["data"], indent=2)
+        try:
+            sim_config: SimulationConfig = load_model(pkl_file.read(), sections)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+    params_json = dump_agent_json(sim_config.sim_instance, fields, agent)
 
     return jsonify({"status": "success", "message": params_json}), 200
 
 
+@app.route("/api/job-progress/<job_id>", methods=["GET"])
+def get_job_progress_api(job_id):
+    """
+    Endpoint to get the progress of a running (or recently finished) discovery or simulation job
+
+    Args:
+        job_id (path): job_id given to start-agent-discovery (in the parameters) or start-agent-simulation (form)
+
+    Returns:
+        json: status of the job, the elapsed time, the stage that is running, the wall time and
+            peak memory of every finished stage and counters (e.g. events_processed, simulation_steps)
+
+        HTTP status code            200 known job
+                                    404 unknown job (or a job that did not start yet)
+
+    Curl example:
+        curl http://127.0.0.1:6002/api/job-progress/my-discovery
+    """
+    # Jobs run in worker processes that write their progress, see source/job_executor.py
+    progress = job_executor.get_progress(job_id) or get_job_progress(job_id)
+    if progress is None:
+        return jsonify({"status": "error", "message": f"Unknown job: {job_id}"}), 404
+
+    return jsonify({"status": "success", "progress": progress}), 200
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job_api(job_id):
+    """
+    Endpoint to get the status of a discovery or simulation job submitted with wait=false
+
+    Args:
+        job_id (path): job_id returned when the job was submitted
+
+    Returns:
+        json: kind and status of the job (queued, running, finished, failed or cancelled), the error of a failed job,
+            the time it was queued and ran, the position in the queue of a queued job and the progress of the job
+            (see job-progress)
+
+        HTTP status code            200 known job
+                                    404 unknown job
+
+    Curl example:
+        curl http://127.0.0.1:6002/api/jobs/<job_id>
+    """
+    status = job_executor.get_status(job_id)
+    if status is None:
+        return jsonify({"status": "error", "message": f"Unknown job: {job_id}"}), 404
+
+    return jsonify({"status": "success", "job": status}), 200
+
+
+@app.route("/api/jobs/<job_id>/result", methods=["GET"])
+def get_job_result_api(job_id):
+    """
+    Endpoint to get the result of a finished job, the zip file that start-agent-discovery or
+    start-agent-simulation returns. The result is kept until it is fetched (or until newer jobs finished)
+
+    Args:
+        job_id (path): job_id returned when the job was submitted
+
+    Returns:
+        zip: the result of the job
+
+        HTTP status code            200 finished job
+                                    404 unknown job
+                                    409 job is queued, running or was cancelled
+                                    500 job failed
+
+    Curl example:
+        curl http://127.0.0.1:6002/api/jobs/<job_id>/result --output out.zip
+    """
+    return _get_job_result(job_id)
+
+
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job_api(job_id):
+    """
+    Endpoint to cancel a queued or running job, a running job is stopped
+
+    Args:
+        job_id (path): job_id returned when the job was submitted
+
+    Returns:
+        HTTP status code            200 job cancelled
+                                    404 unknown job
+                                    409 job is already finished, failed or cancelled
+
+    Curl example:
+        curl -X POST http://127.0.0.1:6002/api/jobs/<job_id>/cancel
+    """
+    status = job_executor.get_status(job_id)
+    if status is None:
+        return jsonify({"status": "error", "message": f"Unknown job: {job_id}"}), 404
+
+    if not job_executor.cancel(job_id):
+        return jsonify({"status": "error", "message": f"Job is {status['status']}: {job_id}"}), 409
+
+    return jsonify({"status": "success", "message": f"Job cancelled: {job_id}"}), 200
+
+
+def _submit_job(kind, func, *args, job_id=None, input_files=None, model_hash=None):
+    """
+    Submits a job to the job executor and returns its result, see _get_job_result.
+    With wait=false (form) the job_id is returned (202) instead, its result can be fetched with get_job_result_api.
+    The hash of the model of the job (model_hash) is added to the response, see _with_model_hash.
+    """
+    try:
+        job_id = job_executor.submit(kind, func, *args, job_id=job_id, input_files=input_files)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+
+    if request.form.get("wait", "true").lower() == "false":
+        response = jsonify({"status": "success", "job_id": job_id})
+        response.status_code = 202
+    else:
+        job_executor.wait(job_id)
+        response = _get_job_result(job_id)
+
+    if model_hash is not None and not isinstance(response, tuple):
+        response = _with_model_hash(response, model_hash)
+    return response
+
+
+def _get_job_result(job_id):
+    """
+    Returns the response with the result of a job, the job is discarded once its result is sent (or failed).
+    The model of a discovery job is registered, so it can be simulated by its hash (see _register_model).
+    """
+    status = job_executor.get_status(job_id)
+    if status is None:
+        return jsonify({"status": "error", "message": f"Unknown job: {job_id}"}), 404
+
+    if status["status"] == FAILED:
+        job_executor.discard(job_id)
+        return jsonify({"status": "error", "message": "Simulation error: " + str(status["error"])}), 500
+
+    if status["status"] != FINISHED:
+        message = "Job was cancelled" if status["status"] == CANCELLED else f"Job is {status['status']}"
+        return jsonify({"status": "error", "message": f"{message}: {job_id}", "job": status}), 409
+
+    result = job_executor.read_result(job_id)
+    job_executor.discard(job_id)
+
+    response = send_file(
+        BytesIO(result), mimetype="application/zip", download_name="data_bundle.zip", as_attachment=True
+    )
+    if status["kind"] == "discovery":
+        response = _with_model_hash(response, agent_simulator_manager.register_discovery_bundle(result))
+    return response
+
+
+def _register_model():
+    """
+    Returns the hash of the model of the request and None, or None and an error response.
+
+    The model is either uploaded (simulation_config_pkl), and registered, or refers to a registered model (model_hash).
+    Models are registered by the SHA-256 hash of the model file, models that were discovered or changed by this
+    service are registered as well. A model_hash that is not registered (anymore) is answered with 404, the client
+    then uploads the model. See source/model_registry.py
+
+    The parameter changes of the overlays (json files as sent to update-parameters) are applied in order to the model,
+    the hash of the resulting model is returned. A scenario can thus be stored as its base model and its changes,
+    the models of the steps are registered and are only derived once (see agent_simulator_manager.apply_overlays).
+    """
+    if "simulation_config_pkl" in request.files:
+        pkl_file = request.files["simulation_config_pkl"]
+
+        if pkl_file.filename == "":
+            return None, (jsonify({"status": "error", "message": "No selected file"}), 400)
+
+        if not pkl_file.filename.endswith(".pkl"):
+            return None, (jsonify({"status": "error", "message": "Invalid file type"}), 400)
+
+        try:
+            model_hash = model_registry.register(pkl_file.read())
+        except Exception as e:
+            return None, (jsonify({"status": "error", "message": "Invalid model file: " + str(e)}), 400)
+
+    else:
+        model_hash = request.form.get("model_hash")
+        if not model_hash:
+            return None, (jsonify({"status": "error", "message": "No file part"}), 400)
+
+        if model_hash not in model_registry:
+            return None, (jsonify({"status": "error", "message": f"Unknown model_hash: {model_hash}"}), 404)
+
+    overlays = request.files.getlist("overlays")
+    try:
+        model_hash = agent_simulator_manager.apply_overlays(model_hash, [overlay.read() for overlay in overlays])
+    except Exception as e:
+        return None, (jsonify({"status": "error", "message": "Invalid overlay: " + str(e)}), 400)
+
+    return model_hash, None
+
+
+def _with_model_hash(response, model_hash):
+    """
+    Adds the hash the model is registered by to a response, later requests can send it instead of the model
+    """
+    response.headers["X-Model-Hash"] = model_hash
+    response.headers["Access-Control-Expose-Headers"] = "X-Model-Hash"
+    return response
+
+
+def _get_log_extension(filename):
+    """
+    Returns the file extension of an uploaded event log, logs are read as csv unless they are Parquet files
+    """
+    extension = os.path.splitext(filename or "")[1].lower()
+    return extension if extension in (".parquet", ".pq") else ".csv"
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=6002)
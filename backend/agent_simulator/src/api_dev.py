@@ -7,6 +7,7 @@ from io import BytesIO
 
 import agent_simulator_manager
 from simulation_config import SimulationConfig
+from source.discovery_to_json import dump_visualization_json
 
 warnings.filterwarnings("ignore")
 
@@ -38,17 +39,6 @@ def start_agent_discovery(event_log_path: str, parameters_path: str = None) -> B
                 args = json.load(f)
                 args["log_path"] = temp_file_path
 
-                # TODO: This needs to be done another way than this below.
-                # None of central_orc or determine_auto is supported with
-                # the current vizualisation and therefore the program crahshes
-                # if the simulation is ran without vizualisation the program works as intended.
-                # This is because elizabeth's code does not support the differnet settings
-                # Change this in the future, (re-do the vizu code) or implement new way of
-                # imputing neccesary values when these settings are used
-
-                args["central_orchestration"] = False
-                args["determine_automatically"] = False
-
         else:
             args = {
                 "log_path": temp_file_path,
@@ -67,10 +57,9 @@ def start_agent_discovery(event_log_path: str, parameters_path: str = None) -> B
 
         sim_config = SimulationConfig()
 
-        visualization_data, params_data, pkl_data = agent_simulator_manager.start_discovery_from_api(sim_config, args)
+        visualization_data, params_json, pkl_data = agent_simulator_manager.start_discovery_from_api(sim_config, args)
 
-        visualization_json = json.dumps(visualization_data, indent=2)
-        params_json = json.dumps(params_data, indent=2)
+        visualization_json = dump_visualization_json(visualization_data)
 
         memory_file = BytesIO()
         with zipfile.ZipFile(memory_file, "w") as zf:
@@ -1,8 +1,10 @@
+import ast
 import copy
 
 # import sys
 from typing import Dict
 
+from source.discovery import apply_behavior_mode
 from source.discovery import compute_activity_duration_distribution_per_agent
 from source.discovery import get_case_arrival_times
 
@@ -24,6 +26,35 @@ def change_start_time(sim_config, dt):
     )
 
 
+def change_behavior_mode(sim_config, central_orchestration=None, discover_extr_delays=None):
+    """
+    Switches the agent behavior type and/or the use of extraneous delays,
+    the parameter sets that were not discovered for the previous mode are discovered now.
+
+    Args:
+        sim_config: A simulation_config instance
+        central_orchestration: True for central orchestration, False for autonomous agents, None to keep it
+        discover_extr_delays: True to use the discovered extraneous delays, None to keep it
+    """
+    sim_instance = sim_config.sim_instance
+    simulation_parameters = sim_instance.simulation_parameters
+
+    if central_orchestration is None:
+        central_orchestration = simulation_parameters["central_orchestration"]
+    if discover_extr_delays is None:
+        # Models discovered before the setting was stored in the simulation parameters
+        discover_extr_delays = simulation_parameters.get(
+            "discover_extr_delays", sim_instance.params["discover_extr_delays"]
+        )
+
+    apply_behavior_mode(simulation_parameters, sim_instance.df_train, central_orchestration, discover_extr_delays)
+
+    sim_instance.params["central_orchestration"] = central_orchestration
+    sim_instance.params["discover_extr_delays"] = discover_extr_delays
+    sim_config.central_orchestration = central_orchestration
+    sim_config.discover_extr_delays = discover_extr_delays
+
+
 def change_inter_arrival_distribution(simulation_config, user_input):
     """
     NOTE: Start time needs to be set before this function, because start_time is used!
@@ -206,7 +237,7 @@ def change_transition_probabilities(config_transition_probabilities, js_transiti
     # Loops over all source activities
     for source_activity in js_transition_probabilities.keys():
 
-        source_activity_t = eval(source_activity)  # Converts string representation into an actual tuple
+        source_activity_t = ast.literal_eval(source_activity)  # Converts string representation into an actual tuple
 
         # Ensure source_activity exists in config_transition_probabilities
         if source_activity_t not in config_transition_probabilities:
@@ -215,7 +246,7 @@ def change_transition_probabilities(config_transition_probabilities, js_transiti
         # Loops over all target agents
         for target_agent, target in js_transition_probabilities[source_activity].items():
 
-            target_agent_t = eval(target_agent)  # Converts string representation into an actual tuple
+            target_agent_t = ast.literal_eval(target_agent)  # Converts string representation into an actual tuple
 
             # Ensure target_activity exists before assigning
             if target_agent_t not in config_transition_probabilities[source_activity_t]:
@@ -0,0 +1,413 @@
+import ast
+import copy
+from dataclasses import dataclass
+from dataclasses import field
+from dataclasses import fields
+from dataclasses import replace
+from datetime import datetime
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from param_changes import apply_agent_activity_overrides
+from param_changes import apply_global_activity_overrides
+from param_changes import apply_simple_overrides
+from param_changes import change_agent_schedule
+from param_changes import change_behavior_mode
+from param_changes import change_distribution_activity_durations
+from param_changes import change_inter_arrival_distribution
+from param_changes import change_num_cases
+from param_changes import change_start_time
+from param_changes import change_transition_probabilities
+from param_changes import update_agent_count
+from source.agent_types.calendar_discovery_parameters import str_week_days
+from source.discovery import materialize_parameter_sets
+
+"""
+Typed parameter changes (the params.json of /api/update-parameters) applied on top of an unchanged base model.
+
+A change set is parsed once from the json (ParameterChangeSet.from_json), the changes that would not change the
+base model (the frontend sends every parameter on every update) are dropped (without_unchanged), and the
+remaining changes are applied to a copy of the base model (apply). Only the simulation parameters that are
+changed are copied, e.g. a schedule change copies the calendar of that agent and nothing else,
+so a base model that is shared (see source/model_registry.py) is never changed.
+"""
+
+# Simulation parameters that are shown in visualization.json (see AgentSimulator.generate_html)
+VISUALIZED_PARAMETERS = (
+    "roles",
+    "agent_to_resource",
+    "max_activity_count_per_case",
+    "start_activities",
+    "transition_probabilities",
+    "transition_probabilities_autonomous",
+    "agent_transition_probabilities",
+    "agent_transition_probabilities_autonomous",
+)
+# Simulation parameters that are changed by adding and removing agents (see update_agent_count)
+_AGENT_COUNT_PARAMETERS = {
+    "agent_to_resource",
+    "duplicated_agents_mapping",
+    "roles",
+    "agent_activity_mapping",
+    "activity_durations_dict",
+    "res_calendars",
+    "transition_probabilities",
+    "transition_probabilities_autonomous",
+    "agent_transition_probabilities",
+    "agent_transition_probabilities_autonomous",
+}
+
+
+@dataclass
+class ParameterChangeSet:
+    """
+    Parameter changes of an update, None (or empty) fields are not changed.
+
+    Args:
+        start_timestamp: Start of the simulation, the case arrival times are sampled again.
+        num_simulations: Number of simulated logs.
+        num_cases_to_simulate: Number of simulated cases per log, the case arrival times are sampled again.
+        central_orchestration: Agent behavior type, True for central orchestration.
+        extr_delays: If the discovered extraneous delays are used.
+        inter_arrival_distribution: Distribution of the case inter arrival times ("normal" or "mean").
+        agent_count_changes: Number of instances of agents, [{"id": 3, "count": 2}, ...].
+        agent_activity_durations: Activity durations of single agents, {agent_id: {activity: duration}}.
+        res_calendars: Weekly schedules of agents, {agent_id: (days, schedule of every day)}.
+        transition_probabilities: Changed transition probabilities (as in params.json).
+        transition_probabilities_autonomous: Changed transition probabilities of autonomous agents.
+        global_activity_durations: Activity durations of all agents, {activity: duration}.
+        activity_duration_distribution: Distribution the activity durations are discovered again with.
+    """
+
+    start_timestamp: Optional[datetime] = None
+    num_simulations: Optional[int] = None
+    num_cases_to_simulate: Optional[int] = None
+    central_orchestration: Optional[bool] = None
+    extr_delays: Optional[bool] = None
+    inter_arrival_distribution: Optional[str] = None
+    agent_count_changes: Optional[List[dict]] = None
+    agent_activity_durations: Dict[int, Dict[str, float]] = field(default_factory=dict)
+    res_calendars: Dict[int, Tuple[List[str], List[list]]] = field(default_factory=dict)
+    transition_probabilities: Dict[str, dict] = field(default_factory=dict)
+    transition_probabilities_autonomous: Dict[str, dict] = field(default_factory=dict)
+    global_activity_durations: Dict[str, float] = field(default_factory=dict)
+    activity_duration_distribution: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, json_data) -> "ParameterChangeSet":
+        """
+        Parses the changes of a params.json, see /api/update-parameters.
+        """
+        params = json_data.get("params", {})
+        changes = cls()
+
+        if _find_key(json_data, "start_timestamp") is not None:
+            changes.start_timestamp = datetime.fromisoformat(params["start_timestamp"])
+        if _find_key(json_data, "num_simulations") is not None:
+            changes.num_simulations = params["num_simulations"]
+        changes.num_cases_to_simulate = _find_key(json_data, "new_num_cases_to_simulate")
+        changes.central_orchestration = _find_key(json_data, "central_orchestration")
+        changes.extr_delays = _find_key(json_data, "extr_delays")
+        if _find_key(json_data, "inter_arrival_distribution") is not None:
+            changes.inter_arrival_distribution = params["inter_arrival_distribution"]["distribution"]
+        changes.agent_count_changes = _find_key(json_data, "agent_count_changes")
+
+        if _find_key(json_data, "agent_activity_durations") is not None:
+            items = params["agent_activity_durations"]
+            # making it a list
+            if isinstance(items, dict):
+                items = [items]
+            elif not isinstance(items, list):
+                raise ValueError("agent_activity_durations must be object or list")
+            changes.agent_activity_durations = {entry["agent_id"]: entry["overrides"] for entry in items}
+
+        if _find_key(json_data, "res_calendars") is not None:
+            changes.res_calendars = {
+                int(calendar["agent_id"]): (calendar["days"], calendar["schedule"])
+                for calendar in params["res_calendars"]
+            }
+
+        if _find_key(json_data, "transition_probabilities") is not None:
+            changes.transition_probabilities = params["transition_probabilities"]
+        if _find_key(json_data, "transition_probabilities_autonomous") is not None:
+            changes.transition_probabilities_autonomous = params["transition_probabilities_autonomous"]
+        if _find_key(json_data, "global_activity_durations") is not None:
+            changes.global_activity_durations = params["global_activity_durations"]
+        if _find_key(json_data, "new_distribution_activity_duration") is not None:
+            changes.activity_duration_distribution = params["new_distribution_activity_duration"]["distribution"]
+
+        return changes
+
+    def is_empty(self) -> bool:
+        return all(getattr(self, f.name) in (None, {}) for f in fields(self))
+
+    def without_unchanged(self, sim_config) -> "ParameterChangeSet":
+        """
+        Returns the changes that change the model [sim_config].
+        """
+        sim_instance = sim_config.sim_instance
+        simulation_parameters = sim_instance.simulation_parameters
+        changes = replace(self)
+
+        if changes.start_timestamp is not None and changes.start_timestamp == simulation_parameters.get(
+            "start_timestamp"
+        ):
+            changes.start_timestamp = None
+        if changes.num_simulations == getattr(sim_config, "num_simulations", None):
+            changes.num_simulations = None
+        if changes.num_cases_to_simulate == sim_instance.num_cases_to_simulate:
+            changes.num_cases_to_simulate = None
+        if changes.central_orchestration == simulation_parameters.get("central_orchestration"):
+            changes.central_orchestration = None
+        if changes.extr_delays == simulation_parameters.get(
+            "discover_extr_delays", sim_instance.params.get("discover_extr_delays")
+        ):
+            changes.extr_delays = None
+        if changes.inter_arrival_distribution == simulation_parameters.get("distribution_type"):
+            changes.inter_arrival_distribution = None
+        if changes.agent_count_changes is not None and _get_agent_counts(changes.agent_count_changes) == (
+            simulation_parameters.get("deactivated_resources", []),
+            simulation_parameters.get("duplicated_agents", []),
+        ):
+            changes.agent_count_changes = None
+
+        agent_overrides = sim_instance.agent_activity_duration_overrides
+        changes.agent_activity_durations = {
+            agent_id: durations
+            for agent_id, durations in changes.agent_activity_durations.items()
+            if any(agent_overrides.get(agent_id, {}).get(name) != value for name, value in durations.items())
+        }
+        changes.global_activity_durations = {
+            name: value
+            for name, value in changes.global_activity_durations.items()
+            if sim_instance.activity_duration_overrides.get(name) != value
+        }
+        calendars = simulation_parameters["res_calendars"]
+        changes.res_calendars = {
+            agent_id: (days, schedule)
+            for agent_id, (days, schedule) in changes.res_calendars.items()
+            if agent_id not in calendars or _is_schedule_changed(calendars[agent_id], days, schedule)
+        }
+        changes.transition_probabilities = _get_changed_transitions(
+            simulation_parameters.get("transition_probabilities"), changes.transition_probabilities
+        )
+        changes.transition_probabilities_autonomous = _get_changed_transitions(
+            simulation_parameters.get("transition_probabilities_autonomous"),
+            changes.transition_probabilities_autonomous,
+        )
+        return changes
+
+    def get_changed_parameters(self) -> Set[str]:
+        """
+        Returns the names of the simulation parameters the changes change.
+        """
+        changed_in_place, replaced = self._get_changed_parameters()
+        return changed_in_place | replaced
+
+    def _get_changed_parameters(self):
+        """
+        Returns the names of the simulation parameters that are changed in place and of those that are replaced.
+        """
+        changed_in_place, replaced = set(), set()
+        if self.start_timestamp is not None:
+            replaced |= {"start_timestamp", "case_arrival_times"}
+        if self.num_cases_to_simulate is not None:
+            replaced.add("case_arrival_times")
+        if self.central_orchestration is not None or self.extr_delays is not None:
+            # including the parameter sets of the new mode that are discovered
+            replaced |= {
+                "central_orchestration",
+                "discover_extr_delays",
+                "timers",
+                "timers_extr",
+                "transition_probabilities",
+                "agent_transition_probabilities",
+                "transition_probabilities_global",
+                "transition_probabilities_autonomous",
+                "agent_transition_probabilities_autonomous",
+            }
+        if self.inter_arrival_distribution is not None:
+            replaced |= {"distribution_type", "case_arrival_times"}
+        if self.agent_count_changes is not None:
+            changed_in_place |= _AGENT_COUNT_PARAMETERS
+            replaced |= {"deactivated_resources", "duplicated_agents"}
+        if self.agent_activity_durations:
+            changed_in_place.add("agent_activity_duration_map")
+        if self.res_calendars:
+            changed_in_place.add("res_calendars")
+        if self.transition_probabilities:
+            changed_in_place.add("transition_probabilities")
+        if self.transition_probabilities_autonomous:
+            changed_in_place.add("transition_probabilities_autonomous")
+        if self.global_activity_durations:
+            changed_in_place.add("activity_duration_map")
+            replaced.add("new_activity_duration")
+        if self.activity_duration_distribution is not None:
+            replaced.add("activity_durations_dict")
+        return changed_in_place, replaced - changed_in_place
+
+    def changes_visualization(self) -> bool:
+        """
+        Returns if the changes change the visualization data of the model.
+        """
+        return not self.get_changed_parameters().isdisjoint(VISUALIZED_PARAMETERS)
+
+    def apply(self, sim_config):
+        """
+        Applies the changes to a copy of the model [sim_config], the model itself is not changed.
+
+        Returns:
+            SimulationConfig: The changed copy, it shares the parameters that are not changed with [sim_config].
+        """
+        sim_config = self._copy_changed(sim_config)
+        sim_instance = sim_config.sim_instance
+        simulation_parameters = sim_instance.simulation_parameters
+
+        # ==================== GENERAL PARAMETERS ====================
+
+        if self.start_timestamp is not None:
+            change_start_time(sim_config, self.start_timestamp)
+
+        if self.num_simulations is not None:
+            apply_simple_overrides(sim_config, {"num_simulations": self.num_simulations})
+
+        if self.num_cases_to_simulate is not None:
+            change_num_cases(sim_config, self.num_cases_to_simulate)
+
+        # sets missing for the new mode are discovered here
+        if self.central_orchestration is not None or self.extr_delays is not None:
+            change_behavior_mode(sim_config, self.central_orchestration, self.extr_delays)
+
+        if self.inter_arrival_distribution is not None:
+            change_inter_arrival_distribution(sim_config, self.inter_arrival_distribution)
+
+        # ==================== AGENT SPECIFIC PARAMETERS ====================
+
+        if self.agent_count_changes is not None:
+            update_agent_count(sim_config, self.agent_count_changes)
+
+        if self.agent_activity_durations:
+            apply_agent_activity_overrides(sim_config, self.agent_activity_durations)
+
+        for agent_id, (days, schedule) in self.res_calendars.items():
+            change_agent_schedule(simulation_parameters["res_calendars"], agent_id, days, schedule)
+
+        if self.transition_probabilities:
+            change_transition_probabilities(
+                simulation_parameters["transition_probabilities"], self.transition_probabilities
+            )
+
+        if self.transition_probabilities_autonomous:
+            materialize_parameter_sets(
+                simulation_parameters, sim_instance.df_train, ["transition_probabilities_autonomous"]
+            )
+            change_transition_probabilities(
+                simulation_parameters["transition_probabilities_autonomous"], self.transition_probabilities_autonomous
+            )
+
+        # ==================== GLOBAL PARAMETERS ====================
+
+        if self.global_activity_durations:
+            apply_global_activity_overrides(sim_config, self.global_activity_durations)
+
+        if self.activity_duration_distribution is not None:
+            change_distribution_activity_durations(sim_config, self.activity_duration_distribution)
+
+        return sim_config
+
+    def _copy_changed(self, base):
+        """
+        Copies the model and the parts of it that the changes change in place.
+        """
+        sim_instance = copy.copy(base.sim_instance)
+        sim_config = copy.copy(base)
+        sim_config.sim_instance = sim_instance
+
+        # The settings are small, they are always copied (the config and the simulator may share them)
+        memo = {}
+        sim_config.params = copy.deepcopy(base.params, memo)
+        sim_instance.params = copy.deepcopy(base.sim_instance.params, memo)
+        sim_instance.activity_duration_overrides = copy.deepcopy(base.sim_instance.activity_duration_overrides)
+        sim_instance.agent_activity_duration_overrides = copy.deepcopy(
+            base.sim_instance.agent_activity_duration_overrides
+        )
+
+        base_parameters = base.sim_instance.simulation_parameters
+        simulation_parameters = dict(base_parameters)
+        sim_instance.simulation_parameters = simulation_parameters
+
+        changed, _ = self._get_changed_parameters()
+        if self.agent_count_changes is None and changed & {"res_calendars"}:
+            # Only the calendars of the rescheduled agents are copied
+            changed.discard("res_calendars")
+            calendars = dict(base_parameters["res_calendars"])
+            for agent_id in self.res_calendars:
+                if agent_id in calendars:
+                    calendars[agent_id] = copy.deepcopy(calendars[agent_id])
+            simulation_parameters["res_calendars"] = calendars
+
+        # Parameters that are the same object as a changed parameter (e.g. the transition probabilities of the
+        # simulation and of autonomous agents) are changed with it, they are copied together to stay the same object
+        changed_values = [base_parameters[name] for name in changed if isinstance(base_parameters.get(name), dict)]
+        changed |= {name for name, value in base_parameters.items() if any(value is v for v in changed_values)}
+        memo = {}
+        for name in changed:
+            if name in base_parameters:
+                simulation_parameters[name] = copy.deepcopy(base_parameters[name], memo)
+        return sim_config
+
+
+def _find_key(data, target_key):
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key == target_key:
+                return value
+            found = _find_key(value, target_key)
+            if found is not None:
+                return found
+    elif isinstance(data, list):
+        for item in data:
+            found = _find_key(item, target_key)
+            if found is not None:
+                return found
+    return None
+
+
+def _get_agent_counts(agent_count_changes):
+    # the deactivated and duplicated agents that update_agent_count sets
+    deactivated = [agent["id"] for agent in agent_count_changes if agent.get("count", 1) == 0]
+    duplicated = [(agent["id"], agent["count"]) for agent in agent_count_changes if agent.get("count", 1) > 1]
+    return deactivated, duplicated
+
+
+def _is_schedule_changed(calendar, days, schedule):
+    # change_agent_schedule changes the days that have a schedule
+    for day, day_schedule in zip(days, schedule):
+        w_day = str_week_days.get(day.upper())
+        if w_day is None:
+            return True
+        current = [
+            (str(interval.start.time()), str(interval.end.time())) for interval in calendar.work_intervals[w_day]
+        ]
+        if current != [tuple(period) for period in day_schedule]:
+            return True
+    return False
+
+
+def _get_changed_transitions(transition_probabilities, changes):
+    """
+    Returns the entries of [changes] (keyed as in params.json) that differ from [transition_probabilities].
+    """
+    if not changes or transition_probabilities is None:
+        return changes
+    changed = {}
+    for source_activity, targets in changes.items():
+        current_targets = transition_probabilities.get(ast.literal_eval(source_activity), {})
+        for target_agent, probabilities in targets.items():
+            current = current_targets.get(ast.literal_eval(target_agent), {})
+            if any(current.get(activity) != probability for activity, probability in probabilities.items()):
+                changed.setdefault(source_activity, {})[target_agent] = probabilities
+    return changed
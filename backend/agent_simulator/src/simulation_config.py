@@ -22,6 +22,7 @@ class SimulationConfig:
     # ========= Public class functions =========
     __all__ = [
         "run_discovery",
+        "run_incremental_discovery",
         "process_discovery_args",
         "run_simulation",
         "load_simulation_config",
@@ -36,6 +37,10 @@ class SimulationConfig:
         self.discover_parallel_work = False
         self.central_orchestration = False
         self.determine_automatically = False
+        self.racing = False
+        self.sample_fraction = None
+        self.sample_max_events = None
+        self.use_discovery_cache = True
         self.path_log = None
         self.path_log_test = None
         self.train_and_test = False
@@ -50,7 +55,7 @@ class SimulationConfig:
         # This is an agent_simulator ("object")
         self.sim_instance = None
 
-    def run_discovery(self):
+    def run_discovery(self, meter=None):
         """
         The function to start a discovery with all set params.
         Note:
@@ -58,7 +63,7 @@ class SimulationConfig:
             discovery object, so all parametres for the discovery are set.
 
         Args:
-            None
+            meter (RuntimeMeter): Optional, records the wall time and peak memory of the discovery steps
 
         Prerequisites:
             process_discovery_args() is correctly called on instance.
@@ -68,7 +73,27 @@ class SimulationConfig:
 
         """
         self.sim_instance = AgentSimulator(self.params)
-        self.sim_instance.execute_discover()
+        self.sim_instance.execute_discover(meter=meter)
+        return self
+
+    def run_incremental_discovery(self, path_log):
+        """
+        Folds the cases of a new log into the discovered model, only the parameters affected by
+        the new cases are discovered again.
+
+        Args:
+            path_log (str): Path to the .csv file with the new cases, with the same columns as the discovered log.
+
+        Prerequisites:
+            run_discovery() has been called on the instance (or it was loaded from a pickle file).
+
+        Returns:
+            SimulationConfig, the instance with the updated model.
+        """
+        if self.sim_instance is None:
+            raise ValueError("A discovered model is needed to fold new cases into, run the discovery first")
+
+        self.sim_instance.execute_incremental_discover(path_log)
         return self
 
     def process_discovery_args(self, args):
@@ -95,6 +120,10 @@ class SimulationConfig:
                 'extr_delays': False,
                 'central_orchestration': False,
                 'determine_automatically': False,
+                'racing': False,  # Optional
+                'sample_fraction': None,  # Optional, discover only this fraction of the cases
+                'sample_max_events': None,  # Optional, discover at most this many events
+                'use_discovery_cache': True,  # Optional, reuse unchanged results of earlier discoveries
                 'num_simulations': 1
             }
         """
@@ -116,18 +145,22 @@ class SimulationConfig:
         self._set_extr_delays(args["extr_delays"])
         self._set_central_orchestration(args["central_orchestration"])
         self._set_determine_automatically(args["determine_automatically"])
+        self._set_racing(args.get("racing", False))
+        self._set_sampling(args.get("sample_fraction"), args.get("sample_max_events"))
+        self._set_use_discovery_cache(args.get("use_discovery_cache", True))
 
         self._set_num_simulations(args["num_simulations"])
 
         self._set_params(self._generate_params())
 
-    def run_simulation(self):
+    def run_simulation(self, meter=None):
         """
         Runs the simulation, needs to be done with a complete discovery phase. Either loaded from a file
         or directyl from the object itself.
 
         Args:
-            None / all args stored in instance itself
+            meter (RuntimeMeter): Optional, records the wall time and peak memory of every simulation
+                and the number of simulation steps
 
         Prerequisites:
             A instance of a ran discovery phase
@@ -154,7 +187,7 @@ class SimulationConfig:
         if not isinstance(self.sim_instance.num_cases_to_simulate, int) or self.sim_instance.num_cases_to_simulate <= 0:
             raise ValueError(f"num_cases must be a positive integer, got {self.sim_instance.num_cases_to_simulate}")
 
-        return_code = self.sim_instance.generate_log()
+        return_code = self.sim_instance.generate_log(meter=meter)
 
         return return_code  # TODO: What to return here?, now this is done for some specifisity to do tests
 
@@ -212,7 +245,7 @@ class SimulationConfig:
         Args:
             Bool
         """
-        self.extr_delays = extr_delays
+        self.discover_extr_delays = extr_delays
 
     def _set_discover_parallel_work(self, discover_parallel_work):
         """
@@ -241,6 +274,38 @@ class SimulationConfig:
         """
         self.determine_automatically = determine_automatically
 
+    def _set_racing(self, racing):
+        """
+        Setter for racing, if the candidates of determine automatically should be raced
+        against each other (clearly worse candidates are stopped early).
+
+        Args:
+            Bool
+        """
+        self.racing = racing
+
+    def _set_sampling(self, sample_fraction, sample_max_events):
+        """
+        Setter for the case sampling, if set only a stratified sample of the cases is discovered
+        (the smallest of the fraction and the fraction within the event budget).
+
+        Args:
+            float or None: fraction of the cases to discover
+            int or None: maximum number of events to discover
+        """
+        self.sample_fraction = sample_fraction
+        self.sample_max_events = sample_max_events
+
+    def _set_use_discovery_cache(self, use_discovery_cache):
+        """
+        Setter for the discovery cache, if the results of discovery stages whose input
+        did not change are reused from earlier discoveries (see source/discovery_cache.py).
+
+        Args:
+            Bool
+        """
+        self.use_discovery_cache = use_discovery_cache
+
     def _set_path_log(self, path_log):
         """
         Setter for the log path to use for discovery phase, the path to .csv file to train on.
@@ -305,6 +370,10 @@ class SimulationConfig:
             "discover_parallel_work": self.discover_parallel_work,
             "central_orchestration": self.central_orchestration,
             "determine_automatically": self.determine_automatically,
+            "racing": self.racing,
+            "sample_fraction": self.sample_fraction,
+            "sample_max_events": self.sample_max_events,
+            "use_discovery_cache": self.use_discovery_cache,
             "path_log": self.path_log,
             "path_log_test": self.path_log_test,
             "train_and_test": self.train_and_test,
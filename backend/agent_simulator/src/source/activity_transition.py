@@ -1,4 +1,31 @@
+def get_start_activity_distribution(business_process_data):
+    """
+    Returns the activities that start the cases of the log with the fraction of the cases they start,
+    {activity: probability}. If a case starts with an artificial start activity ("Start" or "start"),
+    that activity starts every case.
+    """
+    first_activities = (
+        business_process_data.sort_values(["case_id", "start_timestamp", "end_timestamp"])
+        .groupby("case_id")["activity_name"]
+        .first()
+    )
+    for start_activity in ("Start", "start"):
+        if start_activity in first_activities.values:
+            return {start_activity: 1.0}
+
+    start_count = first_activities.value_counts() / business_process_data["case_id"].nunique()
+    return {activity: float(probability) for activity, probability in start_count.items()}
+
+
 def compute_activity_transition_dict_global(business_process_data):
+    return transition_probabilities_from_counts_global(count_activity_transitions_global(business_process_data))
+
+
+def count_activity_transitions_global(business_process_data):
+    """
+    Counts for each prefix of the cases in the log how often each activity follows it.
+    The counts of logs with disjoint cases can be added (see source/discovery_statistics.py).
+    """
     sequences = create_sequences_global(business_process_data)
 
     sequence_parts, next_act = create_labeled_sequences_global(sequences)
@@ -13,21 +40,37 @@ def compute_activity_transition_dict_global(business_process_data):
             else:
                 dict_[sequence_parts[i]][next_act[i]] += 1
 
-    for k, v in dict_.items():
-        sum_values = 0
-        for key, value in v.items():
-            sum_values += value
-        for key, value in v.items():
-            v[key] = value / sum_values
-
     return dict_
 
 
+def transition_probabilities_from_counts_global(transition_counts):
+    """
+    Normalizes the counts of count_activity_transitions_global into transition probabilities.
+    """
+    transition_probabilities = {}
+    for sequence_part, next_activities in transition_counts.items():
+        sum_values = sum(next_activities.values())
+        transition_probabilities[sequence_part] = {
+            next_activity: count / sum_values for next_activity, count in next_activities.items()
+        }
+
+    return transition_probabilities
+
+
 def compute_activity_transition_dict(business_process_data):
+    return transition_probabilities_from_counts(count_activity_transitions(business_process_data))
+
+
+def count_activity_transitions(business_process_data):
+    """
+    Counts for each prefix of the cases in the log and agent performing its last activity
+    how often each activity follows it.
+    The counts of logs with disjoint cases can be added (see source/discovery_statistics.py).
+    """
     sequences, active_agents = create_sequences(business_process_data)
     sequence_parts, next_act, active_agent = create_labeled_sequences(sequences, active_agents)
 
-    # Initialize a nested dictionary to store transition probabilities per agent
+    # Initialize a nested dictionary to store transition counts per agent
     dict_ = {}
 
     for i in range(len(next_act)):
@@ -48,16 +91,19 @@ def compute_activity_transition_dict(business_process_data):
                 else:
                     dict_[sequence_parts[i]][agent][next_act[i]] += 1
 
-    # Normalize transition probabilities for each agent and sequence part
-    for seq_part, agents in dict_.items():
-        for agent, transitions in agents.items():
-            sum_values = sum(transitions.values())
-            for key, value in transitions.items():
-                transitions[key] = value / sum_values
-
     return dict_
 
 
+def transition_probabilities_from_counts(transition_counts):
+    """
+    Normalizes the counts of count_activity_transitions into transition probabilities per agent and sequence part.
+    """
+    return {
+        sequence_part: transition_probabilities_from_counts_global(agents)
+        for sequence_part, agents in transition_counts.items()
+    }
+
+
 # Function to create sequences of activities for each case
 def create_sequences(df):
     df = df.sort_values(by=["case_id", "start_timestamp"])
@@ -1,12 +1,21 @@
 import os
+import random
 
 import debug_config
 
 # import numpy as np
 from deepdiff import DeepDiff
+from source.activity_transition import get_start_activity_distribution
+from source.case_sampling import estimate_sampling_accuracy
+from source.case_sampling import get_case_start_log
+from source.case_sampling import get_sample_fraction
+from source.case_sampling import sample_cases
 from source.discovery import discover_simulation_parameters
+from source.discovery import materialize_parameter_sets
+from source.discovery import update_simulation_parameters
+from source.discovery_cache import DiscoveryCache
 from source.generate_discovery_data import create_interactive_network
-from source.simulation import BusinessProcessModel
+from source.runtime_meter import RuntimeMeter
 from source.simulation import simulate_process
 from source.train_test_split import load_data
 
@@ -16,17 +25,35 @@ class AgentSimulator:
         self.params = params
         self.activity_duration_overrides = {}
         self.agent_activity_duration_overrides: dict[int, dict[str, float]] = {}  # for overriding specific agents
+        # statistics of the training log, used for folding new cases into the model
+        self.discovery_statistics = None
+        # estimated error of the parameters if they were discovered from a sample of the cases
+        self.discovery_accuracy = None
 
     def generate_html(self):
 
-        starting_activity = BusinessProcessModel(
-            self.df_train,
+        # Sampled from the discovered start activities, models discovered before have them computed from the log
+        start_activities = self.simulation_parameters.get("start_activities")
+        if start_activities is None:
+            start_activities = get_start_activity_distribution(self.df_train)
+        starting_activity = random.choices(list(start_activities), weights=list(start_activities.values()), k=1)[0]
+
+        # The visualization shows the handovers between agents, these are only discovered
+        # for autonomous agents so they are discovered now if the model uses central orchestration
+        materialize_parameter_sets(
             self.simulation_parameters,
-        ).contractor_agent.sample_starting_activity()
+            self.df_train,
+            ["transition_probabilities_autonomous", "agent_transition_probabilities_autonomous"],
+        )
+        visualized_parameters = {
+            **self.simulation_parameters,
+            "transition_probabilities": self.simulation_parameters["transition_probabilities_autonomous"],
+            "agent_transition_probabilities": self.simulation_parameters["agent_transition_probabilities_autonomous"],
+        }
 
-        return create_interactive_network(self.simulation_parameters, starting_activity)
+        return create_interactive_network(visualized_parameters, starting_activity)
 
-    def generate_log(self):
+    def generate_log(self, meter=None):
 
         return_code = simulate_process(
             self.df_train,
@@ -34,6 +61,7 @@ class AgentSimulator:
             self.data_dir,
             self.params["num_simulations"],
             self.num_cases_to_simulate,
+            meter=meter,
         )
 
         return return_code  # for success code only, does not return anything usually, consider other possibilites of doing this
@@ -108,35 +136,93 @@ class AgentSimulator:
             num_cases_to_simulate_val,
         )
 
-    def execute_discover(self):
-        (
-            self.df_train,
-            self.df_val,
-            self.num_cases_to_simulate,
-            self.num_cases_to_simulate_val,
-        ) = self._split_log_from_path(self.params["path_log"])
+    def execute_discover(self, meter=None):
+        """
+        Discovers the simulation parameters from the log at params["path_log"],
+        the wall time and peak memory of the discovery steps are recorded in the [meter] (RuntimeMeter).
+        """
+        meter = meter if meter is not None else RuntimeMeter()
+        with meter.stage("load_log"):
+            (
+                self.df_train,
+                self.df_val,
+                self.num_cases_to_simulate,
+                self.num_cases_to_simulate_val,
+            ) = self._split_log_from_path(self.params["path_log"])
+
+        # For large logs only a stratified sample of the cases can be discovered,
+        # the arrivals are still discovered from all cases
+        sample_fraction = get_sample_fraction(
+            self.df_train, self.params.get("sample_fraction"), self.params.get("sample_max_events")
+        )
+        df_arrivals = None
+        if sample_fraction is not None:
+            with meter.stage("sample_cases"):
+                df_arrivals = get_case_start_log(self.df_train)
+                self.df_train, df_held_out = sample_cases(self.df_train, sample_fraction)
+                df_val = self.df_val[self.df_val["case_id"].isin(self.df_train["case_id"])]
+                # small samples may have none of the validation cases, these are then sampled separately
+                self.df_val = df_val if len(df_val) > 0 else sample_cases(self.df_val, sample_fraction)[0]
+                self.num_cases_to_simulate_val = len(set(self.df_val["case_id"]))
 
         # discover basic simulation parameters
         # not sure if need to add my two new added params here
-        self.df_train, self.simulation_parameters = discover_simulation_parameters(
-            self.df_train,
-            None,
-            self.df_val,
-            self.data_dir,
-            self.num_cases_to_simulate,
-            self.num_cases_to_simulate_val,
-            self.params["determine_automatically"],
-            self.params["central_orchestration"],
-            self.params["discover_extr_delays"],
-            None,  # start time
-            self.params["activity_filter"],
-            self.params["new_activity_duration"],
-        )
+        with meter.stage("discovery"):
+            self.df_train, self.simulation_parameters, self.discovery_statistics = discover_simulation_parameters(
+                self.df_train,
+                None,
+                self.df_val,
+                self.data_dir,
+                self.num_cases_to_simulate,
+                self.num_cases_to_simulate_val,
+                self.params["determine_automatically"],
+                self.params["central_orchestration"],
+                self.params["discover_extr_delays"],
+                None,  # start time
+                self.params["activity_filter"],
+                self.params["new_activity_duration"],
+                racing=self.params.get("racing", False),
+                df_arrivals=df_arrivals,
+                cache=DiscoveryCache() if self.params.get("use_discovery_cache", True) else None,
+                meter=meter,
+            )
+
+        if sample_fraction is not None:
+            with meter.stage("sampling_accuracy"):
+                self.discovery_accuracy = estimate_sampling_accuracy(
+                    self.df_train,
+                    df_held_out,
+                    self.discovery_statistics,
+                    self.simulation_parameters["central_orchestration"],
+                    sample_fraction,
+                )
 
         if debug_config.debug:
             # print(self.simulation_parameters["activity_durations_dict"])
             pass
 
+    def execute_incremental_discover(self, path_log):
+        """
+        Folds the cases of the log at [path_log] into the discovered model instead of rediscovering it,
+        see update_simulation_parameters in source/discovery.py.
+        """
+        if not os.path.exists(path_log):
+            raise FileNotFoundError(f"The file {path_log} does not exist.")
+        if getattr(self, "discovery_accuracy", None) is not None:
+            raise ValueError("New cases can not be folded into a model discovered from a sample of the cases")
+
+        file_extension = path_log.lower().split(".")[-1]
+        df_new, _ = load_data(path_log, file_extension, self.params["column_names"])
+
+        # models discovered before the statistics were kept compute them from the training log
+        self.df_train, self.simulation_parameters, self.discovery_statistics = update_simulation_parameters(
+            self.df_train,
+            self.simulation_parameters,
+            getattr(self, "discovery_statistics", None),
+            df_new,
+            self.num_cases_to_simulate,
+        )
+
     # For comparisions to make sure a save then load of a sim is the same as base obj.
     def __eq__(self, other):
         """
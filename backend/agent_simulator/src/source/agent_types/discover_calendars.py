@@ -33,12 +33,7 @@ def discover_resource_calendars_per_profile(
 
     # Register each timestamp to its corresponding profile
     calendar_factory = CalendarFactory(params.granularity)
-    for _, event in event_log.iterrows():
-        # Register start/end timestamps
-        profile_id = resource_to_profile[event["agent"]]
-        activity = event["activity_name"]
-        calendar_factory.check_date_time(profile_id, activity, event["start_timestamp"])
-        calendar_factory.check_date_time(profile_id, activity, event["end_timestamp"])
+    _register_start_end_timestamps(calendar_factory, event_log, event_log["agent"].map(resource_to_profile))
 
     # Discover weekly timetables
     discovered_timetables = calendar_factory.build_weekly_calendars(
@@ -160,11 +155,7 @@ def _discover_undifferentiated_resource_calendar(
     """
     # Register each timestamp to the same profile
     calendar_factory = CalendarFactory(params.granularity)
-    for _, event in event_log.iterrows():
-        # Register start/end timestamps
-        activity = event["activity_name"]
-        calendar_factory.check_date_time("Undifferentiated", activity, event["start_timestamp"])
-        calendar_factory.check_date_time("Undifferentiated", activity, event["end_timestamp"])
+    _register_start_end_timestamps(calendar_factory, event_log, "Undifferentiated")
     # Discover weekly timetables
     discovered_timetables = calendar_factory.build_weekly_calendars(
         params.confidence, params.support, params.participation
@@ -177,6 +168,29 @@ def _discover_undifferentiated_resource_calendar(
     return discovered_timetables
 
 
+def _register_start_end_timestamps(calendar_factory: CalendarFactory, event_log: pd.DataFrame, resource_names):
+    """
+    Registers the start and end timestamp of every event, in the order of the events.
+
+    :param calendar_factory: factory to register the timestamps in.
+    :param event_log: event log with the timestamps.
+    :param resource_names: resource (or profile) name of every event, or one name for all the events.
+    """
+
+    def interleave(starts, ends):
+        # start and end of the first event, start and end of the second event, ...
+        return pd.concat([starts.reset_index(drop=True), ends.reset_index(drop=True)]).sort_index(kind="stable")
+
+    if isinstance(resource_names, pd.Series):
+        resource_names = interleave(resource_names, resource_names)
+    activities = event_log["activity_name"]
+    calendar_factory.check_date_times(
+        resource_names,
+        interleave(activities, activities),
+        interleave(event_log["start_timestamp"], event_log["end_timestamp"]),
+    )
+
+
 def _create_full_day_calendar(schedule_id: str = "24_7_CALENDAR") -> RCalendar:
     schedule = RCalendar(schedule_id)
     schedule.add_calendar_item(
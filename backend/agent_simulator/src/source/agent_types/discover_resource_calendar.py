@@ -12,53 +12,15 @@ def discover_calendar_per_agent(df):
     calendar_factory = CalendarFactory(params.granularity)
     min_confidence, min_support, min_participation = params.confidence, params.support, params.participation
 
-    resource_cases = dict()
-    resource_freq = dict()
-    max_resource_freq = 0
-    task_resource_freq = dict()
-    task_resource_events = dict()
-    task_events = dict()
-    observed_task_resources = dict()
-    min_max_task_duration = dict()
-    total_events = 0
-    removed_traces = 0
-    removed_events = 0
-
-    df = df.sort_values(by="start_timestamp")
-
-    for case_id, group in df.groupby("case_id"):
-        # print(f"Case ID: {case_id}")
-        # print(group)
-        started_events = dict()
-        trace_info = Trace(case_id)
-        for index, event in group.iterrows():
-            # print(f"event: {event}")
-            resource = event["agent"]
-            task_name = event["activity_name"]
-            start_timestamp = event["start_timestamp"]
-            end_timestamp = event["end_timestamp"]
-
-            if task_name not in task_resource_freq:
-                task_resource_events[task_name] = dict()
-                task_resource_freq[task_name] = [0, dict()]
-                task_events[task_name] = list()
-                observed_task_resources[task_name] = set()
-                # min_max_task_duration[task_name] = [sys.float_info.max, 0]
-            if resource not in task_resource_freq[task_name][1]:
-                task_resource_freq[task_name][1][resource] = 0
-                task_resource_events[task_name][resource] = list()
-            task_resource_freq[task_name][1][resource] += 1
-            task_resource_freq[task_name][0] = max(
-                task_resource_freq[task_name][0], task_resource_freq[task_name][1][resource]
-            )
+    # Events in the order of the traces, i.e., per case (in ascending order) sorted by start time
+    df = df.sort_values(by="start_timestamp").sort_values(by="case_id", kind="stable")
 
-            calendar_factory.check_date_time(resource, task_name, end_timestamp)
+    calendar_factory.check_date_times(df["agent"], df["activity_name"], df["end_timestamp"])
 
-            started_events[task_name] = trace_info.start_event(task_name, task_name, start_timestamp, resource)
-            if task_name in started_events:
-                c_event = trace_info.complete_event(started_events.pop(task_name), end_timestamp)
-                task_events[task_name].append(c_event)
-                task_resource_events[task_name][resource].append(c_event)
+    # Events of every resource per task, converted to TaskEvents only if the resource has no calendar
+    task_resource_events = dict()
+    for (task_name, resource), events in df.groupby(["activity_name", "agent"], sort=False, dropna=False):
+        task_resource_events.setdefault(task_name, dict())[resource] = events
 
     return discover_resource_calendars(
         calendar_factory, task_resource_events, min_confidence, min_support, min_participation
@@ -95,7 +57,7 @@ def discover_resource_calendars(calendar_factory, task_resource_events, min_conf
                 or calendar_candidates[r_name] is None
                 or calendar_candidates[r_name].total_weekly_work == 0
             ):
-                unfit_resource_events += task_resource_events[task_name][r_name]
+                unfit_resource_events += _to_task_events(task_resource_events[task_name][r_name])
                 agent_name.append(r_name)
             else:
                 task_event_covered_freq[task_name] += 2 * len(task_resource_events[task_name][r_name])
@@ -109,9 +71,10 @@ def discover_resource_calendars(calendar_factory, task_resource_events, min_conf
                 joint_resource_freq[j_name] = 2 * len(joint_events[i])
                 joint_event_candidates[j_name] = joint_events[i]
                 joint_task_resources[task_name].append(j_name)
-                for ev_info in joint_events[i]:
-                    calendar_factory.check_date_time(j_name, task_name, ev_info.started_at, True)
-                    calendar_factory.check_date_time(j_name, task_name, ev_info.completed_at, True)
+                timestamps = [
+                    timestamp for ev_info in joint_events[i] for timestamp in (ev_info.started_at, ev_info.completed_at)
+                ]
+                calendar_factory.check_date_times(j_name, task_name, timestamps, True)
 
     calendar_candidates = calendar_factory.build_weekly_calendars(min_confidence, min_support, min_participation)
 
@@ -162,6 +125,23 @@ def discover_resource_calendars(calendar_factory, task_resource_events, min_conf
     return resource_calendars, task_resources, joint_resource_events, pools_json, coverage_map
 
 
+def _to_task_events(events):
+    """
+    Converts the events of the log (rows of the DataFrame) to completed TaskEvents.
+    """
+    task_events = list()
+    for case_id, task_name, resource, started_at, completed_at in zip(
+        events["case_id"], events["activity_name"], events["agent"], events["start_timestamp"], events["end_timestamp"]
+    ):
+        task_event = TaskEvent(case_id, task_name, resource)
+        task_event.task_name = task_name
+        task_event.started_at = started_at
+        task_event.completed_at = completed_at
+        task_event.idle_time = 0
+        task_events.append(task_event)
+    return task_events
+
+
 def _max_disjoint_intervals(interval_list):
     if len(interval_list) == 1:
         return [interval_list]
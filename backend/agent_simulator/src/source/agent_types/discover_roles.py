@@ -3,10 +3,10 @@ from dataclasses import dataclass
 from operator import itemgetter
 from typing import List
 
-import networkx as nx
 import numpy as np
 import pandas as pd
-from scipy.stats import pearsonr
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
 from source.agent_types.calendar_discovery_parameters import CalendarDiscoveryParameters
 from source.agent_types.discover_calendars import discover_resource_calendars_per_profile
 from source.agent_types.roles import Resource
@@ -54,39 +54,8 @@ class _ResourcePoolDiscoverer:
         return filtered_list
 
     def _discover_roles(self):
-        def associations(x):
-            return self.tasks[x[self._activity_key]], self.users[x[self._resource_key]]
-
-        self._log["ac_rl"] = self._log.apply(associations, axis=1)
-
-        freq_matrix = (
-            self._log.groupby(by="ac_rl")[self._activity_key]
-            .count()
-            .reset_index()
-            .rename(columns={self._activity_key: "freq"})
-        )
-        freq_matrix = {x["ac_rl"]: x["freq"] for x in freq_matrix.to_dict("records")}
-
-        profiles = self._build_profile(freq_matrix)
-
-        # NOTE: Pearson coefficient calculation might fail if too few resources
-        try:
-            # building of a correl matrix between resources profiles
-            correl_matrix = self._det_correl_matrix(profiles)
-            # creation of a rel network between resources
-            g = nx.Graph()
-            for user in self.users.values():
-                g.add_node(user)
-            for rel in correl_matrix:
-                # creation of edges between nodes excluding the same elements
-                # and those below the similarity threshold
-                if rel["distance"] > self._sim_threshold and rel["x"] != rel["y"]:
-                    g.add_edge(rel["x"], rel["y"], weight=rel["distance"])
-            # extraction of fully connected subgraphs as roles
-            sub_graphs = list((g.subgraph(c) for c in nx.connected_components(g)))
-            # role definition from graph
-            return self._role_definition(sub_graphs)
-        except ValueError:
+        # NOTE: the Pearson coefficient is not defined for profiles with less than two activities
+        if len(self.tasks) < 2:
             members = self._log[self._resource_key].unique()
             quantity = len(members)
             role = "Role 1"
@@ -94,45 +63,56 @@ class _ResourcePoolDiscoverer:
             resource_table = [{"role": role, "resource": member} for member in members]
             return roles, resource_table
 
-    def _build_profile(self, freq_matrix):
-        profiles = []
-        for user, idx in self.users.items():
-            profile = [
-                0,
-            ] * len(self.tasks)
-            for ac_rl, freq in freq_matrix.items():
-                if idx == ac_rl[1]:
-                    profile[ac_rl[0]] = freq
-            profiles.append({self._resource_key: idx, "profile": profile})
-        return profiles
+        profiles = self._build_profile()
+        # building of a correl matrix between resources profiles
+        correl_matrix = self._det_correl_matrix(profiles)
+        # creation of a rel network between resources, excluding the same elements
+        # and those below the similarity threshold
+        adjacency = correl_matrix > self._sim_threshold
+        np.fill_diagonal(adjacency, False)
+        adjacency |= adjacency.T
+        # extraction of fully connected subgraphs as roles
+        _, labels = connected_components(csr_matrix(adjacency), directed=False)
+        return self._role_definition(labels)
+
+    def _build_profile(self):
+        """
+        Returns the profile matrix, with the frequency of every activity (columns) per resource (rows).
+        """
+        activity_codes = self._log[self._activity_key].map(self.tasks).to_numpy()
+        resource_codes = self._log[self._resource_key].map(self.users).to_numpy()
+        return np.bincount(
+            resource_codes * len(self.tasks) + activity_codes, minlength=len(self.users) * len(self.tasks)
+        ).reshape(len(self.users), len(self.tasks))
 
     def _det_correl_matrix(self, profiles):
-        correl_matrix = []
-        for profile_x in profiles:
-            for profile_y in profiles:
-                x = np.array(profile_x["profile"])
-                y = np.array(profile_y["profile"])
-                r_row, p_value = pearsonr(x, y)
-                correl_matrix.append(
-                    (
-                        {
-                            "x": profile_x[self._resource_key],
-                            "y": profile_y[self._resource_key],
-                            "distance": r_row,
-                        }
-                    )
-                )
+        """
+        Returns the Pearson correlation between the profiles of every pair of resources,
+        NaN if one of the profiles is constant.
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # NOTE: corrcoef returns a scalar for a single resource
+            correl_matrix = np.atleast_2d(np.corrcoef(profiles))
+        # resources with a constant profile are not correlated with any other resource
+        is_constant = (profiles == profiles[:, :1]).all(axis=1)
+        correl_matrix[is_constant, :] = np.nan
+        correl_matrix[:, is_constant] = np.nan
         return correl_matrix
 
-    def _role_definition(self, sub_graphs):
+    def _role_definition(self, labels):
+        """
+        Defines one role per connected component, [labels] is the component of every resource.
+        """
         user_index = {v: k for k, v in self.users.items()}
+        # Components in the order of their first resource, and resources in the order of their index
+        _, first_users = np.unique(labels, return_index=True)
         records = []
-        for i in range(0, len(sub_graphs)):
-            users_names = [user_index[x] for x in sub_graphs[i]]
+        for i, label in enumerate(labels[np.sort(first_users)]):
+            users_names = [user_index[x] for x in np.flatnonzero(labels == label)]
             records.append(
                 {
                     "role": "Role " + str(i + 1),
-                    "quantity": len(sub_graphs[i]),
+                    "quantity": len(users_names),
                     "members": users_names,
                 }
             )
@@ -1,6 +1,7 @@
 import datetime
 from typing import Dict
 
+import pandas as pd
 import pytz
 from source.agent_types.resource_calendar import CalendarKPIInfoFactory
 from source.agent_types.resource_calendar import GranuleInfo
@@ -27,6 +28,18 @@ class CalendarFactory:
         self.from_datetime = min(self.from_datetime, timestamp)
         self.to_datetime = max(self.to_datetime, timestamp)
 
+    def check_date_times(self, resource_names, activity_names, timestamps, is_joint=False):
+        """
+        Registers a batch of timestamps at once, [resource_names] and [activity_names] are sequences with
+        the resource and activity of every timestamp, or a single name used for all of them.
+        """
+        timestamps = pd.Series(timestamps)
+        self.kpi_calendar.register_resource_timestamps(resource_names, activity_names, timestamps, is_joint)
+
+        if len(timestamps) > 0:
+            self.from_datetime = min(self.from_datetime, timestamps.min())
+            self.to_datetime = max(self.to_datetime, timestamps.max())
+
     def build_weekly_calendars(self, min_confidence, desired_support, min_participation) -> Dict[str, RCalendar]:
         """
         Builds a calendar for each resource in the KPI calendar, using the given parameters.
@@ -37,7 +50,7 @@ class CalendarFactory:
 
         r_calendars = {}
 
-        for r_name in self.kpi_calendar.shared_task_granules:
+        for r_name in self.kpi_calendar.registered_resources():
             if self.kpi_calendar.resource_participation_ratio(r_name) >= min_participation:
                 r_calendars[r_name] = self._build_resource_calendar(r_name, min_confidence, desired_support)
             else:
@@ -50,21 +63,20 @@ class CalendarFactory:
         r_calendar = RCalendar("%s_Schedule" % r_name)
 
         count = 0
-        for g_index in kpi_c.shared_task_granules[r_name]:
-            for weekday in kpi_c.shared_task_granules[r_name][g_index]:
-                best_task, conf_values = kpi_c.task_cond_confidence(r_name, weekday, g_index)
-                if min_confidence <= conf_values[best_task]:
-                    kpi_c.check_accepted_granule(r_name, weekday, g_index, best_task)
-                    self._add_calendar_item(weekday, g_index, r_calendar)
-                else:
-                    count += 1
-                    kpi_c.g_discarded[r_name].append(GranuleInfo(weekday, g_index))
+        for weekday, g_index in kpi_c.active_granules(r_name):
+            best_task, conf_values = kpi_c.task_cond_confidence(r_name, weekday, g_index)
+            if min_confidence <= conf_values[best_task]:
+                kpi_c.check_accepted_granule(r_name, weekday, g_index, best_task)
+                self._add_calendar_item(weekday, g_index, r_calendar)
+            else:
+                count += 1
+                kpi_c.g_discarded[r_name].append(GranuleInfo(weekday, g_index))
 
         confidence, support = kpi_c.compute_confidence_support(r_name)
 
         if confidence > 0 and support < desired_support:
             kpi_c.g_discarded[r_name].sort(
-                key=lambda x: kpi_c.res_granules_frequency[r_name][x.granule_index][x.week_day],
+                key=lambda x: kpi_c.granule_frequency(r_name, x.week_day, x.granule_index),
                 reverse=True,
             )
 
@@ -116,10 +128,9 @@ class CalendarFactory:
         r_kpi = self.kpi_calendar
         r_calendar = RCalendar("%s_Schedule" % r_name)
 
-        for g_index in r_kpi.res_active_granules_weekdays[r_name]:
-            for week_day in r_kpi.res_active_granules_weekdays[r_name][g_index]:
-                r_kpi.check_accepted_granule(r_name, week_day, g_index, t_name)
-                self._add_calendar_item(week_day, g_index, r_calendar)
+        for week_day, g_index in r_kpi.active_granules(r_name):
+            r_kpi.check_accepted_granule(r_name, week_day, g_index, t_name)
+            self._add_calendar_item(week_day, g_index, r_calendar)
 
         return r_calendar
 
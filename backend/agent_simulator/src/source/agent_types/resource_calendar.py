@@ -2,6 +2,7 @@ import datetime
 from dataclasses import dataclass
 from datetime import timedelta
 
+import numpy as np
 import pandas as pd
 from source.agent_types.calendar_discovery_parameters import conversion_table
 from source.agent_types.calendar_discovery_parameters import int_week_days
@@ -15,126 +16,205 @@ class GranuleInfo:
 
 
 class CalendarKPIInfoFactory:
+    """
+    Frequencies of the timestamps registered per resource, task, weekday and granule of the day, used to
+    compute the confidence and support of the granules of the discovered calendars.
+
+    The timestamps are registered in batches and binned with numpy when the KPIs are needed, the counts
+    are stored in arrays indexed by [resource or (resource, task) pair, weekday, granule].
+    """
+
     def __init__(self, minutes_x_granule=15):
         self.minutes_x_granule = minutes_x_granule
-        self.total_granules = 1440 % self.minutes_x_granule
+        self.total_granules = 1440 // self.minutes_x_granule
 
         self.g_discarded = {}
 
-        # Fields to calculate Confidence and Support
-        self.res_active_weekdays = {}
-        self.res_active_granules_weekdays = {}
-        self.res_enabled_task_granules = None
-        self.res_granules_frequency = {}
-        self.active_res_task_weekdays = {}
-        self.active_res_task_weekdays_granules = {}
-        self.res_task_weekdays_granules_freq = {}
-        self.shared_task_granules = {}
+        # Registered timestamps (resources, tasks, timestamps in local time as nanoseconds, is_joint),
+        # single registrations are collected in pending_timestamps until the KPIs are computed
+        self.registered_batches = []
+        self.pending_timestamps = []
+        self.is_binned = True
+
+        # Resources and tasks in the order in which they were registered, with their index in the arrays
+        self.resources = []
+        self.tasks = []
+        self.resource_index = {}
+        self.task_index = {}
         self.is_joint_resource = {}
         self.joint_to_task = {}
-        self.observed_weekdays = {}
+
+        # Observed (resource, task) pairs, the pairs of every resource and the index of every pair
+        self.pair_resource = np.zeros(0, dtype=np.int64)
+        self.pair_task = np.zeros(0, dtype=np.int64)
+        self.resource_pairs = []
+        self.pair_index = {}
+
+        # Fields to calculate Confidence and Support, [*_days] count the distinct days with a timestamp
+        self.res_granules_frequency = np.zeros((0, 7, self.total_granules), dtype=np.int64)
+        self.res_granules_days = np.zeros((0, 7, self.total_granules), dtype=np.int64)
+        self.res_weekdays_days = np.zeros((0, 7), dtype=np.int64)
+        self.pair_granules_frequency = np.zeros((0, 7, self.total_granules), dtype=np.int64)
+        self.pair_granules_days = np.zeros((0, 7, self.total_granules), dtype=np.int64)
+        self.pair_weekdays_days = np.zeros((0, 7), dtype=np.int64)
+        self.observed_weekdays_days = np.zeros(7, dtype=np.int64)
+        # (weekday, granule) pairs in which every resource was active, in the order in which they were registered
+        self.res_active_granules = {}
+        self.res_enabled_task_granules = None
 
         # Fields to compute resource frequencies (needed for participation ratio)
-        self.resource_freq = {}
-        self.resource_task_freq = {}
-        self.max_resource_freq = 0
-        self.max_resource_task_freq = {}
+        self.resource_freq = np.zeros(0, dtype=np.int64)
+        self.pair_freq = np.zeros(0, dtype=np.int64)
+        self.max_resource_task_freq = np.zeros(0, dtype=np.int64)
 
-        self.task_events_count = {}
-        self.task_events_in_calendar = {}
+        self.task_events_count = np.zeros(0, dtype=np.int64)
+        self.task_events_in_calendar = np.zeros(0, dtype=np.int64)
         self.total_events_in_log = 0
         self.total_events_in_calendar = 0
 
-        self.res_count_events_in_calendar = {}
-        self.res_count_events_in_log = {}
-        self.active_granules_in_calendar = {}
-        self.active_weekdays_in_calendar = {}
-        self.confidence_numerator_sum = {}
-        self.confidence_denominator_sum = {}
+        self.res_count_events_in_calendar = np.zeros(0, dtype=np.int64)
+        self.confidence_numerator_sum = np.zeros(0, dtype=np.int64)
+        self.confidence_denominator_sum = np.zeros(0, dtype=np.int64)
 
         self.task_enabled_in_granule = {}
 
     def register_resource_timestamp(self, r_name, t_name, date_time, is_joint=False):
-        str_date, g_index, weekday = self.split_datetime(date_time)
-
-        if r_name not in self.resource_freq:
-            self.resource_freq[r_name] = 0
-            self.resource_task_freq[r_name] = {}
-            self.res_active_weekdays[r_name] = {}
-            self.res_active_granules_weekdays[r_name] = {}
-            self.res_granules_frequency[r_name] = {}
-            self.active_res_task_weekdays[r_name] = {}
-            self.active_res_task_weekdays_granules[r_name] = {}
-            self.shared_task_granules[r_name] = {}
-            self.res_task_weekdays_granules_freq[r_name] = {}
-
-            if is_joint:
-                self.joint_to_task[r_name] = t_name
+        self.pending_timestamps.append((r_name, t_name, date_time, is_joint))
+        self.is_binned = False
 
-            self.g_discarded[r_name] = []
-
-            self.res_count_events_in_calendar[r_name] = 0
-            self.res_count_events_in_log[r_name] = 0
-            self.active_granules_in_calendar[r_name] = set()
-            self.active_weekdays_in_calendar[r_name] = set()
-            self.confidence_numerator_sum[r_name] = 0
-            self.confidence_denominator_sum[r_name] = 0
-            self.is_joint_resource[r_name] = is_joint
-
-        if t_name not in self.task_events_count:
-            self.task_events_count[t_name] = 0
-            self.task_events_in_calendar[t_name] = 0
-            self.max_resource_task_freq[t_name] = 0
-        if t_name not in self.resource_task_freq[r_name]:
-            self.resource_task_freq[r_name][t_name] = 0
-            self.active_res_task_weekdays[r_name][t_name] = {}
-            self.active_res_task_weekdays_granules[r_name][t_name] = {}
-            self.res_task_weekdays_granules_freq[r_name][t_name] = {}
-        if weekday not in self.active_res_task_weekdays[r_name][t_name]:
-            self.active_res_task_weekdays[r_name][t_name][weekday] = set()
-            self.active_res_task_weekdays_granules[r_name][t_name][weekday] = {}
-        if g_index not in self.active_res_task_weekdays_granules[r_name][t_name][weekday]:
-            self.active_res_task_weekdays_granules[r_name][t_name][weekday][g_index] = set()
-        if g_index not in self.res_task_weekdays_granules_freq[r_name][t_name]:
-            self.res_task_weekdays_granules_freq[r_name][t_name][g_index] = {}
-        if weekday not in self.res_task_weekdays_granules_freq[r_name][t_name][g_index]:
-            self.res_task_weekdays_granules_freq[r_name][t_name][g_index][weekday] = 0
-        if weekday not in self.res_active_weekdays[r_name]:
-            self.res_active_weekdays[r_name][weekday] = set()
-        if g_index not in self.res_active_granules_weekdays[r_name]:
-            self.res_active_granules_weekdays[r_name][g_index] = {}
-            self.res_granules_frequency[r_name][g_index] = {}
-            self.shared_task_granules[r_name][g_index] = {}
-        if weekday not in self.res_active_granules_weekdays[r_name][g_index]:
-            self.res_active_granules_weekdays[r_name][g_index][weekday] = set()
-            self.res_granules_frequency[r_name][g_index][weekday] = 0
-            self.shared_task_granules[r_name][g_index][weekday] = set()
-        if weekday not in self.observed_weekdays:
-            self.observed_weekdays[weekday] = set()
-
-        # Updating the weekdays and granules the resource was observed working
-        self.res_active_weekdays[r_name][weekday].add(str_date)
-        self.res_active_granules_weekdays[r_name][g_index][weekday].add(str_date)
-        self.res_granules_frequency[r_name][g_index][weekday] += 1
-
-        self.active_res_task_weekdays_granules[r_name][t_name][weekday][g_index].add(str_date)
-        self.active_res_task_weekdays[r_name][t_name][weekday].add(str_date)
-
-        self.resource_freq[r_name] += 1
-        self.resource_task_freq[r_name][t_name] += 1
-        self.res_count_events_in_log[r_name] += 1
-        self.shared_task_granules[r_name][g_index][weekday].add(t_name)
-        self.res_task_weekdays_granules_freq[r_name][t_name][g_index][weekday] += 1
-
-        if not is_joint:
-            self.max_resource_task_freq[t_name] = max(
-                self.max_resource_task_freq[t_name],
-                self.resource_task_freq[r_name][t_name],
+    def register_resource_timestamps(self, r_names, t_names, timestamps, is_joint=False):
+        """
+        Registers a batch of timestamps, [r_names] and [t_names] are sequences with the resource and
+        task of every timestamp, or a single name used for all of them.
+        """
+        self._register_pending_timestamps()
+        self._register_batch(r_names, t_names, timestamps, is_joint)
+
+    def _register_pending_timestamps(self):
+        if len(self.pending_timestamps) > 0:
+            r_names, t_names, timestamps, is_joint = zip(*self.pending_timestamps)
+            self.pending_timestamps = []
+            self._register_batch(r_names, t_names, timestamps, is_joint)
+
+    def _register_batch(self, r_names, t_names, timestamps, is_joint):
+        timestamps = _to_local_nanoseconds(timestamps)
+        self.registered_batches.append(
+            (
+                _broadcast_names(r_names, len(timestamps)),
+                _broadcast_names(t_names, len(timestamps)),
+                timestamps,
+                np.broadcast_to(np.asarray(is_joint, dtype=bool), len(timestamps)),
             )
-            self.observed_weekdays[weekday].add(str_date)
-            self.max_resource_freq = max(self.max_resource_freq, self.resource_freq[r_name])
-            self.task_events_count[t_name] += 1
-            self.total_events_in_log += 1
+        )
+        self.is_binned = False
+
+    def registered_resources(self):
+        self._bin_timestamps()
+        return list(self.resources)
+
+    def active_granules(self, r_name):
+        """
+        Returns the (weekday, granule index) pairs in which the resource was active.
+        """
+        self._bin_timestamps()
+        return self.res_active_granules[r_name]
+
+    def granule_frequency(self, r_name, weekday, g_index):
+        self._bin_timestamps()
+        return self.res_granules_frequency[self.resource_index[r_name], weekday, g_index]
+
+    def resource_tasks(self, r_name):
+        self._bin_timestamps()
+        pairs = self.resource_pairs[self.resource_index[r_name]]
+        return [self.tasks[t] for t in self.pair_task[pairs]]
+
+    def _bin_timestamps(self):
+        """
+        Computes the frequencies of all registered timestamps, the calendar info of the resources
+        and tasks registered before is kept.
+        """
+        if self.is_binned:
+            return
+        self._register_pending_timestamps()
+        self.is_binned = True
+        if sum(len(batch[2]) for batch in self.registered_batches) == 0:
+            return
+
+        r_names, t_names, timestamps, is_joint = (np.concatenate(column) for column in zip(*self.registered_batches))
+        # Codes in order of first registration, so codes of earlier registered resources and tasks do not change
+        r_codes, resources = pd.factorize(r_names)
+        t_codes, tasks = pd.factorize(t_names)
+        p_codes, pairs = pd.factorize(r_codes * len(tasks) + t_codes)
+        num_resources, num_tasks, num_pairs = len(resources), len(tasks), len(pairs)
+
+        self.resources, self.tasks = list(resources), list(tasks)
+        self.resource_index = {r_name: r for r, r_name in enumerate(self.resources)}
+        self.task_index = {t_name: t for t, t_name in enumerate(self.tasks)}
+        _, first_registrations = np.unique(r_codes, return_index=True)
+        self.is_joint_resource = dict(zip(self.resources, is_joint[first_registrations].tolist()))
+        self.joint_to_task = {
+            self.resources[r]: self.tasks[t_codes[i]] for r, i in enumerate(first_registrations) if is_joint[i]
+        }
+
+        self.pair_resource, self.pair_task = pairs // num_tasks, pairs % num_tasks
+        self.pair_index = dict(zip(zip(self.pair_resource.tolist(), self.pair_task.tolist()), range(num_pairs)))
+        pairs_by_resource = np.argsort(self.pair_resource, kind="stable")
+        self.resource_pairs = np.split(
+            pairs_by_resource, np.cumsum(np.bincount(self.pair_resource, minlength=num_resources))[:-1]
+        )
+
+        days = timestamps // NANOSECONDS_PER_DAY
+        g_indexes = (timestamps - days * NANOSECONDS_PER_DAY) // (self.minutes_x_granule * NANOSECONDS_PER_MINUTE)
+        weekdays = (days + EPOCH_WEEKDAY) % 7
+        days -= days.min()
+
+        cells = (weekdays * self.total_granules + g_indexes).astype(np.int64)
+        num_cells = 7 * self.total_granules
+        res_cells = r_codes * num_cells + cells
+        pair_cells = p_codes * num_cells + cells
+        shape = (-1, 7, self.total_granules)
+
+        self.res_granules_frequency = np.bincount(res_cells, minlength=num_resources * num_cells).reshape(shape)
+        self.res_granules_days = _count_distinct_days(res_cells, days, num_resources * num_cells).reshape(shape)
+        self.res_weekdays_days = _count_distinct_days(r_codes * 7 + weekdays, days, num_resources * 7).reshape(-1, 7)
+        self.pair_granules_frequency = np.bincount(pair_cells, minlength=num_pairs * num_cells).reshape(shape)
+        self.pair_granules_days = _count_distinct_days(pair_cells, days, num_pairs * num_cells).reshape(shape)
+        self.pair_weekdays_days = _count_distinct_days(p_codes * 7 + weekdays, days, num_pairs * 7).reshape(-1, 7)
+        self.observed_weekdays_days = _count_distinct_days(weekdays[~is_joint], days[~is_joint], 7)
+        self.res_active_granules = self._get_active_granules(r_codes, res_cells, g_indexes, num_cells)
+        self.res_enabled_task_granules = None
+
+        self.resource_freq = np.bincount(r_codes, minlength=num_resources)
+        self.pair_freq = np.bincount(p_codes, minlength=num_pairs)
+        # The maximum frequency of a task only considers the resources that are not joint resources
+        is_regular_pair = np.bincount(p_codes[~is_joint], minlength=num_pairs) > 0
+        self.max_resource_task_freq = np.zeros(num_tasks, dtype=np.int64)
+        np.maximum.at(self.max_resource_task_freq, self.pair_task[is_regular_pair], self.pair_freq[is_regular_pair])
+        self.task_events_count = np.bincount(t_codes[~is_joint], minlength=num_tasks)
+        self.total_events_in_log = int(np.count_nonzero(~is_joint))
+
+        self.task_events_in_calendar = _resize(self.task_events_in_calendar, num_tasks)
+        self.res_count_events_in_calendar = _resize(self.res_count_events_in_calendar, num_resources)
+        self.confidence_numerator_sum = _resize(self.confidence_numerator_sum, num_resources)
+        self.confidence_denominator_sum = _resize(self.confidence_denominator_sum, num_resources)
+        for r_name in self.resources:
+            self.g_discarded.setdefault(r_name, [])
+
+    def _get_active_granules(self, r_codes, res_cells, g_indexes, num_cells):
+        # Granules are ordered by their first registration, and the weekdays of a granule by the first
+        # registration of the (weekday, granule) pair
+        granule_keys = r_codes * self.total_granules + g_indexes
+        _, first_granule_registrations, granule_inverse = np.unique(
+            granule_keys, return_index=True, return_inverse=True
+        )
+        unique_cells, first_cell_registrations = np.unique(res_cells, return_index=True)
+        first_granule_of_cells = first_granule_registrations[granule_inverse[first_cell_registrations]]
+        unique_resources = unique_cells // num_cells
+        order = np.lexsort((first_cell_registrations, first_granule_of_cells, unique_resources))
+        weekdays, g_indexes = np.divmod(unique_cells[order] % num_cells, self.total_granules)
+        granules = list(zip(weekdays.tolist(), g_indexes.tolist()))
+        bounds = np.cumsum(np.bincount(unique_resources, minlength=len(self.resources))).tolist()
+        return {r_name: granules[start:end] for r_name, start, end in zip(self.resources, [0] + bounds, bounds)}
 
     def register_task_enablement(self, trace_events):
         self.res_enabled_task_granules = None
@@ -158,10 +238,10 @@ class CalendarKPIInfoFactory:
 
     def compute_resource_task_granule_enablement(self):
         self.res_enabled_task_granules = {}
-        for r_name in self.resource_task_freq:
+        for r_name in self.registered_resources():
             self.res_enabled_task_granules[r_name] = {}
             joint_granules = {}
-            for t_name in self.resource_task_freq[r_name]:
+            for t_name in self.resource_tasks(r_name):
                 for g_index in self.task_enabled_in_granule[t_name]:
                     if g_index not in self.res_enabled_task_granules[r_name]:
                         joint_granules[g_index] = {}
@@ -179,50 +259,62 @@ class CalendarKPIInfoFactory:
         if self.res_enabled_task_granules is None:
             self.compute_resource_task_granule_enablement()
         return (
-            len(self.res_active_granules_weekdays[r_name][g_index][weekday])
+            self.res_granules_days[self.resource_index[r_name], weekday, g_index]
             / self.res_enabled_task_granules[r_name][g_index][weekday]
         )
 
     def task_cond_confidence(self, r_name, weekday, g_index):
+        self._bin_timestamps()
+        pairs = self.resource_pairs[self.resource_index[r_name]]
+        pairs = pairs[self.pair_granules_frequency[pairs, weekday, g_index] > 0]
+        confidences = self.pair_granules_days[pairs, weekday, g_index] / self.pair_weekdays_days[pairs, weekday]
+
         best_task = None
         max_conf_val = 0
         task_confidences = {}
-        for t_name in self.shared_task_granules[r_name][g_index][weekday]:
-            task_confidences[t_name] = len(
-                self.active_res_task_weekdays_granules[r_name][t_name][weekday][g_index]
-            ) / len(self.active_res_task_weekdays[r_name][t_name][weekday])
-            if max_conf_val < task_confidences[t_name]:
-                best_task = t_name
-                max_conf_val = task_confidences[t_name]
+        for t, conf_value in zip(self.pair_task[pairs].tolist(), confidences.tolist()):
+            task_confidences[self.tasks[t]] = conf_value
+            if max_conf_val < conf_value:
+                best_task = self.tasks[t]
+                max_conf_val = conf_value
         return best_task, task_confidences
 
     def resource_participation_ratio(self, r_name):
-        total_res = 0
-        total_max = 0
-        for t_name in self.resource_task_freq[r_name]:
-            total_res += self.resource_task_freq[r_name][t_name]
-            total_max += self.max_resource_task_freq[t_name]
+        self._bin_timestamps()
+        pairs = self.resource_pairs[self.resource_index[r_name]]
+        total_res = int(self.pair_freq[pairs].sum())
+        total_max = int(self.max_resource_task_freq[self.pair_task[pairs]].sum())
         return total_res / total_max if total_max > 0 else 0
 
     def resource_task_participation_ratio(self, r_name, t_name):
-        if self.max_resource_task_freq[t_name] > 0:
-            return self.resource_task_freq[r_name][t_name] / self.max_resource_task_freq[t_name]
+        self._bin_timestamps()
+        t = self.task_index[t_name]
+        if self.max_resource_task_freq[t] > 0:
+            return int(self.pair_freq[self.pair_index[(self.resource_index[r_name], t)]]) / int(
+                self.max_resource_task_freq[t]
+            )
         return 0
 
     # From all the WeekDays the resource was active, in which ration they were in the given granule
     def confidence(self, r_name, weekday, g_index):
-        return len(self.res_active_granules_weekdays[r_name][g_index][weekday]) / len(
-            self.res_active_weekdays[r_name][weekday]
-        )
+        self._bin_timestamps()
+        r = self.resource_index[r_name]
+        return int(self.res_granules_days[r, weekday, g_index]) / int(self.res_weekdays_days[r, weekday])
 
     def support(self, r_name, weekday, g_index):
-        return len(self.res_active_granules_weekdays[r_name][g_index][weekday]) / len(self.observed_weekdays[weekday])
+        self._bin_timestamps()
+        r = self.resource_index[r_name]
+        return int(self.res_granules_days[r, weekday, g_index]) / int(self.observed_weekdays_days[weekday])
 
     def weekday_support(self, r_name, weekday):
-        return len(self.res_active_weekdays[r_name][weekday]) / len(self.observed_weekdays[weekday])
+        self._bin_timestamps()
+        r = self.resource_index[r_name]
+        return int(self.res_weekdays_days[r, weekday]) / int(self.observed_weekdays_days[weekday])
 
     def task_coverage(self, t_name):
-        return self.task_events_in_calendar[t_name] / self.task_events_count[t_name]
+        self._bin_timestamps()
+        t = self.task_index[t_name]
+        return int(self.task_events_in_calendar[t]) / int(self.task_events_count[t])
 
     def can_improve_support(self, r_name, weekday, g_index):
         best_task, confidence_values = self.task_cond_confidence(r_name, weekday, g_index)
@@ -230,32 +322,25 @@ class CalendarKPIInfoFactory:
         return best_task
 
     def reset_calendar_info(self):
+        self._bin_timestamps()
         self.total_events_in_calendar = 0
-        for t_name in self.task_events_count:
-            self.task_events_in_calendar[t_name] = 0
-        for r_name in self.shared_task_granules:
-            self.res_count_events_in_calendar[r_name] = 0
-            self.active_granules_in_calendar[r_name] = set()
-            self.active_weekdays_in_calendar[r_name] = set()
-            self.g_discarded[r_name] = []
-            self.confidence_numerator_sum[r_name] = 0
-            self.confidence_denominator_sum[r_name] = 0
+        self.task_events_in_calendar[:] = 0
+        self.res_count_events_in_calendar[:] = 0
+        self.confidence_numerator_sum[:] = 0
+        self.confidence_denominator_sum[:] = 0
+        self.g_discarded = {r_name: [] for r_name in self.resources}
 
     def check_accepted_granule(self, r_name, weekday, g_index, best_task):  # TODO: what does it check?
-        self.res_count_events_in_calendar[r_name] += self.res_granules_frequency[r_name][g_index][weekday]
-        self.total_events_in_calendar += self.res_granules_frequency[r_name][g_index][weekday]
-        self.confidence_numerator_sum[r_name] += len(
-            self.active_res_task_weekdays_granules[r_name][best_task][weekday][g_index]
-        )
-        self.confidence_denominator_sum[r_name] += len(self.active_res_task_weekdays[r_name][best_task][weekday])
-        self.active_granules_in_calendar[r_name] |= self.active_res_task_weekdays_granules[r_name][best_task][weekday][
-            g_index
-        ]
-        self.active_weekdays_in_calendar[r_name] |= self.active_res_task_weekdays[r_name][best_task][weekday]
-        for t_name in self.shared_task_granules[r_name][g_index][weekday]:
-            self.task_events_in_calendar[t_name] += self.res_task_weekdays_granules_freq[r_name][t_name][g_index][
-                weekday
-            ]
+        self._bin_timestamps()
+        r = self.resource_index[r_name]
+        best_pair = self.pair_index[(r, self.task_index[best_task])]
+        self.res_count_events_in_calendar[r] += self.res_granules_frequency[r, weekday, g_index]
+        self.total_events_in_calendar += int(self.res_granules_frequency[r, weekday, g_index])
+        self.confidence_numerator_sum[r] += self.pair_granules_days[best_pair, weekday, g_index]
+        self.confidence_denominator_sum[r] += self.pair_weekdays_days[best_pair, weekday]
+        # every task appears once in the pairs of the resource
+        pairs = self.resource_pairs[r]
+        self.task_events_in_calendar[self.pair_task[pairs]] += self.pair_granules_frequency[pairs, weekday, g_index]
 
     def check_discarded_granule(self, r_name, weekday, g_index):
         if r_name not in self.g_discarded:
@@ -283,18 +368,56 @@ class CalendarKPIInfoFactory:
         return str_date, g_index, week_day
 
     def compute_confidence_support(self, r_name):
-        if (
-            r_name not in self.active_weekdays_in_calendar
-            or len(self.active_weekdays_in_calendar[r_name]) == 0
-            or self.res_count_events_in_log[r_name] == 0
-        ):
+        self._bin_timestamps()
+        r = self.resource_index.get(r_name)
+        # the denominator is zero if and only if no weekday with a timestamp is in the calendar
+        if r is None or self.confidence_denominator_sum[r] == 0 or self.resource_freq[r] == 0:
             return 0, 0
         return (
-            self.confidence_numerator_sum[r_name] / self.confidence_denominator_sum[r_name],
-            self.res_count_events_in_calendar[r_name] / self.res_count_events_in_log[r_name],
+            int(self.confidence_numerator_sum[r]) / int(self.confidence_denominator_sum[r]),
+            int(self.res_count_events_in_calendar[r]) / int(self.resource_freq[r]),
         )
 
 
+NANOSECONDS_PER_MINUTE = 60 * 10**9
+NANOSECONDS_PER_DAY = 1440 * NANOSECONDS_PER_MINUTE
+# 1970-01-01 was a Thursday
+EPOCH_WEEKDAY = 3
+
+
+def _to_local_nanoseconds(timestamps) -> np.ndarray:
+    """
+    Returns the (local) wall time of the timestamps as nanoseconds since the epoch.
+    """
+    timestamps = pd.Series(timestamps)
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps)
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_localize(None)
+    return timestamps.to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def _broadcast_names(names, length) -> np.ndarray:
+    if np.ndim(names) == 0:
+        return np.full(length, names, dtype=object)
+    return np.asarray(list(names), dtype=object)
+
+
+def _count_distinct_days(cells, days, num_cells) -> np.ndarray:
+    """
+    Returns the number of distinct days per cell.
+    """
+    num_days = int(days.max(initial=0)) + 1
+    distinct_cell_days = np.unique(cells * num_days + days)
+    return np.bincount(distinct_cell_days // num_days, minlength=num_cells)
+
+
+def _resize(values, length) -> np.ndarray:
+    resized = np.zeros(length, dtype=values.dtype)
+    resized[: min(length, len(values))] = values[:length]
+    return resized
+
+
 class IntervalPoint:
     def __init__(self, date_time, week_day, index, to_start_dist, to_end_dist):
         self.date_time = date_time
@@ -5,6 +5,7 @@ from datetime import datetime
 
 import scipy.stats as st
 from mesa import Agent
+from source.activity_transition import get_start_activity_distribution
 
 
 class ContractorAgent(Agent):
@@ -301,23 +302,16 @@ class ContractorAgent(Agent):
 
         # Cache the start activities if not already cached
         if not hasattr(self, "_start_activities_dist"):
-            # Get first activity for each case more efficiently
-            df = self.model.data
-            # Sort once and get first activity for each case
-            first_activities = (
-                df.sort_values(["case_id", "start_timestamp", "end_timestamp"])
-                .groupby("case_id")["activity_name"]
-                .first()
-            )
+            # Discovered with the model, models discovered before have it computed from the train log
+            start_activities = self.model.simulation_parameters.get("start_activities")
+            if start_activities is None:
+                start_activities = get_start_activity_distribution(self.model.data)
 
             # Handle Start/start cases
-            if "Start" in first_activities.values or "start" in first_activities.values:
-                self._start_activities_dist = ("Start" if "Start" in first_activities.values else "start", None)
+            if list(start_activities) in (["Start"], ["start"]):
+                self._start_activities_dist = (list(start_activities)[0], None)
             else:
-                # Calculate frequencies
-                total_cases = len(df["case_id"].unique())
-                start_count = first_activities.value_counts() / total_cases
-                self._start_activities_dist = (list(start_count.index), list(start_count.values))
+                self._start_activities_dist = (list(start_activities), list(start_activities.values()))
 
         # Use cached distribution
         activities, weights = self._start_activities_dist
@@ -13,27 +13,15 @@ from scipy.stats import wasserstein_distance
 
 
 def get_inter_arrival_times(event_log: pd.DataFrame) -> List[float]:
-    # Get the arrival times from the event log
-    arrival_times = []
-    for case_id, events in event_log.groupby("case_id"):
-        arrival_times += [events["start_timestamp"].min()]
-    # Sort them
-    arrival_times.sort()
-    current_day = arrival_times[0].strftime("%Y-%m-%d")
-    # Compute durations between one arrival and the next one (inter-arrival durations)
-    new_day = []
-    inter_arrival_durations = []
-    last_arrival = None
-    for arrival in arrival_times:
-        if last_arrival:
-            if arrival.strftime("%Y-%m-%d") == current_day:
-                inter_arrival_durations += [(arrival - last_arrival).total_seconds()]
-            else:
-                new_day.append(arrival)
-        last_arrival = arrival
-        current_day = arrival.strftime("%Y-%m-%d")
+    # Get the arrival times from the event log and sort them
+    arrival_times = event_log.groupby("case_id")["start_timestamp"].min().sort_values()
+    # Compute durations between one arrival and the next one (inter-arrival durations),
+    # only arrivals on the same day as the previous arrival are taken into account
+    arrival_days = arrival_times.dt.normalize()
+    same_day = arrival_days == arrival_days.shift(1)
+    inter_arrival_durations = arrival_times.diff()[same_day].dt.total_seconds()
 
-    return inter_arrival_durations
+    return inter_arrival_durations.tolist()
 
 
 def remove_outliers(data: list, m: float = 20.0) -> list:
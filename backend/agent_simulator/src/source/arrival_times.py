@@ -49,7 +49,7 @@ def get_case_arrival_times(df, start_timestamp, num_cases_to_simulate, train=Tru
 
 def get_arrival_parameters_for_train(df, user_input=None):
     arrival_distribution = _get_arrival_distribution(df, user_input=user_input)
-    case_start_timestamps = df.groupby("case_id")["start_timestamp"].min().tolist()
+    case_start_timestamps = df.groupby("case_id")["start_timestamp"].min().reset_index(drop=True)
     min_max_time_per_day = get_min_max_time_per_day(case_start_timestamps)
     average_occurrences_by_day = get_average_occurence_of_cases_per_day(case_start_timestamps)
 
@@ -70,40 +70,43 @@ def _get_arrival_distribution(df_train, user_input=None):
 
 def get_min_max_time_per_day(case_start_timestamps):
     # get the min and max time of case arrivals per day of the week
-    days_of_week = [day.strftime("%A").upper() for day in case_start_timestamps]
-    days_of_week_set = set(days_of_week)
-    min_max_time_per_day = {
-        day: [pd.Timestamp("2023-01-01 23:59:59"), pd.Timestamp("2023-01-01 00:00:01")] for day in days_of_week_set
-    }
-
-    for i in range(len(case_start_timestamps)):
-        for key, value in min_max_time_per_day.items():
-            if days_of_week[i] == key:
-                if case_start_timestamps[i].time() < value[0].time():
-                    value[0] = case_start_timestamps[i]
-                if case_start_timestamps[i].time() > value[1].time():
-                    value[1] = case_start_timestamps[i]
+    case_start_timestamps = pd.Series(case_start_timestamps)
+    days_of_week = case_start_timestamps.dt.day_name().str.upper()
+    time_of_day = case_start_timestamps - case_start_timestamps.dt.normalize()
+
+    # first arrival with the earliest and the latest time of day, per day of the week
+    earliest = time_of_day.groupby(days_of_week).idxmin()
+    latest = time_of_day.groupby(days_of_week).idxmax()
+
+    # arrivals only replace the initial bounds if they are strictly earlier or later
+    initial_min = pd.Timestamp("2023-01-01 23:59:59")
+    initial_max = pd.Timestamp("2023-01-01 00:00:01")
+    min_max_time_per_day = {}
+    for day in earliest.index:
+        first = case_start_timestamps[earliest[day]]
+        last = case_start_timestamps[latest[day]]
+        min_max_time_per_day[day] = [
+            first if first.time() < initial_min.time() else initial_min,
+            last if last.time() > initial_max.time() else initial_max,
+        ]
     return min_max_time_per_day
 
 
 def get_average_occurence_of_cases_per_day(case_start_timestamps):
     # get the mean and std of case arrivals per day of the week
-    days_of_week = [day.strftime("%A").upper() for day in case_start_timestamps]
-    days_of_week = set(days_of_week)
-    count_occurrences_by_day = {day: [] for day in days_of_week}
-    day = case_start_timestamps[0].strftime("%A").upper()
-    counter = 0
-    for time in case_start_timestamps:
-        if day == time.strftime("%A").upper():
-            counter += 1
-        else:
-            count_occurrences_by_day[day].append(counter)
-            counter = 1
-            day = time.strftime("%A").upper()
-
-    average_occurrences_by_day = {day: () for day in days_of_week}
-    for key, value in count_occurrences_by_day.items():
-        average_occurrences_by_day[key] = (np.mean(value), np.std(value))
+    case_start_timestamps = pd.Series(case_start_timestamps)
+    days_of_week = case_start_timestamps.dt.day_name().str.upper()
+
+    # count consecutive arrivals on the same day of the week, the last (possibly incomplete) run is left out
+    run_ids = (days_of_week != days_of_week.shift(1)).cumsum()
+    run_lengths = run_ids.groupby(run_ids).size().iloc[:-1]
+    run_days = days_of_week.groupby(run_ids).first().iloc[:-1]
+    counts_by_day = run_lengths.groupby(run_days)
+
+    average_occurrences_by_day = {}
+    for day in days_of_week.unique():
+        value = counts_by_day.get_group(day).to_numpy() if day in counts_by_day.groups else np.array([])
+        average_occurrences_by_day[day] = (np.mean(value), np.std(value))
 
     return average_occurrences_by_day
 
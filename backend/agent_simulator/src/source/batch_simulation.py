@@ -0,0 +1,156 @@
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+from source.behavior_selection import get_cycle_times
+
+"""
+Seeds and summaries of the replications of a batch simulation (what-if analysis), in which variants of a model
+(the model with different parameter changes) are simulated several times each.
+
+Every replication is simulated with its own seed. With common seeds (common random numbers) the i-th replication
+of every variant uses the same seed, so the differences between the variants are mostly due to their parameters
+instead of to the random samples, and fewer replications are needed to compare them (see compare_replications).
+
+The summary of a replication are key performance indicators of its simulated log, durations are in seconds.
+"""
+
+# Key performance indicators of a simulated log, see summarize_log
+SUMMARY_METRICS = (
+    "num_cases",
+    "num_events",
+    "cycle_time_mean",
+    "cycle_time_median",
+    "cycle_time_p90",
+    "processing_time_mean",
+    "makespan",
+    "throughput_per_day",
+    "resource_utilization",
+)
+
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def get_replication_seeds(
+    num_variants: int,
+    num_replications: int,
+    seed: Optional[int] = None,
+    common_seeds: bool = True,
+    first_replication: int = 0,
+) -> Tuple[int, List[List[int]]]:
+    """
+    Returns the seeds of the replications of every variant.
+
+    Args:
+        num_variants (int): Number of variants.
+        num_replications (int): Number of replications per variant.
+        seed (int): Optional, seed the replication seeds are derived from, a random one if None.
+        common_seeds (bool): If the i-th replication of every variant uses the same seed.
+        first_replication (int): Index of the first replication, to add replications to earlier ones
+            with the same seed (e.g. in rounds, see source/staffing_optimizer.py).
+
+    Returns:
+        tuple: The seed (the random one if none was given) and per variant the list of replication seeds.
+    """
+    sequence = np.random.SeedSequence(seed)
+    if common_seeds:
+        seeds = [int(s) for s in sequence.generate_state(first_replication + num_replications)[first_replication:]]
+        variant_seeds = [list(seeds) for _ in range(num_variants)]
+    else:
+        variant_seeds = [
+            [int(s) for s in child.generate_state(first_replication + num_replications)[first_replication:]]
+            for child in sequence.spawn(num_variants)
+        ]
+    return int(sequence.entropy), variant_seeds
+
+
+def summarize_log(log: pd.DataFrame) -> dict:
+    """
+    Returns the key performance indicators (SUMMARY_METRICS) of a simulated log.
+
+    Args:
+        log (DataFrame): Simulated log with case_id, resource, start_timestamp and end_timestamp (datetime).
+
+    Returns:
+        dict: The number of cases and events, the mean, median and 90th percentile of the cycle times,
+            the mean processing time (sum of the activity durations) per case, the makespan (first start to
+            last end), the completed cases per day and the fraction of the makespan the resources were busy.
+            The durations are None for an empty log.
+    """
+    if log.empty:
+        return {**dict.fromkeys(SUMMARY_METRICS), "num_cases": 0, "num_events": 0}
+
+    cycle_times = get_cycle_times(log).dt.total_seconds()
+    durations = (log["end_timestamp"] - log["start_timestamp"]).dt.total_seconds()
+    makespan = (log["end_timestamp"].max() - log["start_timestamp"].min()).total_seconds()
+    num_resources = log["resource"].nunique()
+
+    return {
+        "num_cases": int(len(cycle_times)),
+        "num_events": int(len(log)),
+        "cycle_time_mean": float(cycle_times.mean()),
+        "cycle_time_median": float(cycle_times.median()),
+        "cycle_time_p90": float(cycle_times.quantile(0.9)),
+        "processing_time_mean": float(durations.groupby(log["case_id"]).sum().mean()),
+        "makespan": float(makespan),
+        "throughput_per_day": float(len(cycle_times) / makespan * _SECONDS_PER_DAY) if makespan > 0 else None,
+        "resource_utilization": (
+            float(durations.sum() / (makespan * num_resources)) if makespan > 0 and num_resources else None
+        ),
+    }
+
+
+def read_simulated_log(path: str) -> pd.DataFrame:
+    """
+    Reads a simulated log (simulated_log_<i>.csv) with its timestamps as datetimes.
+    """
+    log = pd.read_csv(path)
+    for column in ("start_timestamp", "end_timestamp"):
+        log[column] = pd.to_datetime(log[column], utc=True, format="ISO8601")
+    return log
+
+
+def summarize_replications(summaries: List[dict]) -> dict:
+    """
+    Returns the mean, standard deviation, minimum and maximum of every metric over the summaries of the
+    replications of a variant (see summarize_log), replications without a value of the metric are left out.
+    """
+    return {metric: _describe([summary.get(metric) for summary in summaries]) for metric in SUMMARY_METRICS}
+
+
+def compare_replications(summaries: List[dict], reference_summaries: List[dict]) -> dict:
+    """
+    Returns the mean and standard deviation of the difference of every metric between the replications of a variant
+    and the replications with the same seeds of a reference variant (common seeds, see get_replication_seeds).
+
+    Args:
+        summaries (list): Summaries of the replications of the variant.
+        reference_summaries (list): Summaries of the replications of the reference variant, in the same order.
+
+    Returns:
+        dict: Per metric {"mean", "std", "min", "max"} of the paired differences (variant - reference).
+    """
+    return {
+        metric: _describe(
+            [
+                summary[metric] - reference[metric]
+                for summary, reference in zip(summaries, reference_summaries)
+                if summary.get(metric) is not None and reference.get(metric) is not None
+            ]
+        )
+        for metric in SUMMARY_METRICS
+    }
+
+
+def _describe(values):
+    values = np.array([value for value in values if value is not None], dtype=float)
+    if len(values) == 0:
+        return {"mean": None, "std": None, "min": None, "max": None}
+    return {
+        "mean": float(values.mean()),
+        "std": float(values.std(ddof=1)) if len(values) > 1 else 0.0,
+        "min": float(values.min()),
+        "max": float(values.max()),
+    }
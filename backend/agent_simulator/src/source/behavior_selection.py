@@ -0,0 +1,278 @@
+import math
+import multiprocessing
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from scipy.stats import wasserstein_distance
+from source.discovery_stages import default_max_workers
+from source.discovery_stages import read_shared_log
+from source.discovery_stages import write_shared_log
+from source.simulation import BusinessProcessModel
+from source.simulation import Case
+
+"""
+Selection of the agent behavior type (central orchestration or autonomous handovers) and of the
+extraneous delays, used when discovery should determine these automatically.
+
+Every combination is a candidate that simulates the validation log, the candidate whose cycle time
+distribution is closest to the one of the validation log is selected. Candidates are simulated in
+parallel, one process per candidate. In racing mode the candidates are simulated in increments of
+completed cases, and candidates that are clearly worse than the best one are stopped early.
+"""
+
+# Bins of the cycle time distributions that are compared
+CYCLE_TIME_BIN_SIZE = pd.Timedelta(hours=1)
+# Distance (in bins) the racing margin is at least relative to, so a best partial distance of (almost) 0
+# does not stop every other candidate after a single lucky increment
+RACING_MIN_DISTANCE = 2.0
+
+
+@dataclass
+class BehaviorCandidate:
+    """
+    One combination of agent behavior type and extraneous delays.
+
+    Attributes:
+        name                    Name used when reporting the distance of the candidate.
+        central_orchestration   True for central orchestration, False for autonomous handovers.
+        extraneous_delays       True if the discovered extraneous delays (timers) are used.
+    """
+
+    name: str
+    central_orchestration: bool
+    extraneous_delays: bool
+
+
+# In order of preference, the first candidate wins when distances are equal
+CANDIDATES = [
+    BehaviorCandidate("extr + central", central_orchestration=True, extraneous_delays=True),
+    BehaviorCandidate("without extr + central", central_orchestration=True, extraneous_delays=False),
+    BehaviorCandidate("extr + autonomous", central_orchestration=False, extraneous_delays=True),
+    BehaviorCandidate("without extr + autonomous", central_orchestration=False, extraneous_delays=False),
+]
+
+
+def select_behavior_candidate(
+    simulation_parameters,
+    df_train,
+    df_val,
+    case_arrival_times_val,
+    timers_extr,
+    timers,
+    max_workers: Optional[int] = None,
+    racing: bool = False,
+    racing_increment: float = 0.1,
+    racing_margin: float = 0.5,
+    racing_warmup: float = 0.3,
+):
+    """
+    Simulates the validation log with every candidate and returns the candidate closest to the validation log.
+
+    Args:
+        simulation_parameters (dict): Discovered simulation parameters, these are not modified.
+        df_train (DataFrame): Preprocessed training log.
+        df_val (DataFrame): Preprocessed validation log.
+        case_arrival_times_val (list): Sampled arrival times for the simulation of the validation log.
+        timers_extr (dict): Discovered extraneous delays.
+        timers (dict): Timers used when extraneous delays are not used.
+        max_workers (int): One process per candidate is used if at least as many workers are allowed,
+            otherwise the candidates are simulated in the current process. Defaults to the number of CPUs.
+        racing (bool): Simulate in increments and stop candidates that are clearly worse than the best one.
+        racing_increment (float): Fraction of the validation cases simulated per increment.
+        racing_margin (float): A candidate is stopped when its distance is more than racing_margin times
+            the distance of the best candidate (but at least times RACING_MIN_DISTANCE) above that distance.
+        racing_warmup (float): Fraction of the validation cases simulated before candidates are stopped,
+            distances over only a few cases are too noisy to compare.
+
+    Returns:
+        tuple: The selected BehaviorCandidate and a dict with the last distance of every candidate.
+    """
+    # Statistics of the validation log are computed once and shared by all candidates
+    val_cycle_times = get_cycle_times(df_val)
+
+    increment = None
+    warmup_rounds = 0
+    if racing:
+        increment = max(1, math.ceil(len(val_cycle_times) * racing_increment))
+        warmup_rounds = math.ceil(racing_warmup / racing_increment)
+
+    candidate_parameters = [
+        _get_candidate_parameters(simulation_parameters, candidate, case_arrival_times_val, timers_extr, timers)
+        for candidate in CANDIDATES
+    ]
+
+    if max_workers is None:
+        max_workers = default_max_workers(len(df_train))
+
+    if max_workers >= len(CANDIDATES):
+        with tempfile.TemporaryDirectory() as shared_dir:
+            train_path = write_shared_log(df_train, os.path.join(shared_dir, "train.arrow"))
+            simulations = [_ProcessSimulation(train_path, params, increment) for params in candidate_parameters]
+            return _race(simulations, val_cycle_times, racing_margin, warmup_rounds)
+
+    simulations = [_LocalSimulation(df_train, params, increment) for params in candidate_parameters]
+    return _race(simulations, val_cycle_times, racing_margin, warmup_rounds)
+
+
+def get_cycle_times(log: pd.DataFrame) -> pd.Series:
+    """
+    Returns the cycle time (end of the last event - start of the first event) of every case in the log.
+    """
+    cases = log.groupby("case_id").agg(start=("start_timestamp", "min"), end=("end_timestamp", "max"))
+    return cases["end"] - cases["start"]
+
+
+def cycle_time_distribution_distance(original_cycle_times, simulated_cycle_times, bin_size=CYCLE_TIME_BIN_SIZE):
+    """
+    Wasserstein distance between two cycle time distributions discretized to bins of [bin_size],
+    computed like log_distance_measures.cycle_time_distribution_distance but from precomputed cycle times.
+    """
+    min_duration = min(original_cycle_times.min(), simulated_cycle_times.min())
+    original_discrete_ct = np.floor((original_cycle_times - min_duration) / bin_size)
+    simulated_discrete_ct = np.floor((simulated_cycle_times - min_duration) / bin_size)
+    return wasserstein_distance(original_discrete_ct, simulated_discrete_ct)
+
+
+def _get_candidate_parameters(simulation_parameters, candidate, case_arrival_times_val, timers_extr, timers):
+    # create a copy of the simulation parameters such that we can modify it without changing the original one
+    params = simulation_parameters.copy()
+    params["timers"] = timers_extr if candidate.extraneous_delays else timers
+    params["central_orchestration"] = candidate.central_orchestration
+    if candidate.central_orchestration:
+        params["transition_probabilities"] = params["transition_probabilities_global"]
+        params["agent_transition_probabilities"] = None
+    else:
+        params["transition_probabilities"] = params["transition_probabilities_autonomous"]
+        params["agent_transition_probabilities"] = params["agent_transition_probabilities_autonomous"]
+    # simulate the validation log, the first arrival starts the simulation
+    params["start_timestamp"] = case_arrival_times_val[0]
+    params["case_arrival_times"] = case_arrival_times_val[1:]
+    return params
+
+
+def _simulate_cycle_times(df_train, simulation_parameters, increment=None):
+    """
+    Generator simulating the validation log, yields the cycle times of the cases completed so far
+    (and if the simulation is finished) every [increment] completed cases, and the cycle times of
+    all simulated cases at the end.
+    """
+    business_process_model = BusinessProcessModel(df_train, simulation_parameters)
+    cases = [Case(case_id=0, start_timestamp=simulation_parameters["start_timestamp"])]
+    next_report = increment
+    while business_process_model.sampled_case_starting_times:  # while cases list is not empty
+        business_process_model.step(cases)
+        if increment is not None and len(business_process_model.past_cases) >= next_report:
+            yield _get_completed_cycle_times(business_process_model), False
+            next_report += increment
+    yield get_cycle_times(pd.DataFrame(business_process_model.simulated_events)), True
+
+
+def _get_completed_cycle_times(business_process_model):
+    simulated_log = pd.DataFrame(business_process_model.simulated_events)
+    completed_case_ids = [case.case_id for case in business_process_model.past_cases]
+    return get_cycle_times(simulated_log[simulated_log["case_id"].isin(completed_case_ids)])
+
+
+def _race(simulations, val_cycle_times, racing_margin, warmup_rounds):
+    distances = {}
+    remaining = list(range(len(simulations)))  # candidates that are not (yet) clearly worse
+    running = list(remaining)
+    rounds = 0
+    try:
+        while running:
+            # Let every running candidate simulate its next increment (concurrently for processes)
+            for i in running:
+                simulations[i].request_next()
+            for i in list(running):
+                cycle_times, is_finished = simulations[i].receive_next()
+                distances[CANDIDATES[i].name] = cycle_time_distribution_distance(val_cycle_times, cycle_times)
+                if is_finished:
+                    running.remove(i)
+            rounds += 1
+            if rounds < warmup_rounds:
+                continue
+            # Stop the candidates that are clearly worse than the best one
+            best_distance = min(distances[CANDIDATES[i].name] for i in remaining)
+            max_distance = best_distance + racing_margin * max(best_distance, RACING_MIN_DISTANCE)
+            remaining = [i for i in remaining if distances[CANDIDATES[i].name] <= max_distance]
+            running = [i for i in running if i in remaining]
+    finally:
+        for simulation in simulations:
+            simulation.stop()
+
+    # The distance of a stopped candidate is the one of the cases it completed before it was stopped
+    best_candidate = min((CANDIDATES[i] for i in remaining), key=lambda candidate: distances[candidate.name])
+    return best_candidate, distances
+
+
+class _LocalSimulation:
+    """
+    Candidate simulated in the current process.
+    """
+
+    def __init__(self, df_train, simulation_parameters, increment):
+        self._increments = _simulate_cycle_times(df_train, simulation_parameters, increment)
+
+    def request_next(self):
+        pass
+
+    def receive_next(self):
+        return next(self._increments)
+
+    def stop(self):
+        self._increments.close()
+
+
+class _ProcessSimulation:
+    """
+    Candidate simulated in its own (spawned) process, see _candidate_worker.
+    """
+
+    def __init__(self, train_path, simulation_parameters, increment):
+        context = multiprocessing.get_context("spawn")
+        self._connection, child_connection = context.Pipe()
+        self._process = context.Process(
+            target=_candidate_worker, args=(child_connection, train_path, simulation_parameters, increment)
+        )
+        self._process.start()
+        child_connection.close()
+
+    def request_next(self):
+        self._connection.send("next")
+
+    def receive_next(self):
+        result = self._connection.recv()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def stop(self):
+        if self._process.is_alive():
+            try:
+                self._connection.send("stop")
+            except OSError:
+                pass
+            self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._connection.close()
+
+
+def _candidate_worker(connection, train_path, simulation_parameters, increment):
+    """
+    Entry point of a candidate process, simulates the next increment every time it is requested.
+    """
+    try:
+        df_train = read_shared_log(train_path)
+        increments = _simulate_cycle_times(df_train, simulation_parameters, increment)
+        while connection.recv() == "next":
+            connection.send(next(increments))
+    except Exception as e:
+        connection.send(e)
+    finally:
+        connection.close()
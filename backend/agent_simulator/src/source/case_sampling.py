@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import wasserstein_distance
+
+"""
+Case sampling for the approximate discovery of very large logs.
+
+A stratified sample of the cases is discovered instead of the whole log, the accuracy of the
+discovered model is estimated from the sample sizes and from a held-out sample of the other cases.
+"""
+
+# z value of the reported confidence intervals (95%)
+CONFIDENCE_Z = 1.96
+
+
+def get_sample_fraction(df, sample_fraction=None, sample_max_events=None):
+    """
+    Returns the fraction of the cases to sample, the smallest of [sample_fraction] and the fraction
+    that keeps the sample within [sample_max_events] events (None if the whole log should be used).
+    """
+    fractions = [1.0]
+    if sample_fraction is not None:
+        if not 0 < sample_fraction <= 1:
+            raise ValueError(f"sample_fraction must be in (0, 1], got {sample_fraction}")
+        fractions.append(sample_fraction)
+    if sample_max_events is not None:
+        if sample_max_events <= 0:
+            raise ValueError(f"sample_max_events must be a positive integer, got {sample_max_events}")
+        fractions.append(sample_max_events / len(df))
+
+    fraction = min(fractions)
+    return fraction if fraction < 1 else None
+
+
+def sample_cases(df, fraction, random_state=0):
+    """
+    Samples [fraction] of the cases of the log, stratified by variant (activity sequence) and start date.
+
+    The cases are ordered by variant and start timestamp and every (1 / fraction)-th case is sampled
+    (systematic sampling from a random offset), so every variant keeps its share of the cases
+    and the sampled cases of a variant are spread over the period of the log.
+
+    Args:
+        df (DataFrame): Event log with the columns case_id, activity_name and start_timestamp.
+        fraction (float): Fraction of the cases to sample.
+        random_state (int): Seed of the sampling.
+
+    Returns:
+        tuple: The events of the sampled cases and the events of the other (held-out) cases.
+    """
+    rng = np.random.default_rng(random_state)
+    start_timestamps = pd.to_datetime(df["start_timestamp"], utc=True, format="mixed")
+    ordered = df.assign(start_timestamp=start_timestamps).sort_values(by=["case_id", "start_timestamp"], kind="stable")
+    cases = ordered.groupby("case_id", sort=False).agg(
+        variant=("activity_name", tuple), start_timestamp=("start_timestamp", "min")
+    )
+    cases["variant"] = pd.factorize(cases["variant"])[0]
+    cases = cases.sort_values(by=["variant", "start_timestamp"], kind="stable")
+
+    num_sampled = max(int(round(len(cases) * fraction)), 1)
+    step = len(cases) / num_sampled
+    positions = (rng.random() * step + step * np.arange(num_sampled)).astype(int)
+    sampled_case_ids = cases.index[positions]
+
+    is_sampled = df["case_id"].isin(sampled_case_ids)
+    return df[is_sampled].copy(), df[~is_sampled].copy()
+
+
+def get_case_start_log(df):
+    """
+    Returns the start event of every case, the arrivals of the whole log are discovered from these.
+    """
+    case_starts = df[["case_id", "start_timestamp"]].copy()
+    case_starts["start_timestamp"] = pd.to_datetime(case_starts["start_timestamp"], utc=True, format="mixed")
+    return case_starts.groupby("case_id", as_index=False)["start_timestamp"].min()
+
+
+def estimate_sampling_accuracy(df_sample, df_held_out, statistics, central_orchestration, fraction):
+    """
+    Estimates the error of the parameters discovered from a sample of the cases.
+
+    Args:
+        df_sample (DataFrame): Preprocessed sampled log the parameters were discovered from.
+        df_held_out (DataFrame): Events of (a sample of) the cases that were not sampled.
+        statistics (DiscoveryStatistics): Statistics of the sampled log.
+        central_orchestration (bool): If the model uses the global transition probabilities.
+        fraction (float): Fraction of the cases that was sampled.
+
+    Returns:
+        dict: The sample sizes, the count weighted mean and the maximum half-width of the 95% confidence
+            intervals of the transition probabilities, and per activity the Wasserstein distance between
+            the durations in the sample and in the held-out cases (relative to the held-out mean duration).
+    """
+    sampled_events = df_sample[df_sample["activity_name"] != "zzz_end"]
+    sampled_cases = sampled_events["case_id"].nunique()
+    held_out_cases = df_held_out["case_id"].nunique()
+    name = "transition_probabilities_global" if central_orchestration else "transition_probabilities_autonomous"
+
+    return {
+        "sample_fraction": fraction,
+        "sampled_cases": int(sampled_cases),
+        "total_cases": int(sampled_cases + held_out_cases),
+        "sampled_events": int(len(sampled_events)),
+        "total_events": int(len(sampled_events) + len(df_held_out)),
+        "transition_probability_ci": _transition_probability_confidence(
+            statistics.transition_counts.get(name, {}), fraction
+        ),
+        "activity_duration_distance": _activity_duration_distances(sampled_events, df_held_out),
+    }
+
+
+def _transition_probability_confidence(transition_counts, fraction):
+    # every prefix (and agent) is a multinomial sample of the next activities,
+    # the intervals are narrowed by the finite population correction of the sampled fraction
+    finite_population_correction = np.sqrt(1 - fraction)
+    half_widths, weights = [], []
+    stack = [transition_counts]
+    while stack:
+        counts = stack.pop()
+        if any(isinstance(value, dict) for value in counts.values()):
+            stack.extend(counts.values())
+            continue
+        total = sum(counts.values())
+        for count in counts.values():
+            probability = count / total
+            half_widths.append(
+                CONFIDENCE_Z * np.sqrt(probability * (1 - probability) / total) * finite_population_correction
+            )
+            weights.append(count)
+
+    if not half_widths:
+        return {"mean": None, "max": None}
+    return {"mean": float(np.average(half_widths, weights=weights)), "max": float(np.max(half_widths))}
+
+
+def _activity_duration_distances(df_sample, df_held_out):
+    def durations(df):
+        end_timestamps = pd.to_datetime(df["end_timestamp"], utc=True, format="mixed")
+        start_timestamps = pd.to_datetime(df["start_timestamp"], utc=True, format="mixed")
+        return (end_timestamps - start_timestamps).dt.total_seconds().groupby(df["activity_name"])
+
+    held_out_durations = dict(list(durations(df_held_out)))
+    distances = {}
+    for activity, sampled_durations in durations(df_sample):
+        if activity not in held_out_durations:
+            continue
+        held_out = held_out_durations[activity]
+        distance = wasserstein_distance(sampled_durations, held_out)
+        distances[activity] = float(distance / held_out.mean()) if held_out.mean() > 0 else float(distance)
+    return distances
@@ -2,18 +2,28 @@
 import pandas as pd
 from source.activity_transition import compute_activity_transition_dict
 from source.activity_transition import compute_activity_transition_dict_global
+from source.activity_transition import count_activity_transitions
+from source.activity_transition import count_activity_transitions_global
+from source.activity_transition import get_start_activity_distribution
+from source.activity_transition import transition_probabilities_from_counts
+from source.activity_transition import transition_probabilities_from_counts_global
 from source.agent_types.discover_resource_calendar import discover_calendar_per_agent
 from source.agent_types.discover_roles import discover_roles_and_calendars
 from source.arrival_distribution import get_best_fitting_distribution
 from source.arrival_times import get_case_arrival_times
+from source.behavior_selection import select_behavior_candidate
+from source.discovery_stages import DiscoveryStage
+from source.discovery_stages import run_discovery_stages
+from source.discovery_statistics import DiscoveryStatistics
 from source.extraneous_delays.config import Configuration as ExtraneousActivityDelaysConfiguration
 from source.extraneous_delays.config import TimerPlacement
 from source.extraneous_delays.delay_discoverer import compute_complex_extraneous_activity_delays
 from source.extraneous_delays.delay_discoverer import compute_naive_extraneous_activity_delays
 from source.extraneous_delays.event_log import EventLogIDs
 from source.interaction_probabilities import calculate_agent_handover_probabilities_per_activity
-from source.simulation import BusinessProcessModel
-from source.simulation import Case
+from source.interaction_probabilities import count_agent_handovers_per_activity
+from source.interaction_probabilities import handover_probabilities_from_counts
+from source.runtime_meter import RuntimeMeter
 from source.utils import store_preprocessed_data
 
 
@@ -30,63 +40,135 @@ def discover_simulation_parameters(
     start_time=None,
     activity_filter=None,
     new_activity_duration=None,
+    max_workers=None,
+    racing=False,
+    df_arrivals=None,
+    cache=None,
+    meter=None,
 ):
     """
     Discover the simulation model from the training data.
+
+    Independent discovery stages run concurrently in up to [max_workers] processes
+    (defaults to the number of CPUs, 1 runs everything sequentially).
+    With [racing], the automatic selection of the agent behavior type stops clearly worse candidates early.
+    The case arrivals are discovered from the case starts in [df_arrivals] if given (e.g. of the whole log
+    when the training log is a sample of its cases), otherwise from the training log.
+    Stage results are reused from the [cache] (see source/discovery_cache.py) if their inputs did not change.
+    The wall time and peak memory of the discovery steps are recorded in the [meter] (see source/runtime_meter.py).
+
+    Returns the preprocessed training log, the simulation parameters and the statistics they were computed from
+    (see source/discovery_statistics.py), which are used to fold new cases into the model later on.
     """
 
-    df_train, agent_to_resource = preprocess(df_train)
-    if df_test is not None:
-        df_test, _ = preprocess(df_test)
-    df_val, _ = preprocess(df_val)
+    meter = meter if meter is not None else RuntimeMeter()
+    meter.count("events_processed", len(df_train))
+
+    with meter.stage("preprocess"):
+        df_train, agent_to_resource = preprocess(df_train)
+        if df_test is not None:
+            df_test, _ = preprocess(df_test)
+        df_val, _ = preprocess(df_val)
+    logs = {"train": df_train, "val": df_val}
+    if df_arrivals is not None:
+        logs["arrivals"] = df_arrivals
+    arrivals_log = "arrivals" if df_arrivals is not None else "train"
     if start_time is None:
         if df_test is not None:
             start_time = min(df_test.groupby("case_id")["start_timestamp"].min().to_list())
         else:
-            start_time = min(df_train.groupby("case_id")["start_timestamp"].min().to_list())
+            start_time = min(logs[arrivals_log].groupby("case_id")["start_timestamp"].min().to_list())
     start_time = start_time
     start_time_val = min(df_val.groupby("case_id")["start_timestamp"].min().to_list())
 
-    df_train_without_end_activity = store_preprocessed_data(df_train, df_test, df_val, data_dir)
-
-    activities_without_waiting_time = activities_with_zero_waiting_time(df_train)
-
-    # extract roles and calendars
-    roles = discover_roles_and_calendars(df_train_without_end_activity)
-    # first_role = next(iter(roles.items()))
+    with meter.stage("store_preprocessed_data"):
+        df_train_without_end_activity = store_preprocessed_data(df_train, df_test, df_val, data_dir)
+
+    # Stages that only depend on the preprocessed logs (or on each other) are run concurrently
+    stages = [
+        DiscoveryStage("waiting_time_counts", count_zero_waiting_times, ("train",)),
+        # extract roles and calendars
+        DiscoveryStage("roles", discover_roles_and_calendars, ("train_without_end",)),
+        DiscoveryStage("res_calendars", _discover_agent_calendars, ("train_without_end",)),
+        DiscoveryStage(
+            "activity_duration_samples",
+            _compute_activity_duration_distribution,
+            ("train", "res_calendars", "roles"),
+        ),
+        DiscoveryStage("activity_durations_dict", fit_activity_durations, ("activity_duration_samples",)),
+        DiscoveryStage("prerequisites", get_prerequisites_per_activity, ("train",)),
+        # sample arrival times for training and validation data
+        DiscoveryStage(
+            "case_arrival_times",
+            _discover_case_arrival_times,
+            (arrivals_log, "val"),
+            {
+                "start_time": start_time,
+                "start_time_val": start_time_val,
+                "num_cases_to_simulate": num_cases_to_simulate,
+                "num_cases_to_simulate_val": num_cases_to_simulate_val,
+            },
+        ),
+    ]
+    # Only the transition probabilities and timers of the requested behavior type / delays are discovered,
+    # the other sets are discovered when they are needed (see materialize_parameter_sets)
+    required_parameter_sets = get_required_parameter_sets(
+        determine_automatically, central_orchestration, discover_extr_delays
+    )
+    # the transition probabilities are normalized from their counts, which are kept in the statistics
+    stages += [
+        DiscoveryStage(f"{name}_counts", count_transitions, ("train",))
+        for name, (count_transitions, _) in TRANSITION_COUNT_FUNCTIONS.items()
+        if name in required_parameter_sets
+    ]
+    if "timers_extr" in required_parameter_sets:
+        stages.append(DiscoveryStage("timers_extr", PARAMETER_SET_FUNCTIONS["timers_extr"], ("train",)))
+    with meter.stage("stages"):
+        results = run_discovery_stages(
+            stages,
+            logs={**logs, "train_without_end": df_train_without_end_activity},
+            max_workers=max_workers,
+            cache=cache,
+            meter=meter,
+        )
 
-    res_calendars, _, _, _, _ = discover_calendar_per_agent(df_train_without_end_activity)
+    transition_counts = {
+        name: results[f"{name}_counts"] for name in TRANSITION_COUNT_FUNCTIONS if f"{name}_counts" in results
+    }
+    prerequisites, parallel_activities = results["prerequisites"]
+    statistics = DiscoveryStatistics(
+        activity_durations=results["activity_duration_samples"],
+        transition_counts=transition_counts,
+        waiting_time_counts=results["waiting_time_counts"],
+        max_activity_count_per_case=get_max_activity_count_per_case(df_train),
+        agent_activities=get_agent_activity_mapping(df_train),
+        preceding_activities=prerequisites,
+        case_start_times=df_train.groupby("case_id")["start_timestamp"].min(),
+    )
 
-    activity_durations_dict = compute_activity_duration_distribution_per_agent(df_train, res_calendars, roles)
+    activities_without_waiting_time = select_activities_without_waiting_time(statistics.waiting_time_counts)
+    roles = results["roles"]
+    res_calendars = results["res_calendars"]
+    activity_durations_dict = results["activity_durations_dict"]
+    meter.count(
+        "activity_duration_fits",
+        sum(
+            len(durations) > 0
+            for activities in statistics.activity_durations.values()
+            for durations in activities.values()
+        ),
+    )
+    transition_probabilities = {
+        name: TRANSITION_COUNT_FUNCTIONS[name][1](counts) for name, counts in transition_counts.items()
+    }
 
     # define mapping of agents to activities based on event log
-    agent_activity_mapping = df_train.groupby("agent")["activity_name"].unique().apply(list).to_dict()
-
-    transition_probabilities_autonomous = compute_activity_transition_dict(df_train)
-    agent_transition_probabilities_autonomous = calculate_agent_handover_probabilities_per_activity(df_train)
-    agent_transition_probabilities = None
-    transition_probabilities = compute_activity_transition_dict_global(df_train)
-
-    prerequisites, parallel_activities = get_prerequisites_per_activity(df_train)
+    agent_activity_mapping = _copy_lists(statistics.agent_activities)
 
     # get maximum activity frequency per case
-    activity_counts = df_train.groupby(["case_id", "activity_name"]).size().reset_index(name="count")
-    max_activity_count_per_case = activity_counts.groupby("activity_name")["count"].max().to_dict()
+    max_activity_count_per_case = dict(statistics.max_activity_count_per_case)
 
-    # sample arrival times for training and validation data
-    case_arrival_times, train_params = get_case_arrival_times(
-        df_train,
-        start_timestamp=start_time,
-        num_cases_to_simulate=num_cases_to_simulate,
-        train=True,
-    )
-    case_arrival_times_val, _ = get_case_arrival_times(
-        df_val,
-        start_timestamp=start_time_val,
-        num_cases_to_simulate=num_cases_to_simulate_val,
-        train=False,
-        train_params=train_params,
-    )
+    case_arrival_times, case_arrival_times_val = results["case_arrival_times"]
 
     simulation_parameters = {
         "activity_durations_dict": activity_durations_dict,
@@ -94,16 +176,22 @@ def discover_simulation_parameters(
         "roles": roles,
         "res_calendars": res_calendars,
         "agent_activity_mapping": agent_activity_mapping,
-        "transition_probabilities_autonomous": transition_probabilities_autonomous,
-        "agent_transition_probabilities_autonomous": agent_transition_probabilities_autonomous,
-        "agent_transition_probabilities": agent_transition_probabilities,
-        "transition_probabilities": transition_probabilities,
+        "transition_probabilities_global": transition_probabilities.get("transition_probabilities_global"),
+        "transition_probabilities_autonomous": transition_probabilities.get("transition_probabilities_autonomous"),
+        "agent_transition_probabilities_autonomous": transition_probabilities.get(
+            "agent_transition_probabilities_autonomous"
+        ),
+        "timers_extr": results.get("timers_extr"),
+        # set by apply_behavior_mode
+        "agent_transition_probabilities": None,
+        "transition_probabilities": None,
         "max_activity_count_per_case": max_activity_count_per_case,
+        "start_activities": get_start_activity_distribution(df_train),
         "case_arrival_times": case_arrival_times,
         "case_arrival_times_val": case_arrival_times_val,
         "agent_to_resource": agent_to_resource,
         "determine_automatically": determine_automatically,
-        "prerequisites": prerequisites,
+        "prerequisites": _copy_lists(prerequisites),
         # Below are custom parameters added by us
         "activity_filter": activity_filter,
         "new_activity_duration": new_activity_duration,
@@ -114,35 +202,224 @@ def discover_simulation_parameters(
         "distribution_type": None,  # Should be 'mean' or 'normal'
     }
 
-    simulation_parameters = determine_agent_behavior_type_and_extraneous_delays(
+    with meter.stage("behavior_selection"):
+        simulation_parameters = determine_agent_behavior_type_and_extraneous_delays(
+            simulation_parameters,
+            df_train,
+            df_val,
+            case_arrival_times_val,
+            central_orchestration,
+            discover_extr_delays,
+            max_workers=max_workers,
+            racing=racing,
+            meter=meter,
+        )
+    simulation_parameters["start_timestamp"] = start_time
+
+    return df_train, simulation_parameters, statistics
+
+
+def update_simulation_parameters(df_train, simulation_parameters, statistics, df_new, num_cases_to_simulate):
+    """
+    Folds the cases of a new log into a discovered model instead of rediscovering it from the combined log.
+
+    The statistics of the new cases are merged into the statistics of the model and only the parameters
+    whose statistics changed are recomputed: the duration distributions are refitted for the agent-activity
+    pairs with new durations (or all pairs of agents whose calendar changed), the transition probabilities
+    are normalized from the merged counts and the arrival distribution is refitted on the merged case starts.
+    Roles and calendars are discovered from the combined log, the extraneous delays are discovered again
+    when they are used by the model. Changes made to the parameters after the discovery (e.g. with
+    update-parameters, see parameter_change_set.py) are overwritten by the recomputed parameters, they have
+    to be applied again to the updated model.
+
+    Args:
+        df_train (DataFrame): Preprocessed training log the model was discovered from.
+        simulation_parameters (dict): Discovered simulation parameters, modified in place.
+        statistics (DiscoveryStatistics): Statistics of the training log, None if they were not kept
+            (then they are computed from the training log).
+        df_new (DataFrame): Log with the new cases (not preprocessed).
+        num_cases_to_simulate (int): Number of cases to sample arrival times for.
+
+    Returns:
+        tuple: The combined preprocessed log, the updated simulation parameters and the merged statistics.
+    """
+    if len(simulation_parameters["duplicated_agents"]) > 0:
+        raise ValueError("New cases can not be folded into a model with duplicated agents")
+    if len(df_new) == 0:
+        raise ValueError("The log with the new cases is empty")
+
+    df_new, agent_to_resource = preprocess(df_new, simulation_parameters["agent_to_resource"])
+    known_case_ids = set(df_new["case_id"]) & set(df_train["case_id"])
+    if len(known_case_ids) > 0:
+        raise ValueError(f"Cases are already part of the model: {sorted(known_case_ids)}")
+
+    old_roles, old_res_calendars = simulation_parameters["roles"], simulation_parameters["res_calendars"]
+    if statistics is None:
+        activity_durations = _compute_activity_duration_distribution(df_train, old_res_calendars, old_roles)
+        statistics = discover_statistics(df_train, activity_durations, transition_set_names=[])
+
+    df_train = pd.concat([df_train, df_new], ignore_index=True)
+    df_train.sort_values(by=["case_id", "start_timestamp"], kind="stable", inplace=True)
+    df_train.reset_index(drop=True, inplace=True)
+
+    df_train_without_end_activity = df_train[df_train["activity_name"] != "zzz_end"]
+    roles = discover_roles_and_calendars(df_train_without_end_activity.copy())
+    res_calendars = _discover_agent_calendars(df_train_without_end_activity.copy())
+
+    # the durations of agents whose calendar changed are computed again from the combined log
+    recalendared_agents = [
+        agent
+        for agent in agent_to_resource
+        if _get_agent_calendar(agent, res_calendars, roles) != _get_agent_calendar(agent, old_res_calendars, old_roles)
+    ]
+    new_statistics = discover_statistics(
+        df_new,
+        _compute_activity_duration_distribution(
+            df_new[~df_new["agent"].isin(recalendared_agents)], res_calendars, roles
+        ),
+        transition_set_names=statistics.transition_counts,
+    )
+    statistics = statistics.merge(new_statistics)
+    recomputed_durations = _compute_activity_duration_distribution(
+        df_train[df_train["agent"].isin(recalendared_agents)], res_calendars, roles
+    )
+    statistics.replace_durations(recomputed_durations)
+
+    changed_pairs = {
+        (agent, activity)
+        for durations_per_agent in (new_statistics.activity_durations, recomputed_durations)
+        for agent, activities in durations_per_agent.items()
+        for activity, durations in activities.items()
+        if agent in recomputed_durations or len(durations) > 0
+    }
+    refitted = fit_activity_durations(
+        {
+            agent: {
+                activity: durations for activity, durations in activities.items() if (agent, activity) in changed_pairs
+            }
+            for agent, activities in statistics.activity_durations.items()
+        }
+    )
+    activities = {activity for activities in statistics.activity_durations.values() for activity in activities}
+    old_activity_durations = simulation_parameters["activity_durations_dict"]
+    activity_durations_dict = {
+        agent: {
+            activity: (
+                refitted[agent][activity]
+                if (agent, activity) in changed_pairs
+                else old_activity_durations.get(agent, {}).get(activity, [])
+            )
+            for activity in activities
+        }
+        for agent in statistics.activity_durations
+    }
+
+    # only the transition probabilities that were discovered are updated, the others are discovered when needed
+    for name, (count_transitions, normalize_counts) in TRANSITION_COUNT_FUNCTIONS.items():
+        if simulation_parameters.get(name) is None:
+            continue
+        if name not in statistics.transition_counts:
+            statistics.transition_counts[name] = count_transitions(df_train.copy())
+        simulation_parameters[name] = normalize_counts(statistics.transition_counts[name])
+
+    case_start_times = statistics.case_start_times.rename("start_timestamp").rename_axis("case_id").reset_index()
+    simulation_parameters["case_arrival_times"], _ = get_case_arrival_times(
+        case_start_times,
+        start_timestamp=simulation_parameters["start_timestamp"],
+        num_cases_to_simulate=num_cases_to_simulate,
+        train=True,
+        user_input=simulation_parameters.get("distribution_type"),
+    )
+
+    simulation_parameters.update(
+        {
+            "activity_durations_dict": activity_durations_dict,
+            "activities_without_waiting_time": select_activities_without_waiting_time(statistics.waiting_time_counts),
+            "roles": roles,
+            "res_calendars": res_calendars,
+            "agent_activity_mapping": _copy_lists(statistics.agent_activities),
+            "max_activity_count_per_case": dict(statistics.max_activity_count_per_case),
+            "start_activities": get_start_activity_distribution(df_train),
+            "prerequisites": _copy_lists(statistics.preceding_activities),
+            "agent_to_resource": agent_to_resource,
+            # the extraneous delays depend on the whole log
+            "timers_extr": None,
+        }
+    )
+    apply_behavior_mode(
         simulation_parameters,
         df_train,
-        df_val,
-        case_arrival_times_val,
-        central_orchestration,
-        discover_extr_delays,
+        simulation_parameters["central_orchestration"],
+        simulation_parameters["discover_extr_delays"],
     )
-    simulation_parameters["start_timestamp"] = start_time
 
-    return df_train, simulation_parameters
+    return df_train, simulation_parameters, statistics
 
 
-def preprocess(df):
+def discover_statistics(df, activity_durations, transition_set_names):
+    """
+    Computes the statistics of a preprocessed log (see source/discovery_statistics.py).
+
+    Args:
+        df (DataFrame): Preprocessed log.
+        activity_durations (dict): Durations per agent and activity, see _compute_activity_duration_distribution.
+        transition_set_names (iterable): Names of the transition parameter sets to count the transitions of,
+            see TRANSITION_COUNT_FUNCTIONS.
+    """
+    return DiscoveryStatistics(
+        activity_durations=activity_durations,
+        transition_counts={name: TRANSITION_COUNT_FUNCTIONS[name][0](df.copy()) for name in transition_set_names},
+        waiting_time_counts=count_zero_waiting_times(df),
+        max_activity_count_per_case=get_max_activity_count_per_case(df),
+        agent_activities=get_agent_activity_mapping(df),
+        preceding_activities=generate_preceding_activities_dict(df),
+        case_start_times=df.groupby("case_id")["start_timestamp"].min(),
+    )
+
+
+def _copy_lists(dict_of_lists):
+    return {key: list(values) for key, values in dict_of_lists.items()}
+
+
+def _discover_agent_calendars(df_train_without_end_activity):
+    res_calendars, _, _, _, _ = discover_calendar_per_agent(df_train_without_end_activity)
+    return res_calendars
+
+
+def _discover_case_arrival_times(
+    df_train, df_val, start_time, start_time_val, num_cases_to_simulate, num_cases_to_simulate_val
+):
+    """
+    Samples the case arrival times for the simulation and for the validation log,
+    the latter uses the arrival parameters discovered from the training log.
+    """
+    case_arrival_times, train_params = get_case_arrival_times(
+        df_train,
+        start_timestamp=start_time,
+        num_cases_to_simulate=num_cases_to_simulate,
+        train=True,
+    )
+    case_arrival_times_val, _ = get_case_arrival_times(
+        df_val,
+        start_timestamp=start_time_val,
+        num_cases_to_simulate=num_cases_to_simulate_val,
+        train=False,
+        train_params=train_params,
+    )
+    return case_arrival_times, case_arrival_times_val
+
+
+def preprocess(df, agent_to_resource=None):
     """
     Preprocess event log
+
+    Resources of an existing [agent_to_resource] mapping keep their agent, other resources get new agents.
     """
     # transfrom case_id into int
     if df["case_id"].dtype == "object":
-        df["case_id"] = df["case_id"].str.extract("(\d+)").astype(int)
+        df["case_id"] = df["case_id"].str.extract(r"(\d+)").astype(int)
     # fill NaN values of resource column
-    df["resource"].fillna("artificial", inplace=True)
-    df["resource"] = df["resource"].astype(str)
-
-    def rename_artificial(row):
-        if row["resource"] == "artificial":
-            return row["resource"] + "_" + row["activity_name"]
-        else:
-            return row["resource"]
+    df["resource"] = df["resource"].fillna("artificial").astype(str)
 
     def insert_rows_before_case_change(df):
         # Ensure the DataFrame is sorted by case_id and start_timestamp
@@ -159,16 +436,25 @@ def preprocess(df):
         df_with_end_rows.reset_index(drop=True, inplace=True)
         return df_with_end_rows
 
-    # Apply the function to each row
-    df["resource"] = df.apply(rename_artificial, axis=1)
+    # Events without a resource get an artificial resource per activity
+    is_artificial = df["resource"] == "artificial"
+    df["resource"] = df["resource"].where(~is_artificial, "artificial_" + df["activity_name"].astype(str))
     # name agents with plain integers
-    df["agent"] = pd.factorize(df["resource"])[0]
+    if agent_to_resource is None:
+        df["agent"] = pd.factorize(df["resource"])[0]
+        agent_to_resource = {}
+    else:
+        resource_to_agent = {resource: agent for agent, resource in agent_to_resource.items()}
+        new_resources = [resource for resource in df["resource"].unique() if resource not in resource_to_agent]
+        first_new_agent = max(agent_to_resource, default=-1) + 1
+        resource_to_agent.update({resource: first_new_agent + i for i, resource in enumerate(new_resources)})
+        df["agent"] = df["resource"].map(resource_to_agent)
     # Create a mapping of integers to resource values
     integers = df["agent"].unique()
     resources = df["resource"].unique()
     integers_to_resources = dict(zip(integers, resources))
     # Create the agent_to_resource mapping dictionary by reversing the integers_to_resources dictionary
-    agent_to_resource = {k: v for k, v in integers_to_resources.items()}
+    agent_to_resource = {**agent_to_resource, **integers_to_resources}
     # insert a new row after every ending case
     df = insert_rows_before_case_change(df)
     df["start_timestamp"] = pd.to_datetime(df["start_timestamp"], utc=True, format="mixed")
@@ -199,13 +485,7 @@ def _compute_activity_duration_distribution(df, res_calendars, roles):
     act_durations = {key: {k: [] for k in activities} for key in agents}
 
     for agent in agents:
-        if agent in res_calendars.keys():
-            agent_calendar = res_calendars[agent].intervals_to_json()
-        else:
-            agent_calendar = next(
-                (ids["calendar"] for role, ids in roles.items() if agent in ids["agents"]),
-                None,
-            )
+        agent_calendar = _get_agent_calendar(agent, res_calendars, roles)
         # print(f"agent: {agent}")
         # print(f"agent_calendar: {agent_calendar}")
         # if agent_calendar is None:
@@ -297,6 +577,18 @@ def _compute_activity_duration_distribution(df, res_calendars, roles):
     return act_durations
 
 
+def _get_agent_calendar(agent, res_calendars, roles):
+    """
+    Returns the working intervals of the agent's own calendar, or of the calendar of its role.
+    """
+    if agent in res_calendars.keys():
+        return res_calendars[agent].intervals_to_json()
+    return next(
+        (ids["calendar"] for role, ids in roles.items() if agent in ids["agents"]),
+        None,
+    )
+
+
 def compute_activity_duration_distribution_per_agent(df_train, res_calendars, roles, user_input: str = None):
     """
     Compute the best fitting distribution of activity durations per agent.
@@ -308,7 +600,19 @@ def compute_activity_duration_distribution_per_agent(df_train, res_calendars, ro
         dict: A dict storing for each agent the distribution for each activity.
     """
     activity_durations_dict = _compute_activity_duration_distribution(df_train, res_calendars, roles)
+    return fit_activity_durations(activity_durations_dict, user_input)
+
 
+def fit_activity_durations(activity_durations_dict, user_input: str = None):
+    """
+    Fit the best fitting distribution to the activity durations per agent.
+
+    Args:
+        activity_durations_dict: Durations per agent and activity, see _compute_activity_duration_distribution.
+
+    Returns:
+        dict: A dict storing for each agent the distribution for each activity.
+    """
     agents = activity_durations_dict.keys()
     activities = []
     for k, v in activity_durations_dict.items():
@@ -336,20 +640,32 @@ def activities_with_zero_waiting_time(df, threshold=0.99):
     """
     Returns a list of activities that have zero waiting time in the log.
     """
-    # Sort the DataFrame by start timestamp
-    df_sorted = df.sort_values(by="start_timestamp")
-    df_sorted = df_sorted.groupby("case_id")
+    return select_activities_without_waiting_time(count_zero_waiting_times(df), threshold)
 
-    group_list = []
 
-    for case_id, group in df_sorted:
-        # Calculate waiting time for each group
-        group["waiting_time"] = group["start_timestamp"] - group["end_timestamp"].shift(1)
-        # Append the modified group to the list
-        group_list.append(group)
+def select_activities_without_waiting_time(waiting_time_counts, threshold=0.99):
+    """
+    Returns a list of the activities that have zero waiting time in at least [threshold] of their occurrences.
 
-    # Concatenate the list of groups back into a single DataFrame
-    df_with_waiting_time = pd.concat(group_list)
+    Args:
+        waiting_time_counts (DataFrame): Counts per activity, see count_zero_waiting_times.
+    """
+    counts = waiting_time_counts[waiting_time_counts["zero_waiting_time"] > 0]
+    always_zero_waiting_time_activities = counts[counts["zero_waiting_time"] >= counts["total"] * threshold]
+    return always_zero_waiting_time_activities.index.tolist()
+
+
+def count_zero_waiting_times(df):
+    """
+    Returns per activity (index) how often it was performed without waiting time ("zero_waiting_time")
+    and how often it was performed in total ("total").
+    """
+    # Sort the DataFrame by start timestamp, stable so that events starting at the same time keep the log order
+    df_with_waiting_time = df.sort_values(by="start_timestamp", kind="stable")
+
+    # Calculate waiting time as the gap to the end of the previous event of the same case
+    previous_end = df_with_waiting_time.groupby("case_id")["end_timestamp"].shift(1)
+    df_with_waiting_time["waiting_time"] = df_with_waiting_time["start_timestamp"] - previous_end
 
     # replace NaT values (first activity per case) with 0
     df_with_waiting_time["waiting_time"] = df_with_waiting_time["waiting_time"].fillna(pd.Timedelta(seconds=0))
@@ -363,10 +679,23 @@ def activities_with_zero_waiting_time(df, threshold=0.99):
     # Get the total counts for each activity
     total_counts = df_with_waiting_time["activity_name"].value_counts()
 
-    # Filter activities with count equal to total occurrences
-    always_zero_waiting_time_activities = counts[counts >= total_counts[counts.index] * threshold]
+    waiting_time_counts = pd.DataFrame({"zero_waiting_time": counts, "total": total_counts}).fillna(0).astype(int)
+    return waiting_time_counts.sort_index()
 
-    return always_zero_waiting_time_activities.index.tolist()
+
+def get_max_activity_count_per_case(df):
+    """
+    Returns for each activity the maximum number of times it was performed in a case.
+    """
+    activity_counts = df.groupby(["case_id", "activity_name"]).size().reset_index(name="count")
+    return activity_counts.groupby("activity_name")["count"].max().to_dict()
+
+
+def get_agent_activity_mapping(df):
+    """
+    Returns for each agent the activities it performed, in the order of their first occurrence.
+    """
+    return df.groupby("agent")["activity_name"].unique().apply(list).to_dict()
 
 
 def get_prerequisites_per_activity(data):
@@ -551,60 +880,39 @@ def discover_connected_pairs(activity_list):
     return connections
 
 
-def intersect_lists(list_of_lists):
+def generate_preceding_activities_dict(data):
     """
-    Returns the intersection of all lists in a list of lists.
+    Returns for each activity the activities that precede it in every case it occurs in
+    (not counting occurrences as the first activity of a case).
 
-    Args:
-        list_of_lists (list of lists): A list containing multiple lists.
-
-    Returns:
-        list: A list containing elements common to all input lists.
+    The log is walked once in (case_id, end_timestamp) order. Activities are integer coded so that
+    the activities seen so far in the current case can be kept as a bitset, and the prerequisites of
+    an activity are the running intersection (bitwise and) of these bitsets over its occurrences.
     """
-    if not list_of_lists:
-        return []
-
-    # Use set intersection to find common elements
-    intersection = set(list_of_lists[0])
-    for lst in list_of_lists[1:]:
-        intersection &= set(lst)
-
-    # Return the intersection as a list
-    intersection = list(intersection)
-
-    return intersection
-
+    ordered = data.sort_values(by=["case_id", "end_timestamp"], kind="stable")
+    activity_codes, activities = pd.factorize(ordered["activity_name"])
+
+    preceding_bits = {}
+    seen_in_case = 0
+    previous_case_id = None
+    for case_id, code in zip(ordered["case_id"].to_numpy(), activity_codes):
+        if case_id != previous_case_id:
+            # first activity of a case has no preceding activities and is not registered
+            seen_in_case = 0
+            previous_case_id = case_id
+        elif code in preceding_bits:
+            preceding_bits[code] &= seen_in_case
+        else:
+            preceding_bits[code] = seen_in_case
+        seen_in_case |= 1 << int(code)
 
-def generate_preceding_activities_dict(data):
     preceding_activities_dict = {}
-    preceding_activities_dict_clean = {}
-
-    # Group by case_id
-    grouped = data.groupby("case_id")
-
-    # Iterate over groups
-    for case_id, group in grouped:
-        sorted_group = group.sort_values(by="end_timestamp")
-
-        for i in range(1, len(sorted_group)):
-            current_activity = sorted_group.iloc[i]["activity_name"]
-            # print(f"current_activity: {current_activity}")
-            preceding_activities = [sorted_group.iloc[i - j]["activity_name"] for j in range(1, i + 1)]
-            # print(f"preceding_activities: {preceding_activities}")
-
-            if current_activity not in preceding_activities_dict:
-                preceding_activities_dict[current_activity] = []
-            preceding_activities_dict[current_activity].append(preceding_activities)
-
-    # print(f"preceding_activities_dict: {preceding_activities_dict}")
-
-    # iterate over all keys and extract the activities that appear in each sublist of that key
-    for key, value in preceding_activities_dict.items():
-        preceding_activities_dict_clean[key] = intersect_lists(value)
-
-    # print(f"preceding_activities_dict_clean: {preceding_activities_dict_clean}")
+    for code, bits in preceding_bits.items():
+        preceding_activities_dict[activities[code]] = [
+            activity for i, activity in enumerate(activities) if bits >> i & 1
+        ]
 
-    return preceding_activities_dict_clean
+    return preceding_activities_dict
 
 
 # def generate_preceding_activities_dict(data):
@@ -670,6 +978,92 @@ def _get_times_for_extr_delays(df_train, discover_extr_delays=True):
     return timers
 
 
+# Parameter sets that are only used by some agent behavior types / extraneous delay settings,
+# with the function discovering them from the (preprocessed) training log
+PARAMETER_SET_FUNCTIONS = {
+    "transition_probabilities_global": compute_activity_transition_dict_global,
+    "transition_probabilities_autonomous": compute_activity_transition_dict,
+    "agent_transition_probabilities_autonomous": calculate_agent_handover_probabilities_per_activity,
+    "timers_extr": _get_times_for_extr_delays,
+}
+
+
+# Transition parameter sets with the functions counting the transitions in the (preprocessed) training log
+# and normalizing these counts into the transition probabilities
+TRANSITION_COUNT_FUNCTIONS = {
+    "transition_probabilities_global": (
+        count_activity_transitions_global,
+        transition_probabilities_from_counts_global,
+    ),
+    "transition_probabilities_autonomous": (count_activity_transitions, transition_probabilities_from_counts),
+    "agent_transition_probabilities_autonomous": (
+        count_agent_handovers_per_activity,
+        handover_probabilities_from_counts,
+    ),
+}
+
+
+def get_required_parameter_sets(determine_automatically, central_orchestration, discover_extr_delays):
+    """
+    Returns the names of the parameter sets (see PARAMETER_SET_FUNCTIONS) used with the given settings.
+    When the settings are determined automatically, every combination is simulated so all sets are needed.
+    """
+    if determine_automatically:
+        return set(PARAMETER_SET_FUNCTIONS)
+
+    required = set()
+    if central_orchestration:
+        required.add("transition_probabilities_global")
+    else:
+        required.update(["transition_probabilities_autonomous", "agent_transition_probabilities_autonomous"])
+    if discover_extr_delays:
+        required.add("timers_extr")
+    return required
+
+
+def materialize_parameter_sets(simulation_parameters, df_train, names):
+    """
+    Discovers the parameter sets in [names] that were not discovered yet and adds them to the simulation parameters.
+
+    Args:
+        simulation_parameters (dict): Discovered simulation parameters, modified in place.
+        df_train (DataFrame): Preprocessed training log the simulation parameters were discovered from.
+        names (iterable): Names of the needed parameter sets, see PARAMETER_SET_FUNCTIONS.
+    """
+    for name in names:
+        if simulation_parameters.get(name) is None:
+            simulation_parameters[name] = PARAMETER_SET_FUNCTIONS[name](df_train.copy())
+
+
+def apply_behavior_mode(simulation_parameters, df_train, central_orchestration, discover_extr_delays):
+    """
+    Sets the agent behavior type and extraneous delays used by the simulation,
+    parameter sets of the mode that were not discovered yet are discovered first.
+    """
+    materialize_parameter_sets(
+        simulation_parameters,
+        df_train,
+        get_required_parameter_sets(False, central_orchestration, discover_extr_delays),
+    )
+
+    simulation_parameters["central_orchestration"] = central_orchestration
+    simulation_parameters["discover_extr_delays"] = discover_extr_delays
+    if discover_extr_delays is True:
+        simulation_parameters["timers"] = simulation_parameters["timers_extr"]
+    else:
+        simulation_parameters["timers"] = _get_times_for_extr_delays(df_train, discover_extr_delays=False)
+
+    if central_orchestration is True:
+        simulation_parameters["transition_probabilities"] = simulation_parameters["transition_probabilities_global"]
+        simulation_parameters["agent_transition_probabilities"] = None
+    else:
+        simulation_parameters["transition_probabilities"] = simulation_parameters["transition_probabilities_autonomous"]
+        simulation_parameters["agent_transition_probabilities"] = simulation_parameters[
+            "agent_transition_probabilities_autonomous"
+        ]
+    return simulation_parameters
+
+
 def determine_agent_behavior_type_and_extraneous_delays(
     simulation_parameters,
     df_train,
@@ -677,197 +1071,42 @@ def determine_agent_behavior_type_and_extraneous_delays(
     case_arrival_times_val,
     central_orchestration_parameter,
     discover_extr_delays_parameter,
+    max_workers=None,
+    racing=False,
+    meter=None,
 ):
     """
     Determine the agent behavior type and extraneous delays.
-    """
-    timers_extr = _get_times_for_extr_delays(df_train, discover_extr_delays=True)
-    timers = _get_times_for_extr_delays(df_train, discover_extr_delays=False)
-    # create a copy of the simulation parameters such that we can modify it without changing the original one
-    simulation_parameters_copy = simulation_parameters.copy()
-
-    if simulation_parameters_copy["determine_automatically"]:
-        # 1) simulate val log with extr delays and central orchestration
-        central_orchestration = True
-        sampled_case_starting_times = case_arrival_times_val
-        start_timestamp = sampled_case_starting_times[0]
-        sampled_case_starting_times = sampled_case_starting_times[1:]
-
-        simulation_parameters_copy["sampled_case_starting_times"] = sampled_case_starting_times
-        simulation_parameters_copy["start_timestamp"] = start_timestamp
-        simulation_parameters_copy["timers"] = timers_extr
-        simulation_parameters_copy["central_orchestration"] = central_orchestration
-        # Create the model using the loaded data
-        business_process_model = BusinessProcessModel(df_train, simulation_parameters_copy)
-        # define list of cases
-        case_id = 0
-        case_ = Case(case_id=case_id, start_timestamp=start_timestamp)  # first case
-        cases = [case_]
-        # Run the model for a specified number of steps
-        while business_process_model.sampled_case_starting_times:  # while cases list is not empty
-            business_process_model.step(cases)
-        simulated_log_val_extr = pd.DataFrame(business_process_model.simulated_events)
-
-        # 2) simulate val log without extr delays and central orchestration
-        simulation_parameters_copy["timers"] = timers
-        sampled_case_starting_times = case_arrival_times_val
-        simulation_parameters_copy["start_timestamp"] = sampled_case_starting_times[0]
-        simulation_parameters_copy["sampled_case_starting_times"] = sampled_case_starting_times[1:]
-        simulation_parameters_copy["central_orchestration"] = True
-        # Create the model using the loaded data
-        business_process_model = BusinessProcessModel(df_train, simulation_parameters_copy)
-        # define list of cases
-        case_id = 0
-        case_ = Case(case_id=case_id, start_timestamp=start_timestamp)  # first case
-        cases = [case_]
-        # Run the model for a specified number of steps
-        while business_process_model.sampled_case_starting_times:  # while cases list is not empty
-            business_process_model.step(cases)
-        simulated_log_val_ = pd.DataFrame(business_process_model.simulated_events)
-
-        # 3) simulate val log with extr delays and autonomous handover
-        simulation_parameters_copy["central_orchestration"] = False
-        simulation_parameters_copy["timers"] = timers_extr
-        sampled_case_starting_times = case_arrival_times_val
-        simulation_parameters_copy["start_timestamp"] = sampled_case_starting_times[0]
-        simulation_parameters_copy["sampled_case_starting_times"] = sampled_case_starting_times[1:]
-        simulation_parameters_copy["transition_probabilities"] = simulation_parameters_copy[
-            "transition_probabilities_autonomous"
-        ]
-        simulation_parameters_copy["agent_transition_probabilities"] = simulation_parameters_copy[
-            "agent_transition_probabilities_autonomous"
-        ]
-        # Create the model using the loaded data
-        business_process_model = BusinessProcessModel(df_train, simulation_parameters_copy)
-        # define list of cases
-        case_id = 0
-        case_ = Case(case_id=case_id, start_timestamp=start_timestamp)  # first case
-        cases = [case_]
-        # Run the model for a specified number of steps
-        while business_process_model.sampled_case_starting_times:  # while cases list is not empty
-            business_process_model.step(cases)
-        simulated_log_val_extr_autonomous = pd.DataFrame(business_process_model.simulated_events)
-
-        # 4) simulate val log without extr delays and autonomous handover
-        simulation_parameters_copy["timers"] = timers
-        sampled_case_starting_times = case_arrival_times_val
-        simulation_parameters_copy["start_timestamp"] = sampled_case_starting_times[0]
-        simulation_parameters_copy["sampled_case_starting_times"] = sampled_case_starting_times[1:]
-        simulation_parameters_copy["central_orchestration"] = False
-        simulation_parameters_copy["transition_probabilities"] = simulation_parameters_copy[
-            "transition_probabilities_autonomous"
-        ]
-        simulation_parameters_copy["agent_transition_probabilities"] = simulation_parameters_copy[
-            "agent_transition_probabilities_autonomous"
-        ]
-        # Create the model using the loaded data
-        business_process_model = BusinessProcessModel(df_train, simulation_parameters_copy)
-        # define list of cases
-        case_id = 0
-        case_ = Case(case_id=case_id, start_timestamp=start_timestamp)  # first case
-        cases = [case_]
-        # Run the model for a specified number of steps
-        while business_process_model.sampled_case_starting_times:  # while cases list is not empty
-            business_process_model.step(cases)
-        simulated_log_val_autonomous = pd.DataFrame(business_process_model.simulated_events)
-
-        # 5) compute cycle time and check which one is closer to the val log
-        from log_distance_measures.config import EventLogIDs
-        from log_distance_measures.cycle_time_distribution import cycle_time_distribution_distance
-
-        # Set event log column ID mapping
-        event_log_ids = EventLogIDs(  # These values are stored in DEFAULT_CSV_IDS
-            case="case_id",
-            activity="activity_name",
-            start_time="start_timestamp",
-            end_time="end_timestamp",
-            resource="resource",
-        )
-
-        ctdd_extr = cycle_time_distribution_distance(
-            df_val,
-            event_log_ids,  # First event log and its column id mappings
-            simulated_log_val_extr,
-            event_log_ids,  # Second event log and its column id mappings
-            bin_size=pd.Timedelta(hours=1),  # Bins of 1 hour
-        )
 
-        ctdd = cycle_time_distribution_distance(
-            df_val,
-            event_log_ids,  # First event log and its column id mappings
-            simulated_log_val_,
-            event_log_ids,  # Second event log and its column id mappings
-            bin_size=pd.Timedelta(hours=1),  # Bins of 1 hour
-        )
-
-        ctdd_extr_autonomous = cycle_time_distribution_distance(
+    If they should be determined automatically, the validation log is simulated with every combination
+    (in parallel, see source/behavior_selection.py), optionally racing the combinations against each other.
+    """
+    if simulation_parameters["determine_automatically"]:
+        materialize_parameter_sets(simulation_parameters, df_train, PARAMETER_SET_FUNCTIONS)
+        timers = _get_times_for_extr_delays(df_train, discover_extr_delays=False)
+
+        # simulate the val log with every combination of extr delays and architecture,
+        # and check which one has the cycle time distribution closest to the val log
+        best_candidate, distances = select_behavior_candidate(
+            simulation_parameters,
+            df_train,
             df_val,
-            event_log_ids,  # First event log and its column id mappings
-            simulated_log_val_extr_autonomous,
-            event_log_ids,  # Second event log and its column id mappings
-            bin_size=pd.Timedelta(hours=1),  # Bins of 1 hour
+            case_arrival_times_val,
+            simulation_parameters["timers_extr"],
+            timers,
+            max_workers=max_workers,
+            racing=racing,
         )
-
-        ctdd_autonomous = cycle_time_distribution_distance(
-            df_val,
-            event_log_ids,  # First event log and its column id mappings
-            simulated_log_val_autonomous,
-            event_log_ids,  # Second event log and its column id mappings
-            bin_size=pd.Timedelta(hours=1),  # Bins of 1 hour
+        for name, distance in distances.items():
+            print(f"CTD {name}: {distance}")
+        if meter is not None:
+            meter.count("behavior_candidates_simulated", len(distances))
+
+        # set the hyperparameter for extr_delays and the architecture
+        return apply_behavior_mode(
+            simulation_parameters, df_train, best_candidate.central_orchestration, best_candidate.extraneous_delays
         )
-        print(f"CTD extr + central: {ctdd_extr}")
-        print(f"CTD without extr + central: {ctdd}")
-        print(f"CTD extr + autonomous: {ctdd_extr_autonomous}")
-        print(f"CTD without extr + autonomous: {ctdd_autonomous}")
-
-        # 4) set the hyperparameter for extr_delays and the architecture
-        ct_results_val = [ctdd_extr, ctdd, ctdd_extr_autonomous, ctdd_autonomous]
-        best_val_result = min(ct_results_val)
-
-        if ctdd_extr == best_val_result:
-            simulation_parameters["timers"] = timers_extr
-            # discover_delays = True
-            simulation_parameters["central_orchestration"] = True
-        elif ctdd == best_val_result:
-            simulation_parameters["timers"] = timers
-            # discover_delays = False
-            simulation_parameters["central_orchestration"] = True
-        elif ctdd_extr_autonomous == best_val_result:
-            simulation_parameters["timers"] = timers_extr
-            # discover_delays = True
-            simulation_parameters["central_orchestration"] = False
-            simulation_parameters["transition_probabilities"] = simulation_parameters[
-                "transition_probabilities_autonomous"
-            ]
-            simulation_parameters["agent_transition_probabilities"] = simulation_parameters[
-                "agent_transition_probabilities_autonomous"
-            ]
-        elif ctdd_autonomous == best_val_result:
-            simulation_parameters["timers"] = timers
-            # discover_delays = False
-            simulation_parameters["central_orchestration"] = False
-            simulation_parameters["transition_probabilities"] = simulation_parameters[
-                "transition_probabilities_autonomous"
-            ]
-            simulation_parameters["agent_transition_probabilities"] = simulation_parameters[
-                "agent_transition_probabilities_autonomous"
-            ]
-    else:
-        if discover_extr_delays_parameter is True:
-            simulation_parameters["timers"] = timers_extr
-        else:
-            simulation_parameters["timers"] = timers
 
-        simulation_parameters["central_orchestration"] = central_orchestration_parameter
-        if central_orchestration_parameter is False:
-            simulation_parameters["transition_probabilities"] = simulation_parameters[
-                "transition_probabilities_autonomous"
-            ]
-            simulation_parameters["agent_transition_probabilities"] = simulation_parameters[
-                "agent_transition_probabilities_autonomous"
-            ]
-
-    # print(f"discover extr. delays: {discover_delays}")
-    # print(f"central orchestration: {central_orchestration}")
-
-    return simulation_parameters
+    return apply_behavior_mode(
+        simulation_parameters, df_train, central_orchestration_parameter, discover_extr_delays_parameter
+    )
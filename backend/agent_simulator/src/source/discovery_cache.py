@@ -0,0 +1,158 @@
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+
+import pandas as pd
+
+"""
+Content-addressed on-disk cache of the results of the discovery stages (see source/discovery_stages.py).
+
+A stage result is keyed by a hash of the stage function, its keyword arguments and its inputs, where an
+event log is hashed by its content and the result of another stage by the key of that stage. Repeating a
+discovery on the same log with other settings reuses the results of all stages the settings do not affect.
+
+Every key also contains a fingerprint of the code (the source files of the source package and the source of
+the stage function), so results cached by another version of the code, e.g. before a redeploy, are not reused.
+"""
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), "../../discovery_cache")
+DEFAULT_MAX_BYTES = 1024**3
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class DiscoveryCache:
+    """
+    Pickled stage results in a directory, the least recently used results are evicted
+    when the results take up more than [max_bytes].
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def get(self, key: str):
+        """
+        Returns if the result of [key] is cached, and the cached result.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            # The modification time orders the results by their last use
+            os.utime(path)
+        except FileNotFoundError:
+            return False, None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Results that can not be read (e.g. from an older version of the code) are discovered again
+            self._remove(path)
+            return False, None
+        return True, value
+
+    def put(self, key: str, value):
+        """
+        Stores the result of [key] and evicts the least recently used results if the cache is too large.
+        """
+        tmp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Written to a temporary file first, so other processes never read a partially written result
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+            self._evict()
+        except (OSError, pickle.PicklingError) as e:
+            # The discovery does not depend on the cache, the result is only not reused
+            print(f"Failed to cache discovery result: {e}")
+            if tmp_path is not None:
+                self._remove(tmp_path)
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pkl"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove(path)
+            total_bytes -= size
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def hash_log(df: pd.DataFrame) -> str:
+    """
+    Hashes the content of an event log (values, index, column names and types).
+    """
+    digest = hashlib.sha256()
+    digest.update(repr([(str(column), str(dtype)) for column, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def get_code_fingerprint(directory: str = SOURCE_DIR) -> str:
+    """
+    Hashes the paths and contents of the Python source files in [directory] and its subdirectories.
+    """
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".py"):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, directory).encode())
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _get_function_source(func) -> str:
+    # Functions without Python source (e.g. builtins) only change with the Python version
+    try:
+        return inspect.getsource(func)
+    except (OSError, TypeError):
+        return ""
+
+
+def get_stage_keys(stages, logs) -> dict:
+    """
+    Returns the cache key of every stage.
+
+    Args:
+        stages (list[DiscoveryStage]): The stages, in any order.
+        logs (dict): Event logs used as stage input, keyed by name.
+    """
+    keys = {name: hash_log(log) for name, log in logs.items() if any(name in stage.inputs for stage in stages)}
+    remaining = list(stages)
+    stage_keys = {}
+    while remaining:
+        stage = next(stage for stage in remaining if all(name in keys for name in stage.inputs))
+        digest = hashlib.sha256()
+        digest.update(get_code_fingerprint().encode())
+        digest.update(f"{stage.func.__module__}.{stage.func.__qualname__}".encode())
+        digest.update(_get_function_source(stage.func).encode())
+        digest.update(repr(sorted(stage.kwargs.items())).encode())
+        for name in stage.inputs:
+            digest.update(keys[name].encode())
+        keys[stage.name] = stage_keys[stage.name] = digest.hexdigest()
+        remaining.remove(stage)
+    return stage_keys
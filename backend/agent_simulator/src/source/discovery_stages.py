@@ -0,0 +1,218 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Callable
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+from source.discovery_cache import get_stage_keys
+from source.runtime_meter import MemorySampler
+
+"""
+Stage graph for the discovery phase.
+
+Every discovery stage is a top level function that gets the (preprocessed) event logs and/or the results of
+other stages as positional arguments. Stages whose inputs are available run concurrently in a process pool.
+The event logs are written once to uncompressed Arrow IPC files that the worker processes memory-map,
+so the logs do not have to be pickled for every stage.
+With a cache (see source/discovery_cache.py), stages whose inputs and settings did not change are not run again.
+The wall time and peak memory of every stage can be recorded in a RuntimeMeter (see source/runtime_meter.py).
+"""
+
+
+@dataclass
+class DiscoveryStage:
+    """
+    A single step of the discovery phase.
+
+    Attributes:
+        name    Name of the stage, the result of the stage is stored under this name.
+        func    Top level (picklable) function computing the result of the stage.
+        inputs  Names of the event logs and/or stages whose results are passed to [func], in order.
+        kwargs  Additional keyword arguments passed to [func].
+    """
+
+    name: str
+    func: Callable
+    inputs: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+
+
+# Below this number of events, starting worker processes takes longer than running all stages sequentially
+MIN_EVENTS_FOR_CONCURRENCY = 20000
+
+# Event logs already loaded by this (worker) process, keyed by the path of their Arrow file
+_shared_logs = {}
+
+
+def run_discovery_stages(stages: list, logs: dict, max_workers: Optional[int] = None, cache=None, meter=None) -> dict:
+    """
+    Runs the stages of the discovery, stages that do not depend on each other are run concurrently.
+
+    Args:
+        stages (list[DiscoveryStage]): The stages to run.
+        logs (dict): Event logs (pandas DataFrames) that can be used as stage input, keyed by name.
+        max_workers (int): Maximum number of worker processes, defaults to the number of CPUs
+            (or 1 if the logs have less than MIN_EVENTS_FOR_CONCURRENCY events).
+            With 1 worker all stages run sequentially in the current process.
+        cache (DiscoveryCache): Cache of stage results, stages with a cached result are not run.
+        meter (RuntimeMeter): Records the wall time and peak memory of every stage.
+
+    Returns:
+        dict: The result of every stage, keyed by the stage name.
+    """
+    _check_stage_graph(stages, logs)
+
+    cached_results = {}
+    if cache is not None:
+        stage_keys = get_stage_keys(stages, logs)
+        for stage in stages:
+            is_cached, result = cache.get(stage_keys[stage.name])
+            if is_cached:
+                cached_results[stage.name] = result
+                if meter is not None:
+                    meter.add_stage(stage.name, 0.0, None, cached=True)
+        stages = [stage for stage in stages if stage.name not in cached_results]
+        # Logs that are only used by cached stages are not needed
+        logs = {name: log for name, log in logs.items() if any(name in stage.inputs for stage in stages)}
+
+    if max_workers is None:
+        max_workers = default_max_workers(sum(len(log) for log in logs.values()))
+    max_workers = min(max_workers, len(stages))
+
+    if max_workers <= 1:
+        results = _run_sequentially(stages, logs, cached_results, meter)
+    else:
+        with tempfile.TemporaryDirectory() as shared_dir:
+            log_paths = {
+                name: write_shared_log(log, os.path.join(shared_dir, f"{name}.arrow")) for name, log in logs.items()
+            }
+            results = _run_concurrently(stages, log_paths, max_workers, cached_results, meter)
+
+    if cache is not None:
+        for stage in stages:
+            cache.put(stage_keys[stage.name], results[stage.name])
+    return results
+
+
+def default_max_workers(num_events: int) -> int:
+    """
+    Number of worker processes to use for a log with [num_events] events.
+    """
+    return (os.cpu_count() or 1) if num_events >= MIN_EVENTS_FOR_CONCURRENCY else 1
+
+
+def _check_stage_graph(stages, logs):
+    """
+    Makes sure that every stage input exists and that there are no cyclic dependencies.
+    """
+    stage_names = [stage.name for stage in stages]
+    if len(set(stage_names)) != len(stage_names):
+        raise ValueError(f"Stage names must be unique, got {stage_names}")
+
+    for stage in stages:
+        for name in stage.inputs:
+            if name not in logs and name not in stage_names:
+                raise ValueError(f"Unknown input '{name}' for discovery stage '{stage.name}'")
+
+    resolved = set(logs)
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if all(name in resolved for name in stage.inputs)]
+        if not ready:
+            raise ValueError(f"Cyclic dependencies between discovery stages {[stage.name for stage in remaining]}")
+        resolved.update(stage.name for stage in ready)
+        remaining = [stage for stage in remaining if stage not in ready]
+
+
+def _run_sequentially(stages, logs, cached_results, meter):
+    results = dict(cached_results)
+    remaining = list(stages)
+    while remaining:
+        stage = next(stage for stage in remaining if all(name in logs or name in results for name in stage.inputs))
+        args = [logs[name] if name in logs else results[name] for name in stage.inputs]
+        results[stage.name], duration, peak_memory = _measure(stage.func, args, stage.kwargs)
+        _record_stage(meter, stage, duration, peak_memory)
+        remaining.remove(stage)
+    return results
+
+
+def _run_concurrently(stages, log_paths, max_workers, cached_results, meter):
+    results = dict(cached_results)
+    remaining = list(stages)
+    running = {}
+    # Workers are spawned instead of forked, forking a process that already used polars (or other libraries
+    # with their own thread pools) can leave the worker waiting on a lock that is never released
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        while remaining or running:
+            # Submit all stages whose inputs are available
+            for stage in [
+                stage for stage in remaining if all(name in log_paths or name in results for name in stage.inputs)
+            ]:
+                shared_inputs = [
+                    ("log", log_paths[name]) if name in log_paths else ("value", results[name]) for name in stage.inputs
+                ]
+                running[executor.submit(_run_stage, stage.func, shared_inputs, stage.kwargs)] = stage
+                remaining.remove(stage)
+            # Wait for at least one stage to finish, its result might unlock other stages
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                results[stage.name], duration, peak_memory = future.result()
+                _record_stage(meter, stage, duration, peak_memory)
+    return results
+
+
+def _run_stage(func, shared_inputs, kwargs):
+    """
+    Entry point of a stage in a worker process.
+    """
+    args = [read_shared_log(value) if kind == "log" else value for kind, value in shared_inputs]
+    return _measure(func, args, kwargs)
+
+
+def _measure(func, args, kwargs):
+    """
+    Runs the stage function, returns its result, wall time and the peak memory of the process while it ran.
+    """
+    start = time.perf_counter()
+    with MemorySampler() as memory:
+        result = func(*args, **kwargs)
+    return result, time.perf_counter() - start, memory.peak
+
+
+def _record_stage(meter, stage, duration, peak_memory):
+    if meter is not None:
+        meter.add_stage(stage.name, duration, peak_memory)
+        meter.count("discovery_stages_completed")
+
+
+def write_shared_log(df: pd.DataFrame, path: str) -> str:
+    """
+    Writes the event log to an uncompressed Arrow IPC file, so it can be memory-mapped by other processes.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return path
+
+
+def read_shared_log(path: str) -> pd.DataFrame:
+    """
+    Reads an event log written with write_shared_log, the memory-mapped table is kept for later calls.
+    """
+    if path not in _shared_logs:
+        # Logs of a previous discovery are no longer needed
+        for old_path in [p for p in _shared_logs if os.path.dirname(p) != os.path.dirname(path)]:
+            del _shared_logs[old_path]
+        _shared_logs[path] = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    # Every stage gets its own DataFrame, as some stages modify their input
+    return _shared_logs[path].to_pandas()
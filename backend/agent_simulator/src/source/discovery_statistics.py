@@ -0,0 +1,185 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+"""
+Sufficient statistics of the discovered simulation parameters, these are kept with a discovered model
+so that new cases can be folded into it (see update_simulation_parameters in source/discovery.py)
+instead of rediscovering the model from the whole log.
+
+The activity durations are kept as a bounded uniform sample (reservoir) of at most MAX_DURATION_SAMPLES durations
+per agent and activity together with the number of observed durations, so the statistics do not grow with every
+folded log. Merging two samples draws a uniform sample of the combined durations.
+"""
+
+MAX_DURATION_SAMPLES = 2000
+
+
+@dataclass
+class DiscoveryStatistics:
+    """
+    Statistics of a log that the simulation parameters are computed from.
+
+    The statistics of two logs with disjoint cases can be merged into the statistics of the combined log.
+
+    Attributes:
+        activity_durations (dict): Per agent and activity a uniform sample of at most MAX_DURATION_SAMPLES of the
+            observed durations within the agent's calendar.
+        transition_counts (dict): Per discovered transition parameter set (e.g. "transition_probabilities_global")
+            the transition counts it was normalized from.
+        waiting_time_counts (DataFrame): Per activity (index) how often it was performed without waiting
+            time ("zero_waiting_time") and in total ("total").
+        max_activity_count_per_case (dict): Per activity the maximum number of times it was performed in a case.
+        agent_activities (dict): Per agent the activities it performed.
+        preceding_activities (dict): Per activity the activities preceding it in every case it occurs in.
+        case_start_times (Series): Start timestamp per case_id (index).
+        activity_duration_counts (dict): Per agent and activity the number of observed durations,
+            counted from activity_durations if not given.
+    """
+
+    activity_durations: dict
+    transition_counts: dict
+    waiting_time_counts: pd.DataFrame
+    max_activity_count_per_case: dict
+    agent_activities: dict
+    preceding_activities: dict
+    case_start_times: pd.Series
+    activity_duration_counts: dict = None
+
+    def __post_init__(self):
+        # statistics of models discovered before the durations were sampled have all of them
+        if self.activity_duration_counts is None:
+            self.activity_duration_counts = _count_samples(self.activity_durations)
+        self.activity_durations = _limit_samples(self.activity_durations, np.random.default_rng(0))
+
+    def case_ids(self):
+        return self.case_start_times.index
+
+    def replace_durations(self, activity_durations):
+        """
+        Replaces the durations of the agents in [activity_durations] (e.g. durations computed again from the
+        whole log), the durations of the other agents are kept.
+        """
+        self.activity_durations.update(_limit_samples(activity_durations, np.random.default_rng(0)))
+        self.activity_duration_counts.update(_count_samples(activity_durations))
+
+    def merge(self, other, random_state=0):
+        """
+        Merges the statistics with the statistics of a log of other cases.
+
+        Transition counts are only kept for the parameter sets counted in both logs,
+        the other sets have to be counted from the combined log when they are needed.
+
+        Args:
+            other (DiscoveryStatistics): Statistics of a log without any of the cases of this one.
+            random_state (int): Seed of the sample of the combined durations.
+
+        Returns:
+            DiscoveryStatistics: The statistics of the combined log.
+        """
+        shared_case_ids = self.case_ids().intersection(other.case_ids())
+        if len(shared_case_ids) > 0:
+            raise ValueError(f"Statistics of the same cases can not be merged, shared cases: {list(shared_case_ids)}")
+
+        activity_durations, activity_duration_counts = _merge_samples(
+            self.activity_durations,
+            self.activity_duration_counts,
+            other.activity_durations,
+            other.activity_duration_counts,
+            np.random.default_rng(random_state),
+        )
+        return DiscoveryStatistics(
+            activity_durations=activity_durations,
+            transition_counts={
+                name: merge_counts(counts, other.transition_counts[name])
+                for name, counts in self.transition_counts.items()
+                if name in other.transition_counts
+            },
+            waiting_time_counts=self.waiting_time_counts.add(other.waiting_time_counts, fill_value=0).astype(int),
+            max_activity_count_per_case={
+                activity: max(self.max_activity_count_per_case.get(activity, 0), count)
+                for activity, count in {**self.max_activity_count_per_case, **other.max_activity_count_per_case}.items()
+            },
+            agent_activities={
+                agent: list(dict.fromkeys(self.agent_activities.get(agent, []) + other.agent_activities.get(agent, [])))
+                for agent in sorted({*self.agent_activities, *other.agent_activities})
+            },
+            preceding_activities=_merge_preceding_activities(self.preceding_activities, other.preceding_activities),
+            case_start_times=pd.concat([self.case_start_times, other.case_start_times]).sort_index(),
+            activity_duration_counts=activity_duration_counts,
+        )
+
+
+def merge_counts(counts, other):
+    """
+    Adds two (nested) count dictionaries, neither of them is modified.
+    """
+    merged = dict(counts)
+    for key, value in other.items():
+        if isinstance(value, dict):
+            merged[key] = merge_counts(counts.get(key, {}), value)
+        else:
+            merged[key] = counts.get(key, 0) + value
+    return merged
+
+
+def _count_samples(samples):
+    return {
+        agent: {activity: len(durations) for activity, durations in activities.items()}
+        for agent, activities in samples.items()
+    }
+
+
+def _limit_samples(samples, rng):
+    return {
+        agent: {
+            activity: (
+                [durations[i] for i in sorted(rng.choice(len(durations), MAX_DURATION_SAMPLES, replace=False))]
+                if len(durations) > MAX_DURATION_SAMPLES
+                else durations
+            )
+            for activity, durations in activities.items()
+        }
+        for agent, activities in samples.items()
+    }
+
+
+def _merge_samples(samples, counts, other, other_counts, rng):
+    merged = {agent: dict(activities) for agent, activities in samples.items()}
+    merged_counts = {agent: dict(activities) for agent, activities in counts.items()}
+    for agent, activities in other.items():
+        merged_activities = merged.setdefault(agent, {})
+        for activity, durations in activities.items():
+            count = counts.get(agent, {}).get(activity, 0)
+            other_count = other_counts.get(agent, {}).get(activity, 0)
+            merged_activities[activity] = _merge_sample(
+                merged_activities.get(activity, []), count, durations, other_count, rng
+            )
+            merged_counts.setdefault(agent, {})[activity] = count + other_count
+    return merged, merged_counts
+
+
+def _merge_sample(sample, count, other, other_count, rng):
+    # Uniform samples of [count] and [other_count] durations give a uniform sample of the combined durations
+    # by taking a hypergeometric number of durations from the first sample and the rest from the second one
+    if count + other_count <= MAX_DURATION_SAMPLES:
+        return sample + other
+    size = MAX_DURATION_SAMPLES
+    from_sample = rng.hypergeometric(count, other_count, size)
+    return [sample[i] for i in sorted(rng.choice(len(sample), from_sample, replace=False))] + [
+        other[i] for i in sorted(rng.choice(len(other), size - from_sample, replace=False))
+    ]
+
+
+def _merge_preceding_activities(preceding_activities, other):
+    # An activity is preceded by the activities that precede it in the cases of both logs
+    merged = {}
+    for activity, preceding in preceding_activities.items():
+        if activity in other:
+            merged[activity] = [a for a in preceding if a in other[activity]]
+        else:
+            merged[activity] = list(preceding)
+    for activity, preceding in other.items():
+        merged.setdefault(activity, list(preceding))
+    return merged
@@ -1,3 +1,5 @@
+import json
+
 import numpy as np
 import pandas as pd
 from source.agent_simulator import AgentSimulator  # Adjust to your actual module
@@ -5,64 +7,233 @@ from source.agent_types.resource_calendar import Interval
 from source.agent_types.resource_calendar import RCalendar
 from source.arrival_distribution import DurationDistribution
 
+"""
+JSON representation of a discovered model (params.json), see agent_to_json and dump_agent_json,
+and of its visualization data (visualization.json). The JSON text is written without indentation.
+
+The simulation parameters are encoded by the encoder of their known shape (see _PARAMETER_ENCODERS),
+other values by the generic _encode_value. A parameter that is the same object as another parameter
+(e.g. the transition probabilities of the simulation and of autonomous agents) is encoded once.
+A part of the model can be selected, some fields (fields) or the parameters of one agent (agent).
+"""
+
+# Attributes of the AgentSimulator that are not part of the json (the logs and their statistics)
+_SKIPPED_FIELDS = ("df_train", "df_val", "discovery_statistics")
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+_COMPACT = (",", ":")
+
+
+def agent_to_json(sim_instance, fields=None, agent=None):
+    """
+    Returns the JSON representation of a model, {"__type__": "AgentSimulator", "data": {...}}.
+
+    Args:
+        sim_instance (AgentSimulator): The model.
+        fields (iterable): Optional, the attributes (e.g. "params") and simulation parameters
+            (e.g. "res_calendars") to include, all of them if None.
+        agent (int): Optional, only the entries of this agent are included in the parameters
+            that have entries per agent (e.g. its calendar or its transition probabilities).
+
+    Returns:
+        dict: The JSON representation.
+    """
+    return {"__type__": "AgentSimulator", "data": dict(_iter_fields(sim_instance, fields, agent))}
+
+
+def dump_agent_json(sim_instance, fields=None, agent=None) -> str:
+    """
+    Returns agent_to_json(sim_instance, fields, agent)["data"] as compact JSON text (params.json),
+    the text is written while the fields are encoded instead of encoding the whole model first.
+    """
+    return "".join(iter_agent_json(sim_instance, fields, agent))
+
+
+def dump_visualization_json(visualization) -> str:
+    """
+    Returns the visualization data of a model (see AgentSimulator.generate_html) as compact JSON text.
+    """
+    return json.dumps(visualization, separators=_COMPACT)
+
+
+def iter_agent_json(sim_instance, fields=None, agent=None):
+    """
+    Yields the JSON text of dump_agent_json field by field, e.g. to stream it as a response.
+    """
+    encoded_texts = {}
+    yield "{"
+    for i, (name, value) in enumerate(_iter_fields(sim_instance, fields, agent, encoded_texts)):
+        yield ("," if i else "") + json.dumps(name) + ":"
+        if name == "simulation_parameters":
+            yield "{"
+            for j, (parameter, encoded) in enumerate(value.items()):
+                yield ("," if j else "") + json.dumps(parameter) + ":" + encoded_texts[id(encoded)]
+            yield "}"
+        else:
+            yield json.dumps(value, separators=_COMPACT)
+    yield "}"
+
+
+def _iter_fields(sim_instance, fields, agent, encoded_texts=None):
+    """
+    Yields the name and encoded value of the fields of a model.
+    The simulation parameters are encoded once per object, their text is kept in [encoded_texts] (if given).
+    """
+    fields = set(fields) if fields is not None else None
+    for name, value in vars(sim_instance).items():
+        if name in _SKIPPED_FIELDS:
+            continue
+        if name == "simulation_parameters":
+            parameters = _encode_parameters(value, fields, agent, encoded_texts)
+            if fields is None or parameters or name in fields:
+                yield name, parameters
+        elif fields is None or name in fields:
+            yield str(name), _encode_value(value)
+
+
+def _encode_parameters(simulation_parameters, fields, agent, encoded_texts):
+    encoded_by_id = {}
+    parameters = {}
+    for name, value in simulation_parameters.items():
+        if fields is not None and name not in fields and "simulation_parameters" not in fields:
+            continue
+        encoder, agent_filter = _PARAMETER_ENCODERS.get(name, (_encode_value, None))
+        if agent is not None and agent_filter is not None and value is not None:
+            value = agent_filter(value, agent)
+
+        # e.g. transition_probabilities is the same object as transition_probabilities_autonomous,
+        # the value is kept with its encoding so its id is not reused while the parameters are encoded
+        key = (id(value), encoder)
+        if key not in encoded_by_id:
+            encoded = encoder(value)
+            encoded_by_id[key] = (value, encoded)
+            if encoded_texts is not None:
+                encoded_texts[id(encoded)] = json.dumps(encoded, separators=_COMPACT)
+        parameters[str(name)] = encoded_by_id[key][1]
+    return parameters
+
+
+# ============== Encoders ==============
+
+
+def _encode_value(obj):
+    """
+    Generic encoder, for values whose shape is not known.
+    """
+    if isinstance(obj, _SCALAR_TYPES) and not isinstance(obj, (np.integer, np.floating)):
+        return obj
+
+    if isinstance(obj, dict):
+        return {str(k): _encode_value(v) for k, v in obj.items() if k not in _SKIPPED_FIELDS}
+
+    elif isinstance(obj, (list, tuple)):
+        return [_encode_value(item) for item in obj]
+
+    elif isinstance(obj, AgentSimulator):
+        return {"__type__": "AgentSimulator", "data": _encode_value(obj.__dict__)}
+
+    elif isinstance(obj, RCalendar):
+        return _encode_calendar(obj)
+
+    elif isinstance(obj, pd.DataFrame):
+        return obj.applymap(
+            lambda x: x.isoformat() if isinstance(x, pd.Timestamp) else (None if pd.isna(x) else x)
+        ).to_dict(orient="records")
+
+    elif isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+
+    elif isinstance(obj, np.integer):
+        return int(obj)
+
+    elif isinstance(obj, np.floating):
+        return float(obj)
+
+    elif isinstance(obj, Interval):
+        return {"__type__": "Interval", "start": obj.start.isoformat(), "end": obj.end.isoformat()}
+
+    elif isinstance(obj, DurationDistribution):
+        return _encode_distribution(obj)
+
+    # Try using __dict__ if it has one
+    if hasattr(obj, "__dict__"):
+        return _encode_value(obj.__dict__)
+
+    # Fallback
+    return str(obj)
+
+
+def _encode_number(value):
+    return value if type(value) is float or type(value) is int else _encode_value(value)
+
+
+def _encode_calendar(calendar):
+    return {"__type__": "RCalendar", "data": _encode_value(calendar.to_dict())}
+
+
+def _encode_distribution(distribution):
+    if not isinstance(distribution, DurationDistribution):
+        return _encode_value(distribution)
+    return {
+        "__type__": "DurationDistribution",
+        "type": distribution.type.value,
+        "mean": distribution.mean,
+        "var": distribution.var,
+        "std": distribution.std if distribution.std is not None else None,
+        "min": distribution.min,
+        "max": distribution.max,
+    }
+
+
+def _encode_timestamps(timestamps):
+    if not isinstance(timestamps, list) or not all(isinstance(t, pd.Timestamp) for t in timestamps):
+        return _encode_value(timestamps)
+    return [timestamp.isoformat() for timestamp in timestamps]
 
-def agent_to_json(sim_instance):
-    def clean_obj(obj):
-        if isinstance(obj, dict):
-            result = {}
-            for k, v in obj.items():
-                if k == "df_train" or k == "df_val":
-                    continue  # Skip df_train field
-                """if k == "transition_probabilities_autonomous":
-                continue  # Skip this field"""
-                result[str(k)] = clean_obj(v)
-            return result
 
-        elif isinstance(obj, list) or isinstance(obj, tuple):
-            return [clean_obj(item) for item in obj]
+def _mapping_of(encode_value):
+    """
+    Returns an encoder of a dictionary whose values are encoded with [encode_value].
+    """
 
-        elif isinstance(obj, AgentSimulator):
-            return {"__type__": "AgentSimulator", "data": clean_obj(obj.__dict__)}
+    def encode(mapping):
+        if not isinstance(mapping, dict):
+            return _encode_value(mapping)
+        return {str(key): encode_value(value) for key, value in mapping.items()}
 
-        elif isinstance(obj, RCalendar):
-            return {"__type__": "RCalendar", "data": clean_obj(obj.to_dict())}
+    return encode
 
-        elif isinstance(obj, pd.DataFrame):
-            return obj.applymap(
-                lambda x: x.isoformat() if isinstance(x, pd.Timestamp) else (None if pd.isna(x) else x)
-            ).to_dict(orient="records")
 
-        elif isinstance(obj, pd.Timestamp):
-            return obj.isoformat()
+# {activity: probability}
+_encode_probabilities = _mapping_of(_encode_number)
+# {prefix: {agent: {activity: probability}}}
+_encode_transitions = _mapping_of(_mapping_of(_encode_probabilities))
+# {agent: {activity: {agent: {activity: probability}}}}
+_encode_agent_transitions = _mapping_of(_mapping_of(_mapping_of(_encode_probabilities)))
 
-        elif isinstance(obj, np.integer):
-            return int(obj)
 
-        elif isinstance(obj, np.floating):
-            return float(obj)
+# ============== Agent filters ==============
 
-        elif isinstance(obj, Interval):
-            return {"__type__": "Interval", "start": obj.start.isoformat(), "end": obj.end.isoformat()}
 
-        elif isinstance(obj, DurationDistribution):
-            return {
-                "__type__": "DurationDistribution",
-                "type": obj.type.value,
-                "mean": obj.mean,
-                "var": obj.var,
-                "std": obj.std if obj.std is not None else None,
-                "min": obj.min,
-                "max": obj.max,
-            }
+def _entries_of_agent(mapping, agent):
+    # {agent: ...}
+    return {key: value for key, value in mapping.items() if key == agent}
 
-        elif isinstance(obj, (str, int, float, bool)) or obj is None:
-            return obj
 
-        # Try using __dict__ if it has one
-        if hasattr(obj, "__dict__"):
-            return clean_obj(obj.__dict__)
+def _transitions_to_agent(transition_probabilities, agent):
+    # {prefix: {agent: {activity: probability}}}
+    return {prefix: {agent: targets[agent]} for prefix, targets in transition_probabilities.items() if agent in targets}
 
-        # Fallback
-        return str(obj)
 
-    return clean_obj(sim_instance)
+# Encoder and agent filter of the simulation parameters with a known shape
+_PARAMETER_ENCODERS = {
+    "activity_durations_dict": (_mapping_of(_mapping_of(_encode_distribution)), _entries_of_agent),
+    "res_calendars": (_mapping_of(_encode_calendar), _entries_of_agent),
+    "agent_activity_mapping": (_encode_value, _entries_of_agent),
+    "agent_to_resource": (_encode_value, _entries_of_agent),
+    "transition_probabilities": (_encode_transitions, _transitions_to_agent),
+    "transition_probabilities_autonomous": (_encode_transitions, _transitions_to_agent),
+    "agent_transition_probabilities": (_encode_agent_transitions, _entries_of_agent),
+    "agent_transition_probabilities_autonomous": (_encode_agent_transitions, _entries_of_agent),
+    "case_arrival_times": (_encode_timestamps, None),
+    "case_arrival_times_val": (_encode_timestamps, None),
+}
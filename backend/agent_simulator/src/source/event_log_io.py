@@ -0,0 +1,99 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+"""
+Reading of event logs into the columns used by the discovery (case_id, activity_name, resource,
+start_timestamp and end_timestamp).
+
+CSV files are parsed by the multi-threaded Arrow CSV reader with an explicit schema for these columns,
+Parquet files are read directly. The timestamps are parsed once, into UTC datetimes, and numbered
+case ids (e.g. "case_12") are coded as integers.
+"""
+
+CSV_EXTENSIONS = ("csv", "gz")
+PARQUET_EXTENSIONS = ("parquet", "pq")
+
+TIMESTAMP_COLUMNS = ("start_timestamp", "end_timestamp")
+# Read dictionary encoded, every distinct name is decoded to a single Python string that all its events share
+NAME_COLUMNS = ("activity_name", "resource")
+
+
+def read_event_log(path_or_buffer, file_extension: str, column_names: dict) -> pd.DataFrame:
+    """
+    Reads an event log and renames its columns.
+
+    Args:
+        path_or_buffer: Path or file-like object of the log.
+        file_extension (str): Type of the log, "csv" (or "gz" for a compressed csv) or "parquet".
+        column_names (dict): Mapping of the column names in the log to the column names used by the discovery.
+
+    Returns:
+        DataFrame: The event log with parsed timestamps.
+    """
+    if file_extension in CSV_EXTENSIONS:
+        table = _read_csv(path_or_buffer, column_names)
+    elif file_extension in PARQUET_EXTENSIONS:
+        table = pq.read_table(path_or_buffer)
+    else:
+        raise ValueError(f"Unsupported event log type '{file_extension}', expected csv or parquet")
+
+    table = table.rename_columns([column_names.get(name, name) for name in table.column_names])
+    df = table.to_pandas()
+
+    for column in NAME_COLUMNS:
+        if column in df and isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(object)
+    for column in TIMESTAMP_COLUMNS:
+        if column in df:
+            df[column] = parse_timestamps(df[column])
+    if "case_id" in df:
+        df["case_id"] = code_case_ids(df["case_id"])
+
+    return df
+
+
+def _read_csv(path_or_buffer, column_names):
+    # activities and resources are read as dictionary encoded strings, the other columns are inferred,
+    # ISO 8601 timestamps are parsed by the reader and other timestamp formats by parse_timestamps
+    column_types = {
+        name: pa.dictionary(pa.int32(), pa.string()) for name, column in column_names.items() if column in NAME_COLUMNS
+    }
+    return pa_csv.read_csv(
+        path_or_buffer,
+        read_options=pa_csv.ReadOptions(use_threads=True),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=column_types, timestamp_parsers=[pa_csv.ISO8601], strings_can_be_null=True
+        ),
+    )
+
+
+def parse_timestamps(column: pd.Series) -> pd.Series:
+    """
+    Parses timestamps into UTC datetimes (in nanoseconds), timestamps without a time zone are taken as UTC.
+    """
+    if pd.api.types.is_datetime64_any_dtype(column):
+        timestamps = column.dt.tz_localize("UTC") if column.dt.tz is None else column.dt.tz_convert("UTC")
+    else:
+        try:
+            # The fast path for ISO 8601 timestamps, logs with other formats are parsed per timestamp
+            timestamps = pd.to_datetime(column, utc=True, format="ISO8601")
+        except (ValueError, TypeError):
+            timestamps = pd.to_datetime(column, utc=True, format="mixed")
+    # NOTE: the reader parses whole second timestamps in seconds
+    return timestamps.dt.as_unit("ns")
+
+
+def code_case_ids(case_ids: pd.Series) -> pd.Series:
+    """
+    Codes numbered case ids (e.g. "case_12") as the integers they contain, other case ids are kept.
+    """
+    if pd.api.types.is_integer_dtype(case_ids):
+        return case_ids
+    # The numbers are only extracted once per case
+    codes, unique_case_ids = pd.factorize(case_ids)
+    numbers = pd.Series(unique_case_ids).astype(str).str.extract(r"(\d+)", expand=False)
+    if (codes < 0).any() or numbers.isna().any():
+        return case_ids
+    return pd.Series(numbers.astype(int).to_numpy()[codes], index=case_ids.index, name=case_ids.name)
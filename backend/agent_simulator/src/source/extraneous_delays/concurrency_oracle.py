@@ -1,14 +1,22 @@
 import enum
-from collections import Counter
+import multiprocessing
+import os
 from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from dataclasses import field
+from typing import Optional
 
+import numpy as np
 import pandas as pd
-import polars as pl
+from scipy import sparse
 from source.extraneous_delays.event_log import DEFAULT_CSV_IDS
 from source.extraneous_delays.event_log import EventLogIDs
 
+# Minimum number of events per process when computing the enabled times in parallel
+MIN_EVENTS_PER_WORKER = 250000
+# Maximum number of candidate pairs of overlapping events checked at once
+MAX_CANDIDATE_PAIRS_PER_CHUNK = 5000000
+
 
 class ReEstimationMethod(enum.Enum):
     SET_INSTANT = 1
@@ -128,173 +136,308 @@ class ConcurrencyOracle:
         # Return the enabling activity instance
         return enabling_activity_instance
 
-    def _get_enabling_info_of_trace(
-        self,
-        trace: pd.DataFrame,
-        log_ids: EventLogIDs,
-        set_nat_to_first_event: bool = False,
-    ):
-        # Initialize lists for indexes, enabled times, and enabling activities of each event in the trace
-        indexes, enabled_times, enabling_activities = [], [], []
-        # Compute trace start time
-        if log_ids.start_time in trace:
-            trace_start_time = min(trace[log_ids.start_time].min(), trace[log_ids.end_time].min())
-        else:
-            trace_start_time = trace[log_ids.end_time].min()
-        # Get the enabling activity and enabled time of each event
-        for index, event in trace.iterrows():
-            indexes += [index]
-            enabling_activity_instance = self.enabling_activity_instance(trace, event)
-            # Store enabled time
-            if enabling_activity_instance.empty:
-                # No enabling activity, use trace start or NA
-                enabled_times += [pd.NaT] if set_nat_to_first_event else [trace_start_time]
-                enabling_activities += [pd.NA]
-            else:
-                # Use computed value
-                enabled_times += [enabling_activity_instance[log_ids.end_time]]
-                enabling_activities += [enabling_activity_instance[log_ids.activity]]
-        # Return values of all events in trace
-        return indexes, enabled_times, enabling_activities
-
     def add_enabled_times(
         self,
         event_log: pd.DataFrame,
         set_nat_to_first_event: bool = False,
         include_enabling_activity: bool = False,
+        max_workers: Optional[int] = None,
     ):
         """
         Add the enabled time of each activity instance to the received event log based on the concurrency relations
         established in the class instance (extracted from the event log passed to the instantiation). For the first
         event on each trace, set the start of the trace as value.
 
+        The enabling activity instances of all events are searched at once: the events are sorted by case and end time,
+        and for each event a binary search gives the last event of its case ending before it, from where the search
+        steps back over the events concurrent with it.
+
         :param event_log:                   event log to add the enabled time information to.
         :param set_nat_to_first_event:      if False, use the start of the trace as enabled time for the activity
                                             instances with no previous activity enabling them, otherwise use pd.NaT.
         :param include_enabling_activity:   if True, add a column with the label of the activity enabling the current
                                             one.
+        :param max_workers:                 number of processes to split the cases over, by default only logs with at
+                                            least MIN_EVENTS_PER_WORKER events per process are split.
         """
-        # Initialize needed columns to 'obj'
-        event_log[self.log_ids.enabled_time] = None
-        if include_enabling_activity:
-            event_log[self.log_ids.enabling_activity] = None
-        # Initialize lists to write all enabled times in the log at once
-        indexes, enabled_times, enabling_activities = [], [], []
-        # Parallelize enabling information extraction by trace
-        with ProcessPoolExecutor() as executor:
-            # For each trace in the log, estimate the enabled time/activity of its events
-            handles = [
-                executor.submit(
-                    self._get_enabling_info_of_trace,
-                    trace=trace,
-                    log_ids=self.log_ids,
-                    set_nat_to_first_event=set_nat_to_first_event,
-                )
-                for _, trace in event_log.groupby(self.log_ids.case)
-            ]
-            # Recover all results
-            for handle in handles:
-                indexes_, enabled_times_, enabling_activities_ = handle.result()
-                indexes += indexes_
-                enabled_times += enabled_times_
-                enabling_activities += enabling_activities_
+        log_ids = self.log_ids
+        # Encode cases, activities, and timestamps as integer arrays
+        case_codes = pd.factorize(event_log[log_ids.case])[0]
+        activity_codes, activity_labels = pd.factorize(event_log[log_ids.activity])
+        end_times = _to_nanoseconds(event_log[log_ids.end_time])
+        start_times = _to_nanoseconds(event_log[log_ids.start_time]) if self.config.consider_start_times else None
+        # concurrent[A, B] is True if B is concurrent with A
+        concurrent = np.zeros((len(activity_labels), len(activity_labels)), dtype=bool)
+        activity_index = {activity: code for code, activity in enumerate(activity_labels)}
+        for activity, code in activity_index.items():
+            for concurrent_activity in self.concurrency.get(activity, set()):
+                if concurrent_activity in activity_index:
+                    concurrent[code, activity_index[concurrent_activity]] = True
+        # Position of the enabling activity instance of each event (-1 if none)
+        enabling_positions = _get_enabling_positions_in_chunks(
+            case_codes, activity_codes, start_times, end_times, concurrent, max_workers
+        )
+        has_enabling = enabling_positions >= 0
+        # Enabled times: end of the enabling activity instance, or trace start / NaT if none
+        event_end_times = pd.to_datetime(event_log[log_ids.end_time], utc=True)
+        enabled_times = pd.Series(
+            event_end_times.to_numpy()[enabling_positions], index=event_log.index, dtype=event_end_times.dtype
+        )
+        if set_nat_to_first_event:
+            enabled_times[~has_enabling] = pd.NaT
+        else:
+            if log_ids.start_time in event_log:
+                event_start_times = pd.to_datetime(event_log[log_ids.start_time], utc=True)
+                trace_start_times = pd.concat([event_start_times, event_end_times], axis=1).min(axis=1)
+            else:
+                trace_start_times = event_end_times
+            trace_start_times = trace_start_times.groupby(case_codes).transform("min")
+            enabled_times[~has_enabling] = trace_start_times[~has_enabling]
         # Update all trace enabled times (and enabling activities if necessary) at once
         if include_enabling_activity:
-            event_log.loc[indexes, self.log_ids.enabling_activity] = enabling_activities
-        event_log.loc[indexes, self.log_ids.enabled_time] = enabled_times
-        event_log[self.log_ids.enabled_time] = pd.to_datetime(event_log[self.log_ids.enabled_time], utc=True)
+            enabling_activities = pd.Series(
+                event_log[log_ids.activity].to_numpy()[enabling_positions], index=event_log.index, dtype=object
+            )
+            enabling_activities[~has_enabling] = pd.NA
+            event_log[log_ids.enabling_activity] = enabling_activities
+        event_log[log_ids.enabled_time] = pd.to_datetime(enabled_times, utc=True)
 
 
 class OverlappingConcurrencyOracle(ConcurrencyOracle):
     def __init__(self, event_log: pd.DataFrame, config: Configuration):
-        # Get the activity labels
-        activities = set(event_log[config.log_ids.activity])
-        # Get matrix with the frequency of each activity overlapping with the rest and in directly-follows order
-        overlapping_relations = _get_overlapping_matrix(event_log, activities, config)
+        log_ids = config.log_ids
+        # Encode the activity labels (sorted, so every pair of activities is always checked in the same direction)
+        activity_codes, activities = pd.factorize(event_log[log_ids.activity], sort=True)
+        case_codes = pd.factorize(event_log[log_ids.case])[0]
+        # Ignore events without activity label
+        is_labeled = activity_codes >= 0
+        case_codes, activity_codes = case_codes[is_labeled], activity_codes[is_labeled]
+        # Get matrix with the frequency of each activity overlapping with the rest
+        overlapping_relations = _get_overlapping_matrix(
+            case_codes,
+            activity_codes,
+            _to_nanoseconds(event_log[log_ids.start_time])[is_labeled],
+            _to_nanoseconds(event_log[log_ids.end_time])[is_labeled],
+            len(activities),
+        )
+        # Get matrix with the number of times each pair of activity instances co-occurs in a case
+        co_occurrences = _get_co_occurrence_matrix(case_codes, activity_codes, len(activities)).tocoo()
         # Create concurrency if the overlapping relations is higher than the threshold specifies
         concurrency = {activity: set() for activity in activities}
-        already_checked = set()
-        for act_a in activities:
-            # Store as already checked to avoid redundant checks
-            already_checked.add(act_a)
-            # Get the number of occurrences of A per case
-            occurrences_a = Counter(event_log[event_log[config.log_ids.activity] == act_a][config.log_ids.case])
-            for act_b in activities - already_checked:
-                # Get the number of occurrences of B per case
-                occurrences_b = Counter(event_log[event_log[config.log_ids.activity] == act_b][config.log_ids.case])
-                # Compute number of times they co-occur
-                co_occurrences = sum(
-                    [
-                        occurrences_a[case_id] * occurrences_b[case_id]
-                        for case_id in set(list(occurrences_a.keys()) + list(occurrences_b.keys()))
-                    ]
-                )
-                # Check if the proportion of overlapping occurrences is higher than the established threshold
-                if co_occurrences > 0:
-                    overlapping_ratio = overlapping_relations[act_a].get(act_b, 0) / co_occurrences
-                    if overlapping_ratio >= config.concurrency_thresholds.df:
-                        # Concurrency relation AB, add it
-                        concurrency[act_a].add(act_b)
-                        concurrency[act_b].add(act_a)
+        is_checked_pair = co_occurrences.row < co_occurrences.col
+        act_a, act_b = co_occurrences.row[is_checked_pair], co_occurrences.col[is_checked_pair]
+        # Check if the proportion of overlapping occurrences is higher than the established threshold
+        overlapping_ratios = (
+            np.asarray(overlapping_relations[act_a, act_b]).ravel() / co_occurrences.data[is_checked_pair]
+        )
+        for a, b in zip(
+            act_a[overlapping_ratios >= config.concurrency_thresholds.df],
+            act_b[overlapping_ratios >= config.concurrency_thresholds.df],
+        ):
+            # Concurrency relation AB, add it
+            concurrency[activities[a]].add(activities[b])
+            concurrency[activities[b]].add(activities[a])
         # Set flag to consider start times also when individually checking enabled time
         config.consider_start_times = True
         # Super
         super(OverlappingConcurrencyOracle, self).__init__(concurrency=concurrency, config=config)
 
 
-def _get_overlapping_matrix(event_log: pd.DataFrame, activities: set, config: Configuration) -> dict:
-    """
-    Optimized version of _get_overlapping_matrix using Polars.
+def _get_overlapping_matrix(
+    case_codes: np.ndarray,
+    activity_codes: np.ndarray,
+    start_times: np.ndarray,
+    end_times: np.ndarray,
+    num_activities: int,
+) -> sparse.csr_matrix:
     """
+    Get a sparse matrix with, for each pair of activities [A, B], the number of times an instance of B overlaps with
+    an instance of A in the same trace: B starts or ends while A is being executed, or B is executed within A.
+
+    The overlapping pairs are found with an interval self-join: sorting the events of each trace by start time, the
+    events that can overlap with an event are the ones starting after it and before its end, so each candidate pair
+    is a contiguous range of the sorted events. The candidate pairs are expanded in chunks of at most
+    MAX_CANDIDATE_PAIRS_PER_CHUNK pairs and checked in both directions.
+
+    :param case_codes:      integer code of the case of each event.
+    :param activity_codes:  integer code (between 0 and [num_activities]) of the activity of each event.
+    :param start_times:     start time (ns) of each event.
+    :param end_times:       end time (ns) of each event.
+    :param num_activities:  number of activities.
 
-    ####
-    def most_frequent_dtype(column):
-        # Count the occurrences of each data type
-        dtype_counts = column.apply(type).value_counts()
-        # Get the most frequent data type
-        most_frequent_dtype = dtype_counts.idxmax()
-        return most_frequent_dtype
-
-    # Loop through each column and convert values to the most frequent data type
-    for column in event_log.columns:
-        # print(column)
-        most_common_dtype = most_frequent_dtype(event_log[column])
-        # print(most_common_dtype)
-        if most_common_dtype != pd.Timestamp:
-            event_log[column] = event_log[column].astype(most_common_dtype)
-    ####
-
-    # Translate pandas DataFrame to polars DataFrame
-    event_log_rs = pl.from_pandas(event_log)
-    # Initialize dictionary for overlapping relations df_count[A][B] = number of times B overlaps with A
-    overlapping_relations = {activity: {} for activity in activities}
-    # Count overlapping relations
-    for _, trace in event_log_rs.groupby(config.log_ids.case):
-        # For each event in the trace
-        for event in trace.iter_rows(named=True):
-            event_start_time = event[config.log_ids.start_time]
-            event_end_time = event[config.log_ids.end_time]
-            event_activity = event[config.log_ids.activity]
-            current_activity = event_activity
-            # Get labels of overlapping activity instances
-            overlapping_labels = trace.filter(
+    :return: a sparse [num_activities] x [num_activities] matrix with the overlapping counts.
+    """
+    num_events = len(case_codes)
+    overlapping_relations = sparse.csr_matrix((num_activities, num_activities), dtype=np.int64)
+    if num_events == 0:
+        return overlapping_relations
+    # Sort by case and start time, and combine both in one sortable key
+    order = np.lexsort((np.arange(num_events), start_times, case_codes))
+    case_codes, activity_codes = case_codes[order], activity_codes[order]
+    start_times, end_times = start_times[order], end_times[order]
+    unique_start_times = np.unique(start_times)
+    key_factor = len(unique_start_times) + 1
+    sorted_keys = case_codes * key_factor + np.searchsorted(unique_start_times, start_times)
+    # The candidates of each event are the next events of its case starting before (or at) its end
+    first_candidates = np.arange(1, num_events + 1)
+    last_candidates = np.searchsorted(
+        sorted_keys,
+        case_codes * key_factor + np.searchsorted(unique_start_times, end_times, side="right"),
+        side="left",
+    )
+    num_candidates = np.maximum(last_candidates - first_candidates, 0)
+    # Expand the candidate pairs in chunks of events, to bound the memory used
+    cumulative_candidates = np.cumsum(num_candidates)
+    chunk_bounds = np.searchsorted(
+        cumulative_candidates,
+        np.arange(MAX_CANDIDATE_PAIRS_PER_CHUNK, cumulative_candidates[-1], MAX_CANDIDATE_PAIRS_PER_CHUNK),
+        side="right",
+    )
+    chunk_bounds = np.unique(np.concatenate([[0], chunk_bounds, [num_events]]))
+    for chunk_start, chunk_end in zip(chunk_bounds[:-1], chunk_bounds[1:]):
+        chunk_candidates = num_candidates[chunk_start:chunk_end]
+        events = np.repeat(np.arange(chunk_start, chunk_end), chunk_candidates)
+        # Offset of each pair within the candidates of its event
+        offsets = np.arange(len(events)) - np.repeat(np.cumsum(chunk_candidates) - chunk_candidates, chunk_candidates)
+        others = first_candidates[events] + offsets
+        for current, other in ((events, others), (others, events)):
+            is_overlapping = (
                 (
-                    (pl.col(config.log_ids.start_time) < event_start_time)  # The current event starts while the other
-                    & (event_start_time < pl.col(config.log_ids.end_time))
+                    (start_times[other] < start_times[current])  # The current event starts while the other
+                    & (start_times[current] < end_times[other])
                 )  # is being executed; OR
                 | (
-                    (pl.col(config.log_ids.start_time) < event_end_time)  # the current event ends while the other
-                    & (event_end_time < pl.col(config.log_ids.end_time))
+                    (start_times[other] < end_times[current])  # the current event ends while the other
+                    & (end_times[current] < end_times[other])
                 )  # is being executed; OR
                 | (
-                    (event_start_time <= pl.col(config.log_ids.start_time))  # the other event starts and
-                    & (pl.col(config.log_ids.end_time) <= event_end_time)  # ends within the current one, and
-                    & (pl.col(config.log_ids.activity) != event_activity)
+                    (start_times[current] <= start_times[other])  # the other event starts and
+                    & (end_times[other] <= end_times[current])  # ends within the current one, and
+                    & (activity_codes[other] != activity_codes[current])
                 )  # it's not the current one.
-            )[config.log_ids.activity].to_list()
-            for overlapping_activity in overlapping_labels:
-                overlapping_relations[current_activity][overlapping_activity] = (
-                    overlapping_relations[current_activity].get(overlapping_activity, 0) + 1
-                )
+            )
+            overlapping_relations += sparse.csr_matrix(
+                (
+                    np.ones(is_overlapping.sum(), dtype=np.int64),
+                    (activity_codes[current[is_overlapping]], activity_codes[other[is_overlapping]]),
+                ),
+                shape=(num_activities, num_activities),
+            )
     # Return matrix with dependency values
     return overlapping_relations
+
+
+def _get_co_occurrence_matrix(case_codes: np.ndarray, activity_codes: np.ndarray, num_activities: int):
+    """
+    Get a sparse matrix with, for each pair of activities [A, B], the number of pairs of an instance of A and an
+    instance of B in the same case (the sum over the cases of the occurrences of A times the occurrences of B).
+    """
+    num_cases = case_codes.max() + 1 if len(case_codes) > 0 else 0
+    occurrences = sparse.csr_matrix(
+        (np.ones(len(case_codes), dtype=np.int64), (case_codes, activity_codes)),
+        shape=(num_cases, num_activities),
+    )
+    return (occurrences.T @ occurrences).tocsr()
+
+
+def _to_nanoseconds(timestamps: pd.Series) -> np.ndarray:
+    return pd.to_datetime(timestamps, utc=True).dt.tz_convert(None).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+
+
+def _get_enabling_positions_in_chunks(case_codes, activity_codes, start_times, end_times, concurrent, max_workers):
+    """
+    Runs _get_enabling_positions over chunks of whole cases in parallel processes, or at once for small logs.
+    """
+    num_events = len(case_codes)
+    if max_workers is None:
+        max_workers = min(os.cpu_count() or 1, num_events // MIN_EVENTS_PER_WORKER)
+    num_cases = case_codes.max() + 1 if num_events > 0 else 0
+    num_chunks = min(max_workers, num_cases)
+    if num_chunks <= 1:
+        return _get_enabling_positions(case_codes, activity_codes, start_times, end_times, concurrent)
+
+    # Split the cases in contiguous ranges of case codes, only plain arrays are sent to the workers
+    chunk_ids = case_codes * num_chunks // num_cases
+    chunk_indexes = [np.flatnonzero(chunk_ids == chunk_id) for chunk_id in range(num_chunks)]
+    enabling_positions = np.full(num_events, -1, dtype=np.int64)
+    # Spawn the workers, forking a process that already used polars (e.g. in the discovery) can deadlock
+    with ProcessPoolExecutor(max_workers=num_chunks, mp_context=multiprocessing.get_context("spawn")) as executor:
+        handles = [
+            executor.submit(
+                _get_enabling_positions,
+                case_codes[indexes],
+                activity_codes[indexes],
+                start_times[indexes] if start_times is not None else None,
+                end_times[indexes],
+                concurrent,
+            )
+            for indexes in chunk_indexes
+        ]
+        for indexes, handle in zip(chunk_indexes, handles):
+            chunk_positions = handle.result()
+            # Translate the positions within the chunk to positions within the log
+            enabling_positions[indexes] = np.where(chunk_positions >= 0, indexes[chunk_positions], -1)
+    return enabling_positions
+
+
+def _get_enabling_positions(
+    case_codes: np.ndarray,
+    activity_codes: np.ndarray,
+    start_times: Optional[np.ndarray],
+    end_times: np.ndarray,
+    concurrent: np.ndarray,
+) -> np.ndarray:
+    """
+    Get the position of the enabling activity instance of each event: the event of the same case with the latest end
+    time before the end of the event (and before its start if [start_times] is given) which activity is not concurrent
+    with the activity of the event. If several events end at that time, the first one in the log is the enabling one.
+
+    :param case_codes:      integer code of the case of each event.
+    :param activity_codes:  integer code of the activity of each event.
+    :param start_times:     start time (ns) of each event, or None to not consider the start times.
+    :param end_times:       end time (ns) of each event.
+    :param concurrent:      boolean matrix, [A, B] is True if activity B is concurrent with activity A.
+
+    :return: an array with the position of the enabling event of each event, or -1 if none.
+    """
+    num_events = len(case_codes)
+    if num_events == 0:
+        return np.empty(0, dtype=np.int64)
+    # Sort by case and end time (stable w.r.t. the position in the log)
+    order = np.lexsort((np.arange(num_events), end_times, case_codes))
+    sorted_activities = activity_codes[order]
+    sorted_end_times = end_times[order]
+    # Combine case and end time rank in one sortable key
+    unique_end_times = np.unique(end_times)
+    key_factor = len(unique_end_times) + 1
+    sorted_keys = case_codes[order] * key_factor + np.searchsorted(unique_end_times, sorted_end_times)
+    # Rank of the latest end time allowed for the enabling event: before the end (and the start) of the event
+    bound_ranks = np.searchsorted(unique_end_times, end_times, side="left")
+    if start_times is not None:
+        bound_ranks = np.minimum(bound_ranks, np.searchsorted(unique_end_times, start_times, side="right"))
+    # Binary search for the first event of each case, and the last event ending before the bound
+    case_starts = np.searchsorted(sorted_keys, case_codes * key_factor, side="left")
+    candidates = np.searchsorted(sorted_keys, case_codes * key_factor + bound_ranks, side="left") - 1
+    # Step back over the candidates concurrent with the event
+    pending = np.flatnonzero(candidates >= case_starts)
+    while len(pending) > 0:
+        is_concurrent = concurrent[activity_codes[pending], sorted_activities[candidates[pending]]]
+        pending = pending[is_concurrent]
+        candidates[pending] -= 1
+        pending = pending[candidates[pending] >= case_starts[pending]]
+    candidates[candidates < case_starts] = -1
+    # Among the non-concurrent events with the same end time, take the first one in the log
+    probes = candidates - 1
+    pending = np.flatnonzero(
+        (candidates >= 0) & (probes >= case_starts) & (sorted_end_times[probes] == sorted_end_times[candidates])
+    )
+    while len(pending) > 0:
+        is_enabling = ~concurrent[activity_codes[pending], sorted_activities[probes[pending]]]
+        candidates[pending[is_enabling]] = probes[pending[is_enabling]]
+        probes[pending] -= 1
+        pending = pending[
+            (probes[pending] >= case_starts[pending])
+            & (sorted_end_times[probes[pending]] == sorted_end_times[candidates[pending]])
+        ]
+    # Translate sorted positions to positions in the log
+    return np.where(candidates >= 0, order[candidates], -1)
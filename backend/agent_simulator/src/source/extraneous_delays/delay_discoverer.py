@@ -2,6 +2,7 @@ from typing import Callable
 from typing import Tuple
 from typing import Union
 
+import numpy as np
 import pandas as pd
 from source.arrival_distribution import get_best_fitting_distribution
 from source.extraneous_delays.availability import absolute_unavailability_intervals_within
@@ -11,6 +12,7 @@ from source.extraneous_delays.config import Configuration
 from source.extraneous_delays.config import TimerPlacement
 from source.extraneous_delays.event_log import EventLogIDs
 from source.extraneous_delays.resource_availability import CalendarResourceAvailability
+from source.extraneous_delays.resource_availability import to_datetime64
 
 
 def compute_naive_extraneous_activity_delays(
@@ -168,35 +170,46 @@ def _extend_log_with_first_last_available(event_log: pd.DataFrame, log_ids: Even
     for resource, events in event_log.groupby(log_ids.resource):
         # Initialize resource working calendar if existing
         calendar = config.working_schedules[resource] if resource in config.working_schedules else None
-        indexes, first_available, last_available = [], [], []
-        for index, event in events.iterrows():
+        start_times, end_times = list(events[log_ids.start_time]), list(events[log_ids.end_time])
+        enabled_times = list(events[log_ids.enabled_time])
+        # Sort the events of the resource by end and by start, so the events performed in the waiting time of
+        # each event are two contiguous ranges that can be found with a binary search
+        start_times_64 = to_datetime64(events[log_ids.start_time])
+        end_times_64 = to_datetime64(events[log_ids.end_time])
+        enabled_times_64 = to_datetime64(events[log_ids.enabled_time])
+        by_end, by_start = np.argsort(end_times_64, kind="stable"), np.argsort(start_times_64, kind="stable")
+        sorted_end_times, sorted_start_times = end_times_64[by_end], start_times_64[by_start]
+        # Events ending after the enablement and not after the start of each event
+        first_ending = np.searchsorted(sorted_end_times, enabled_times_64, side="right")
+        last_ending = np.searchsorted(sorted_end_times, start_times_64, side="right")
+        # Events starting not before the enablement and before the start of each event
+        first_starting = np.searchsorted(sorted_start_times, enabled_times_64, side="left")
+        last_starting = np.searchsorted(sorted_start_times, start_times_64, side="left")
+        first_available, last_available = [], []
+        for i in range(len(events)):
+            if pd.isna(enabled_times[i]):
+                # Not enabled by any other activity instance, no waiting time
+                first_available += [pd.NaT]
+                last_available += [pd.NaT]
+                continue
             # Get activity instances performed by the same resource happening in its waiting time
-            performed_events = events[
-                (
-                    (event[log_ids.enabled_time] < events[log_ids.end_time])
-                    & (events[log_ids.end_time] <= event[log_ids.start_time])
-                )
-                | (
-                    (event[log_ids.enabled_time] <= events[log_ids.start_time])
-                    & (events[log_ids.start_time] < event[log_ids.start_time])
-                )
-            ]
+            performed_events = set(by_end[first_ending[i] : last_ending[i]])
+            performed_events.update(by_start[first_starting[i] : last_starting[i]])
             # If the resource has a calendar associated, get off-duty intervals happening in its waiting time
             if calendar:
                 resource_off_duty = absolute_unavailability_intervals_within(
-                    start=event[log_ids.enabled_time],
-                    end=event[log_ids.start_time],
+                    start=enabled_times[i],
+                    end=start_times[i],
                     schedule=calendar,
                 )
             else:
                 resource_off_duty = []
             # Get first and last availability instants
-            indexes += [index]
             first_instant, last_instant = _get_first_and_last_available(
-                beginning=event[log_ids.enabled_time],
-                end=event[log_ids.start_time],
-                starts=list(performed_events[log_ids.start_time]) + [interval.start for interval in resource_off_duty],
-                ends=list(performed_events[log_ids.end_time]) + [interval.end for interval in resource_off_duty],
+                beginning=enabled_times[i],
+                end=start_times[i],
+                starts=[start_times[j] for j in performed_events] + [interval.start for interval in resource_off_duty],
+                ends=[end_times[j] for j in performed_events] + [interval.end for interval in resource_off_duty],
                 time_gap=config.time_gap,
                 extrapolate=config.extrapolate_complex_delays_estimation,
             )
@@ -206,11 +219,11 @@ def _extend_log_with_first_last_available(event_log: pd.DataFrame, log_ids: Even
                 last_available += [last_instant]
             else:
                 # Busy during all the waiting time, set start time as availability
-                first_available += [event[log_ids.start_time]]
-                last_available += [event[log_ids.start_time]]
+                first_available += [start_times[i]]
+                last_available += [start_times[i]]
         # Set first and last available times for all events of this resource
-        event_log.loc[indexes, "first_available"] = first_available
-        event_log.loc[indexes, "last_available"] = last_available
+        event_log.loc[events.index, "first_available"] = first_available
+        event_log.loc[events.index, "last_available"] = last_available
     # Convert columns to Timestamp
     event_log["first_available"] = pd.to_datetime(event_log["first_available"], utc=True)
     event_log["last_available"] = pd.to_datetime(event_log["last_available"], utc=True)
@@ -244,16 +257,10 @@ def _get_first_and_last_available(
     # Add beginning and end of interval as artificial instant activities
     starts += [beginning, end]
     ends += [beginning, end]
-    # Store the start and ends in a list of dicts
-    times = (
-        pd.DataFrame(
-            {
-                "time": starts + ends,
-                "type": ["start"] * len(starts) + ["end"] * len(ends),
-            }
-        )
-        .sort_values(["time", "type"], ascending=[True, False])
-        .values.tolist()
+    # Store the start and ends in a list sorted by time, with the starts before the ends at the same time
+    times = sorted(
+        [[time, "start"] for time in starts] + [[time, "end"] for time in ends],
+        key=lambda instant: (instant[0], instant[1] == "end"),
     )
     first_available = None
     last_available = None
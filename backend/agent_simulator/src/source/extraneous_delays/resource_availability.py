@@ -1,5 +1,6 @@
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 from source.extraneous_delays.availability import get_last_available_timestamp
 from source.extraneous_delays.concurrency_oracle import Configuration
@@ -15,35 +16,53 @@ class ResourceAvailability:
         self.config = config
         # Set log IDs to ease access within class
         self.log_ids = config.log_ids
+        # Sorted end times of each resource, to binary search the latest end previous to an instant
+        self._sorted_end_times = {}
+        for resource, end_times in performed_events.items():
+            sorted_end_times = end_times.dropna().sort_values()
+            self._sorted_end_times[resource] = (sorted_end_times, to_datetime64(sorted_end_times))
 
     def available_since(self, resource: str, event) -> datetime:
         # Get the end timestamp of the previous activity instance executed by the same resource
         if resource == self.config.missing_resource:
             # If the resource is missing return pd.NaT
-            timestamp_previous_event = pd.NaT
+            return pd.NaT
         elif resource in self.config.bot_resources:
             # If the resource has been marked as 'bot resource', return the same timestamp
-            timestamp_previous_event = event[self.log_ids.end_time]
+            return event[self.log_ids.end_time]
         else:
             # If existing resource, take the latest timestamp previous to [timestamp]
-            resource_events = self.performed_events[resource]
-            timestamp_previous_event = resource_events.where(
-                (resource_events < event[self.log_ids.end_time])
-                & ((not self.config.consider_start_times) or (resource_events <= event[self.log_ids.start_time]))
-            ).max()
-            if pd.isna(timestamp_previous_event):
-                timestamp_previous_event = pd.NaT
-            # If there are non-working periods from the latest previous
-            # end timestamp, take the end of the last non-working period
-            if resource in self.working_schedules:
-                activity_start = (
-                    event[self.log_ids.start_time] if self.config.consider_start_times else event[self.log_ids.end_time]
-                )
-                timestamp_previous_event = get_last_available_timestamp(
-                    start=timestamp_previous_event, end=activity_start, schedule=self.working_schedules[resource]
+            start_times = pd.Series([event[self.log_ids.start_time]]) if self.config.consider_start_times else None
+            return self._available_since(resource, pd.Series([event[self.log_ids.end_time]]), start_times)[0]
+
+    def _available_since(self, resource, end_times: pd.Series, start_times: pd.Series = None) -> list:
+        """
+        Get, for each of the activity instances ending at [end_times] (and starting at [start_times]), the instant since
+        when [resource] is available: the latest end of its activity instances before the end (and start if considering
+        start times) of the activity instance, moved to the end of the last non-working period if any.
+        """
+        sorted_end_times, sorted_end_times_64 = self._sorted_end_times.get(str(resource), (pd.Series(dtype=object), []))
+        # Number of end times before each activity instance, the previous end time is the last one of them
+        num_previous = np.searchsorted(sorted_end_times_64, to_datetime64(end_times), side="left")
+        if start_times is not None:
+            num_previous = np.minimum(
+                num_previous, np.searchsorted(sorted_end_times_64, to_datetime64(start_times), side="right")
+            )
+            num_previous[pd.isna(start_times).to_numpy()] = 0
+        # No previous end time for missing timestamps
+        num_previous[pd.isna(end_times).to_numpy()] = 0
+        previous_end_times = [sorted_end_times.iloc[i - 1] if i > 0 else pd.NaT for i in num_previous]
+        # If there are non-working periods from the latest previous
+        # end timestamp, take the end of the last non-working period
+        if resource in self.working_schedules:
+            activity_starts = start_times if start_times is not None else end_times
+            previous_end_times = [
+                get_last_available_timestamp(
+                    start=previous_end_time, end=activity_start, schedule=self.working_schedules[resource]
                 )
-        # Return previous timestamp where the resource became available
-        return timestamp_previous_event
+                for previous_end_time, activity_start in zip(previous_end_times, activity_starts)
+            ]
+        return previous_end_times
 
     def add_resource_availability_times(self, event_log: pd.DataFrame):
         """
@@ -54,15 +73,21 @@ class ResourceAvailability:
         """
         # Initialize column to 'obj'
         event_log[self.log_ids.available_time] = None
-        # For each trace in the log, estimate the enabled time of its events
+        # For each resource in the log, get the availability times of all its events at once
         indexes = []
         resource_availability_times = []
-        for case_id, trace in event_log.groupby(self.log_ids.case):
-            # Get the resource availability times
-            for index, event in trace.iterrows():
-                indexes += [index]
-                resource_availability_time = self.available_since(event[self.log_ids.resource], event)
-                resource_availability_times += [resource_availability_time]
+        for resource, events in event_log.groupby(self.log_ids.resource, dropna=False):
+            indexes += list(events.index)
+            if resource == self.config.missing_resource:
+                resource_availability_times += [pd.NaT] * len(events)
+            elif resource in self.config.bot_resources:
+                resource_availability_times += list(events[self.log_ids.end_time])
+            else:
+                resource_availability_times += self._available_since(
+                    resource,
+                    events[self.log_ids.end_time],
+                    events[self.log_ids.start_time] if self.config.consider_start_times else None,
+                )
         # Set all enabled times at once
         event_log.loc[indexes, self.log_ids.available_time] = resource_availability_times
         event_log[self.log_ids.available_time] = pd.to_datetime(event_log[self.log_ids.available_time], utc=True)
@@ -71,12 +96,7 @@ class ResourceAvailability:
 class SimpleResourceAvailability(ResourceAvailability):
     def __init__(self, event_log: pd.DataFrame, config: Configuration):
         # Create a dictionary with the resources as key and all its end events as value
-        resources = {str(i) for i in event_log[config.log_ids.resource].unique()}
-        resources_calendar = {}
-        for resource in resources - config.bot_resources:
-            resources_calendar[resource] = event_log[event_log[config.log_ids.resource] == resource][
-                config.log_ids.end_time
-            ]
+        resources_calendar = _get_end_times_per_resource(event_log, config)
         # Super
         super(SimpleResourceAvailability, self).__init__(resources_calendar, {}, config)
 
@@ -84,11 +104,27 @@ class SimpleResourceAvailability(ResourceAvailability):
 class CalendarResourceAvailability(ResourceAvailability):
     def __init__(self, event_log: pd.DataFrame, config: Configuration):
         # Create a dictionary with the resources as key and all its end events as value
-        resources = {str(i) for i in event_log[config.log_ids.resource].unique()}
-        resources_calendar = {}
-        for resource in resources - config.bot_resources:
-            resources_calendar[resource] = event_log[event_log[config.log_ids.resource] == resource][
-                config.log_ids.end_time
-            ]
+        resources_calendar = _get_end_times_per_resource(event_log, config)
         # Super
         super(CalendarResourceAvailability, self).__init__(resources_calendar, config.working_schedules, config)
+
+
+def _get_end_times_per_resource(event_log: pd.DataFrame, config: Configuration) -> dict:
+    """
+    Get a dictionary with the resources (as string) as key and the end times of all their events as value.
+    """
+    return {
+        str(resource): end_times
+        for resource, end_times in event_log.groupby(config.log_ids.resource)[config.log_ids.end_time]
+        if str(resource) not in config.bot_resources
+    }
+
+
+def to_datetime64(timestamps: pd.Series) -> np.ndarray:
+    """
+    Convert the timestamps to a (UTC) datetime64 array that can be binary searched.
+    """
+    timestamps = pd.to_datetime(timestamps)
+    if getattr(timestamps.dt, "tz", None) is not None:
+        timestamps = timestamps.dt.tz_convert(None)
+    return timestamps.to_numpy(dtype="datetime64[ns]")
@@ -2,8 +2,6 @@ import json
 import random
 from collections import defaultdict
 
-import networkx as nx
-from pyvis.network import Network
 from source.agent_types.calendar_discovery_parameters import int_week_days
 
 # NOTE: TODO: This entire file is taken from PHD student Elizabeth's code that was given to us.
@@ -36,6 +34,7 @@ def get_edges_between_agents(agents, agent_transition_probabilities):
 
 def get_agent_with_highes_transition_probability(agents, agent_transition_probabilities):
     edges = []
+    seen_edges = set()
     for agent in agents:
         for activity, transtion_agents_dict in agent_transition_probabilities[agent].items():
             max_probability = 0.0
@@ -77,7 +76,8 @@ def get_agent_with_highes_transition_probability(agents, agent_transition_probab
                 transition_activity,
                 max_probability,
             )
-            if edge not in edges:
+            if edge not in seen_edges:
+                seen_edges.add(edge)
                 edges.append(edge)
     return edges
 
@@ -89,13 +89,13 @@ def generate_random_color():
 
 
 def get_agent_for_role(agents, roles):
-    agent_to_roles = {}
-    for agent in agents:
-        for role, agents_dict in roles.items():
-            if int(agent) in agents_dict["agents"]:
-                agent_to_roles[agent] = role
-                break
-    return agent_to_roles
+    # An agent belongs to the first role listing it
+    role_of_agent = {}
+    for role, agents_dict in roles.items():
+        for agent in agents_dict["agents"]:
+            role_of_agent.setdefault(agent, role)
+
+    return {agent: role_of_agent[int(agent)] for agent in agents if int(agent) in role_of_agent}
 
 
 def get_string_calendar(agent, resource_calendars):
@@ -231,21 +231,37 @@ def get_all_activities_for_role_as_string(agents, target_role, agent_for_role, a
 
 
 def get_starting_agents(transition_probabilities, starting_activity):
-    starting_agents = []
-    for agent, transition_activities in transition_probabilities.items():
-        for transition_activity, proabilities_dict in transition_activities.items():
-            if transition_activity == starting_activity:
-                starting_agents.append(str(agent))
-
-    return starting_agents
-
-
-def get_activity_flow_for_starting_agent(agents, transition_probabilities, starting_activity):
-    all_edges_sorted_by_probability = sorted(
-        get_edges_between_agents(agents, transition_probabilities),
-        key=lambda x: x[4],
-        reverse=True,
-    )
+    return [
+        str(agent)
+        for agent, transition_activities in transition_probabilities.items()
+        if starting_activity in transition_activities
+    ]
+
+
+def get_handover_index(edges):
+    """
+    Indexes the edges between agents (see get_edges_between_agents) by their source agent and activity,
+    the handovers (target agent, target activity) of every source are sorted by decreasing probability.
+    """
+    handovers = defaultdict(list)
+    for start_resource, end_resource, activity, trans_activity, probability in sorted(
+        edges, key=lambda x: x[4], reverse=True
+    ):
+        handovers[(start_resource, activity)].append((end_resource, trans_activity))
+    return handovers
+
+
+def get_activity_flow_for_starting_agent(agents, transition_probabilities, starting_activity, edges=None):
+    """
+    Returns for every agent performing the starting activity the most likely flow of activities,
+    following the most probable handover to an activity that is not in the flow yet until the end of the case.
+
+    Args:
+        edges (list): Optional, the edges between the agents if already computed, see get_edges_between_agents.
+    """
+    if edges is None:
+        edges = get_edges_between_agents(agents, transition_probabilities)
+    handovers = get_handover_index(edges)
     starting_agents = get_starting_agents(transition_probabilities, starting_activity)
     activity_flow_for_agent = {}
 
@@ -253,16 +269,14 @@ def get_activity_flow_for_starting_agent(agents, transition_probabilities, start
         flow = [current_activity]
         while current_activity != "zzz_end":
             next_edge = None
-            for edge in all_edges_sorted_by_probability:
-                start_resource, end_resource, activity, trans_activity, probability = edge
-                if start_resource == current_agent and activity == current_activity:
-                    if trans_activity not in visited_activities or trans_activity == "zzz_end":
-                        next_edge = edge
-                        break
+            for end_resource, trans_activity in handovers.get((current_agent, current_activity), ()):
+                if trans_activity not in visited_activities or trans_activity == "zzz_end":
+                    next_edge = (end_resource, trans_activity)
+                    break
             if not next_edge:
                 break
 
-            start_resource, end_resource, activity, trans_activity, probability = next_edge
+            end_resource, trans_activity = next_edge
 
             flow.append(trans_activity)
             current_agent, current_activity = end_resource, trans_activity
@@ -305,12 +319,6 @@ def create_interactive_network(discovered_simulation_parameters, starting_activi
     # if agent_transition_probabilities is None:
     #     agent_transition_probabilities = discovered_simulation_parameters["agent_transition_probabilities_autonomous"]
 
-    activity_flow_for_starting_agent = get_activity_flow_for_starting_agent(
-        list(agent_transition_probabilities.keys()),
-        agent_transition_probabilities,
-        starting_activity,
-    )
-
     agents = [str(agent) for agent in agent_transition_probabilities.keys()]
 
     # Get agent network data
@@ -318,8 +326,17 @@ def create_interactive_network(discovered_simulation_parameters, starting_activi
         list(agent_transition_probabilities.keys()), agent_transition_probabilities
     )
 
-    edges_between_agents_max_probability = get_agent_with_highes_transition_probability(
-        list(agent_transition_probabilities.keys()), agent_transition_probabilities
+    edges_between_agents_max_probability = set(
+        get_agent_with_highes_transition_probability(
+            list(agent_transition_probabilities.keys()), agent_transition_probabilities
+        )
+    )
+
+    activity_flow_for_starting_agent = get_activity_flow_for_starting_agent(
+        list(agent_transition_probabilities.keys()),
+        agent_transition_probabilities,
+        starting_activity,
+        edges_between_agents,
     )
 
     # Get role network data
@@ -346,29 +363,7 @@ def create_interactive_network(discovered_simulation_parameters, starting_activi
 
     get_average_completion_time_per_activity(activity_duration_dict)
 
-    # Create agent network
-    g = nx.DiGraph()
-
-    for agent in agents:
-        g.add_node(
-            agent,
-            role=agent_for_role.get(agent, "Unknown"),
-        )
-    g.add_edges_from(
-        [
-            (source, target, {"activity": activity, "probability": probability})
-            for source, target, activity, trans_activity, probability in edges_between_agents
-        ]
-    )
-
-    net = Network(
-        directed=True,
-        cdn_resources="remote",
-        height="100%",
-        width="100%",
-        notebook=True,
-    )
-
+    # The agent network is drawn by the frontend from the nodes and edges returned below
     # Organize agent nodes by role
     roles_to_agents = defaultdict(list)
 
@@ -502,26 +497,12 @@ def create_interactive_network(discovered_simulation_parameters, starting_activi
             "size": 25,
         }
         activity_nodes_data.append(activity_node)
-        net.add_node(
-            n_id=activity_node["id"],
-            title=activity_node["title"],
-            color=activity_node["color"],
-            label=activity_node["label"],
-            x=activity_node["x"],
-            y=activity_node["y"],
-            fixed=activity_node["fixed"],
-            shape=activity_node["shape"],
-            size=activity_node["size"],
-        )
 
     # Prepare agent edges
     agent_edges_data = []
     edge_id_count = defaultdict(int)
     for source, target, activity, trans_activity, probability in edges_between_agents:
-        is_max_prob = any(
-            (source, target, activity, trans_activity, prob) in edges_between_agents_max_probability
-            for prob in [probability]
-        )
+        is_max_prob = (source, target, activity, trans_activity, probability) in edges_between_agents_max_probability
 
         edge_id_base = f"{source}-{target}-{activity}"
         edge_id_count[edge_id_base] += 1
@@ -648,17 +629,6 @@ def create_interactive_network(discovered_simulation_parameters, starting_activi
             }
             activity_edges_data.append(edge_data)
 
-            net.add_edge(
-                source=edge_data["from"],
-                to=edge_data["to"],
-                id=edge_data["id"],
-                smooth=edge_data["smooth"],
-                arrows=edge_data["arrows"],
-                color=edge_data["color"],
-                label=edge_data["label"],
-                probability=edge_data["probability"],
-            )
-
     process_start_edge = {
         "id": "activity_Process Start-activity_" + starting_activity,
         "from": "activity_Process Start",
@@ -671,39 +641,15 @@ def create_interactive_network(discovered_simulation_parameters, starting_activi
 
     activity_edges_data.append(process_start_edge)
 
-    net.add_edge(
-        source=process_start_edge["from"],
-        to=process_start_edge["to"],
-        id=process_start_edge["id"],
-        smooth=process_start_edge["smooth"],
-        arrows=process_start_edge["arrows"],
-        color=process_start_edge["color"],
-        label=process_start_edge["label"],
-    )
-
-    options = {
-        "layout": {"improvedLayout": True, "hierarchical": {"enabled": False}},
-        "physics": {"enabled": False},
-        "edges": {
-            "arrows": {"to": {"enabled": True, "scaleFactor": 0.4}},
-            "smooth": {"enabled": True, "type": "curvedCW", "roundness": 0.1},
-            "selfReference": {"size": 20, "angle": 0.7853981634},
-            "color": {"inherit": "from"},
-        },
-        "margin": {"right": 300},
-    }
-
-    net.set_options(json.dumps(options))
-
-    # Pass role network data to JavaScript
-    agent_nodes_json = json.dumps(agent_nodes_data)
-    agent_edges_json = json.dumps(agent_edges_data)
-    role_nodes_json = json.dumps(role_nodes_data)
-    role_edges_json = json.dumps(role_edges_data)
-    activity_nodes_json = json.dumps(activity_nodes_data)
-    activity_edges_json = json.dumps(activity_edges_data)
+    # Pass role network data to JavaScript (compact, the json is parsed by the frontend)
+    agent_nodes_json = json.dumps(agent_nodes_data, separators=(",", ":"))
+    agent_edges_json = json.dumps(agent_edges_data, separators=(",", ":"))
+    role_nodes_json = json.dumps(role_nodes_data, separators=(",", ":"))
+    role_edges_json = json.dumps(role_edges_data, separators=(",", ":"))
+    activity_nodes_json = json.dumps(activity_nodes_data, separators=(",", ":"))
+    activity_edges_json = json.dumps(activity_edges_data, separators=(",", ":"))
 
-    activity_flow_json = json.dumps(activity_flow_for_starting_agent)
+    activity_flow_json = json.dumps(activity_flow_for_starting_agent, separators=(",", ":"))
 
     return {
         "agent_nodes": agent_nodes_json,
@@ -205,6 +205,24 @@ def calculate_agent_handover_probabilities_per_activity(df):
             Dictionary containing handover probabilities from each agent-activity pair
             to every other agent-activity pair.
     """
+    return handover_probabilities_from_counts(count_agent_handovers_per_activity(df))
+
+
+def count_agent_handovers_per_activity(df):
+    """
+    For counting the handovers between agents per activity pair within the cases of the log.
+    The counts of logs with disjoint cases can be added (see source/discovery_statistics.py).
+
+    Parameters:
+        -----------
+        df : pandas df
+            The training log.
+
+        Returns:
+        --------
+        transition_counts : dict
+            Nested dictionary agent_from -> activity_from -> agent_to -> activity_to -> count.
+    """
     # Convert end_timestamp to datetime
     df["end_timestamp"] = pd.to_datetime(df["end_timestamp"], format="mixed")
 
@@ -217,50 +235,38 @@ def calculate_agent_handover_probabilities_per_activity(df):
     # Initialize transition count dictionary
     transition_counts = {}
 
-    # Initialize agent-activity counts dictionary
-    agent_activity_counts = {}
-
     # Iterate over groups
     for _, group in grouped:
         agents = group["agent"].tolist()
         activities = group["activity_name"].tolist()
 
         for i in range(len(agents) - 1):
-            # Create transition tuple with (from_agent, from_activity, to_agent, to_activity)
-            transition = (agents[i], activities[i], agents[i + 1], activities[i + 1])
+            # Create nested dictionaries if they don't exist
+            to_counts = transition_counts.setdefault(agents[i], {}).setdefault(activities[i], {})
+            to_counts = to_counts.setdefault(agents[i + 1], {})
 
             # Update transition counts
-            if transition in transition_counts:
-                transition_counts[transition] += 1
-            else:
-                transition_counts[transition] = 1
-
-            # Update agent-activity counts
-            agent_activity_key = (agents[i], activities[i])
-            if agent_activity_key in agent_activity_counts:
-                agent_activity_counts[agent_activity_key] += 1
-            else:
-                agent_activity_counts[agent_activity_key] = 1
-
-    # Initialize transition probabilities dictionary
-    transition_probabilities = {}
+            to_counts[activities[i + 1]] = to_counts.get(activities[i + 1], 0) + 1
 
-    # Calculate transition probabilities
-    for transition, count in transition_counts.items():
-        agent_from, activity_from, agent_to, activity_to = transition
+    return transition_counts
 
-        # Create nested dictionaries if they don't exist
-        if agent_from not in transition_probabilities:
-            transition_probabilities[agent_from] = {}
-        if activity_from not in transition_probabilities[agent_from]:
-            transition_probabilities[agent_from][activity_from] = {}
-        if agent_to not in transition_probabilities[agent_from][activity_from]:
-            transition_probabilities[agent_from][activity_from][agent_to] = {}
 
-        # Calculate probability: count(from_agent, from_activity, to_agent, to_activity) / count(from_agent, from_activity)
-        agent_activity_count = agent_activity_counts[(agent_from, activity_from)]
-        transition_probabilities[agent_from][activity_from][agent_to][activity_to] = count / agent_activity_count
+def handover_probabilities_from_counts(transition_counts):
+    """
+    Normalizes the counts of count_agent_handovers_per_activity into handover probabilities.
+    """
+    transition_probabilities = {}
 
-    # print(f"transition_probabilities: {transition_probabilities}")
+    for agent_from, activities_from in transition_counts.items():
+        transition_probabilities[agent_from] = {}
+        for activity_from, agents_to in activities_from.items():
+            # count(from_agent, from_activity) is the number of handovers from the pair
+            agent_activity_count = sum(sum(activities_to.values()) for activities_to in agents_to.values())
+
+            # Calculate probability: count(from_agent, from_activity, to_agent, to_activity) / count(from_agent, from_activity)
+            transition_probabilities[agent_from][activity_from] = {
+                agent_to: {activity_to: count / agent_activity_count for activity_to, count in activities_to.items()}
+                for agent_to, activities_to in agents_to.items()
+            }
 
     return transition_probabilities
@@ -0,0 +1,441 @@
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from dataclasses import field
+from multiprocessing.connection import wait as wait_for_processes
+from typing import Callable
+from typing import Optional
+
+from source.runtime_meter import get_job_progress
+
+"""
+Executor for the long running jobs (discovery and simulation) of the service.
+
+A submitted job is assigned an id and queued, every job runs in its own worker process and at most
+[limit] jobs of a kind run at the same time, so small simulations do not wait behind large discoveries.
+A job gets its own temporary directory: its input files are stored there, the temporary files of the job are
+created there and the worker process writes the result (bytes, e.g. a zip file) and the progress of the job
+(see source/runtime_meter.py) there. The directory is removed when the job is discarded.
+A queued or running job can be cancelled, a running job by terminating its worker process and the processes it
+started.
+
+The worker processes are started from a fork server, a single threaded process that preloads the simulator
+modules, so jobs start fast and do not inherit the state (e.g. held locks) of the request threads.
+The jobs are only known to the process that submitted them, the service has to run in one (gunicorn) worker.
+"""
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Jobs run concurrently per kind, unless configured by the environment variables of JOB_LIMIT_VARIABLES
+DEFAULT_JOB_LIMITS = {"discovery": 1, "simulation": 2}
+JOB_LIMIT_VARIABLES = {"discovery": "MAX_DISCOVERY_JOBS", "simulation": "MAX_SIMULATION_JOBS"}
+# Number of finished jobs whose result is kept until it is discarded
+MAX_FINISHED_JOBS = 20
+# Interval (seconds) at which a worker process writes the progress of its job
+PROGRESS_INTERVAL = 0.5
+# Interval (seconds) at which the executor checks if it has to start jobs that were submitted meanwhile
+MONITOR_INTERVAL = 0.2
+
+_RESULT_FILE = "result"
+_ERROR_FILE = "error.txt"
+_PROGRESS_FILE = "progress.json"
+
+
+def get_job_limits() -> dict:
+    """
+    Returns the number of jobs that may run at the same time per kind, see JOB_LIMIT_VARIABLES.
+    """
+    limits = dict(DEFAULT_JOB_LIMITS)
+    for kind, variable in JOB_LIMIT_VARIABLES.items():
+        if os.environ.get(variable):
+            limits[kind] = max(int(os.environ[variable]), 1)
+    return limits
+
+
+@dataclass
+class Job:
+    """
+    A job of the executor.
+
+    Attributes:
+        job_id      Id of the job.
+        kind        Kind of the job (e.g. "discovery"), the number of running jobs is limited per kind.
+        func        Top level (picklable) function running the job, called as func(job_id, directory, *args)
+                    in the worker process. It returns the result of the job as bytes.
+        args        Additional (picklable) arguments passed to [func].
+        directory   Temporary directory of the job.
+    """
+
+    job_id: str
+    kind: str
+    func: Callable
+    args: tuple
+    directory: str
+    status: str = QUEUED
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    process: Optional[multiprocessing.process.BaseProcess] = None
+
+    def is_done(self) -> bool:
+        return self.status in (FINISHED, FAILED, CANCELLED)
+
+    def to_dict(self) -> dict:
+        end = self.finished_at if self.finished_at is not None else time.time()
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "queued_seconds": round((self.started_at or end) - self.submitted_at, 4),
+            "running_seconds": round(end - self.started_at, 4) if self.started_at is not None else None,
+        }
+
+
+class JobExecutor:
+    """
+    Runs submitted jobs in worker processes, at most limits[kind] jobs of a kind at the same time.
+    """
+
+    def __init__(self, limits: dict, preload: tuple = (), max_finished_jobs: int = MAX_FINISHED_JOBS):
+        """
+        Args:
+            limits (dict): Number of jobs that may run at the same time per kind.
+            preload (tuple): Modules imported by the fork server before it starts worker processes.
+            max_finished_jobs (int): Number of finished jobs that are kept, the oldest are discarded.
+        """
+        self.limits = dict(limits)
+        self.preload = list(preload)
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs = OrderedDict()
+        self._condition = threading.Condition()
+        self._context = None
+        self._monitor = None
+
+    def submit(
+        self, kind: str, func: Callable, *args, job_id: Optional[str] = None, input_files: Optional[dict] = None
+    ) -> str:
+        """
+        Queues a job, it is started as soon as less than limits[kind] jobs of its kind run.
+
+        Args:
+            kind (str): Kind of the job, one of the kinds of the limits.
+            func (Callable): Top level function running the job, see Job.
+            args: Additional arguments passed to [func].
+            job_id (str): Optional, id of the job, generated if not given.
+            input_files (dict): Optional, files stored in the directory of the job before it is started,
+                {file name: bytes or an object with a save(path) method (e.g. an uploaded file)}.
+
+        Returns:
+            str: The id of the job.
+        """
+        if kind not in self.limits:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = job_id or uuid.uuid4().hex
+        with self._condition:
+            if job_id in self._jobs:
+                raise ValueError(f"Job already exists: {job_id}")
+
+        directory = tempfile.mkdtemp(prefix="job_")
+        try:
+            for name, content in (input_files or {}).items():
+                path = os.path.join(directory, name)
+                if isinstance(content, bytes):
+                    with open(path, "wb") as f:
+                        f.write(content)
+                else:
+                    content.save(path)
+        except Exception:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+
+        with self._condition:
+            if job_id in self._jobs:
+                shutil.rmtree(directory, ignore_errors=True)
+                raise ValueError(f"Job already exists: {job_id}")
+            self._jobs[job_id] = Job(job_id, kind, func, args, directory)
+            self._start_queued_jobs()
+            self._ensure_monitor()
+            self._condition.notify_all()
+        return job_id
+
+    def get_status(self, job_id: str) -> Optional[dict]:
+        """
+        Returns the status of a job, with the progress of a job that started (see source/runtime_meter.py),
+        None if the job is unknown.
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            status = job.to_dict()
+            if job.status in (QUEUED, RUNNING):
+                status["queue_position"] = self._get_queue_position(job)
+        status["progress"] = self.get_progress(job_id)
+        return status
+
+    def get_progress(self, job_id: str) -> Optional[dict]:
+        """
+        Returns the last progress written by the worker process of a job, None if there is none (yet).
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        try:
+            with open(os.path.join(job.directory, _PROGRESS_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get_result_path(self, job_id: str) -> Optional[str]:
+        """
+        Returns the path of the result of a finished job, None if the job is unknown or did not finish (yet).
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != FINISHED:
+                return None
+            return os.path.join(job.directory, _RESULT_FILE)
+
+    def read_result(self, job_id: str) -> Optional[bytes]:
+        """
+        Returns the result of a finished job, None if the job is unknown or did not finish (yet).
+        """
+        path = self.get_result_path(job_id)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[dict]:
+        """
+        Waits until a job is done (finished, failed or cancelled) or the timeout (seconds) passed.
+
+        Returns:
+            dict: The status of the job, None if the job is unknown.
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            self._condition.wait_for(job.is_done, timeout)
+        return self.get_status(job_id)
+
+    def as_completed(self, job_ids: list):
+        """
+        Yields the status of every job of [job_ids] as soon as it is done, in the order the jobs are done,
+        e.g. to read the results of many jobs before the oldest finished jobs are discarded.
+        Unknown jobs are skipped.
+        """
+        pending = list(job_ids)
+        while pending:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: any(job_id not in self._jobs or self._jobs[job_id].is_done() for job_id in pending)
+                )
+                done = [job_id for job_id in pending if job_id not in self._jobs or self._jobs[job_id].is_done()]
+            for job_id in done:
+                pending.remove(job_id)
+                status = self.get_status(job_id)
+                if status is not None:
+                    yield status
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancels a queued or running job.
+
+        Returns:
+            bool: If the job was cancelled, False if it is unknown or already done.
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.is_done():
+                return False
+
+            if job.status == RUNNING:
+                _terminate(job.process)
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            self._start_queued_jobs()
+            self._condition.notify_all()
+        return True
+
+    def discard(self, job_id: str):
+        """
+        Forgets a job that is done and removes its directory, a job that is not done is cancelled first.
+        """
+        self.cancel(job_id)
+        with self._condition:
+            job = self._jobs.get(job_id)
+            # The directory of a cancelled job is removed once its worker process exited, see _collect
+            if job is not None and _has_exited(job):
+                del self._jobs[job_id]
+                shutil.rmtree(job.directory, ignore_errors=True)
+
+    def _get_queue_position(self, job):
+        if job.status != QUEUED:
+            return 0
+        queued = [other for other in self._jobs.values() if other.kind == job.kind and other.status == QUEUED]
+        return queued.index(job) + 1
+
+    def _start_queued_jobs(self):
+        """
+        Starts the oldest queued jobs of every kind with less than limits[kind] running jobs.
+        """
+        running = {kind: 0 for kind in self.limits}
+        for job in self._jobs.values():
+            if job.status == RUNNING:
+                running[job.kind] += 1
+
+        for job in self._jobs.values():
+            if job.status != QUEUED or running[job.kind] >= self.limits[job.kind]:
+                continue
+            job.process = self._get_context().Process(
+                target=_run_job,
+                args=(job.job_id, job.directory, job.func, job.args),
+                name=f"job-{job.job_id}",
+            )
+            job.process.start()
+            job.status = RUNNING
+            job.started_at = time.time()
+            running[job.kind] += 1
+
+    def _get_context(self):
+        if self._context is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                self._context = multiprocessing.get_context("forkserver")
+                self._context.set_forkserver_preload(self.preload)
+            else:
+                self._context = multiprocessing.get_context("spawn")
+        return self._context
+
+    def _ensure_monitor(self):
+        if self._monitor is None or not self._monitor.is_alive():
+            self._monitor = threading.Thread(target=self._monitor_jobs, name="job-executor", daemon=True)
+            self._monitor.start()
+
+    def _monitor_jobs(self):
+        """
+        Collects the jobs whose worker process exited and starts the queued jobs that can run.
+        """
+        while True:
+            with self._condition:
+                processes = {
+                    job.process.sentinel: job
+                    for job in self._jobs.values()
+                    if job.status == RUNNING or (job.status == CANCELLED and not _has_exited(job))
+                }
+                if not processes:
+                    self._condition.wait(MONITOR_INTERVAL)
+                    continue
+
+            for sentinel in wait_for_processes(list(processes), timeout=MONITOR_INTERVAL):
+                self._collect(processes[sentinel])
+
+    def _collect(self, job):
+        job.process.join()
+        with self._condition:
+            if job.status == RUNNING:
+                if job.process.exitcode == 0 and os.path.exists(os.path.join(job.directory, _RESULT_FILE)):
+                    job.status = FINISHED
+                else:
+                    job.status = FAILED
+                    job.error = _read_error(job.directory, job.process.exitcode)
+                job.finished_at = time.time()
+            elif job.status == CANCELLED:
+                # Only the status of a cancelled job is kept
+                shutil.rmtree(job.directory, ignore_errors=True)
+
+            self._start_queued_jobs()
+            self._discard_finished_jobs()
+            self._condition.notify_all()
+
+    def _discard_finished_jobs(self):
+        finished = [job for job in self._jobs.values() if job.is_done() and _has_exited(job)]
+        for job in finished[: max(len(finished) - self.max_finished_jobs, 0)]:
+            del self._jobs[job.job_id]
+            shutil.rmtree(job.directory, ignore_errors=True)
+
+
+# ============== Worker process ==============
+
+
+def _run_job(job_id, directory, func, args):
+    """
+    Runs a job in its worker process, the result (or the error) and the progress are written to [directory].
+    """
+    # The processes started by the job are in its process group, so they are terminated with the job
+    if hasattr(os, "setpgid"):
+        os.setpgid(0, 0)
+    # Temporary files of the job (and of the processes it starts) are created in its directory
+    tempfile.tempdir = directory
+    os.environ["TMPDIR"] = directory
+
+    stopped = threading.Event()
+    progress_writer = threading.Thread(target=_write_progress, args=(job_id, directory, stopped), daemon=True)
+    progress_writer.start()
+    try:
+        result = func(job_id, directory, *args)
+        _write_file(os.path.join(directory, _RESULT_FILE), bytes(result))
+    except BaseException as e:
+        _write_file(os.path.join(directory, _ERROR_FILE), str(e).encode())
+        raise SystemExit(1)
+    finally:
+        stopped.set()
+        progress_writer.join()
+
+
+def _write_progress(job_id, directory, stopped):
+    # The progress is written until (and once more after) the job stopped
+    while True:
+        is_stopped = stopped.wait(PROGRESS_INTERVAL)
+        progress = get_job_progress(job_id)
+        if progress is not None:
+            _write_file(os.path.join(directory, _PROGRESS_FILE), json.dumps(progress).encode())
+        if is_stopped:
+            return
+
+
+def _write_file(path, content: bytes):
+    # Written to a temporary file first, so the file is never read partially written
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _read_error(directory, exitcode):
+    try:
+        with open(os.path.join(directory, _ERROR_FILE)) as f:
+            return f.read()
+    except OSError:
+        return f"Worker process exited with code {exitcode}"
+
+
+def _has_exited(job):
+    return job.process is None or job.process.exitcode is not None
+
+
+def _terminate(process):
+    """
+    Terminates the worker process of a job and the processes it started (its process group).
+    """
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except (AttributeError, OSError):
+        process.terminate()
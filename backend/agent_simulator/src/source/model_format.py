@@ -0,0 +1,509 @@
+import datetime
+import io
+import json
+import pickle
+import struct
+import zlib
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from simulation_config import SimulationConfig
+from source.agent_simulator import AgentSimulator
+from source.agent_types.resource_calendar import Interval
+from source.agent_types.resource_calendar import RCalendar
+from source.arrival_distribution import DistributionType
+from source.arrival_distribution import DurationDistribution
+from source.discovery_statistics import DiscoveryStatistics
+
+"""
+Versioned file format of a discovered model (a SimulationConfig with its AgentSimulator).
+
+A model file starts with a fixed header (MAGIC, the format version and the length of the table of contents),
+followed by a JSON table of contents with the offset, length and encoding of every section. A section can be
+read without decoding the other sections (see read_model_sections):
+
+    config           Settings of the SimulationConfig and AgentSimulator (discovery parameters, number of cases...)
+    parameters       Simulation parameters that are not part of another section (roles, agent mappings...)
+    calendars        Resource calendars
+    distributions    Activity duration and extraneous delay distributions
+    transitions      Transition probabilities, stored as prefix tries
+    arrivals         Case arrival times and the start of the simulation
+    statistics       Statistics (summaries) of the training log, see source/discovery_statistics.py
+    training_log     Preprocessed training log
+    validation_log   Preprocessed validation log
+
+The logs are stored as zstd compressed Arrow IPC files, the other sections as zlib compressed JSON
+with tagged values for the types JSON does not have (tuples, dictionaries with non-string keys, timestamps...).
+Models that were stored as a pickled SimulationConfig (before this format) can still be loaded.
+"""
+
+MAGIC = b"AGSIMMDL"
+# Increment when the layout or encoding of a section changes, older files are still read by their version
+MODEL_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sHI")
+
+CONFIG_SECTION = "config"
+PARAMETER_SECTIONS = ("parameters", "calendars", "distributions", "transitions", "arrivals")
+LOG_SECTIONS = ("statistics", "training_log", "validation_log")
+SECTIONS = (CONFIG_SECTION, *PARAMETER_SECTIONS, *LOG_SECTIONS)
+
+# Simulation parameters stored in a section other than "parameters"
+SECTION_PARAMETERS = {
+    "calendars": ("res_calendars",),
+    "distributions": ("activity_durations_dict", "timers_extr", "timers"),
+    "transitions": (
+        "transition_probabilities_global",
+        "transition_probabilities_autonomous",
+        "agent_transition_probabilities_autonomous",
+        "transition_probabilities",
+        "agent_transition_probabilities",
+    ),
+    "arrivals": ("case_arrival_times", "case_arrival_times_val", "start_timestamp", "distribution_type"),
+}
+_LOG_SECTIONS = {"training_log": "df_train", "validation_log": "df_val"}
+# AgentSimulator attributes that are stored in their own section
+_SECTION_ATTRIBUTES = ("simulation_parameters", "discovery_statistics", "df_train", "df_val")
+
+_TAG = "__t"
+
+
+def is_model_file(data: bytes) -> bool:
+    """
+    Returns if [data] is a model in this format (and not a pickled SimulationConfig).
+    """
+    return data[: len(MAGIC)] == MAGIC
+
+
+def dump_model(sim_config, base: Optional[bytes] = None, unchanged_sections=()) -> bytes:
+    """
+    Encodes a discovered model.
+
+    Args:
+        sim_config (SimulationConfig): The model, run_discovery() has been called on it.
+        base (bytes): Optional, the encoded model [sim_config] was derived from (e.g. by parameter changes).
+        unchanged_sections (iterable): Sections that are the same in [base] and [sim_config], these are
+            copied from [base] instead of being encoded again (see get_changed_sections).
+
+    Returns:
+        bytes: The encoded model.
+    """
+    sim_instance = sim_config.sim_instance
+    simulation_parameters = sim_instance.simulation_parameters
+    reused = _read_encoded_sections(base, unchanged_sections) if base is not None and is_model_file(base) else {}
+
+    def encode(name, encoder, get_value):
+        return reused[name] if name in reused else encoder(get_value())
+
+    config = {
+        "simulation_config": {name: value for name, value in vars(sim_config).items() if name != "sim_instance"},
+        "agent_simulator": {
+            name: value for name, value in vars(sim_instance).items() if name not in _SECTION_ATTRIBUTES
+        },
+    }
+    sectioned = {name for names in SECTION_PARAMETERS.values() for name in names}
+    sections = {
+        CONFIG_SECTION: _encode_json(config),
+        "parameters": encode(
+            "parameters",
+            _encode_json,
+            lambda: {name: value for name, value in simulation_parameters.items() if name not in sectioned},
+        ),
+        "calendars": encode(
+            "calendars",
+            _encode_json,
+            lambda: {
+                "res_calendars": {
+                    agent: _calendar_to_state(calendar)
+                    for agent, calendar in simulation_parameters["res_calendars"].items()
+                }
+            },
+        ),
+        "distributions": encode(
+            "distributions", _encode_json, lambda: _get_parameters(simulation_parameters, "distributions")
+        ),
+        "transitions": encode("transitions", _encode_json, lambda: _encode_transitions(simulation_parameters)),
+        "arrivals": encode("arrivals", _encode_json, lambda: _get_parameters(simulation_parameters, "arrivals")),
+    }
+    # models discovered before the statistics were kept do not have them
+    statistics = getattr(sim_instance, "discovery_statistics", None)
+    if statistics is not None:
+        sections["statistics"] = encode("statistics", _encode_json, lambda: vars(statistics))
+    for section, attribute in _LOG_SECTIONS.items():
+        df = getattr(sim_instance, attribute, None)
+        if df is not None:
+            sections[section] = encode(section, _encode_arrow, lambda: df)
+
+    return _write_container(sections)
+
+
+def load_model(data: bytes, sections=None):
+    """
+    Decodes a model written with dump_model, or a pickled SimulationConfig of an older version.
+
+    Args:
+        data (bytes): The encoded model.
+        sections (list): Names of the sections to decode (all sections if None), the config is always decoded.
+            The simulation parameters of the other sections are missing and the other logs are None, so a model
+            loaded in part is only meant to be read (e.g. to show its calendars). Pickled models are always
+            loaded as a whole.
+
+    Returns:
+        SimulationConfig: The model, sections that were not stored (e.g. the statistics) are None.
+    """
+    if not is_model_file(data):
+        # Models stored before this format
+        return pickle.loads(data)
+
+    if sections is not None:
+        unknown = set(sections) - set(SECTIONS)
+        if unknown:
+            raise ValueError(f"Unknown model sections: {', '.join(sorted(unknown))}")
+        sections = {CONFIG_SECTION, *sections}
+    sections = read_model_sections(data, sections)
+    config = sections[CONFIG_SECTION]
+
+    sim_config = SimulationConfig()
+    vars(sim_config).update(config["simulation_config"])
+    sim_instance = AgentSimulator(config["agent_simulator"]["params"])
+    vars(sim_instance).update(config["agent_simulator"])
+
+    simulation_parameters = {}
+    for section in PARAMETER_SECTIONS:
+        simulation_parameters.update(sections.get(section, {}))
+    sim_instance.simulation_parameters = simulation_parameters
+    sim_instance.discovery_statistics = sections.get("statistics")
+    sim_instance.df_train = sections.get("training_log")
+    sim_instance.df_val = sections.get("validation_log")
+
+    sim_config.sim_instance = sim_instance
+    return sim_config
+
+
+def read_model_sections(data: bytes, names=None) -> dict:
+    """
+    Decodes the sections [names] (all sections if None) of a model, without decoding the other sections.
+
+    Returns:
+        dict: The decoded sections that are stored in the model, keyed by name.
+    """
+    version, table_of_contents, start = _read_table_of_contents(data)
+    if version > MODEL_FORMAT_VERSION:
+        raise ValueError(f"Model format version {version} is newer than the supported version {MODEL_FORMAT_VERSION}")
+
+    sections = {}
+    for entry in table_of_contents:
+        name = entry["name"]
+        if names is not None and name not in names:
+            continue
+        payload = memoryview(data)[start + entry["offset"] : start + entry["offset"] + entry["length"]]
+        sections[name] = _decode_section(name, entry["encoding"], payload)
+    return sections
+
+
+def get_changed_sections(parameter_names) -> set:
+    """
+    Returns the sections that store the simulation parameters [parameter_names].
+    """
+    sections = set()
+    for name in parameter_names:
+        section = next((section for section, names in SECTION_PARAMETERS.items() if name in names), "parameters")
+        sections.add(section)
+    return sections
+
+
+def get_model_sections(data: bytes) -> dict:
+    """
+    Returns the size in bytes of every section of a model.
+    """
+    _, table_of_contents, _ = _read_table_of_contents(data)
+    return {entry["name"]: entry["length"] for entry in table_of_contents}
+
+
+# ============== Container ==============
+
+
+def _write_container(sections):
+    table_of_contents = []
+    offset = 0
+    for name, (encoding, payload) in sections.items():
+        table_of_contents.append({"name": name, "encoding": encoding, "offset": offset, "length": len(payload)})
+        offset += len(payload)
+    toc_bytes = json.dumps(table_of_contents, separators=(",", ":")).encode()
+
+    buffer = io.BytesIO()
+    buffer.write(_HEADER.pack(MAGIC, MODEL_FORMAT_VERSION, len(toc_bytes)))
+    buffer.write(toc_bytes)
+    for _, payload in sections.values():
+        buffer.write(payload)
+    return buffer.getvalue()
+
+
+def _read_table_of_contents(data):
+    if not is_model_file(data):
+        raise ValueError("Not a model file")
+    _, version, toc_length = _HEADER.unpack_from(data)
+    start = _HEADER.size + toc_length
+    table_of_contents = json.loads(bytes(data[_HEADER.size : start]))
+    return version, table_of_contents, start
+
+
+def _read_encoded_sections(data, names):
+    version, table_of_contents, start = _read_table_of_contents(data)
+    if version != MODEL_FORMAT_VERSION:
+        # sections of other versions are encoded again
+        return {}
+    return {
+        entry["name"]: (entry["encoding"], data[start + entry["offset"] : start + entry["offset"] + entry["length"]])
+        for entry in table_of_contents
+        if entry["name"] in names
+    }
+
+
+def _decode_section(name, encoding, payload):
+    if encoding == "arrow":
+        return _decode_arrow(payload)
+    value = json.loads(zlib.decompress(payload), object_hook=_decode_object)
+    if name == "calendars":
+        value = {
+            "res_calendars": {agent: _calendar_from_state(state) for agent, state in value["res_calendars"].items()}
+        }
+    elif name == "transitions":
+        value = _decode_transitions(value)
+    elif name == "statistics":
+        value = DiscoveryStatistics(**value)
+    return value
+
+
+def _encode_json(value):
+    return "json+zlib", zlib.compress(json.dumps(_encode(value), separators=(",", ":")).encode())
+
+
+def _encode_arrow(df):
+    table = pa.Table.from_pandas(df)
+    # Activities and resources repeat in every event, they are stored once per distinct name
+    for i, field in enumerate(table.schema):
+        if pa.types.is_string(field.type):
+            table = table.set_column(i, field.name, table.column(i).dictionary_encode())
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression="zstd")) as writer:
+        writer.write_table(table)
+    return "arrow", sink.getvalue().to_pybytes()
+
+
+def _decode_arrow(payload):
+    table = pa.ipc.open_file(pa.py_buffer(payload)).read_all()
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+    return table.to_pandas()
+
+
+# ============== Sections ==============
+
+
+def _get_parameters(simulation_parameters, section):
+    return {name: simulation_parameters[name] for name in SECTION_PARAMETERS[section] if name in simulation_parameters}
+
+
+def _encode_transitions(simulation_parameters):
+    # The transition probabilities used by the simulation are the discovered sets of the behavior type,
+    # a set that is the same object as an earlier set is stored as a reference to it
+    transitions = {}
+    references = {}
+    for name in SECTION_PARAMETERS["transitions"]:
+        if name not in simulation_parameters:
+            continue
+        value = simulation_parameters[name]
+        same_as = next(
+            (other for other in transitions if value is not None and simulation_parameters[other] is value), None
+        )
+        if same_as is not None:
+            references[name] = same_as
+        else:
+            transitions[name] = value
+    return {"sets": transitions, "references": references}
+
+
+def _decode_transitions(value):
+    transitions = dict(value["sets"])
+    for name, same_as in value["references"].items():
+        transitions[name] = transitions[same_as]
+    return transitions
+
+
+def _calendar_to_state(calendar):
+    return {
+        "calendar_id": calendar.calendar_id,
+        "default_date": calendar.default_date,
+        "new_day": calendar.new_day,
+        "work_intervals": {
+            day: [(interval.start, interval.end) for interval in intervals]
+            for day, intervals in calendar.work_intervals.items()
+        },
+        "cumulative_work_durations": calendar.cumulative_work_durations,
+        "work_rest_count": calendar.work_rest_count,
+        "total_weekly_work": calendar.total_weekly_work,
+        "total_weekly_rest": calendar.total_weekly_rest,
+    }
+
+
+def _calendar_from_state(state):
+    calendar = RCalendar(state["calendar_id"])
+    vars(calendar).update(state)
+    calendar.work_intervals = {
+        day: [Interval(start, end) for start, end in intervals] for day, intervals in state["work_intervals"].items()
+    }
+    return calendar
+
+
+# ============== Values ==============
+
+
+def _encode(value):
+    """
+    Converts a value to JSON, values of types JSON does not have are tagged with their type.
+    """
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value) and _TAG not in value:
+            return {key: _encode(item) for key, item in value.items()}
+        if value and all(isinstance(key, tuple) for key in value):
+            return {_TAG: "trie", "v": _encode_trie(value)}
+        return {_TAG: "map", "k": [_encode(key) for key in value], "v": [_encode(item) for item in value.values()]}
+    if isinstance(value, list):
+        if value and all(isinstance(item, pd.Timestamp) for item in value):
+            return _encode_timestamps(value)
+        return [_encode(item) for item in value]
+    if isinstance(value, tuple):
+        return {_TAG: "tuple", "v": [_encode(item) for item in value]}
+    if isinstance(value, set):
+        return {_TAG: "set", "v": [_encode(item) for item in value]}
+    if isinstance(value, pd.Timestamp):
+        return {_TAG: "timestamp", "v": value.isoformat()}
+    if isinstance(value, datetime.datetime):
+        return {_TAG: "datetime", "v": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {_TAG: "date", "v": value.isoformat()}
+    if isinstance(value, DurationDistribution):
+        return {_TAG: "distribution", "v": [value.type.value, value.mean, value.var, value.std, value.min, value.max]}
+    if isinstance(value, pd.DataFrame):
+        return {
+            _TAG: "frame",
+            "names": [_encode(name) for name in value.columns],
+            "columns": [_encode_array(value[name]) for name in value.columns],
+            "index": _encode(value.index),
+        }
+    if isinstance(value, pd.Series):
+        return {
+            _TAG: "series",
+            "name": _encode(value.name),
+            "values": _encode_array(value),
+            "index": _encode(value.index),
+        }
+    if isinstance(value, pd.Index):
+        return {_TAG: "index", "name": _encode(value.name), "values": _encode_array(value)}
+    raise TypeError(f"Values of type {type(value).__name__} can not be stored in a model")
+
+
+def _decode_object(value):
+    tag = value.get(_TAG)
+    if tag is None:
+        return value
+    if tag == "map":
+        return dict(zip(value["k"], value["v"]))
+    if tag == "trie":
+        return _decode_trie(value["v"])
+    if tag == "tuple":
+        return tuple(value["v"])
+    if tag == "set":
+        return set(value["v"])
+    if tag == "timestamp":
+        return pd.Timestamp(value["v"])
+    if tag == "timestamps":
+        return list(_to_datetimes(value["v"], value["tz"]))
+    if tag == "datetime":
+        return datetime.datetime.fromisoformat(value["v"])
+    if tag == "date":
+        return datetime.date.fromisoformat(value["v"])
+    if tag == "distribution":
+        name, mean, var, std, minimum, maximum = value["v"]
+        return DurationDistribution(DistributionType(name), mean, var, std, minimum, maximum)
+    if tag == "frame":
+        return pd.DataFrame(
+            {name: _decode_array(array) for name, array in zip(value["names"], value["columns"])}, index=value["index"]
+        )
+    if tag == "series":
+        return pd.Series(_decode_array(value["values"]), index=value["index"], name=value["name"])
+    if tag == "index":
+        return pd.Index(_decode_array(value["values"]), name=value["name"])
+    raise ValueError(f"Unknown value type '{tag}' in model")
+
+
+def _encode_trie(value):
+    # Keys (e.g. prefixes of activities) that share a prefix share the nodes of the prefix
+    root = {}
+    for key, item in value.items():
+        node = root
+        for element in key:
+            node = node.setdefault("c", {}).setdefault(element, {})
+        node["v"] = item
+
+    def encode_node(node):
+        encoded = {}
+        if "v" in node:
+            encoded["v"] = _encode(node["v"])
+        if "c" in node:
+            encoded["k"] = [_encode(element) for element in node["c"]]
+            encoded["c"] = [encode_node(child) for child in node["c"].values()]
+        return encoded
+
+    return encode_node(root)
+
+
+def _decode_trie(root):
+    decoded = {}
+    stack = [((), root)]
+    while stack:
+        prefix, node = stack.pop()
+        if "v" in node:
+            decoded[prefix] = node["v"]
+        for element, child in zip(node.get("k", []), node.get("c", [])):
+            stack.append(((*prefix, element), child))
+    return decoded
+
+
+def _encode_timestamps(timestamps):
+    # Timestamps are stored in nanoseconds whatever the unit they were parsed in
+    index = pd.DatetimeIndex(timestamps).as_unit("ns")
+    return {_TAG: "timestamps", "tz": _get_timezone(index.dtype), "v": index.asi8.tolist()}
+
+
+def _encode_array(values):
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        nanoseconds = values.dt.as_unit("ns").array.asi8
+        return {"dtype": str(values.dtype), "tz": _get_timezone(values.dtype), "v": nanoseconds.tolist()}
+    return {"dtype": str(values.dtype), "v": [_encode(item) for item in values.tolist()]}
+
+
+def _decode_array(array):
+    if "tz" in array:
+        return pd.array(_to_datetimes(array["v"], array["tz"])).astype(array["dtype"])
+    return pd.array(array["v"], dtype=array["dtype"])
+
+
+def _get_timezone(dtype):
+    tz = getattr(dtype, "tz", None)
+    return str(tz) if tz is not None else None
+
+
+def _to_datetimes(nanoseconds, tz):
+    datetimes = pd.to_datetime(np.asarray(nanoseconds, dtype=np.int64), unit="ns")
+    return datetimes.tz_localize("UTC").tz_convert(tz) if tz is not None else datetimes
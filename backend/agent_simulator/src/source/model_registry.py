@@ -0,0 +1,208 @@
+import copy
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+
+from source.model_format import load_model
+
+"""
+In-memory registry of decoded models, keyed by the SHA-256 hash of the model file.
+
+A model that was uploaded once can be referred to by its hash (model_hash) in later requests, which then
+skip the upload and the decoding of the model. The model file and the visualization data are kept with the
+decoded model, so a model that is derived from it by parameter changes can reuse the parts that do not change.
+The least recently used models are evicted when the registry holds more than MAX_MODELS models or more than
+MAX_MODEL_BYTES bytes, the size of a model is the size of its model file and of the decoded model (estimated by
+its pickled size, the model file is compressed and several times smaller).
+
+A derived model can also be looked up by the model and the changes it was derived from (see get_overlay_hash),
+so the models of scenarios that are stored as a base model and a list of parameter changes are only derived once.
+"""
+
+MAX_MODELS = 8
+MAX_MODEL_BYTES = 512 * 1024 * 1024
+
+
+def get_model_hash(data: bytes) -> str:
+    """
+    Returns the hash a model file is registered by.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_overlay_hash(model_hash: str, overlay: bytes) -> str:
+    """
+    Returns the hash a model derived from the model [model_hash] by the parameter changes [overlay] is known by,
+    see ModelRegistry.add_alias.
+    """
+    return hashlib.sha256(model_hash.encode() + overlay).hexdigest()
+
+
+class ModelRegistry:
+    """
+    Size bounded LRU registry of decoded models (SimulationConfig).
+
+    The registered models are never handed out themselves, get returns a copy that a request can change.
+    A registered model must not be changed, it may share objects with the models that were derived from it.
+    """
+
+    def __init__(self, max_models: int = MAX_MODELS, max_bytes: int = MAX_MODEL_BYTES):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self._models = OrderedDict()
+        # alias -> model hash, e.g. for models derived by parameter changes
+        self._aliases = {}
+        self._lock = threading.Lock()
+
+    def register(self, data: bytes, sim_config=None, visualization=None) -> str:
+        """
+        Decodes and registers a model file, a model that is already registered is not decoded again.
+
+        Args:
+            data (bytes): The model file (see source/model_format.py).
+            sim_config (SimulationConfig): Optional, the model [data] was encoded from, it is registered
+                instead of decoding [data] and must not be changed afterwards.
+            visualization (JsonVisualization): Optional, the visualization data of the model.
+
+        Returns:
+            str: The hash of the model.
+        """
+        model_hash = get_model_hash(data)
+        with self._lock:
+            model = self._models.get(model_hash)
+            if model is not None:
+                self._models.move_to_end(model_hash)
+                if visualization is not None:
+                    model.visualization = visualization
+                return model_hash
+
+        if sim_config is None:
+            sim_config = load_model(data)
+
+        # The model is sized (pickled) outside of the lock
+        model = _RegisteredModel(sim_config, data, visualization)
+        with self._lock:
+            self._models[model_hash] = model
+            self._models.move_to_end(model_hash)
+            self._evict()
+        return model_hash
+
+    def get(self, model_hash: str, private: bool = False):
+        """
+        Returns a copy of a registered model, None if the model is not registered.
+
+        Args:
+            model_hash (str): The hash returned by register.
+            private (bool): If the copy is changed in place (e.g. parameter changes), only the simulation
+                parameters are copied otherwise, which is all a simulation changes.
+
+        Returns:
+            SimulationConfig: The copy of the model.
+        """
+        model = self._get(model_hash)
+        if model is None:
+            return None
+        sim_config = model.sim_config
+
+        if private:
+            # Faster than copy.deepcopy for the many small objects of a model
+            return pickle.loads(self._dump(model))
+
+        sim_instance = copy.copy(sim_config.sim_instance)
+        sim_instance.simulation_parameters = dict(sim_instance.simulation_parameters)
+        sim_config = copy.copy(sim_config)
+        sim_config.sim_instance = sim_instance
+        return sim_config
+
+    def dump(self, model_hash: str):
+        """
+        Returns the pickled decoded model of a registered model, None if the model is not registered.
+
+        Unpickling is several times faster than decoding the model file, a worker process is sent the
+        pickled model instead of the model file (see agent_simulator_manager.run_simulation_job).
+        """
+        model = self._get(model_hash)
+        return self._dump(model) if model is not None else None
+
+    def get_data(self, model_hash: str):
+        """
+        Returns the model file of a registered model, None if the model is not registered.
+        """
+        model = self._get(model_hash)
+        return model.data if model is not None else None
+
+    def get_visualization(self, model_hash: str):
+        """
+        Returns the visualization data of a registered model, None if it is not known.
+        """
+        model = self._get(model_hash)
+        return model.visualization if model is not None else None
+
+    def set_visualization(self, model_hash: str, visualization):
+        """
+        Sets the visualization data of a registered model, e.g. after it was generated for a derived model.
+        """
+        model = self._get(model_hash)
+        if model is not None:
+            model.visualization = visualization
+
+    def add_alias(self, alias: str, model_hash: str):
+        """
+        Makes a registered model known by another hash as well, the alias is removed with the model.
+        """
+        with self._lock:
+            self._aliases[alias] = model_hash
+
+    def get_alias(self, alias: str):
+        """
+        Returns the hash of the registered model known by [alias], None if there is none.
+        """
+        with self._lock:
+            model_hash = self._aliases.get(alias)
+            return model_hash if model_hash in self._models else None
+
+    def __contains__(self, model_hash: str) -> bool:
+        with self._lock:
+            return model_hash in self._models
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._models)
+
+    def _get(self, model_hash):
+        with self._lock:
+            model = self._models.get(model_hash)
+            if model is not None:
+                self._models.move_to_end(model_hash)
+            return model
+
+    @staticmethod
+    def _dump(model):
+        return pickle.dumps(model.sim_config, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _evict(self):
+        # The model that was just registered is kept, even if it is larger than max_bytes
+        total_bytes = sum(model.size for model in self._models.values())
+        evicted = False
+        while len(self._models) > 1 and (len(self._models) > self.max_models or total_bytes > self.max_bytes):
+            _, model = self._models.popitem(last=False)
+            total_bytes -= model.size
+            evicted = True
+        if evicted:
+            self._aliases = {
+                alias: model_hash for alias, model_hash in self._aliases.items() if model_hash in self._models
+            }
+
+
+class _RegisteredModel:
+    def __init__(self, sim_config, data, visualization):
+        self.sim_config = sim_config
+        self.data = data
+        self.visualization = visualization
+        # Bytes the model is counted as in the size bound of the registry
+        self.size = len(data) + len(ModelRegistry._dump(self))
+
+
+# The registry of the service
+model_registry = ModelRegistry()
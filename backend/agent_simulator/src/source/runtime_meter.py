@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+"""
+Timing and progress of the stages of discovery and simulation jobs.
+
+A RuntimeMeter records the wall time and peak memory of every stage of a job, together with counters such as
+the number of processed events or simulation steps. Meters of running (and recently finished) jobs are kept in
+a registry, so the progress of a job can be queried while it runs (see get_job_progress).
+"""
+
+# Interval (seconds) at which the memory of the process is sampled while a stage runs
+MEMORY_SAMPLE_INTERVAL = 0.05
+# Number of finished jobs whose progress can still be queried
+MAX_FINISHED_JOBS = 100
+
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+class RuntimeMeter:
+    """
+    Wall time, peak memory and counters of the stages of a job.
+
+    Stages can be nested, a nested stage is named after its parents (e.g. "discovery/roles").
+    The peak memory of a stage is the peak resident set size of the process while the stage ran
+    (None on platforms where it can not be read).
+    """
+
+    def __init__(self, job_id: Optional[str] = None, kind: str = "job"):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.status = "running"
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.stages = []
+        self.counters = {}
+        self._running_stages = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Measures the stage run in the with block.
+        """
+        with self._lock:
+            full_name = "/".join([*self._running_stages, name])
+            self._running_stages.append(name)
+        start = time.perf_counter()
+        try:
+            with MemorySampler() as memory:
+                yield
+        finally:
+            with self._lock:
+                self._running_stages.pop()
+            self.add_stage(full_name, time.perf_counter() - start, memory.peak, nested=False)
+
+    def add_stage(
+        self, name: str, duration: float, peak_memory: Optional[int], cached: bool = False, nested: bool = True
+    ):
+        """
+        Records a stage that was measured elsewhere (e.g. in a worker process).
+
+        Args:
+            name (str): Name of the stage, prefixed with the running stages if [nested].
+            duration (float): Wall time of the stage in seconds.
+            peak_memory (int): Peak resident set size in bytes while the stage ran.
+            cached (bool): If the result of the stage was reused instead of computed.
+        """
+        with self._lock:
+            if nested:
+                name = "/".join([*self._running_stages, name])
+            self.stages.append(
+                {
+                    "name": name,
+                    "duration_seconds": round(duration, 4),
+                    "peak_memory_bytes": peak_memory,
+                    "cached": cached,
+                }
+            )
+
+    def count(self, name: str, n: int = 1):
+        """
+        Adds [n] to the counter [name] (e.g. "events_processed").
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def finish(self, error: Optional[Exception] = None):
+        self.finished_at = time.time()
+        self.status = "failed" if error is not None else "finished"
+        self.error = str(error) if error is not None else None
+
+    def to_dict(self) -> dict:
+        """
+        Returns the progress and measurements of the job.
+        """
+        with self._lock:
+            end = self.finished_at if self.finished_at is not None else time.time()
+            return {
+                "job_id": self.job_id,
+                "kind": self.kind,
+                "status": self.status,
+                "error": self.error,
+                "elapsed_seconds": round(end - self.started_at, 4),
+                "current_stage": "/".join(self._running_stages) if self._running_stages else None,
+                "stages": [dict(stage) for stage in self.stages],
+                "counters": dict(self.counters),
+            }
+
+
+@contextmanager
+def track_job(meter: RuntimeMeter):
+    """
+    Registers the meter for the duration of the with block, so the progress of the job can be queried.
+    """
+    with _jobs_lock:
+        _jobs[meter.job_id] = meter
+        _jobs.move_to_end(meter.job_id)
+    try:
+        yield meter
+    except Exception as e:
+        meter.finish(e)
+        raise
+    else:
+        meter.finish()
+    finally:
+        with _jobs_lock:
+            finished = [job_id for job_id, job in _jobs.items() if job.status != "running"]
+            for job_id in finished[: max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+                del _jobs[job_id]
+
+
+def get_job_progress(job_id: str) -> Optional[dict]:
+    """
+    Returns the progress of a running or recently finished job, None if the job is unknown.
+    """
+    with _jobs_lock:
+        meter = _jobs.get(job_id)
+    return meter.to_dict() if meter is not None else None
+
+
+class MemorySampler:
+    """
+    Samples the resident set size of the process in a background thread, [peak] is the largest sample.
+    """
+
+    def __init__(self, interval: float = MEMORY_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._sample()
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+        return False
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = get_resident_memory()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+
+def get_resident_memory() -> Optional[int]:
+    """
+    Returns the resident set size of the process in bytes, None if it can not be read (only Linux is supported).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
@@ -4,6 +4,7 @@ from mesa.datacollection import DataCollector
 from mesa.time import BaseScheduler
 from source.agents.contractor import ContractorAgent
 from source.agents.resource import ResourceAgent
+from source.runtime_meter import RuntimeMeter
 from source.utils import store_simulated_log
 
 # Old (AS IS IN OFFICIAL REPO)
@@ -39,37 +40,49 @@ from source.utils import store_simulated_log
 #         store_simulated_log(data_dir, simulated_log, i)
 
 
-def simulate_process(df_train, simulation_parameters, data_dir, num_simulations, num_cases):
+def simulate_process(df_train, simulation_parameters, data_dir, num_simulations, num_cases, meter=None):
+    """
+    Simulates [num_simulations] logs of [num_cases] cases each and stores them in [data_dir].
+    The wall time and peak memory of every simulation, and the number of simulation steps, simulated cases
+    and simulated events, are recorded in the [meter] (see source/runtime_meter.py).
+    """
     # try:
+    meter = meter if meter is not None else RuntimeMeter()
     start_timestamp = simulation_parameters["case_arrival_times"][0]
     simulation_parameters["start_timestamp"] = start_timestamp
     simulation_parameters["case_arrival_times"] = simulation_parameters["case_arrival_times"][1:]
     for i in range(num_simulations):
-        # Create the model using the loaded data
-        business_process_model = BusinessProcessModel(df_train, simulation_parameters)
-
-        # define list of cases
-        case_id = 0
-        case_ = Case(case_id=case_id, start_timestamp=start_timestamp)  # first case
-        cases = [case_]
-
-        # Truncates the cases to the number of cases to simulate
-        business_process_model.sampled_case_starting_times = business_process_model.sampled_case_starting_times[
-            :num_cases
-        ]
-
-        # Run the model for a specified number of steps
-        while business_process_model.sampled_case_starting_times:  # while cases list is not empty
-            business_process_model.step(cases)
-
-        print(f"number of simulated cases: {len(business_process_model.past_cases)}")
-
-        # Record steps taken by each agent to a single CSV file
-        simulated_log = pd.DataFrame(business_process_model.simulated_events)
-        # add resource column
-        simulated_log["resource"] = simulated_log["agent"].map(simulation_parameters["agent_to_resource"])
-        # save log to csv
-        store_simulated_log(data_dir, simulated_log, i)
+        with meter.stage(f"simulation_{i}"):
+            # Create the model using the loaded data
+            business_process_model = BusinessProcessModel(df_train, simulation_parameters)
+
+            # define list of cases
+            case_id = 0
+            case_ = Case(case_id=case_id, start_timestamp=start_timestamp)  # first case
+            cases = [case_]
+
+            # Truncates the cases to the number of cases to simulate
+            business_process_model.sampled_case_starting_times = business_process_model.sampled_case_starting_times[
+                :num_cases
+            ]
+
+            # Run the model for a specified number of steps
+            steps = 0
+            while business_process_model.sampled_case_starting_times:  # while cases list is not empty
+                business_process_model.step(cases)
+                steps += 1
+
+            print(f"number of simulated cases: {len(business_process_model.past_cases)}")
+            meter.count("simulation_steps", steps)
+            meter.count("simulated_cases", len(business_process_model.past_cases))
+            meter.count("simulated_events", len(business_process_model.simulated_events))
+
+            # Record steps taken by each agent to a single CSV file
+            simulated_log = pd.DataFrame(business_process_model.simulated_events)
+            # add resource column
+            simulated_log["resource"] = simulated_log["agent"].map(simulation_parameters["agent_to_resource"])
+            # save log to csv
+            store_simulated_log(data_dir, simulated_log, i)
 
     return 0
 
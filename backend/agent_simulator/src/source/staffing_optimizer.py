@@ -0,0 +1,375 @@
+import itertools
+import math
+import random
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import numpy as np
+from source.batch_simulation import SUMMARY_METRICS
+
+"""
+Simulation based search of the staffing of a model: the number of instances of agents and their weekly schedules.
+
+Every candidate staffing is a variant of the model, with the agent counts (see param_changes.update_agent_count)
+and schedules (see param_changes.change_agent_schedule) of the candidate. Its cost is the weekly working time of
+all instances of the agents times their hourly cost (see get_staffing_cost), its performance is a key performance
+indicator (kpi) of its simulated logs (see source/batch_simulation.py).
+
+The candidates are simulated in rounds (racing), the number of replications is doubled every round until
+num_simulations. All candidates are simulated with the same seeds (common random numbers), so the difference of
+the kpi of two candidates is estimated from paired replications. After every round the candidates that are clearly
+worse than a candidate that is not more expensive (dominated), or that clearly miss the kpi target (infeasible),
+are pruned and are not simulated further. A candidate is clearly worse if the mean difference is more than
+prune_margin standard errors. The result is the Pareto front of cost against kpi of the remaining candidates.
+"""
+
+# Status of a candidate
+ACTIVE = "active"
+PARETO = "pareto"
+DOMINATED = "dominated"
+INFEASIBLE = "infeasible"
+
+
+@dataclass
+class AgentStaffingOptions:
+    """
+    The staffing options of one agent.
+
+    Attributes:
+        agent_id        Id of the agent (as in agent_to_resource).
+        counts          Numbers of instances of the agent to try, added instances are copies of the agent.
+        schedules       Weekly schedules to try, {"name", "days", "schedule"} with days and schedule as the
+                        res_calendars of a params.json. None is the current schedule of the agent.
+        hourly_cost     Cost of one working hour of an instance of the agent, the default cost if None.
+    """
+
+    agent_id: int
+    counts: List[int]
+    schedules: List[Optional[dict]] = field(default_factory=lambda: [None])
+    hourly_cost: Optional[float] = None
+
+
+@dataclass
+class StaffingCandidate:
+    """
+    A candidate staffing and the summaries of its simulated replications.
+
+    Attributes:
+        index           Number of the candidate.
+        counts          Number of instances per agent id.
+        schedules       Schedule per agent id, None for the current schedule.
+        cost            Cost of the staffing, see get_staffing_cost.
+        replications    Summaries of the simulated logs of the candidate (see source/batch_simulation.py).
+        status          ACTIVE while it is simulated, then PARETO, DOMINATED or INFEASIBLE.
+        pruned_by       Index of the candidate that dominates a pruned candidate.
+    """
+
+    index: int
+    counts: Dict[int, int]
+    schedules: Dict[int, Optional[dict]]
+    cost: Optional[float] = None
+    replications: List[dict] = field(default_factory=list)
+    status: str = ACTIVE
+    pruned_by: Optional[int] = None
+
+    def get_overlays(self) -> List[dict]:
+        """
+        Returns the parameter changes of the candidate as params.json overlays (see agent_simulator_manager.
+        apply_overlays), the schedules first so the added instances of an agent get its new schedule.
+        """
+        calendars = [
+            {"agent_id": agent_id, "days": schedule["days"], "schedule": schedule["schedule"]}
+            for agent_id, schedule in self.schedules.items()
+            if schedule is not None
+        ]
+        counts = [{"id": agent_id, "count": count} for agent_id, count in self.counts.items() if count != 1]
+
+        overlays = []
+        if calendars:
+            overlays.append({"params": {"res_calendars": calendars}})
+        if counts:
+            overlays.append({"params": {"agent_count_changes": counts}})
+        return overlays
+
+    def get_kpi_values(self, kpi: str) -> np.ndarray:
+        return np.array([replication.get(kpi) for replication in self.replications], dtype=float)
+
+    def to_dict(self, kpi: str) -> dict:
+        values = self.get_kpi_values(kpi)
+        values = values[~np.isnan(values)]
+        return {
+            "candidate": self.index,
+            "agents": [
+                {
+                    "id": agent_id,
+                    "count": count,
+                    "schedule": self.schedules[agent_id]["name"] if self.schedules.get(agent_id) else None,
+                }
+                for agent_id, count in self.counts.items()
+            ],
+            "cost": self.cost,
+            "kpi": {
+                "mean": float(values.mean()) if len(values) else None,
+                "std": float(values.std(ddof=1)) if len(values) > 1 else None,
+            },
+            "num_simulations": len(self.replications),
+            "status": self.status,
+            "pruned_by": self.pruned_by,
+            "changes": self.get_overlays(),
+        }
+
+
+@dataclass
+class StaffingSearch:
+    """
+    Settings of a staffing search, see the module documentation.
+
+    Attributes:
+        agents              Staffing options of the agents that are searched, the other agents are not changed.
+        kpi                 Key performance indicator that is optimized, one of batch_simulation.SUMMARY_METRICS.
+        maximize            If the kpi is maximized (e.g. throughput_per_day) instead of minimized.
+        target              Optional, the kpi a staffing has to reach (at most, at least if maximize).
+        hourly_cost         Cost of one working hour of an agent without its own hourly_cost.
+        num_simulations     Replications of the candidates that are not pruned.
+        initial_simulations Replications of every candidate in the first round.
+        max_candidates      Candidates that are simulated at most, a random sample of them if there are more.
+        prune_margin        Standard errors by which a candidate has to be worse to be pruned.
+        seed                Seed of the replications and of the sample of candidates, a random one if None.
+    """
+
+    agents: List[AgentStaffingOptions]
+    kpi: str = "cycle_time_mean"
+    maximize: bool = False
+    target: Optional[float] = None
+    hourly_cost: float = 1.0
+    num_simulations: int = 8
+    initial_simulations: int = 2
+    max_candidates: int = 64
+    prune_margin: float = 2.0
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_json(cls, json_data) -> "StaffingSearch":
+        """
+        Parses the settings of a staffing search, see /api/optimize-staffing.
+
+        Raises:
+            ValueError: If the settings are invalid.
+        """
+        agents = []
+        for options in json_data.get("agents", []):
+            counts = options.get("counts")
+            if counts is None:
+                counts = list(range(options.get("min_count", 1), options.get("max_count", 1) + 1))
+            if not counts or min(counts) < 1:
+                # Agents without instances are deactivated, their simulations may not end
+                raise ValueError(f"Agent {options['id']} needs counts of at least one instance")
+
+            schedules = [None] if options.get("keep_schedule", True) else []
+            schedules += options.get("schedules", [])
+            if not schedules:
+                raise ValueError(f"Agent {options['id']} needs a schedule")
+
+            agents.append(
+                AgentStaffingOptions(int(options["id"]), sorted(set(counts)), schedules, options.get("hourly_cost"))
+            )
+
+        search = cls(agents, **{key: json_data[key] for key in _SETTINGS if key in json_data})
+        if not search.agents:
+            raise ValueError("No agents to staff")
+        if search.kpi not in SUMMARY_METRICS:
+            raise ValueError(f"Unknown kpi {search.kpi}, one of {', '.join(SUMMARY_METRICS)}")
+        if search.num_simulations < 1 or not 1 <= search.initial_simulations <= search.num_simulations:
+            raise ValueError("Invalid num_simulations or initial_simulations")
+        if search.max_candidates < 1:
+            raise ValueError("Invalid max_candidates")
+        if search.seed is None:
+            search.seed = random.randrange(2**32)
+        return search
+
+    def get_candidates(self) -> List[StaffingCandidate]:
+        """
+        Returns the candidates, every combination of the options of the agents. If there are more than
+        max_candidates, a random sample of them that contains the first and the last combination.
+        """
+        options = [list(itertools.product(agent.counts, agent.schedules)) for agent in self.agents]
+        num_combinations = math.prod(len(agent_options) for agent_options in options)
+
+        if num_combinations <= self.max_candidates:
+            indices = range(num_combinations)
+        else:
+            sample = random.Random(self.seed).sample(range(1, num_combinations - 1), max(self.max_candidates - 2, 0))
+            indices = sorted({0, num_combinations - 1, *sample})[: self.max_candidates]
+
+        candidates = []
+        for index in indices:
+            combination = []
+            for agent_options in reversed(options):
+                index, option = divmod(index, len(agent_options))
+                combination.append(agent_options[option])
+            combination.reverse()
+
+            candidates.append(
+                StaffingCandidate(
+                    len(candidates),
+                    {agent.agent_id: count for agent, (count, _) in zip(self.agents, combination)},
+                    {agent.agent_id: schedule for agent, (_, schedule) in zip(self.agents, combination)},
+                )
+            )
+        return candidates
+
+    def get_hourly_costs(self) -> Dict[int, float]:
+        return {agent.agent_id: agent.hourly_cost for agent in self.agents if agent.hourly_cost is not None}
+
+
+_SETTINGS = (
+    "kpi",
+    "maximize",
+    "target",
+    "hourly_cost",
+    "num_simulations",
+    "initial_simulations",
+    "max_candidates",
+    "prune_margin",
+    "seed",
+)
+
+
+def get_staffing_cost(simulation_parameters: dict, hourly_costs: Dict[int, float], default_hourly_cost=1.0) -> float:
+    """
+    Returns the weekly cost of the agents of a model, their weekly working time (hours) times their hourly cost.
+
+    Args:
+        simulation_parameters (dict): The simulation parameters of the model.
+        hourly_costs (dict): Hourly cost per agent id, added instances of an agent have the cost of the agent.
+        default_hourly_cost (float): Hourly cost of the agents without a cost in hourly_costs.
+
+    Returns:
+        float: The cost, deactivated agents have no cost.
+    """
+    calendars = simulation_parameters["res_calendars"]
+    duplicated_agents = simulation_parameters.get("duplicated_agents_mapping") or {}
+    deactivated_agents = set(simulation_parameters.get("deactivated_resources") or [])
+
+    cost = 0.0
+    for agent_id in simulation_parameters["agent_to_resource"]:
+        base_agent = duplicated_agents.get(agent_id, agent_id)
+        if base_agent in deactivated_agents or agent_id not in calendars:
+            continue
+        cost += calendars[agent_id].total_weekly_work / 3600 * hourly_costs.get(base_agent, default_hourly_cost)
+    return cost
+
+
+def search_staffing(search: StaffingSearch, candidates: List[StaffingCandidate], evaluate: Callable) -> dict:
+    """
+    Simulates the candidates in rounds, prunes the dominated and infeasible ones, and returns the Pareto front.
+
+    Args:
+        search (StaffingSearch): Settings of the search.
+        candidates (list): The candidates with their cost.
+        evaluate (Callable): evaluate(candidates, first_replication, num_replications) simulates the replications
+            first_replication, ... of the candidates and returns per candidate the summaries of the replications.
+            The i-th replication of every candidate uses the same seed.
+
+    Returns:
+        dict: The settings, the Pareto front (sorted by cost), the cheapest candidate of the front that reaches the
+            target (best), every candidate (see StaffingCandidate.to_dict) and the number of simulated replications.
+    """
+    active = list(candidates)
+    num_replications = 0
+    num_simulated = 0
+    while active and num_replications < search.num_simulations:
+        round_replications = (
+            search.initial_simulations if num_replications == 0 else min(2 * num_replications, search.num_simulations)
+        )
+        summaries = evaluate(active, num_replications, round_replications - num_replications)
+        for candidate, replications in zip(active, summaries):
+            candidate.replications += replications
+        num_simulated += len(active) * (round_replications - num_replications)
+        num_replications = round_replications
+
+        _prune(search, active)
+        active = [candidate for candidate in active if candidate.status == ACTIVE]
+
+    front = _set_pareto_front(search, active)
+    best = next((candidate for candidate in front if _reaches_target(search, candidate)), None)
+    return {
+        "kpi": search.kpi,
+        "maximize": search.maximize,
+        "target": search.target,
+        "seed": search.seed,
+        "pareto_front": [candidate.to_dict(search.kpi) for candidate in front],
+        "best": best.to_dict(search.kpi) if best is not None else None,
+        "candidates": [candidate.to_dict(search.kpi) for candidate in candidates],
+        "num_simulated": num_simulated,
+        "num_simulated_without_pruning": len(candidates) * search.num_simulations,
+    }
+
+
+def _prune(search, candidates):
+    """
+    Marks the candidates that are clearly dominated by another candidate, or that clearly miss the target, as
+    pruned. The candidates have the same replications, the differences are estimated from the paired replications.
+    """
+    if not candidates or len(candidates[0].replications) < 2:
+        return
+
+    values = [_oriented(search, candidate.get_kpi_values(search.kpi)) for candidate in candidates]
+
+    for candidate, candidate_values in zip(candidates, values):
+        if search.target is not None and _clearly_positive(candidate_values - _oriented(search, search.target), search):
+            candidate.status = INFEASIBLE
+            continue
+
+        for other, other_values in zip(candidates, values):
+            if other is not candidate and other.cost <= candidate.cost:
+                if _clearly_positive(candidate_values - other_values, search):
+                    candidate.status = DOMINATED
+                    candidate.pruned_by = other.index
+                    break
+
+
+def _set_pareto_front(search, candidates):
+    """
+    Marks the candidates whose mean kpi is better than the one of every cheaper candidate as PARETO, the other ones
+    as DOMINATED. Returns the Pareto front sorted by cost.
+    """
+    front = []
+    best_value = math.inf
+    for candidate in sorted(candidates, key=lambda c: (c.cost, _mean_value(search, c))):
+        value = _mean_value(search, candidate)
+        if value < best_value:
+            candidate.status = PARETO
+            front.append(candidate)
+            best_value = value
+        else:
+            candidate.status = DOMINATED
+            candidate.pruned_by = front[-1].index if front else None
+    return front
+
+
+def _reaches_target(search, candidate):
+    return search.target is None or _mean_value(search, candidate) <= _oriented(search, search.target)
+
+
+def _oriented(search, values):
+    # The kpi is minimized, a maximized kpi is negated
+    return -values if search.maximize else values
+
+
+def _mean_value(search, candidate):
+    values = _oriented(search, candidate.get_kpi_values(search.kpi))
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if len(values) else math.inf
+
+
+def _clearly_positive(differences, search):
+    differences = differences[~np.isnan(differences)]
+    if len(differences) < 2:
+        return False
+    standard_error = differences.std(ddof=1) / math.sqrt(len(differences))
+    return differences.mean() - search.prune_margin * standard_error > 0
@@ -7,6 +7,7 @@ from operator import itemgetter
 import debug_config
 import numpy as np
 import pandas as pd
+from source.event_log_io import read_event_log
 
 
 def _sort_log(log):
@@ -86,12 +87,9 @@ def split_data(path_log, column_names, path_log_test=None):
 
 
 def load_data(path_or_buffer, file_extension, column_names):
-    if file_extension == "csv" or file_extension == "gz":
-        df = pd.read_csv(path_or_buffer)
+    # csv or parquet, read with typed columns and parsed timestamps (see source/event_log_io.py)
+    df = read_event_log(path_or_buffer, file_extension, column_names)
 
-    # if debug_config.debug:
-    # print(column_names)
-    df = df.rename(columns=column_names)
     # if debug_config.debug:
     # print(df)
     df_train_big = df
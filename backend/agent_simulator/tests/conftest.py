@@ -1,6 +1,8 @@
 import os
 import sys
 
+import pytest
+
 # File is used for managing imports from the src directory.
 # Note that if your workspace has real time linting or similar (any IDE nowadays),
 # it will complain on imports, this is a local static problem and not a
@@ -10,3 +12,43 @@ import sys
 # pytest
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+
+def _discovery_params():
+    return {
+        "log_path": "test_resources/LoanAppSmall.csv",
+        "train_path": None,
+        "test_path": None,
+        "case_id": "case_id",
+        "activity_name": "activity",
+        "resource_name": "resource",
+        "end_timestamp": "end_time",
+        "start_timestamp": "start_time",
+        "extr_delays": False,
+        "central_orchestration": False,
+        "determine_automatically": False,
+        "use_discovery_cache": False,
+        "num_simulations": 1,
+    }
+
+
+@pytest.fixture
+def discovery_params():
+    """
+    Discovery arguments for test_resources/LoanAppSmall.csv, see SimulationConfig.process_discovery_args.
+    """
+    return _discovery_params()
+
+
+@pytest.fixture(scope="session")
+def discovered_sim_config():
+    """
+    Model discovered from test_resources/LoanAppSmall.csv, it is shared by all tests and must not be changed
+    (changes are made to a copy).
+    """
+    from simulation_config import SimulationConfig
+
+    config = SimulationConfig()
+    config.process_discovery_args(_discovery_params())
+    config.run_discovery()
+    return config
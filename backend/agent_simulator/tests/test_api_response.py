@@ -56,7 +56,9 @@ class TestAPIResponse(unittest.TestCase):
             print("Response content:\n", response.text)
         self.assertEqual(response.status_code, 200)
         with zipfile.ZipFile(BytesIO(response.content)) as zip_file:
-            self.assertEqual(set(zip_file.namelist()), {"model.pkl", "params.json", "visualization.json"})
+            self.assertEqual(
+                set(zip_file.namelist()), {"model.pkl", "params.json", "visualization.json", "runtime.json"}
+            )
             data = json.loads(zip_file.read("visualization.json").decode("utf-8"))
             self.assertIsInstance(data, dict)
             for key, t in expected_keys.items():
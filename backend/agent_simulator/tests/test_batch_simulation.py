@@ -0,0 +1,100 @@
+"""
+Unit tests for the batch simulation of variants of a model (source/batch_simulation.py and
+agent_simulator_manager.simulate_variants).
+"""
+
+import json
+
+import pandas as pd
+import pytest
+from agent_simulator_manager import apply_overlays
+from agent_simulator_manager import simulate_variants
+from source.batch_simulation import compare_replications
+from source.batch_simulation import get_replication_seeds
+from source.batch_simulation import summarize_log
+from source.batch_simulation import summarize_replications
+from source.job_executor import JobExecutor
+from source.model_format import dump_model
+from source.model_registry import model_registry
+
+
+@pytest.fixture(scope="module")
+def model_hash(discovered_sim_config):
+    return model_registry.register(dump_model(discovered_sim_config), discovered_sim_config)
+
+
+@pytest.fixture
+def executor():
+    executor = JobExecutor({"discovery": 1, "simulation": 2})
+    yield executor
+    for job_id in list(executor._jobs):
+        executor.discard(job_id)
+
+
+def test_summarize_log():
+    log = pd.DataFrame(
+        {
+            "case_id": [0, 0, 1],
+            "resource": ["a", "b", "a"],
+            "start_timestamp": pd.to_datetime(["2025-01-01 08:00", "2025-01-01 09:00", "2025-01-01 10:00"]),
+            "end_timestamp": pd.to_datetime(["2025-01-01 09:00", "2025-01-01 11:00", "2025-01-01 12:00"]),
+        }
+    )
+
+    summary = summarize_log(log)
+
+    assert summary["num_cases"] == 2
+    assert summary["num_events"] == 3
+    assert summary["cycle_time_mean"] == 2.5 * 3600
+    assert summary["processing_time_mean"] == 2.5 * 3600
+    assert summary["makespan"] == 4 * 3600
+    assert summary["throughput_per_day"] == 12
+    assert summary["resource_utilization"] == 5 / 8
+    assert summarize_log(log.iloc[:0])["cycle_time_mean"] is None
+
+
+def test_replication_seeds():
+    seed, common = get_replication_seeds(3, 4, seed=7)
+    _, independent = get_replication_seeds(3, 4, seed=7, common_seeds=False)
+
+    assert seed == 7
+    assert common == [common[0]] * 3 and len(set(common[0])) == 4
+    assert len({s for seeds in independent for s in seeds}) == 12
+    assert get_replication_seeds(3, 4, seed=7, common_seeds=False)[1] == independent
+    assert get_replication_seeds(1, 4)[1] != get_replication_seeds(1, 4)[1]
+
+
+def test_summarize_and_compare_replications():
+    summaries = [{"cycle_time_mean": 10.0}, {"cycle_time_mean": 14.0}, {"cycle_time_mean": None}]
+    reference = [{"cycle_time_mean": 9.0}, {"cycle_time_mean": 11.0}, {"cycle_time_mean": 10.0}]
+
+    described = summarize_replications(summaries)["cycle_time_mean"]
+    difference = compare_replications(summaries, reference)["cycle_time_mean"]
+
+    assert described == {"mean": 12.0, "std": pytest.approx(2**1.5), "min": 10.0, "max": 14.0}
+    assert difference["mean"] == 2.0 and difference["min"] == 1.0 and difference["max"] == 3.0
+
+
+def test_variants_with_common_seeds(model_hash, executor):
+    # A variant without changes is simulated like the base model with common seeds
+    same_model_hash = apply_overlays(model_hash, [json.dumps({"params": {}}).encode()])
+    fewer_cases_hash = apply_overlays(model_hash, [json.dumps({"params": {"new_num_cases_to_simulate": 5}}).encode()])
+
+    models = [model_registry.dump(h) for h in (model_hash, same_model_hash, fewer_cases_hash)]
+
+    summary, logs = simulate_variants(executor, models, 2, seed=3, include_logs=True)
+    base, same, fewer_cases = summary["variants"]
+
+    assert summary["seed"] == 3
+    assert [replication["seed"] for replication in same["replications"]] == [
+        replication["seed"] for replication in base["replications"]
+    ]
+    assert same["replications"] == base["replications"]
+    assert same["difference"]["cycle_time_mean"]["max"] == 0.0
+    assert fewer_cases["summary"]["num_cases"]["max"] <= 5
+    assert sorted(logs) == [f"variant_{i}/simulated_log_{j}.csv" for i in range(3) for j in range(2)]
+    assert not executor._jobs
+
+    # The same seed gives the same replications
+    again, _ = simulate_variants(executor, models[:1], 2, seed=3)
+    assert again["variants"][0]["replications"] == base["replications"]
@@ -0,0 +1,115 @@
+"""
+Unit tests for the selection of the agent behavior type and extraneous delays (source/behavior_selection.py).
+"""
+
+import pandas as pd
+from log_distance_measures.config import EventLogIDs
+from log_distance_measures.cycle_time_distribution import cycle_time_distribution_distance as ctd_reference
+from source.behavior_selection import CANDIDATES
+from source.behavior_selection import _race
+from source.behavior_selection import cycle_time_distribution_distance
+from source.behavior_selection import get_cycle_times
+
+
+def _log(cycle_times_in_hours):
+    start = pd.Timestamp("2024-01-01 08:00:00", tz="UTC")
+    return pd.DataFrame(
+        {
+            "case_id": list(range(len(cycle_times_in_hours))),
+            "activity_name": "A",
+            "start_timestamp": start,
+            "end_timestamp": [start + pd.Timedelta(hours=hours) for hours in cycle_times_in_hours],
+        }
+    )
+
+
+class _FakeSimulation:
+    """
+    Returns precomputed cycle times for every increment.
+    """
+
+    def __init__(self, increments):
+        self.increments = list(increments)
+        self.requested = 0
+        self.stopped = False
+
+    def request_next(self):
+        self.requested += 1
+
+    def receive_next(self):
+        cycle_times = self.increments.pop(0)
+        return cycle_times, not self.increments
+
+    def stop(self):
+        self.stopped = True
+
+
+def test_cycle_time_distribution_distance_matches_log_distance_measures():
+    original = _log([1, 2, 3, 5, 8])
+    simulated = _log([1, 1, 4, 6, 10, 12])
+    ids = EventLogIDs(case="case_id", activity="activity_name", start_time="start_timestamp", end_time="end_timestamp")
+
+    expected = ctd_reference(original, ids, simulated, ids, pd.Timedelta(hours=1))
+
+    assert cycle_time_distribution_distance(get_cycle_times(original), get_cycle_times(simulated)) == expected
+
+
+def test_race_stops_clearly_worse_candidates():
+    val_cycle_times = get_cycle_times(_log([1, 2, 3]))
+    good = get_cycle_times(_log([1, 2, 3]))
+    bad = get_cycle_times(_log([20, 30, 40]))
+    simulations = [
+        _FakeSimulation([bad, bad, bad]),
+        _FakeSimulation([good, good, good]),
+        _FakeSimulation([good, bad, bad]),
+        _FakeSimulation([bad, good, good]),
+    ]
+
+    best, distances = _race(simulations, val_cycle_times, racing_margin=0.5, warmup_rounds=1)
+
+    assert best == CANDIDATES[1]
+    assert distances[CANDIDATES[1].name] == 0
+    # candidates 0 and 3 are stopped after the first round, candidate 2 after the second round
+    assert [simulation.requested for simulation in simulations] == [1, 3, 2, 1]
+    assert all(simulation.stopped for simulation in simulations)
+
+
+def test_race_selects_from_remaining_candidates():
+    val_cycle_times = get_cycle_times(_log([1, 2, 3]))
+    good = get_cycle_times(_log([1, 2, 3]))
+    worse = get_cycle_times(_log([5, 6, 7]))
+    worst = get_cycle_times(_log([9, 10, 11]))
+    bad = get_cycle_times(_log([20, 30, 40]))
+    # candidate 0 is stopped after the first round, its distance stays lower than the final one of candidate 1
+    simulations = [
+        _FakeSimulation([worse, worse, worse]),
+        _FakeSimulation([good, worst, worst]),
+        _FakeSimulation([bad, bad, bad]),
+        _FakeSimulation([bad, bad, bad]),
+    ]
+
+    best, distances = _race(simulations, val_cycle_times, racing_margin=0.5, warmup_rounds=1)
+
+    assert distances[CANDIDATES[0].name] < distances[CANDIDATES[1].name]
+    assert best == CANDIDATES[1]
+    assert [simulation.requested for simulation in simulations] == [1, 3, 1, 1]
+
+
+def test_race_keeps_candidates_close_to_a_perfect_warmup():
+    val_cycle_times = get_cycle_times(_log([1, 2, 3]))
+    good = get_cycle_times(_log([1, 2, 3]))
+    close = get_cycle_times(_log([1, 2, 5]))
+    bad = get_cycle_times(_log([20, 30, 40]))
+    # candidate 1 leads after the warm-up with a distance of 0, candidate 2 is closer over all cases
+    simulations = [
+        _FakeSimulation([bad, bad, bad]),
+        _FakeSimulation([good, close, close]),
+        _FakeSimulation([close, good, good]),
+        _FakeSimulation([bad, bad, bad]),
+    ]
+
+    best, distances = _race(simulations, val_cycle_times, racing_margin=0.5, warmup_rounds=1)
+
+    assert best == CANDIDATES[2]
+    assert distances[CANDIDATES[2].name] == 0
+    assert [simulation.requested for simulation in simulations] == [1, 3, 3, 1]
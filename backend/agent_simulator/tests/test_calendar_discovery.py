@@ -0,0 +1,76 @@
+"""
+Unit tests for the discovery of the resource calendars (source/agent_types).
+"""
+
+import pandas as pd
+from source.agent_types.discover_roles import discover_resource_pools
+from source.agent_types.factory import CalendarFactory
+
+
+def _timestamps():
+    # Monday 1 and Monday 8 in the 09:00 granule, Tuesday 2 in the 10:15 granule
+    return pd.Series(
+        pd.to_datetime(
+            ["2024-01-01 09:05", "2024-01-01 09:10", "2024-01-08 09:00", "2024-01-02 10:20"],
+        ).tz_localize("UTC")
+    )
+
+
+def test_register_timestamps():
+    calendar_factory = CalendarFactory(15)
+    calendar_factory.check_date_times(["r1", "r1", "r1", "r2"], ["A", "B", "A", "A"], _timestamps())
+    kpi = calendar_factory.kpi_calendar
+
+    assert kpi.registered_resources() == ["r1", "r2"]
+    assert kpi.active_granules("r1") == [(0, 36)]
+    assert kpi.active_granules("r2") == [(1, 41)]
+    assert kpi.granule_frequency("r1", 0, 36) == 3
+    # r1 was active in the granule on both Mondays it was active
+    assert kpi.confidence("r1", 0, 36) == 1
+    assert kpi.support("r1", 0, 36) == 1
+    best_task, task_confidences = kpi.task_cond_confidence("r1", 0, 36)
+    # B was only active on one Monday, but always in this granule, ties keep the task registered first
+    assert best_task == "A"
+    assert task_confidences == {"A": 1, "B": 1}
+    assert kpi.resource_participation_ratio("r1") == 1
+    assert kpi.resource_participation_ratio("r2") == 0.5
+
+
+def test_register_single_timestamps_like_batches():
+    single_factory = CalendarFactory(15)
+    for resource, activity, timestamp in zip(["r1", "r1", "r1", "r2"], ["A", "B", "A", "A"], _timestamps()):
+        single_factory.check_date_time(resource, activity, timestamp)
+    batch_factory = CalendarFactory(15)
+    batch_factory.check_date_times(["r1", "r1", "r1", "r2"], ["A", "B", "A", "A"], _timestamps())
+
+    single_calendars = single_factory.build_weekly_calendars(0.1, 0.7, 0.4)
+    batch_calendars = batch_factory.build_weekly_calendars(0.1, 0.7, 0.4)
+
+    assert {r: c.to_dict() for r, c in single_calendars.items()} == {r: c.to_dict() for r, c in batch_calendars.items()}
+    assert single_calendars["r1"].to_dict()["time_periods"] == [
+        {"from": "MONDAY", "to": "MONDAY", "beginTime": "09:00:00", "endTime": "09:15:00"}
+    ]
+
+
+def test_discover_resource_pools():
+    # agents 0 and 1 mostly perform A, agents 2 and 3 mostly perform B and C, agent 4 performs all equally often
+    activities = {0: "AAAB", 1: "AAAAC", 2: "BBCCA", 3: "BBBCC", 4: "ABC"}
+    log = pd.DataFrame(
+        [
+            {"activity_name": activity, "agent": agent}
+            for agent, agent_activities in activities.items()
+            for activity in agent_activities
+        ]
+    )
+
+    pools = discover_resource_pools(log)
+
+    assert pools == {"Role 1": [0, 1], "Role 2": [2, 3], "Role 3": [4]}
+
+
+def test_discover_resource_pools_single_agent():
+    log = pd.DataFrame({"activity_name": list("AABC"), "agent": 0})
+
+    pools = discover_resource_pools(log)
+
+    assert pools == {"Role 1": [0]}
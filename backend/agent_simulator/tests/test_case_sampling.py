@@ -0,0 +1,120 @@
+"""
+Unit tests for the case sampling of the approximate discovery (source/case_sampling.py).
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from simulation_config import SimulationConfig
+from source.case_sampling import CONFIDENCE_Z
+from source.case_sampling import estimate_sampling_accuracy
+from source.case_sampling import get_sample_fraction
+from source.case_sampling import sample_cases
+
+
+def _log(num_cases):
+    # every fourth case follows the rare variant A -> C, the others A -> B
+    rows = []
+    for case_id in range(num_cases):
+        start = pd.Timestamp("2024-01-01 08:00:00", tz="UTC") + pd.Timedelta(hours=case_id)
+        second_activity = "C" if case_id % 4 == 0 else "B"
+        for i, activity in enumerate(["A", second_activity]):
+            rows.append(
+                {
+                    "case_id": case_id,
+                    "activity_name": activity,
+                    "start_timestamp": start + pd.Timedelta(minutes=i),
+                    "end_timestamp": start + pd.Timedelta(minutes=i + 1),
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def test_get_sample_fraction():
+    df = _log(10)
+
+    assert get_sample_fraction(df) is None
+    assert get_sample_fraction(df, sample_fraction=0.5) == 0.5
+    # 20 events, a budget of 5 events is a quarter of the log
+    assert get_sample_fraction(df, sample_fraction=0.5, sample_max_events=5) == 0.25
+    assert get_sample_fraction(df, sample_max_events=100) is None
+    with pytest.raises(ValueError):
+        get_sample_fraction(df, sample_fraction=0)
+
+
+def test_sample_cases_is_stratified_by_variant():
+    df = _log(40)
+
+    sample, held_out = sample_cases(df, 0.5)
+
+    sampled_case_ids = set(sample["case_id"])
+    assert len(sampled_case_ids) == 20
+    assert sampled_case_ids.isdisjoint(held_out["case_id"])
+    assert len(sample) + len(held_out) == len(df)
+    # the rare variant keeps its share of the cases
+    assert (sample["activity_name"] == "C").sum() == 5
+    # cases are sampled completely
+    assert (sample.groupby("case_id").size() == 2).all()
+
+
+def test_sample_cases_is_reproducible():
+    df = _log(40)
+
+    assert sample_cases(df, 0.3)[0].equals(sample_cases(df, 0.3)[0])
+
+
+def _events(case_id, durations):
+    # consecutive activities of a case with the given durations in minutes
+    rows = []
+    end = pd.Timestamp("2024-01-01 08:00:00", tz="UTC") + pd.Timedelta(hours=case_id)
+    for activity, minutes in durations:
+        start, end = end, end + pd.Timedelta(minutes=minutes)
+        rows.append({"case_id": case_id, "activity_name": activity, "start_timestamp": start, "end_timestamp": end})
+    return rows
+
+
+def test_estimate_sampling_accuracy():
+    df_sample = pd.DataFrame(
+        _events(0, [("A", 1), ("B", 1), ("zzz_end", 0)]) + _events(1, [("A", 1), ("C", 1), ("zzz_end", 0)])
+    )
+    df_held_out = pd.DataFrame(_events(2, [("A", 2), ("B", 1)]) + _events(3, [("A", 2), ("B", 1)]))
+    # A is followed 30 times by B and 10 times by C, B is always followed by the end
+    transition_counts = {("A",): {"B": 30, "C": 10}, ("A", "B"): {"zzz_end": 40}}
+    statistics = SimpleNamespace(transition_counts={"transition_probabilities_global": transition_counts})
+
+    accuracy = estimate_sampling_accuracy(df_sample, df_held_out, statistics, True, 0.75)
+
+    assert accuracy["sampled_cases"] == 2
+    assert accuracy["total_cases"] == 4
+    assert accuracy["sampled_events"] == 4
+    assert accuracy["total_events"] == 8
+    # both next activities of A have the same half-width, the certain end of B has none
+    half_width = CONFIDENCE_Z * np.sqrt(0.75 * 0.25 / 40) * np.sqrt(1 - 0.75)
+    assert accuracy["transition_probability_ci"]["max"] == pytest.approx(half_width)
+    assert accuracy["transition_probability_ci"]["mean"] == pytest.approx((30 + 10) / 80 * half_width)
+    # A takes 1 minute in the sample and 2 minutes in the held-out cases, C is not held out
+    assert accuracy["activity_duration_distance"] == {"A": pytest.approx(0.5), "B": 0.0}
+
+
+def test_estimate_sampling_accuracy_without_transitions():
+    df = pd.DataFrame(_events(0, [("A", 1)]))
+    statistics = SimpleNamespace(transition_counts={})
+
+    accuracy = estimate_sampling_accuracy(df, df, statistics, False, 0.5)
+
+    assert accuracy["transition_probability_ci"] == {"mean": None, "max": None}
+    assert accuracy["activity_duration_distance"] == {"A": 0.0}
+
+
+def test_discovery_of_small_sample(discovery_params):
+    # none of the few sampled cases is one of the validation cases (the last 20 % of the cases)
+    config = SimulationConfig()
+    config.process_discovery_args({**discovery_params, "sample_fraction": 0.05})
+
+    config.run_discovery()
+
+    sim_instance = config.sim_instance
+    assert sim_instance.num_cases_to_simulate_val == sim_instance.df_val["case_id"].nunique() > 0
+    assert sim_instance.discovery_accuracy is not None
@@ -0,0 +1,71 @@
+"""
+Unit tests for the concurrency oracles (source/extraneous_delays/concurrency_oracle.py).
+"""
+
+import pandas as pd
+import pytest
+from source.extraneous_delays.concurrency_oracle import ConcurrencyOracle
+from source.extraneous_delays.concurrency_oracle import Configuration
+from source.extraneous_delays.concurrency_oracle import OverlappingConcurrencyOracle
+from source.extraneous_delays.event_log import EventLogIDs
+
+
+def _event_log():
+    # case 1: A -> (B || C) -> D, case 2: A -> D
+    events = [
+        (1, "A", "08:00", "09:00"),
+        (1, "B", "09:00", "10:00"),
+        (1, "C", "09:00", "10:30"),
+        (1, "D", "11:00", "12:00"),
+        (2, "A", "08:00", "08:30"),
+        (2, "D", "09:00", "10:00"),
+    ]
+    return pd.DataFrame(
+        [
+            {
+                "case_id": case_id,
+                "activity_name": activity,
+                "start_timestamp": pd.Timestamp(f"2024-01-01 {start}", tz="UTC"),
+                "end_timestamp": pd.Timestamp(f"2024-01-01 {end}", tz="UTC"),
+            }
+            for case_id, activity, start, end in events
+        ]
+    )
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_add_enabled_times(max_workers):
+    event_log = _event_log()
+    concurrency = {"A": set(), "B": {"C"}, "C": {"B"}, "D": set()}
+    oracle = ConcurrencyOracle(concurrency, Configuration(log_ids=EventLogIDs(), consider_start_times=True))
+
+    oracle.add_enabled_times(
+        event_log, set_nat_to_first_event=True, include_enabling_activity=True, max_workers=max_workers
+    )
+
+    assert event_log["enabling_activity"].fillna("-").tolist() == ["-", "A", "A", "C", "-", "A"]
+    assert pd.isna(event_log.loc[0, "enabled_time"])
+    # C is concurrent with B, so it is enabled by A and not by B
+    assert event_log.loc[2, "enabled_time"] == pd.Timestamp("2024-01-01 09:00", tz="UTC")
+    assert event_log.loc[3, "enabled_time"] == pd.Timestamp("2024-01-01 10:30", tz="UTC")
+
+
+def test_add_enabled_times_uses_trace_start_for_first_events():
+    event_log = _event_log()
+    oracle = ConcurrencyOracle({"A": set(), "B": set(), "C": set(), "D": set()}, Configuration(log_ids=EventLogIDs()))
+
+    oracle.add_enabled_times(event_log)
+
+    assert event_log.loc[0, "enabled_time"] == pd.Timestamp("2024-01-01 08:00", tz="UTC")
+    # without considering start times, B (ending first) enables C
+    assert event_log.loc[2, "enabled_time"] == pd.Timestamp("2024-01-01 10:00", tz="UTC")
+
+
+def test_overlapping_concurrency_oracle():
+    event_log = _event_log()
+
+    oracle = OverlappingConcurrencyOracle(event_log, Configuration(log_ids=EventLogIDs()))
+
+    # B and C overlap in every case where both occur, the rest is executed sequentially
+    assert oracle.concurrency == {"A": set(), "B": {"C"}, "C": {"B"}, "D": set()}
+    assert oracle.config.consider_start_times is True
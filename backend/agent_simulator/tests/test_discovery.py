@@ -0,0 +1,200 @@
+"""
+Unit tests for the helper functions used in the discovery phase (source/discovery.py).
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from source.activity_transition import get_start_activity_distribution
+from source.arrival_distribution import get_inter_arrival_times
+from source.discovery import PARAMETER_SET_FUNCTIONS
+from source.discovery import TRANSITION_COUNT_FUNCTIONS
+from source.discovery import activities_with_zero_waiting_time
+from source.discovery import apply_behavior_mode
+from source.discovery import discover_statistics
+from source.discovery import generate_preceding_activities_dict
+from source.discovery import get_required_parameter_sets
+from source.discovery import preprocess
+from source.discovery_statistics import MAX_DURATION_SAMPLES
+
+
+def _log_from_traces(traces):
+    """
+    Builds a small event log from a dict of case_id -> list of activity names,
+    every activity takes one minute and directly follows the previous one.
+    """
+    rows = []
+    for case_id, activities in traces.items():
+        start = pd.Timestamp("2024-01-01 08:00:00", tz="UTC")
+        for activity in activities:
+            end = start + pd.Timedelta(minutes=1)
+            rows.append({"case_id": case_id, "activity_name": activity, "start_timestamp": start, "end_timestamp": end})
+            start = end
+    return pd.DataFrame(rows)
+
+
+def test_generate_preceding_activities_dict():
+    df = _log_from_traces(
+        {
+            1: ["A", "B", "C", "D"],
+            2: ["A", "C", "B", "D"],
+            3: ["B", "A", "A", "D"],
+        }
+    )
+
+    prerequisites = generate_preceding_activities_dict(df)
+
+    # Activities are registered in the order they first appear after the start of a case
+    assert list(prerequisites.keys()) == ["B", "C", "D", "A"]
+    # B is the first activity of case 3, so only case 1 and 2 count
+    assert sorted(prerequisites["B"]) == ["A"]
+    assert sorted(prerequisites["C"]) == ["A"]
+    assert sorted(prerequisites["D"]) == ["A", "B"]
+    # A only follows the start of case 3, where both occurrences are preceded by B
+    assert sorted(prerequisites["A"]) == ["B"]
+
+
+def test_generate_preceding_activities_dict_uses_end_timestamp_order():
+    df = _log_from_traces({1: ["A", "B", "C"]})
+    # Make B end after C, so C is preceded by A only
+    df.loc[df["activity_name"] == "B", "end_timestamp"] += pd.Timedelta(hours=1)
+
+    prerequisites = generate_preceding_activities_dict(df)
+
+    assert sorted(prerequisites["C"]) == ["A"]
+    assert sorted(prerequisites["B"]) == ["A", "C"]
+
+
+def test_get_start_activity_distribution():
+    df = _log_from_traces({1: ["A", "B"], 2: ["B", "A"], 3: ["A", "C"], 4: ["A"]})
+
+    assert get_start_activity_distribution(df) == {"A": 0.75, "B": 0.25}
+
+    # an artificial start activity starts every case
+    df = _log_from_traces({1: ["Start", "A"], 2: ["B", "A"]})
+    assert get_start_activity_distribution(df) == {"Start": 1.0}
+
+
+def test_preprocess_names_artificial_resources():
+    df = _log_from_traces({1: ["A", "B"], 2: ["A", "B"]})
+    df["resource"] = ["Clerk", np.nan, "Clerk", np.nan]
+
+    df, agent_to_resource = preprocess(df)
+
+    assert sorted(agent_to_resource.values()) == ["Clerk", "artificial_B"]
+    assert (df.loc[df["activity_name"] == "B", "resource"] == "artificial_B").all()
+    # every case ends with an artificial end activity
+    assert (df.groupby("case_id")["activity_name"].last() == "zzz_end").all()
+
+
+def test_preprocess_keeps_agents_of_existing_mapping():
+    df = _log_from_traces({1: ["A", "B"]})
+    df["resource"] = ["Clerk", "Manager"]
+    _, agent_to_resource = preprocess(df)
+
+    new_df = _log_from_traces({2: ["A", "B"]})
+    new_df["resource"] = ["Intern", "Clerk"]
+    new_df, new_agent_to_resource = preprocess(new_df, agent_to_resource)
+
+    # known resources keep their agent, new resources get the next free agent
+    assert new_agent_to_resource == {0: "Clerk", 1: "Manager", 2: "Intern"}
+    assert new_df.loc[new_df["activity_name"] != "zzz_end", "agent"].tolist() == [2, 0]
+
+
+def test_merged_statistics_equal_statistics_of_whole_log():
+    traces = {1: ["A", "B", "C"], 2: ["A", "C", "B", "B"], 3: ["B", "A", "C"], 4: ["A", "B", "C"]}
+    resources = {"A": "Clerk", "B": "Manager", "C": "Clerk"}
+    df = _log_from_traces(traces)
+    df["resource"] = df["activity_name"].map(resources)
+    # C waits one hour after B in the last case
+    df.loc[(df["case_id"] == 4) & (df["activity_name"] == "C"), "start_timestamp"] += pd.Timedelta(hours=1)
+
+    whole_log, agent_to_resource = preprocess(df.copy())
+    first_half, _ = preprocess(df[df["case_id"] <= 2].copy(), agent_to_resource)
+    second_half, _ = preprocess(df[df["case_id"] > 2].copy(), agent_to_resource)
+
+    def statistics(log):
+        return discover_statistics(log, {}, transition_set_names=TRANSITION_COUNT_FUNCTIONS)
+
+    merged = statistics(first_half).merge(statistics(second_half))
+    whole = statistics(whole_log)
+
+    assert merged.transition_counts == whole.transition_counts
+    assert merged.waiting_time_counts.equals(whole.waiting_time_counts)
+    assert merged.max_activity_count_per_case == whole.max_activity_count_per_case
+    assert merged.agent_activities == whole.agent_activities
+    assert merged.preceding_activities == whole.preceding_activities
+    assert merged.case_start_times.equals(whole.case_start_times)
+
+
+def test_merged_duration_samples_are_bounded():
+    df = _log_from_traces({1: ["A"], 2: ["A"]})
+    df["resource"] = "Clerk"
+    first_half, agent_to_resource = preprocess(df[df["case_id"] == 1].copy())
+    second_half, _ = preprocess(df[df["case_id"] == 2].copy(), agent_to_resource)
+    # every case has many durations of A, so that the combined durations do not fit into a sample
+    first = discover_statistics(first_half, {0: {"A": [1.0] * 3 * MAX_DURATION_SAMPLES}}, transition_set_names=[])
+    second = discover_statistics(second_half, {0: {"A": [2.0] * MAX_DURATION_SAMPLES}}, transition_set_names=[])
+
+    merged = first.merge(second)
+
+    assert len(first.activity_durations[0]["A"]) == MAX_DURATION_SAMPLES
+    assert first.activity_duration_counts == {0: {"A": 3 * MAX_DURATION_SAMPLES}}
+    assert len(merged.activity_durations[0]["A"]) == MAX_DURATION_SAMPLES
+    assert merged.activity_duration_counts == {0: {"A": 4 * MAX_DURATION_SAMPLES}}
+    # the sample keeps the share of the durations of both logs
+    assert np.mean(merged.activity_durations[0]["A"]) == pytest.approx(1.25, abs=0.05)
+
+
+def test_activities_with_zero_waiting_time():
+    df = _log_from_traces({1: ["A", "B", "C"], 2: ["A", "B", "C"]})
+    # C waits one hour after B in the second case
+    df.loc[(df["case_id"] == 2) & (df["activity_name"] == "C"), "start_timestamp"] += pd.Timedelta(hours=1)
+
+    assert activities_with_zero_waiting_time(df) == ["A", "B"]
+
+
+def test_get_inter_arrival_times_skips_first_arrival_of_day():
+    df = _log_from_traces({1: ["A"], 2: ["A"], 3: ["A"]})
+    df["start_timestamp"] = pd.to_datetime(
+        ["2024-01-01 08:00:00", "2024-01-01 08:30:00", "2024-01-02 08:00:00"], utc=True
+    )
+
+    assert get_inter_arrival_times(df) == [1800.0]
+
+
+def test_get_required_parameter_sets():
+    assert get_required_parameter_sets(False, False, False) == {
+        "transition_probabilities_autonomous",
+        "agent_transition_probabilities_autonomous",
+    }
+    assert get_required_parameter_sets(False, True, True) == {"transition_probabilities_global", "timers_extr"}
+    assert get_required_parameter_sets(True, False, False) == set(PARAMETER_SET_FUNCTIONS)
+
+
+def test_apply_behavior_mode_materializes_missing_parameter_sets():
+    df = _log_from_traces({1: ["A", "B"], 2: ["A", "B"]})
+    df["agent"] = 0
+    simulation_parameters = {name: None for name in PARAMETER_SET_FUNCTIONS}
+    simulation_parameters["transition_probabilities_global"] = {("A",): {"B": 1.0}}
+
+    apply_behavior_mode(simulation_parameters, df, central_orchestration=True, discover_extr_delays=False)
+
+    # the discovered global transition probabilities are kept, nothing else is discovered
+    assert simulation_parameters["transition_probabilities"] == {("A",): {"B": 1.0}}
+    assert simulation_parameters["agent_transition_probabilities"] is None
+    assert simulation_parameters["transition_probabilities_autonomous"] is None
+    assert simulation_parameters["timers"] == {}
+
+    apply_behavior_mode(simulation_parameters, df, central_orchestration=False, discover_extr_delays=False)
+
+    assert simulation_parameters["central_orchestration"] is False
+    assert simulation_parameters["transition_probabilities_autonomous"] is not None
+    assert (
+        simulation_parameters["transition_probabilities"]
+        is simulation_parameters["transition_probabilities_autonomous"]
+    )
+    assert (
+        simulation_parameters["agent_transition_probabilities"]
+        is simulation_parameters["agent_transition_probabilities_autonomous"]
+    )
@@ -0,0 +1,162 @@
+"""
+Unit tests for the discovery stage graph (source/discovery_stages.py).
+"""
+
+import os
+
+import pandas as pd
+import pytest
+from source import discovery_cache
+from source.discovery import activities_with_zero_waiting_time
+from source.discovery import get_prerequisites_per_activity
+from source.discovery import preprocess
+from source.discovery_cache import DiscoveryCache
+from source.discovery_cache import get_code_fingerprint
+from source.discovery_cache import get_stage_keys
+from source.discovery_stages import DiscoveryStage
+from source.discovery_stages import run_discovery_stages
+from source.runtime_meter import RuntimeMeter
+
+
+@pytest.fixture(scope="module")
+def train_log():
+    df = pd.read_csv("test_resources/LoanAppSmall.csv")
+    df = df.rename(columns={"activity": "activity_name", "start_time": "start_timestamp", "end_time": "end_timestamp"})
+    df, _ = preprocess(df)
+    return df
+
+
+# Arguments of every call of _count_activities
+_counted_logs = []
+
+
+def _count_activities(df, activity="zzz_end"):
+    _counted_logs.append(len(df))
+    return int((df["activity_name"] == activity).sum())
+
+
+def _stages():
+    return [
+        DiscoveryStage("activities_without_waiting_time", activities_with_zero_waiting_time, ("train",)),
+        DiscoveryStage("prerequisites", get_prerequisites_per_activity, ("train",)),
+        # Depends on another stage, len is used as a simple picklable function
+        DiscoveryStage("num_prerequisites", len, ("prerequisites",)),
+    ]
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_run_discovery_stages(train_log, max_workers):
+    results = run_discovery_stages(_stages(), {"train": train_log}, max_workers=max_workers)
+
+    assert results["activities_without_waiting_time"] == activities_with_zero_waiting_time(train_log)
+    assert results["prerequisites"] == get_prerequisites_per_activity(train_log)
+    assert results["num_prerequisites"] == 2
+
+
+def test_run_discovery_stages_unknown_input(train_log):
+    stages = [DiscoveryStage("prerequisites", get_prerequisites_per_activity, ("test",))]
+
+    with pytest.raises(ValueError):
+        run_discovery_stages(stages, {"train": train_log}, max_workers=1)
+
+
+def test_run_discovery_stages_cyclic_dependencies(train_log):
+    stages = [DiscoveryStage("a", len, ("b",)), DiscoveryStage("b", len, ("a",))]
+
+    with pytest.raises(ValueError):
+        run_discovery_stages(stages, {"train": train_log}, max_workers=1)
+
+
+def test_run_discovery_stages_reuses_cached_results(train_log, tmp_path):
+    cache = DiscoveryCache(str(tmp_path))
+    _counted_logs.clear()
+
+    first = run_discovery_stages(
+        _stages() + [DiscoveryStage("ends", _count_activities, ("train",))],
+        {"train": train_log},
+        max_workers=1,
+        cache=cache,
+    )
+    second = run_discovery_stages(
+        _stages() + [DiscoveryStage("ends", _count_activities, ("train",))],
+        {"train": train_log},
+        max_workers=1,
+        cache=cache,
+    )
+
+    assert first == second
+    assert len(_counted_logs) == 1
+
+    # other settings or another log are a different input
+    run_discovery_stages(
+        [DiscoveryStage("ends", _count_activities, ("train",), {"activity": "AML check"})],
+        {"train": train_log},
+        max_workers=1,
+        cache=cache,
+    )
+    run_discovery_stages(
+        [DiscoveryStage("ends", _count_activities, ("train",))],
+        {"train": train_log.head(10)},
+        max_workers=1,
+        cache=cache,
+    )
+    assert len(_counted_logs) == 3
+
+
+def _count_other_activities(df, activity="zzz_end"):
+    return int((df["activity_name"] != activity).sum())
+
+
+def test_stage_keys_change_with_the_code(train_log, tmp_path, monkeypatch):
+    stage = DiscoveryStage("ends", _count_activities, ("train",))
+    key = get_stage_keys([stage], {"train": train_log})["ends"]
+
+    # an edited stage function with the same name
+    monkeypatch.setattr(_count_other_activities, "__qualname__", _count_activities.__qualname__)
+    edited_stage = DiscoveryStage("ends", _count_other_activities, ("train",))
+    assert get_stage_keys([edited_stage], {"train": train_log})["ends"] != key
+
+    # an edit anywhere in the source package
+    (tmp_path / "module.py").write_text("x = 1")
+    fingerprint = get_code_fingerprint(str(tmp_path))
+    (tmp_path / "module.py").write_text("x = 2")
+    get_code_fingerprint.cache_clear()
+    assert get_code_fingerprint(str(tmp_path)) != fingerprint
+    monkeypatch.setattr(discovery_cache, "get_code_fingerprint", lambda: fingerprint)
+    assert get_stage_keys([stage], {"train": train_log})["ends"] != key
+
+
+def test_discovery_cache_evicts_least_recently_used(tmp_path):
+    cache = DiscoveryCache(str(tmp_path))
+    cache.put("a", "a")
+    entry_size = os.path.getsize(tmp_path / "a.pkl")
+    cache.max_bytes = 2 * entry_size
+    os.utime(tmp_path / "a.pkl", (1, 1))
+    cache.put("b", "b")
+    os.utime(tmp_path / "b.pkl", (2, 2))
+
+    # using a makes b the least recently used result
+    assert cache.get("a") == (True, "a")
+    cache.put("c", "c")
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, "a")
+    assert cache.get("c") == (True, "c")
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_run_discovery_stages_records_stages(train_log, max_workers):
+    meter = RuntimeMeter()
+
+    with meter.stage("stages"):
+        run_discovery_stages(_stages(), {"train": train_log}, max_workers=max_workers, meter=meter)
+
+    stages = {stage["name"]: stage for stage in meter.to_dict()["stages"]}
+    assert set(stages) == {
+        "stages/activities_without_waiting_time",
+        "stages/prerequisites",
+        "stages/num_prerequisites",
+        "stages",
+    }
+    assert all(stage["duration_seconds"] >= 0 for stage in stages.values())
+    assert meter.counters["discovery_stages_completed"] == 3
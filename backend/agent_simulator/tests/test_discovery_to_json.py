@@ -0,0 +1,60 @@
+"""
+Unit tests for the JSON representation of a discovered model (source/discovery_to_json.py).
+"""
+
+import copy
+import json
+
+import pytest
+from source.discovery_to_json import agent_to_json
+from source.discovery_to_json import dump_agent_json
+from source.discovery_to_json import iter_agent_json
+
+
+@pytest.fixture(scope="module")
+def sim_instance(discovered_sim_config):
+    return discovered_sim_config.sim_instance
+
+
+def test_dump_is_compact_json_of_the_model(sim_instance):
+    text = dump_agent_json(sim_instance)
+
+    assert json.loads(text) == agent_to_json(sim_instance)["data"]
+    assert "".join(iter_agent_json(sim_instance)) == text
+    assert text == json.dumps(json.loads(text), separators=(",", ":"))
+    assert "df_train" not in json.loads(text)
+
+
+def test_aliased_parameters_are_encoded_alike(sim_instance):
+    simulation_parameters = dict(sim_instance.simulation_parameters)
+    simulation_parameters["transition_probabilities_autonomous"] = simulation_parameters["transition_probabilities"]
+    sim_instance = copy.copy(sim_instance)
+    sim_instance.simulation_parameters = simulation_parameters
+
+    parameters = json.loads(dump_agent_json(sim_instance))["simulation_parameters"]
+
+    assert parameters["transition_probabilities"] == parameters["transition_probabilities_autonomous"]
+    assert len(parameters) == len(simulation_parameters)
+
+
+def test_selected_fields(sim_instance):
+    data = json.loads(dump_agent_json(sim_instance, fields=["res_calendars", "roles", "params"]))
+    roles = agent_to_json(sim_instance)["data"]["simulation_parameters"]["roles"]
+
+    assert set(data) == {"params", "simulation_parameters"}
+    assert set(data["simulation_parameters"]) == {"res_calendars", "roles"}
+    assert data["simulation_parameters"]["roles"] == roles
+
+
+def test_parameters_of_one_agent(sim_instance):
+    simulation_parameters = sim_instance.simulation_parameters
+    agent = list(simulation_parameters["res_calendars"])[0]
+
+    parameters = json.loads(dump_agent_json(sim_instance, agent=agent))["simulation_parameters"]
+
+    assert list(parameters["res_calendars"]) == [str(agent)]
+    assert list(parameters["agent_transition_probabilities"]) in ([str(agent)], [])
+    for targets in parameters["transition_probabilities"].values():
+        assert list(targets) == [str(agent)]
+    # parameters without entries per agent are not filtered
+    assert parameters["roles"] == json.loads(dump_agent_json(sim_instance))["simulation_parameters"]["roles"]
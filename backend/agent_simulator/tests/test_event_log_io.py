@@ -0,0 +1,70 @@
+"""
+Unit tests for reading event logs (source/event_log_io.py).
+"""
+
+import pandas as pd
+from source.train_test_split import load_data
+
+COLUMN_NAMES = {
+    "case": "case_id",
+    "activity": "activity_name",
+    "resource": "resource",
+    "start_time": "start_timestamp",
+    "end_time": "end_timestamp",
+}
+
+
+def _raw_log():
+    return pd.DataFrame(
+        {
+            "case": ["case_2", "case_2", "case_10"],
+            "activity": ["A", "B", "A"],
+            "resource": ["Clerk", None, "Clerk"],
+            "start_time": ["2024-01-01T08:00:00+01:00", "2024-01-01T09:00:00+01:00", "2024-01-02T08:00:00+01:00"],
+            "end_time": ["2024-01-01T08:30:00+01:00", "2024-01-01T09:30:00+01:00", "2024-01-02T08:30:00+01:00"],
+        }
+    )
+
+
+def _assert_typed_log(df, num_cases):
+    assert num_cases == 2
+    assert df["case_id"].tolist() == [2, 2, 10]
+    assert df["activity_name"].tolist() == ["A", "B", "A"]
+    assert pd.isna(df["resource"][1])
+    # the timestamps are parsed into UTC
+    assert df["start_timestamp"][0] == pd.Timestamp("2024-01-01 07:00:00", tz="UTC")
+    assert str(df["end_timestamp"].dt.tz) == "UTC"
+    # whole second timestamps are kept in nanoseconds like the other timestamps
+    assert df["start_timestamp"].dtype == df["end_timestamp"].dtype == "datetime64[ns, UTC]"
+
+
+def test_load_csv(tmp_path):
+    path = tmp_path / "log.csv"
+    _raw_log().to_csv(path, index=False)
+
+    df, num_cases = load_data(str(path), "csv", COLUMN_NAMES)
+
+    _assert_typed_log(df, num_cases)
+
+
+def test_load_csv_with_other_timestamp_format(tmp_path):
+    path = tmp_path / "log.csv"
+    raw_log = _raw_log()
+    raw_log["start_time"] = ["2024/01/01 07:00:00", "2024/01/01 08:00:00", "2024/01/02 07:00:00"]
+    raw_log.to_csv(path, index=False)
+
+    df, _ = load_data(str(path), "csv", COLUMN_NAMES)
+
+    assert df["start_timestamp"][0] == pd.Timestamp("2024-01-01 07:00:00", tz="UTC")
+    assert df["start_timestamp"].dtype == "datetime64[ns, UTC]"
+
+
+def test_load_parquet(tmp_path):
+    path = tmp_path / "log.parquet"
+    raw_log = _raw_log()
+    raw_log["start_time"] = pd.to_datetime(raw_log["start_time"], utc=True)
+    raw_log.to_parquet(path, index=False)
+
+    df, num_cases = load_data(str(path), "parquet", COLUMN_NAMES)
+
+    _assert_typed_log(df, num_cases)
@@ -0,0 +1,41 @@
+"""
+Unit tests for the visualization data of a discovered model (source/generate_discovery_data.py).
+"""
+
+from source.generate_discovery_data import get_activity_flow_for_starting_agent
+from source.generate_discovery_data import get_agent_for_role
+from source.generate_discovery_data import get_handover_index
+
+# {agent: {activity: {agent: {activity: probability}}}}
+AGENT_TRANSITION_PROBABILITIES = {
+    0: {"A": {1: {"B": 0.7, "C": 0.3}}, "D": {0: {"zzz_end": 1.0}}},
+    1: {"B": {0: {"A": 0.6}, 2: {"C": 0.4}}, "C": {0: {"D": 1.0}}},
+    2: {"A": {1: {"C": 1.0}}, "C": {0: {"D": 0.9, "zzz_end": 0.1}}},
+}
+
+
+def test_handover_index_is_sorted_by_probability():
+    edges = [("0", "1", "A", "B", 30.0), ("0", "2", "A", "C", 70.0), ("1", "0", "B", "D", 100.0)]
+
+    handovers = get_handover_index(edges)
+
+    assert handovers[("0", "A")] == [("2", "C"), ("1", "B")]
+    assert handovers[("1", "B")] == [("0", "D")]
+
+
+def test_activity_flow_follows_most_probable_unvisited_handover():
+    agents = list(AGENT_TRANSITION_PROBABILITIES)
+
+    flows = get_activity_flow_for_starting_agent(agents, AGENT_TRANSITION_PROBABILITIES, "A")
+
+    # agent 1 most likely hands B back to A, which is already in the flow, so the handover to C is followed
+    assert flows == {
+        "0": ["Process Start", "A", "B", "C", "D", "zzz_end"],
+        "2": ["Process Start", "A", "C", "D", "zzz_end"],
+    }
+
+
+def test_agent_for_role_is_first_role_listing_agent():
+    roles = {"Role 1": {"agents": [0, 1]}, "Role 2": {"agents": [1, 2]}}
+
+    assert get_agent_for_role(["0", "1", "2", "3"], roles) == {"0": "Role 1", "1": "Role 1", "2": "Role 2"}
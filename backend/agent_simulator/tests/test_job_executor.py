@@ -0,0 +1,102 @@
+"""
+Unit tests for the executor of discovery and simulation jobs (source/job_executor.py).
+"""
+
+import os
+import tempfile
+import time
+
+import pytest
+from source.job_executor import CANCELLED
+from source.job_executor import FAILED
+from source.job_executor import FINISHED
+from source.job_executor import QUEUED
+from source.job_executor import RUNNING
+from source.job_executor import JobExecutor
+from source.job_executor import get_job_limits
+from source.runtime_meter import RuntimeMeter
+from source.runtime_meter import track_job
+
+# Jobs are run in worker processes, so they are top level functions
+
+
+def _echo_job(job_id, directory, text):
+    with open(os.path.join(directory, "input.txt")) as f:
+        return f"{f.read()} {text} {tempfile.gettempdir() == directory}".encode()
+
+
+def _sleeping_job(job_id, directory, seconds):
+    with track_job(RuntimeMeter(job_id, kind="simulation")) as meter:
+        with meter.stage("sleep"):
+            time.sleep(seconds)
+    return b"done"
+
+
+def _failing_job(job_id, directory):
+    raise ValueError("invalid model")
+
+
+@pytest.fixture
+def executor():
+    executor = JobExecutor({"discovery": 1, "simulation": 2})
+    yield executor
+    for job_id in list(executor._jobs):
+        executor.discard(job_id)
+
+
+def test_job_runs_in_its_own_directory(executor):
+    job_id = executor.submit("simulation", _echo_job, "world", input_files={"input.txt": b"hello"})
+
+    status = executor.wait(job_id, timeout=60)
+
+    assert status["status"] == FINISHED
+    assert executor.read_result(job_id) == b"hello world True"
+    directory = executor._jobs[job_id].directory
+    executor.discard(job_id)
+    assert executor.get_status(job_id) is None
+    assert not os.path.exists(directory)
+
+
+def test_failed_job_reports_error(executor):
+    job_id = executor.submit("simulation", _failing_job)
+
+    status = executor.wait(job_id, timeout=60)
+
+    assert status["status"] == FAILED
+    assert status["error"] == "invalid model"
+    assert executor.read_result(job_id) is None
+
+
+def test_limits_are_per_kind(executor):
+    first = executor.submit("discovery", _sleeping_job, 30)
+    second = executor.submit("discovery", _sleeping_job, 30)
+    simulation = executor.submit("simulation", _sleeping_job, 0.1, job_id="small-simulation")
+
+    # the simulation does not wait for the discoveries
+    assert executor.wait(simulation, timeout=60)["status"] == FINISHED
+    assert executor.get_status("small-simulation")["progress"]["stages"][0]["name"] == "sleep"
+    assert executor.get_status(first)["status"] == RUNNING
+    assert executor.get_status(second)["status"] == QUEUED
+    assert executor.get_status(second)["queue_position"] == 1
+
+    # cancelling the running discovery starts the queued one
+    assert executor.cancel(first)
+    assert executor.get_status(first)["status"] == CANCELLED
+    assert executor.get_status(second)["status"] == RUNNING
+    assert executor.cancel(second)
+    assert not executor.cancel(second)
+
+
+def test_job_ids_are_unique(executor):
+    executor.submit("simulation", _sleeping_job, 0, job_id="job")
+
+    with pytest.raises(ValueError):
+        executor.submit("simulation", _sleeping_job, 0, job_id="job")
+    with pytest.raises(ValueError):
+        executor.submit("optimization", _sleeping_job, 0)
+
+
+def test_job_limits_from_environment(monkeypatch):
+    monkeypatch.setenv("MAX_SIMULATION_JOBS", "4")
+
+    assert get_job_limits() == {"discovery": 1, "simulation": 4}
@@ -0,0 +1,108 @@
+"""
+Unit tests for the model file format (source/model_format.py).
+"""
+
+import json
+import pickle
+
+import pandas as pd
+import pytest
+from source.discovery_to_json import agent_to_json
+from source.model_format import MAGIC
+from source.model_format import PARAMETER_SECTIONS
+from source.model_format import SECTIONS
+from source.model_format import _decode_object
+from source.model_format import _encode
+from source.model_format import dump_model
+from source.model_format import get_model_sections
+from source.model_format import load_model
+from source.model_format import read_model_sections
+
+
+def _vars(value):
+    return vars(value) if hasattr(value, "__dict__") else value
+
+
+def _round_trip(value):
+    return json.loads(json.dumps(_encode(value)), object_hook=_decode_object)
+
+
+def test_round_trip_timestamps_in_seconds():
+    # whole second timestamps are parsed in seconds instead of nanoseconds
+    timestamps = pd.Series(pd.to_datetime(["2023-02-09 08:00:00", "2023-02-10 09:30:00"]), name="start")
+    timestamps = timestamps.astype("datetime64[s]").dt.tz_localize("UTC")
+
+    pd.testing.assert_series_equal(_round_trip(timestamps), timestamps)
+    assert _round_trip(list(timestamps)) == list(timestamps)
+    assert _round_trip(list(timestamps.dt.tz_convert("Europe/Stockholm"))) == list(timestamps)
+
+
+def test_dump_and_load_model(discovered_sim_config):
+    data = dump_model(discovered_sim_config)
+    loaded = load_model(data)
+
+    assert data.startswith(MAGIC)
+    assert set(get_model_sections(data)) == set(SECTIONS)
+    assert len(data) < len(pickle.dumps(discovered_sim_config))
+
+    assert loaded.params == discovered_sim_config.params
+    assert loaded.sim_instance.num_cases_to_simulate == discovered_sim_config.sim_instance.num_cases_to_simulate
+    pd.testing.assert_frame_equal(loaded.sim_instance.df_train, discovered_sim_config.sim_instance.df_train)
+
+    parameters, loaded_parameters = (
+        discovered_sim_config.sim_instance.simulation_parameters,
+        loaded.sim_instance.simulation_parameters,
+    )
+    assert loaded_parameters.keys() == parameters.keys()
+    for name in ["roles", "agent_activity_mapping", "prerequisites", "case_arrival_times", "start_timestamp"]:
+        assert loaded_parameters[name] == parameters[name]
+    assert loaded_parameters["transition_probabilities_autonomous"] == parameters["transition_probabilities_autonomous"]
+    # the transition probabilities used by the simulation are still the discovered set
+    assert loaded_parameters["transition_probabilities"] is loaded_parameters["transition_probabilities_autonomous"]
+    for agent, activities in parameters["activity_durations_dict"].items():
+        for activity, distribution in activities.items():
+            assert _vars(loaded_parameters["activity_durations_dict"][agent][activity]) == _vars(distribution)
+    for agent, calendar in parameters["res_calendars"].items():
+        loaded_calendar = loaded_parameters["res_calendars"][agent]
+        assert loaded_calendar.to_dict() == calendar.to_dict()
+        assert loaded_calendar.default_date == calendar.default_date
+
+    statistics = loaded.sim_instance.discovery_statistics
+    assert statistics.transition_counts == discovered_sim_config.sim_instance.discovery_statistics.transition_counts
+    pd.testing.assert_series_equal(
+        statistics.case_start_times, discovered_sim_config.sim_instance.discovery_statistics.case_start_times
+    )
+
+
+def test_read_model_sections(discovered_sim_config):
+    data = dump_model(discovered_sim_config)
+
+    sections = read_model_sections(data, ["arrivals"])
+
+    assert list(sections) == ["arrivals"]
+    assert (
+        sections["arrivals"]["case_arrival_times"]
+        == discovered_sim_config.sim_instance.simulation_parameters["case_arrival_times"]
+    )
+
+
+def test_load_pickled_model(discovered_sim_config):
+    loaded = load_model(pickle.dumps(discovered_sim_config))
+
+    assert loaded == discovered_sim_config
+
+
+def test_load_model_sections(discovered_sim_config):
+    data = dump_model(discovered_sim_config)
+
+    loaded = load_model(data, ["calendars"])
+
+    parameters = loaded.sim_instance.simulation_parameters
+    assert loaded.sim_instance.params == discovered_sim_config.sim_instance.params
+    assert parameters.keys() == {"res_calendars"}
+    assert loaded.sim_instance.df_train is None
+    assert agent_to_json(load_model(data, PARAMETER_SECTIONS).sim_instance) == agent_to_json(
+        discovered_sim_config.sim_instance
+    )
+    with pytest.raises(ValueError):
+        load_model(data, ["calendar"])
@@ -0,0 +1,78 @@
+"""
+Unit tests for the registry of decoded models (source/model_registry.py).
+"""
+
+import pickle
+
+import pytest
+from source.model_format import dump_model
+from source.model_registry import ModelRegistry
+from source.model_registry import get_model_hash
+from source.model_registry import get_overlay_hash
+
+
+@pytest.fixture(scope="module")
+def model_data(discovered_sim_config):
+    return dump_model(discovered_sim_config)
+
+
+def test_register_and_get_model(model_data):
+    registry = ModelRegistry()
+
+    model_hash = registry.register(model_data)
+
+    assert model_hash == get_model_hash(model_data)
+    assert model_hash in registry
+    assert registry.get("unknown") is None
+
+    # a simulation changes the top level simulation parameters of its copy only
+    sim_config = registry.get(model_hash)
+    case_arrival_times = sim_config.sim_instance.simulation_parameters["case_arrival_times"]
+    sim_config.sim_instance.simulation_parameters["case_arrival_times"] = case_arrival_times[1:]
+    assert registry.get(model_hash).sim_instance.simulation_parameters["case_arrival_times"] == case_arrival_times
+
+    private = registry.get(model_hash, private=True)
+    private.sim_instance.simulation_parameters["roles"].clear()
+    assert registry.get(model_hash).sim_instance.simulation_parameters["roles"]
+
+    # a worker process is sent the pickled model
+    assert pickle.loads(registry.dump(model_hash)) == registry.get(model_hash)
+    assert registry.dump("unknown") is None
+
+
+def test_registry_evicts_least_recently_used(model_data):
+    registry = ModelRegistry(max_models=2)
+    other_data = [model_data + bytes([i]) for i in range(2)]
+    sim_config = registry.get(registry.register(model_data))
+
+    first_hash = registry.register(other_data[0], sim_config)
+    registry.get(get_model_hash(model_data))
+    registry.register(other_data[1], sim_config)
+
+    assert len(registry) == 2
+    assert first_hash not in registry
+    assert get_model_hash(model_data) in registry
+
+
+def test_registry_evicts_by_decoded_size(model_data):
+    # the model files take up less than max_bytes, the decoded models do not
+    registry = ModelRegistry(max_bytes=3 * len(model_data))
+    sim_config = registry.get(registry.register(model_data))
+
+    other_hash = registry.register(model_data + b"other", sim_config)
+
+    assert len(registry) == 1
+    assert other_hash in registry
+
+
+def test_alias_is_removed_with_model(model_data):
+    registry = ModelRegistry(max_models=1)
+    model_hash = registry.register(model_data)
+    overlay_hash = get_overlay_hash(model_hash, b'{"params": {"new_num_cases_to_simulate": 5}}')
+
+    registry.add_alias(overlay_hash, model_hash)
+
+    assert registry.get_alias(overlay_hash) == model_hash
+    assert registry.get_alias(get_overlay_hash(model_hash, b"{}")) is None
+    registry.register(model_data + b"other", registry.get(model_hash))
+    assert registry.get_alias(overlay_hash) is None
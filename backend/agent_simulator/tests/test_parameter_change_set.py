@@ -0,0 +1,126 @@
+"""
+Unit tests for parameter changes applied on top of a base model (parameter_change_set.py).
+"""
+
+import copy
+
+import pytest
+from parameter_change_set import ParameterChangeSet
+from source.model_format import CONFIG_SECTION
+from source.model_format import SECTIONS
+from source.model_format import dump_model
+from source.model_format import get_changed_sections
+
+
+def _calendar_json(agent_id, days, schedule):
+    return {"agent_id": agent_id, "days": days, "schedule": schedule}
+
+
+def test_unchanged_parameters_are_dropped(discovered_sim_config):
+    simulation_parameters = discovered_sim_config.sim_instance.simulation_parameters
+    changed_id, unchanged_id = list(simulation_parameters["res_calendars"])[:2]
+    # the frontend sends the schedules of all agents
+    time_periods = simulation_parameters["res_calendars"][unchanged_id].to_dict()["time_periods"]
+    days = sorted({period["from"] for period in time_periods})
+    schedule = [[[p["beginTime"], p["endTime"]] for p in time_periods if p["from"] == day] for day in days]
+    json_data = {
+        "params": {
+            "new_num_cases_to_simulate": discovered_sim_config.sim_instance.num_cases_to_simulate,
+            "central_orchestration": simulation_parameters["central_orchestration"],
+            "res_calendars": [
+                _calendar_json(changed_id, ["SUNDAY"], [[["09:00:00", "10:00:00"]]]),
+                _calendar_json(unchanged_id, days, schedule),
+            ],
+        }
+    }
+
+    changes = ParameterChangeSet.from_json(json_data).without_unchanged(discovered_sim_config)
+
+    assert changes.num_cases_to_simulate is None
+    assert changes.central_orchestration is None
+    assert list(changes.res_calendars) == [changed_id]
+    assert changes.get_changed_parameters() == {"res_calendars"}
+    assert not changes.changes_visualization()
+    assert ParameterChangeSet().without_unchanged(discovered_sim_config).is_empty()
+
+
+def test_transition_keys_are_literals(discovered_sim_config):
+    transitions = discovered_sim_config.sim_instance.simulation_parameters["transition_probabilities_autonomous"]
+    source_activity, targets = next(iter(transitions.items()))
+    target_agent, probabilities = next(iter(targets.items()))
+    unchanged = {str(source_activity): {str(target_agent): dict(probabilities)}}
+
+    changes = ParameterChangeSet.from_json({"params": {"transition_probabilities_autonomous": unchanged}})
+
+    assert not changes.without_unchanged(discovered_sim_config).transition_probabilities_autonomous
+    # the keys are parsed as literals, not evaluated
+    changes.transition_probabilities_autonomous = {"print('changed')": {str(target_agent): {}}}
+    with pytest.raises(ValueError):
+        changes.without_unchanged(discovered_sim_config)
+
+
+def test_apply_does_not_change_base_model(discovered_sim_config):
+    base = discovered_sim_config.sim_instance.simulation_parameters
+    agent_ids = list(base["res_calendars"])
+    before = copy.deepcopy({name: base[name] for name in ["roles", "agent_to_resource", "case_arrival_times"]})
+    calendar_before = base["res_calendars"][agent_ids[0]].to_dict()
+    json_data = {
+        "params": {
+            "new_num_cases_to_simulate": 5,
+            "agent_count_changes": [{"id": agent_ids[1], "count": 0}],
+            "res_calendars": [_calendar_json(agent_ids[0], ["MONDAY"], [[["09:00:00", "10:00:00"]]])],
+        }
+    }
+
+    changes = ParameterChangeSet.from_json(json_data).without_unchanged(discovered_sim_config)
+    updated = changes.apply(discovered_sim_config)
+    parameters = updated.sim_instance.simulation_parameters
+
+    assert updated.sim_instance.num_cases_to_simulate == 5
+    assert parameters["case_arrival_times"] != before["case_arrival_times"]
+    assert parameters["res_calendars"][agent_ids[0]].to_dict() != calendar_before
+    assert agent_ids[1] in parameters["deactivated_resources"]
+    assert changes.changes_visualization()
+    # the base model is not changed
+    assert {name: base[name] for name in before} == before
+    assert base["res_calendars"][agent_ids[0]].to_dict() == calendar_before
+    assert "deactivated_resources" not in base or agent_ids[1] not in base["deactivated_resources"]
+
+
+def test_calendar_change_copies_only_that_calendar(discovered_sim_config):
+    base = discovered_sim_config.sim_instance.simulation_parameters
+    agent_ids = list(base["res_calendars"])
+    json_data = {"params": {"res_calendars": [_calendar_json(agent_ids[0], ["MONDAY"], [[["09:00:00", "10:00:00"]]])]}}
+
+    updated = (
+        ParameterChangeSet.from_json(json_data).without_unchanged(discovered_sim_config).apply(discovered_sim_config)
+    )
+    parameters = updated.sim_instance.simulation_parameters
+
+    assert parameters["res_calendars"][agent_ids[0]] is not base["res_calendars"][agent_ids[0]]
+    assert parameters["res_calendars"][agent_ids[1]] is base["res_calendars"][agent_ids[1]]
+    assert parameters["transition_probabilities"] is base["transition_probabilities"]
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"new_num_cases_to_simulate": 7},
+        {"start_timestamp": "2026-01-01 08:00:00+00:00"},
+        {"central_orchestration": True},
+        {"agent_count_changes": [{"id": 0, "count": 2}]},
+        {"res_calendars": [_calendar_json(0, ["TUESDAY"], [[["08:00:00", "12:00:00"]]])]},
+        {"global_activity_durations": {"Check application form completeness": 60.0}},
+    ],
+)
+def test_dump_reuses_unchanged_sections(discovered_sim_config, params):
+    base_data = dump_model(discovered_sim_config)
+    changes = ParameterChangeSet.from_json({"params": params}).without_unchanged(discovered_sim_config)
+    unchanged = set(SECTIONS) - {CONFIG_SECTION} - get_changed_sections(changes.get_changed_parameters())
+
+    updated = changes.apply(discovered_sim_config)
+    data = dump_model(updated, base_data, unchanged)
+
+    # the reused sections are the ones encoding the changed model would give
+    assert unchanged
+    assert data == dump_model(updated)
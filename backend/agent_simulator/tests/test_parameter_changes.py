@@ -11,10 +11,10 @@ from datetime import datetime
 import pandas as pd
 import pytest
 from agent_simulator_manager import _apply_changes
-from agent_simulator_manager import apply_agent_activity_overrides
-from agent_simulator_manager import apply_global_activity_overrides
 from agent_simulator_manager import start_simulation_from_api
 from param_changes import _add_new_agents
+from param_changes import apply_agent_activity_overrides
+from param_changes import apply_global_activity_overrides
 from param_changes import change_num_cases
 from param_changes import change_start_time
 from param_changes import deactivate_agents
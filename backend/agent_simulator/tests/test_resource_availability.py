@@ -0,0 +1,61 @@
+"""
+Unit tests for the resource availability used in the extraneous delay discovery (source/extraneous_delays).
+"""
+
+import pandas as pd
+from source.extraneous_delays.concurrency_oracle import Configuration
+from source.extraneous_delays.delay_discoverer import _get_first_and_last_available
+from source.extraneous_delays.event_log import EventLogIDs
+from source.extraneous_delays.resource_availability import SimpleResourceAvailability
+
+
+def _timestamp(time):
+    return pd.Timestamp(f"2024-01-01 {time}", tz="UTC")
+
+
+def _event_log():
+    events = [
+        (1, "A", 0, "08:00", "09:00"),
+        (2, "A", 0, "09:30", "10:00"),
+        (1, "B", 1, "09:00", "09:30"),
+        (2, "B", 0, "10:00", "11:00"),
+    ]
+    return pd.DataFrame(
+        [
+            {
+                "case_id": case_id,
+                "activity_name": activity,
+                "agent": agent,
+                "start_timestamp": _timestamp(start),
+                "end_timestamp": _timestamp(end),
+            }
+            for case_id, activity, agent, start, end in events
+        ]
+    )
+
+
+def test_add_resource_availability_times():
+    event_log = _event_log()
+    config = Configuration(log_ids=EventLogIDs(), consider_start_times=True)
+
+    SimpleResourceAvailability(event_log, config).add_resource_availability_times(event_log)
+
+    available_times = event_log["available_time"].tolist()
+    # the first event of each resource has no previous event
+    assert pd.isna(available_times[0]) and pd.isna(available_times[2])
+    assert available_times[1] == _timestamp("09:00")
+    assert available_times[3] == _timestamp("10:00")
+
+
+def test_get_first_and_last_available():
+    first_available, last_available = _get_first_and_last_available(
+        beginning=_timestamp("08:00"),
+        end=_timestamp("12:00"),
+        starts=[_timestamp("07:30"), _timestamp("10:00")],
+        ends=[_timestamp("09:00"), _timestamp("12:00")],
+        time_gap=pd.Timedelta(seconds=1),
+    )
+
+    # the resource is only idle between 09:00 and 10:00
+    assert first_available == _timestamp("09:00")
+    assert last_available == _timestamp("10:00")
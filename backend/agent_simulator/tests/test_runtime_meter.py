@@ -0,0 +1,51 @@
+"""
+Unit tests for the stage timing and job progress (source/runtime_meter.py).
+"""
+
+import pytest
+from source.runtime_meter import RuntimeMeter
+from source.runtime_meter import get_job_progress
+from source.runtime_meter import track_job
+
+
+def test_runtime_meter_records_nested_stages():
+    meter = RuntimeMeter(kind="discovery")
+
+    with meter.stage("discovery"):
+        assert meter.to_dict()["current_stage"] == "discovery"
+        with meter.stage("preprocess"):
+            meter.count("events_processed", 10)
+            assert meter.to_dict()["current_stage"] == "discovery/preprocess"
+        meter.count("events_processed", 5)
+
+    runtime = meter.to_dict()
+    assert [stage["name"] for stage in runtime["stages"]] == ["discovery/preprocess", "discovery"]
+    assert runtime["stages"][1]["duration_seconds"] >= runtime["stages"][0]["duration_seconds"]
+    assert runtime["counters"] == {"events_processed": 15}
+    assert runtime["current_stage"] is None
+
+
+def test_track_job_progress():
+    meter = RuntimeMeter("test-job", kind="simulation")
+
+    with track_job(meter):
+        with meter.stage("simulation_0"):
+            assert get_job_progress("test-job")["status"] == "running"
+            assert get_job_progress("test-job")["current_stage"] == "simulation_0"
+
+    progress = get_job_progress("test-job")
+    assert progress["status"] == "finished"
+    assert progress["stages"][0]["name"] == "simulation_0"
+    assert get_job_progress("unknown-job") is None
+
+
+def test_track_job_failure():
+    meter = RuntimeMeter("failing-job")
+
+    with pytest.raises(ValueError):
+        with track_job(meter):
+            raise ValueError("No agents")
+
+    progress = get_job_progress("failing-job")
+    assert progress["status"] == "failed"
+    assert progress["error"] == "No agents"
@@ -71,7 +71,7 @@ def test_process_discovery_args():
     assert isinstance(config.column_names, dict)
     assert config.sim_instance is None  # Is yet not set, gets set in discovery
     assert config.determine_automatically is True
-    assert config.extr_delays is False
+    assert config.discover_extr_delays is False
     assert config.central_orchestration is False
     assert config.path_log == "test_resources/LoanAppSmall.csv"
 
@@ -0,0 +1,135 @@
+"""
+Unit tests for the staffing search (source/staffing_optimizer.py and agent_simulator_manager.optimize_staffing).
+"""
+
+import json
+
+import numpy as np
+import pytest
+from agent_simulator_manager import apply_overlays
+from agent_simulator_manager import optimize_staffing
+from source.job_executor import JobExecutor
+from source.model_format import dump_model
+from source.model_registry import model_registry
+from source.staffing_optimizer import DOMINATED
+from source.staffing_optimizer import INFEASIBLE
+from source.staffing_optimizer import PARETO
+from source.staffing_optimizer import StaffingSearch
+from source.staffing_optimizer import get_staffing_cost
+from source.staffing_optimizer import search_staffing
+
+EARLY_SHIFT = {"name": "early", "days": ["MONDAY", "TUESDAY"], "schedule": [[["06:00:00", "14:00:00"]]] * 2}
+
+
+@pytest.fixture(scope="module")
+def model_hash(discovered_sim_config):
+    return model_registry.register(dump_model(discovered_sim_config), discovered_sim_config)
+
+
+def test_search_from_json():
+    search = StaffingSearch.from_json(
+        {
+            "agents": [{"id": "3", "min_count": 1, "max_count": 3, "schedules": [EARLY_SHIFT]}, {"id": 5}],
+            "kpi": "makespan",
+            "seed": 4,
+        }
+    )
+
+    assert [(agent.agent_id, agent.counts) for agent in search.agents] == [(3, [1, 2, 3]), (5, [1])]
+    assert search.agents[0].schedules == [None, EARLY_SHIFT]
+    assert (search.kpi, search.seed) == ("makespan", 4)
+    assert len(search.get_candidates()) == 6
+
+    with pytest.raises(ValueError):
+        StaffingSearch.from_json({"agents": [{"id": 3, "counts": [0, 1]}]})
+    with pytest.raises(ValueError):
+        StaffingSearch.from_json({"agents": [{"id": 3}], "kpi": "unknown"})
+
+
+def test_sampled_candidates():
+    search = StaffingSearch.from_json(
+        {"agents": [{"id": agent_id, "max_count": 4} for agent_id in range(4)], "max_candidates": 10, "seed": 1}
+    )
+
+    candidates = search.get_candidates()
+
+    assert len(candidates) == 10
+    assert candidates[0].counts == {0: 1, 1: 1, 2: 1, 3: 1}
+    assert candidates[-1].counts == {0: 4, 1: 4, 2: 4, 3: 4}
+    assert [c.counts for c in search.get_candidates()] == [c.counts for c in candidates]
+
+
+def test_candidate_changes_schedules_before_counts():
+    search = StaffingSearch.from_json({"agents": [{"id": 3, "counts": [2], "schedules": [EARLY_SHIFT]}]})
+    candidate = search.get_candidates()[1]
+
+    assert candidate.get_overlays() == [
+        {
+            "params": {
+                "res_calendars": [{"agent_id": 3, "days": EARLY_SHIFT["days"], "schedule": EARLY_SHIFT["schedule"]}]
+            }
+        },
+        {"params": {"agent_count_changes": [{"id": 3, "count": 2}]}},
+    ]
+
+
+def test_search_prunes_with_common_random_numbers():
+    search = StaffingSearch.from_json(
+        {"agents": [{"id": 0, "max_count": 4}], "num_simulations": 8, "initial_simulations": 2, "target": 12}
+    )
+    candidates = search.get_candidates()
+    for candidate in candidates:
+        candidate.cost = candidate.counts[0]
+    # The cycle time decreases with more instances until 3, the noise of a replication is shared by all candidates
+    expected = {1: 14.0, 2: 11.0, 3: 10.0, 4: 10.5}
+    noise = np.random.default_rng(0).normal(0, 1, 8)
+    evaluated = []
+
+    def evaluate(active, first_replication, num_replications):
+        evaluated.append(([candidate.index for candidate in active], first_replication, num_replications))
+        return [
+            [
+                {"cycle_time_mean": expected[candidate.counts[0]] + noise[first_replication + i]}
+                for i in range(num_replications)
+            ]
+            for candidate in active
+        ]
+
+    result = search_staffing(search, candidates, evaluate)
+
+    statuses = {candidate["candidate"]: candidate["status"] for candidate in result["candidates"]}
+    assert statuses == {0: INFEASIBLE, 1: PARETO, 2: PARETO, 3: DOMINATED}
+    assert evaluated == [([0, 1, 2, 3], 0, 2), ([1, 2], 2, 2), ([1, 2], 4, 4)]
+    assert [candidate["candidate"] for candidate in result["pareto_front"]] == [1, 2]
+    assert result["best"]["candidate"] == 1
+    assert result["candidates"][3]["pruned_by"] == 2
+    assert result["num_simulated"] == 8 + 4 + 8 < result["num_simulated_without_pruning"]
+
+
+def test_staffing_cost(model_hash):
+    simulation_parameters = model_registry.get(model_hash).sim_instance.simulation_parameters
+    agent_id = int(next(iter(simulation_parameters["agent_to_resource"])))
+    agent_hours = simulation_parameters["res_calendars"][agent_id].total_weekly_work / 3600
+    cost = get_staffing_cost(simulation_parameters, {})
+
+    overlay = json.dumps({"params": {"agent_count_changes": [{"id": agent_id, "count": 3}]}}).encode()
+    changed_parameters = model_registry.get(apply_overlays(model_hash, [overlay])).sim_instance.simulation_parameters
+
+    assert get_staffing_cost(changed_parameters, {}) == pytest.approx(cost + 2 * agent_hours)
+    assert get_staffing_cost(changed_parameters, {agent_id: 10.0}) == pytest.approx(cost + 29 * agent_hours)
+
+
+def test_optimize_staffing(model_hash):
+    simulation_parameters = model_registry.get(model_hash).sim_instance.simulation_parameters
+    agent_id = int(next(iter(simulation_parameters["agent_to_resource"])))
+    search = StaffingSearch.from_json({"agents": [{"id": agent_id, "counts": [1, 2]}], "num_simulations": 2, "seed": 1})
+    executor = JobExecutor({"discovery": 1, "simulation": 2})
+
+    result = optimize_staffing(executor, model_hash, search)
+
+    first, second = result["candidates"]
+    assert first["cost"] < second["cost"]
+    assert first["num_simulations"] == second["num_simulations"] == 2
+    assert first["status"] == PARETO
+    assert result["pareto_front"][0]["candidate"] == 0
+    assert not executor._jobs
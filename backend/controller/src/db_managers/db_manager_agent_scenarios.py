@@ -6,6 +6,8 @@ is used to manage the database operations related to AgentSimulator scenarios.
 import psycopg2
 from src.db_managers.url_builder import build_database_url
 
+HAS_OVERLAYS_MESSAGE = "Scenario has scenarios derived from it, delete them first"
+
 
 class DBManagerAgentScenarios:
     """
@@ -36,13 +38,18 @@ class DBManagerAgentScenarios:
         """
         Uploads an AgentSimulator scenario to the database.
 
+        A scenario either stores its model (model_pkl and visualization_json), or is an overlay of
+        a parent scenario (parent_id and overlay_json), see get_agent_scenario_lineage.
+
         Args:
             data (dict): A dictionary containing the scenario details:
                 - event_log_id (int)
                 - name (str)
-                - model_pkl (bytes)
+                - model_pkl (bytes, optional for overlays)
                 - param_json (bytes)
-                - visualization_json (bytes)
+                - visualization_json (bytes, optional for overlays)
+                - parent_id (int, optional): The scenario the overlay is applied to.
+                - overlay_json (bytes, optional): The parameter changes applied to the parent's model.
 
         Returns:
             int: The new scenario database ID on success.
@@ -53,11 +60,19 @@ class DBManagerAgentScenarios:
         cursor.execute(
             """
             INSERT INTO agent_scenarios
-                (event_log_id, name, model_pkl, param_json, visualization_json)
-            VALUES (%s, %s, %s, %s, %s)
+                (event_log_id, name, model_pkl, param_json, visualization_json, parent_id, overlay_json)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
             RETURNING id
             """,
-            (data["event_log_id"], data["name"], data["model_pkl"], data["param_json"], data["visualization_json"]),
+            (
+                data["event_log_id"],
+                data["name"],
+                data.get("model_pkl"),
+                data["param_json"],
+                data.get("visualization_json"),
+                data.get("parent_id"),
+                data.get("overlay_json"),
+            ),
         )
         new_scenario = cursor.fetchone()
         conn.commit()
@@ -130,14 +145,19 @@ class DBManagerAgentScenarios:
         Returns:
             dict: On success, keys:
                 - id, event_log_id, name, model_pkl (bytes),
-                  param_json (bytes), visualization_json (bytes)
+                  param_json (bytes), visualization_json (bytes),
+                  parent_id (int), overlay_json (bytes)
+                  model_pkl and visualization_json are None for overlays (parent_id is not None)
             tuple: ({"status": "error", "message": "Scenario not found"}, 404)
                     if no matching record.
         """
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute(
-            "SELECT id, event_log_id, name, model_pkl, param_json, visualization_json FROM agent_scenarios WHERE id = %s",
+            """
+            SELECT id, event_log_id, name, model_pkl, param_json, visualization_json, parent_id, overlay_json
+            FROM agent_scenarios WHERE id = %s
+            """,
             (id,),
         )
         scenario = cursor.fetchone()
@@ -152,10 +172,49 @@ class DBManagerAgentScenarios:
                 "model_pkl": scenario[3],
                 "param_json": scenario[4],
                 "visualization_json": scenario[5],
+                "parent_id": scenario[6],
+                "overlay_json": scenario[7],
             }
         else:
             return {"status": "error", "message": "Scenario not found"}, 404
 
+    def get_agent_scenario_lineage(self, id):
+        """
+        Fetch the model of an AgentSimulator scenario as its base model and the ordered overlays
+        (parameter changes) of the scenarios from the base scenario down to the scenario.
+
+        Args:
+            id (int): Scenario database ID.
+
+        Returns:
+            dict: On success, keys:
+                - model_pkl (bytes): The model of the base scenario.
+                - overlays (list[bytes]): The overlays to apply to the model, in order.
+            None: If no scenario matches the ID.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            WITH RECURSIVE lineage AS (
+                SELECT id, parent_id, model_pkl, overlay_json, 0 AS depth
+                FROM agent_scenarios WHERE id = %s
+                UNION ALL
+                SELECT s.id, s.parent_id, s.model_pkl, s.overlay_json, l.depth + 1
+                FROM agent_scenarios AS s JOIN lineage AS l ON s.id = l.parent_id
+            )
+            SELECT model_pkl, overlay_json FROM lineage ORDER BY depth DESC
+            """,
+            (id,),
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+        if not rows:
+            return None
+        return {"model_pkl": rows[0][0], "overlays": [row[1] for row in rows[1:]]}
+
     def update_agent_scenario(self, id, name=None, param_json=None):
         """
         Change a AgentSimulator scenario's name and/or parameter JSON.
@@ -210,22 +269,34 @@ class DBManagerAgentScenarios:
         """
         Remove a AgentSimulator scenario by its ID.
 
+        A scenario that other scenarios are overlays of is not deleted, since their models are derived
+        from its model, the overlays have to be deleted first.
+
         Args:
             id (int): Scenario ID.
 
         Returns:
-            dict: success or error message.
+            dict: success or error message, the message is HAS_OVERLAYS_MESSAGE if other scenarios
+                are overlays of the scenario.
         """
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
             cursor.execute(
-                "DELETE FROM agent_scenarios WHERE id = %s RETURNING id",
-                (id,),
+                """
+                DELETE FROM agent_scenarios
+                WHERE id = %s AND NOT EXISTS (SELECT FROM agent_scenarios WHERE parent_id = %s)
+                RETURNING id
+                """,
+                (id, id),
             )
             deleted = cursor.fetchone()
             if deleted is None:
+                cursor.execute("SELECT EXISTS (SELECT FROM agent_scenarios WHERE parent_id = %s)", (id,))
+                has_overlays = cursor.fetchone()
                 conn.commit()
+                if has_overlays is not None and has_overlays[0]:
+                    return {"status": "error", "message": HAS_OVERLAYS_MESSAGE}
                 return {"status": "error", "message": "Scenario not found"}
 
             conn.commit()
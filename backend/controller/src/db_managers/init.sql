@@ -40,13 +40,20 @@ CREATE TABLE IF NOT EXISTS simod_outputs (
     output_data BYTEA NOT NULL
 );
 
+-- A scenario either stores its model (model_pkl, visualization_json) or is an overlay of its parent scenario,
+-- storing only the parameter changes (overlay_json) that are applied to the model of the parent
 CREATE TABLE IF NOT EXISTS agent_scenarios (
     id SERIAL PRIMARY KEY,
     event_log_id INTEGER NOT NULL REFERENCES event_logs(id),
     name VARCHAR(255) NOT NULL,
-    model_pkl BYTEA NOT NULL,
+    model_pkl BYTEA,
     param_json BYTEA NOT NULL,
-    visualization_json BYTEA NOT NULL
+    visualization_json BYTEA,
+    -- A scenario can not be deleted while other scenarios are overlays of it
+    parent_id INTEGER REFERENCES agent_scenarios(id) ON DELETE RESTRICT,
+    overlay_json BYTEA,
+    CONSTRAINT agent_scenarios_model_check
+        CHECK ((parent_id IS NULL AND model_pkl IS NOT NULL) OR (parent_id IS NOT NULL AND overlay_json IS NOT NULL))
 );
 
 CREATE TABLE IF NOT EXISTS agent_outputs (
@@ -32,6 +32,7 @@ from flask import send_file
 from src.db_managers.db_manager_agent_output import DBManagerAgentOutput
 from src.db_managers.db_manager_agent_scenarios import DBManagerAgentScenarios
 from src.db_managers.db_manager_event_log import DBManagerEventLog
+from src.routes.utils.agent_models import post_scenario_model
 
 db_manager = DBManagerEventLog()
 db_manager_agent_scenario = DBManagerAgentScenarios()
@@ -162,19 +163,15 @@ def start_agent_simulation():
     if not user_id or not scenario_id:
         return jsonify({"status": "error", "message": "Missing user_id or scenario_id parameters"}), 400
 
-    # Get discovery scenario from database
-    scenario_result = db_manager_agent_scenario.get_agent_scenario(scenario_id)
-    if not scenario_result:
+    # Get the model of the discovery scenario from database, as its base model and overlays
+    lineage = db_manager_agent_scenario.get_agent_scenario_lineage(scenario_id)
+    if not lineage:
         return jsonify({"status": "error", "message": "Scenario not found"}), 404
 
-    # Convert to BytesIO objects for sending to the API
-    pkl_data_io = BytesIO(scenario_result["model_pkl"])
-
     # Send request to Agent Simulator API for simulation
     url = "http://agent_simulator:6002/api/start-agent-simulation"
-    files = {"simulation_config_pkl": ("simulation_config.pkl", pkl_data_io, "application/octet-stream")}
     try:
-        response = requests.post(url, files=files)
+        response = post_scenario_model(url, lineage)
 
         if save_boolean == "true":
             filename = "simulated_event_logs.zip"
@@ -209,9 +206,12 @@ def start_agent_simulation():
 @agent_bp.route("/api/update-agent-parameters", methods=["POST"])
 def update_agent_parameters():
     """
-    Fetch an existing scenarios model.pkl from the DB, apply parameter changes via
+    Fetch an existing scenarios model from the DB, apply parameter changes via
     the simulation api, save the new scenario, and return the updated ZIP.
 
+    The new scenario is saved as an overlay of the existing scenario: only the parameter changes
+    are stored, its model is derived from the model of the existing scenario when it is used.
+
     Args:
         user_id (str): ID of the user (required).
         scenario_id (int): ID of the scenario to update (required).
@@ -244,19 +244,18 @@ def update_agent_parameters():
         return jsonify({"status": "error", "message": "Invalid JSON file"}), 400
 
     original = db_manager_agent_scenario.get_agent_scenario(scenario_id)
-    if not original:
+    lineage = db_manager_agent_scenario.get_agent_scenario_lineage(scenario_id)
+    if not original or isinstance(original, tuple) or not lineage:
         return jsonify({"status": "error", "message": "Scenario not found"}), 404
 
-    model_bytes = original["model_pkl"]
-    pkl_io = BytesIO(model_bytes)
-
-    pkl_tuple = ("model.pkl", pkl_io, "application/octet-stream")
-    json_tuple = (json_file.filename, json_file.stream, "application/json")
+    changed_parameters = json_file.read()
+    json_tuple = (json_file.filename, changed_parameters, "application/json")
 
     try:
-        response = requests.post(
+        response = post_scenario_model(
             "http://agent_simulator:6002/api/update-parameters",
-            files={"simulation_config_pkl": pkl_tuple, "changed_parameters": json_tuple},
+            lineage,
+            files={"changed_parameters": json_tuple},
         )
     except requests.RequestException as e:
         return jsonify({"status": "error", "message": f"Could not connect to AgentSimulator: {e}"}), 502
@@ -273,15 +272,14 @@ def update_agent_parameters():
     bundle_io = BytesIO(response.content)
     zf = zipfile.ZipFile(bundle_io)
     new_params = zf.read("params.json")
-    new_model_pkl = zf.read("model.pkl")
-    new_visualization = zf.read("visualization.json")
 
+    # The new scenario is stored as an overlay of the original scenario, only the changes are stored
     save_data = {
         "event_log_id": original["event_log_id"],
         "name": new_name or original.get("name", ""),
         "param_json": new_params,
-        "model_pkl": new_model_pkl,
-        "visualization_json": new_visualization,
+        "parent_id": original["id"],
+        "overlay_json": changed_parameters,
     }
     new_scenario_id = db_manager_agent_scenario.upload_agent_scenario(save_data)
 
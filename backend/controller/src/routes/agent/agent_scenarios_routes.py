@@ -39,7 +39,9 @@ from flask import Blueprint
 from flask import jsonify
 from flask import request
 from flask import send_file
+from src.db_managers.db_manager_agent_scenarios import HAS_OVERLAYS_MESSAGE
 from src.db_managers.db_manager_agent_scenarios import DBManagerAgentScenarios
+from src.routes.utils.agent_models import post_scenario_model
 
 db_manager = DBManagerAgentScenarios()
 agent_scenarios_bp = Blueprint("agent_scenarios", __name__)
@@ -187,6 +189,7 @@ def list_agent_scenarios_api():
 def get_agent_scenario_api():
     """
     Retrieve an AgentSimulator scenario by its ID and return it as a ZIP download.
+    The model of a scenario that is stored as an overlay is derived by the Agent Simulator.
 
     Args:
         id (query int): The ID of the scenario to retrieve (required).
@@ -221,6 +224,13 @@ def get_agent_scenario_api():
         scenario["visualization_json"],
     )
 
+    # The model of an overlay is derived from the model of its parent scenario by the Agent Simulator
+    if scenario["parent_id"] is not None:
+        try:
+            model_pkl, visualization_json = _resolve_overlay(scenario_id)
+        except Exception as e:
+            return jsonify({"status": "error", "message": f"could not derive the scenario model: {str(e)}"}), 500
+
     if name is None or model_pkl is None or param_json is None or visualization_json is None:
         return jsonify({"status": "error", "message": "invalid scenario data format"}), 500
 
@@ -320,6 +330,7 @@ def delete_agent_scenario_api():
         JSON response (200): {"status": "success", "message": "Agent scenario deleted successfully."}
         JSON response (400): {"status": "error", "message": str}
         JSON response (404): {"status": "error", "message": str}
+        JSON response (409): {"status": "error", "message": str} if other scenarios are overlays of the scenario
         JSON response (500): {"status": "error", "message": str}
 
     Curl example:
@@ -332,7 +343,34 @@ def delete_agent_scenario_api():
     result = db_manager.delete_agent_scenario(scenario_id)
 
     if result["status"] == "error":
-        code = 404 if result["message"] == "Scenario not found" else 500
+        code = {"Scenario not found": 404, HAS_OVERLAYS_MESSAGE: 409}.get(result["message"], 500)
         return jsonify(result), code
 
     return jsonify(result), 200
+
+
+def _resolve_overlay(scenario_id):
+    """
+    Derives the model of a scenario that is stored as an overlay of its parent scenario.
+
+    The last overlay is sent as the changed parameters of an update, as when the scenario was created,
+    the Agent Simulator answers with the model and visualization data it derived then (if it still has them).
+
+    Args:
+        scenario_id (int): The ID of the scenario.
+
+    Returns:
+        tuple: The model (bytes) and the visualization data (bytes) of the scenario.
+    """
+    lineage = db_manager.get_agent_scenario_lineage(scenario_id)
+    *overlays, last_overlay = lineage["overlays"]
+    response = post_scenario_model(
+        "http://agent_simulator:6002/api/update-parameters",
+        {"model_pkl": lineage["model_pkl"], "overlays": overlays},
+        files={"changed_parameters": ("overlay.json", bytes(last_overlay), "application/json")},
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Agent simulator error {response.status_code}")
+
+    bundle = zipfile.ZipFile(BytesIO(response.content))
+    return bundle.read("model.pkl"), bundle.read("visualization.json")
@@ -30,6 +30,7 @@ from src.db_managers.db_manager_agent_scenarios import DBManagerAgentScenarios
 from src.db_managers.db_manager_event_log import DBManagerEventLog
 from src.db_managers.db_manager_simod_output import DBManagerSimodOutput
 from src.db_managers.db_manager_simod_scenarios import DBManagerSimodScenario
+from src.routes.utils.agent_models import post_scenario_model
 
 analyze_bp = Blueprint("analyze", __name__)
 db_manager_event_log = DBManagerEventLog()
@@ -187,19 +188,21 @@ def get_agent_parameters_dict(agent_scenario_id):
     """
 
     try:
-        scenario_data = db_manager_agent_scenario.get_agent_scenario(agent_scenario_id)
-        if isinstance(scenario_data, tuple) or "error" in scenario_data:
+        lineage = db_manager_agent_scenario.get_agent_scenario_lineage(agent_scenario_id)
+        if not lineage:
             return None
 
-        param_json = scenario_data.get("model_pkl")
-
-        pkl_data_io = BytesIO(param_json)
-
         # Send request to Agent Simulator API.
+        # The analysis only uses the calendars (and salaries) of the agents, only these sections of the model are read.
+        # The model of a scenario stored as an overlay is derived from its base model by the Agent Simulator instead
         url = "http://agent_simulator:6002/api/get-pkl-as-json"
-        files = {"pkl_file": pkl_data_io}
+        files = {"pkl_file": BytesIO(lineage["model_pkl"])}
+        data = {"sections": "parameters,calendars"}
         try:
-            response = requests.post(url, files=files)
+            if lineage["overlays"]:
+                response = post_scenario_model(url, lineage)
+            else:
+                response = requests.post(url, files=files, data=data)
             if response.status_code == 200:
                 return json.loads(response.json()["message"])
             else:
@@ -0,0 +1,62 @@
+"""
+This file contains the functions for sending the model of an AgentSimulator scenario to the Agent Simulator API.
+
+A scenario is stored either with its model or as an overlay (parameter changes) of its parent scenario,
+see DBManagerAgentScenarios.get_agent_scenario_lineage. The model is sent as the model of the base scenario and
+the overlays, the Agent Simulator applies the overlays and keeps the resulting models in memory.
+"""
+
+import hashlib
+
+import requests
+
+
+def post_model(url, model_bytes, overlays=(), files=None, data=None):
+    """
+    Sends a request about a model to the Agent Simulator API.
+
+    The Agent Simulator keeps the models it has seen in memory, so the model is referred to by its hash
+    and only uploaded if the Agent Simulator does not know the hash (404).
+
+    Args:
+        url (str): URL of the Agent Simulator endpoint.
+        model_bytes (bytes): The model file (model.pkl).
+        overlays (list[bytes], optional): Parameter changes (json) applied in order to the model.
+        files (dict, optional): The other files of the request, with their content as bytes
+            (the request may be sent twice).
+        data (dict, optional): The other form fields of the request.
+
+    Returns:
+        requests.Response: The response of the Agent Simulator.
+    """
+    model_bytes = bytes(model_bytes)
+    model_hash = hashlib.sha256(model_bytes).hexdigest()
+    files = list((files or {}).items())
+    files += [
+        ("overlays", (f"overlay_{i}.json", bytes(overlay), "application/json")) for i, overlay in enumerate(overlays)
+    ]
+    data = data or {}
+
+    response = requests.post(url, files=files or None, data={"model_hash": model_hash, **data})
+    if response.status_code != 404:
+        return response
+
+    model_file = ("model.pkl", model_bytes, "application/octet-stream")
+    return requests.post(url, files=[("simulation_config_pkl", model_file), *files], data=data or None)
+
+
+def post_scenario_model(url, lineage, files=None, data=None):
+    """
+    Sends a request about the model of a scenario to the Agent Simulator API, see post_model.
+
+    Args:
+        url (str): URL of the Agent Simulator endpoint.
+        lineage (dict): The base model and overlays of the scenario, see
+            DBManagerAgentScenarios.get_agent_scenario_lineage.
+        files (dict, optional): The other files of the request, with their content as bytes.
+        data (dict, optional): The other form fields of the request.
+
+    Returns:
+        requests.Response: The response of the Agent Simulator.
+    """
+    return post_model(url, lineage["model_pkl"], lineage["overlays"], files=files, data=data)
@@ -2,6 +2,7 @@
 Integration tests for the Agent routes.
 """
 
+import hashlib
 import zipfile
 from io import BytesIO
 from unittest.mock import MagicMock
@@ -9,15 +10,18 @@ from unittest.mock import MagicMock
 import pytest
 from flask import Flask
 from src.db_managers.db_manager_agent_output import DBManagerAgentOutput
+from src.db_managers.db_manager_agent_scenarios import HAS_OVERLAYS_MESSAGE
 from src.db_managers.db_manager_agent_scenarios import DBManagerAgentScenarios
 from src.db_managers.db_manager_event_log import DBManagerEventLog
 from src.routes.agent.agent_routes import agent_bp
+from src.routes.agent.agent_scenarios_routes import agent_scenarios_bp
 
 # import requests
 
 # Create a Flask app for testing
 app = Flask(__name__)
 app.register_blueprint(agent_bp)
+app.register_blueprint(agent_scenarios_bp)
 
 
 # Creates the client to curl towards
@@ -33,11 +37,13 @@ def mock_db_managers(mocker):
     """Mock all database managers."""
     mock_event_log = mocker.patch.object(DBManagerEventLog, "get_event_log")
     mock_agent_scenario = mocker.patch.object(DBManagerAgentScenarios, "get_agent_scenario")
+    mock_scenario_lineage = mocker.patch.object(DBManagerAgentScenarios, "get_agent_scenario_lineage")
     mock_create_scenario = mocker.patch.object(DBManagerAgentScenarios, "upload_agent_scenario")
     mock_agent_output = mocker.patch.object(DBManagerAgentOutput, "upload_agent_output")
     return {
         "event_log": mock_event_log,
         "agent_scenario": mock_agent_scenario,
+        "scenario_lineage": mock_scenario_lineage,
         "create_scenario": mock_create_scenario,
         "agent_output": mock_agent_output,
     }
@@ -110,3 +116,65 @@ def test_start_agent_simulation_missing_params(client):
     response = client.get("/api/start-agent-simulation?scenario_id=1")
 
     assert response.json == {"status": "error", "message": "Missing user_id or scenario_id parameters"}
+
+
+def test_start_agent_simulation_uploads_unknown_model(client, mock_db_managers, mock_requests_post):
+    """Test that the model is only uploaded when the Agent simulator does not know its hash"""
+    # Arrange: The first request (by hash) is answered with 404, the second (with the model) with the logs
+    mock_db_managers["scenario_lineage"].return_value = {"model_pkl": b"model", "overlays": []}
+    unknown_model = MagicMock(status_code=404)
+    simulated_logs = MagicMock(status_code=200, content=b"zip")
+    mock_requests_post.side_effect = [unknown_model, simulated_logs]
+
+    # Act: Send GET request
+    response = client.get("/api/start-agent-simulation?user_id=skib&scenario_id=1")
+
+    # Assert: The model was referred to by its hash before it was uploaded
+    assert response.status_code == 200
+    assert response.data == b"zip"
+    first_call, second_call = mock_requests_post.call_args_list
+    assert first_call.kwargs["data"] == {"model_hash": hashlib.sha256(b"model").hexdigest()}
+    assert dict(second_call.kwargs["files"])["simulation_config_pkl"][1] == b"model"
+
+
+def test_update_agent_parameters_saves_overlay(client, mock_db_managers, mock_requests_post):
+    """Test that an updated scenario is saved as the parameter changes of the original scenario"""
+    # Arrange: The original scenario is an overlay of a base scenario
+    mock_db_managers["agent_scenario"].return_value = {"id": 2, "event_log_id": 1, "name": "original"}
+    mock_db_managers["scenario_lineage"].return_value = {"model_pkl": b"model", "overlays": [b'{"first": 1}']}
+    mock_db_managers["create_scenario"].return_value = 3
+    zip_buffer = BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w") as zip_file:
+        zip_file.writestr("model.pkl", b"changed model")
+        zip_file.writestr("params.json", b'{"param": "value"}')
+        zip_file.writestr("visualization.json", b'{"visual": "value"}')
+    mock_requests_post.return_value = MagicMock(status_code=200, content=zip_buffer.getvalue())
+
+    # Act: Send POST request with the changes
+    response = client.post(
+        "/api/update-agent-parameters?user_id=skib&scenario_id=2",
+        data={"changed_parameters": (BytesIO(b'{"second": 2}'), "changes.json")},
+    )
+
+    # Assert: The overlays are sent with the model, only the new changes are saved
+    assert response.status_code == 200
+    assert response.headers["X-Scenario-ID"] == "3"
+    files = mock_requests_post.call_args.kwargs["files"]
+    assert ("overlays", ("overlay_0.json", b'{"first": 1}', "application/json")) in files
+    saved = mock_db_managers["create_scenario"].call_args.args[0]
+    assert saved["parent_id"] == 2
+    assert saved["overlay_json"] == b'{"second": 2}'
+    assert "model_pkl" not in saved
+
+
+def test_delete_agent_scenario_with_overlays(client, mocker):
+    mocker.patch.object(
+        DBManagerAgentScenarios,
+        "delete_agent_scenario",
+        return_value={"status": "error", "message": HAS_OVERLAYS_MESSAGE},
+    )
+
+    response = client.delete("/storage/delete-agent-scenario?id=1")
+
+    assert response.status_code == 409
+    assert response.get_json()["message"] == HAS_OVERLAYS_MESSAGE
@@ -3,6 +3,7 @@ Unit tests for the DBManagerAgentScenarios class.
 """
 
 import pytest
+from src.db_managers.db_manager_agent_scenarios import HAS_OVERLAYS_MESSAGE
 from src.db_managers.db_manager_agent_scenarios import DBManagerAgentScenarios
 
 
@@ -38,6 +39,22 @@ class DummyCursor:
         pass
 
 
+class SequenceCursor(DummyCursor):
+    """
+    A dummy cursor that returns the next of the given rows
+    for every executed query.
+    """
+
+    def __init__(self, rows):
+        super().__init__()
+        self._next_rows = list(rows)
+        self.queries = []
+
+    def execute(self, query, params):
+        self.queries.append(query)
+        self._row = self._next_rows.pop(0)
+
+
 class DummyConn:
     """
     A dummy connection class to simulate
@@ -137,7 +154,7 @@ def test_get_agent_scenario_found(monkeypatch, db_mgr):
     Test that get_agent_scenario returns a full dict
     when the scenario is found.
     """
-    row = (2, 3, "X", b"mp", b"pj", b"vj")
+    row = (2, 3, "X", b"mp", b"pj", b"vj", None, None)
     dummy_cursor = DummyCursor(row=row)
     dummy_conn = DummyConn(dummy_cursor)
     monkeypatch.setattr(db_mgr, "get_connection", lambda: dummy_conn)
@@ -150,6 +167,8 @@ def test_get_agent_scenario_found(monkeypatch, db_mgr):
         "model_pkl": b"mp",
         "param_json": b"pj",
         "visualization_json": b"vj",
+        "parent_id": None,
+        "overlay_json": None,
     }
     assert result == expected
     assert not dummy_conn.committed
@@ -172,6 +191,32 @@ def test_get_agent_scenario_not_found(monkeypatch, db_mgr):
     assert "Scenario not found" in error.get("message", "")
 
 
+def test_get_agent_scenario_lineage(monkeypatch, db_mgr):
+    """
+    Test that get_agent_scenario_lineage returns the model of the base scenario
+    and the overlays of the scenarios below it in order.
+    """
+    rows = [(b"mp", None), (None, b"o1"), (None, b"o2")]
+    dummy_cursor = DummyCursor(rows=rows)
+    dummy_conn = DummyConn(dummy_cursor)
+    monkeypatch.setattr(db_mgr, "get_connection", lambda: dummy_conn)
+
+    result = db_mgr.get_agent_scenario_lineage(id=3)
+    assert result == {"model_pkl": b"mp", "overlays": [b"o1", b"o2"]}
+
+
+def test_get_agent_scenario_lineage_not_found(monkeypatch, db_mgr):
+    """
+    Test that get_agent_scenario_lineage returns None
+    when no scenario matches the given ID.
+    """
+    dummy_cursor = DummyCursor(rows=[])
+    dummy_conn = DummyConn(dummy_cursor)
+    monkeypatch.setattr(db_mgr, "get_connection", lambda: dummy_conn)
+
+    assert db_mgr.get_agent_scenario_lineage(id=8) is None
+
+
 def test_update_agent_scenario_success(monkeypatch, db_mgr):
     """
     Test that update_agent_scenario commits and returns the ID
@@ -252,3 +297,18 @@ def test_delete_agent_scenario_not_found(monkeypatch, db_mgr):
     assert isinstance(result, dict)
     assert result.get("status") == "error"
     assert "not found" in result.get("message", "").lower()
+
+
+def test_delete_agent_scenario_with_overlays(monkeypatch, db_mgr):
+    """
+    Test that delete_agent_scenario does not delete a scenario
+    that other scenarios are overlays of.
+    """
+    dummy_cursor = SequenceCursor(rows=[None, (True,)])
+    dummy_conn = DummyConn(dummy_cursor)
+    monkeypatch.setattr(db_mgr, "get_connection", lambda: dummy_conn)
+
+    result = db_mgr.delete_agent_scenario(id=5)
+    assert result == {"status": "error", "message": HAS_OVERLAYS_MESSAGE}
+    assert "NOT EXISTS" in dummy_cursor.queries[0]
+    assert not dummy_conn.rolled_back
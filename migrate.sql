@@ -0,0 +1,25 @@
+/* ------------------
+*  migrate.sql
+*  ------------------
+*  Purpose:
+*   SQL script that updates the tables of an existing database to the tables of 'init.sql'.
+*   Ran by the 'migrate' container on every start, since 'init.sql' only runs for a new database volume.
+*
+*  Note: 
+*   Every statement is idempotent, running the script on an up to date database changes nothing.
+*/
+
+-- Agent scenarios stored as overlays of their parent scenario
+ALTER TABLE agent_scenarios ADD COLUMN IF NOT EXISTS parent_id INTEGER REFERENCES agent_scenarios(id) ON DELETE RESTRICT;
+ALTER TABLE agent_scenarios ADD COLUMN IF NOT EXISTS overlay_json BYTEA;
+ALTER TABLE agent_scenarios ALTER COLUMN model_pkl DROP NOT NULL;
+ALTER TABLE agent_scenarios ALTER COLUMN visualization_json DROP NOT NULL;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT FROM pg_constraint WHERE conname = 'agent_scenarios_model_check') THEN
+    ALTER TABLE agent_scenarios ADD CONSTRAINT agent_scenarios_model_check
+      CHECK ((parent_id IS NULL AND model_pkl IS NOT NULL) OR (parent_id IS NOT NULL AND overlay_json IS NOT NULL));
+  END IF;
+END
+$$;